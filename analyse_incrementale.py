@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Ajout incrémental de deals à une analyse existante
+Une AnalysePersistee conserve, à côté du DataFrame final, ce qu'il faut pour
+intégrer un nouvel export sans tout recalculer :
+- les deals déjà vus (fichier d'origine, n° d'ordre) pour ignorer ceux réexportés
+- les positions encore ouvertes (IN sans OUT), réinjectées dans le matching du nouvel
+  export pour que ses OUT puissent les fermer
+- l'état non arrondi de la récurrence des cumuls (solde courant, plus haut, drawdown lissé)
+- les agrégats additifs (sommes / comptes par heure, jour, mois ; trades gagnants / perdants)
+
+Le coût d'un ajout dépend des nouveaux deals. Exception : des deals antérieurs au dernier
+deal connu (ou sans date) imposent de recalculer les cumuls de tout l'historique.
+
+Usage:
+    analyse = AnalysePersistee(df_final, solde_initial=10000, etat_cumuls=analyzer.etat_cumuls)
+    resume = analyse.ajouter(["export_semaine_42.xlsx"], origine="EURUSD m15.xlsx")
+    analyse.sauvegarder("analyse.pkl")
+    analyse = AnalysePersistee.charger("analyse.pkl")
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+import moteur_rapide
+from deal_schema import COLONNE_DATE, appliquer_schema_deals, concatener_deals
+
+COLONNES_CUMULS = ["Profit_compose", "Profit_cumule", "Solde_cumule", "Profit_pips_cumule",
+                   "Drawdown_pct", "Drawdown_euros", "Drawdown_running_pct"]
+HEURES, JOURS, MOIS = 24, 7, 12
+
+
+def _extreme(fonction, a, b):
+    """min / max de deux dates en ignorant les NaT"""
+    dates = [d for d in (a, b) if pd.notna(d)]
+    return fonction(dates) if dates else pd.NaT
+
+
+def _cles_deals(df):
+    """Identifiants (fichier d'origine, n° d'ordre) des lignes"""
+    ordres = pd.to_numeric(df["Ordre_ordre"], errors='coerce').tolist()
+    return list(zip(df["Fichier_Source"].astype(str).tolist(), ordres))
+
+
+class AnalysePersistee:
+    """Analyse finale (DataFrame + cumuls + agrégats additifs) à laquelle on ajoute des exports"""
+
+    def __init__(self, df, solde_initial=10000, multiplier=1.0, broker=None, engine=None, filter_type=None,
+                 etat_cumuls=None, solde_initial_reference=10000):
+        self.df = df
+        self.solde_initial = solde_initial
+        self.multiplier = multiplier
+        self.broker = broker
+        self.engine = engine or moteur_rapide.moteur_par_defaut()
+        self.filter_type = filter_type
+        self.solde_initial_reference = solde_initial_reference
+        self._analyzer = None
+
+        if etat_cumuls is None:
+            # Même boucle que fusionner_et_calculer_cumuls, sur une copie (état seul)
+            if len(df):
+                etat_cumuls = moteur_rapide.calculer_cumuls(df[["Profit", "Profit_pips"]].copy(), solde_initial,
+                                                            solde_initial_reference)
+            else:
+                etat_cumuls = moteur_rapide.etat_cumuls_initial(solde_initial)
+        self.etat_cumuls = dict(etat_cumuls)
+
+        self.deals_connus = set(_cles_deals(df))
+        # Lignes IN des positions ouvertes (Volume_restant : volume encore à fermer)
+        self.positions_ouvertes = pd.DataFrame()
+        self._integrer_positions(df)
+        # Cle_Match -> [profit (toutes lignes), profit (lignes datées), premier IN, dernier OUT]
+        self.trades = {}
+        self.agregats = {
+            'lignes': 0, 'profit_total': 0.0, 'total': 0, 'gagnants': 0, 'perdants': 0, 'neutres': 0,
+            'duree_somme': 0.0, 'duree_nb': 0,
+            'drawdown_max': float(df["Drawdown_pct"].max()) if len(df) and "Drawdown_pct" in df.columns else 0.0,
+            'heures_in': np.zeros(HEURES, dtype='int64'), 'heures_out': np.zeros(HEURES, dtype='int64'),
+        }
+        for periode, taille in (('heure', HEURES), ('jour', JOURS), ('mois', MOIS)):
+            for nom in ('profits', 'profits_pos', 'pertes_abs'):
+                self.agregats[f"{nom}_{periode}"] = np.zeros(taille, dtype='float64')
+            self.agregats[f"tp_{periode}"] = np.zeros(taille, dtype='int64')
+            self.agregats[f"sl_{periode}"] = np.zeros(taille, dtype='int64')
+        self.symboles = set()
+        self._agreger(df)
+
+    # ------------------------------------------------------------------
+    def __getstate__(self):
+        etat = self.__dict__.copy()
+        etat['_analyzer'] = None
+        return etat
+
+    def sauvegarder(self, chemin):
+        temporaire = f"{chemin}.tmp"
+        with open(temporaire, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaire, chemin)
+
+    @classmethod
+    def charger(cls, chemin):
+        with open(chemin, 'rb') as f:
+            return pickle.load(f)
+
+    def analyseur(self):
+        if self._analyzer is None:
+            from trading_analyzer_unified import TradingAnalyzer
+            self._analyzer = TradingAnalyzer(solde_initial=self.solde_initial, multiplier=self.multiplier,
+                                             broker=self.broker, engine=self.engine)
+        return self._analyzer
+
+    # ------------------------------------------------------------------
+    def _agreger(self, lignes):
+        """Ajoute la contribution de nouvelles lignes aux agrégats additifs"""
+        agregats = self.agregats
+        agregats['lignes'] += len(lignes)
+        if len(lignes) == 0:
+            return
+        agregats['profit_total'] += float(lignes["Profit"].sum())
+        if "Symbole_ordre" in lignes.columns:
+            self.symboles.update(str(s) for s in lignes["Symbole_ordre"].dropna().unique())
+
+        dates = pd.to_datetime(lignes[COLONNE_DATE], errors='coerce')
+        datees = dates.notna().to_numpy()
+        direction = lignes["Direction"].astype(object).to_numpy()
+        profits = np.nan_to_num(lignes["Profit"].to_numpy(dtype='float64'))
+
+        entrees = datees & (direction == "in")
+        agregats['heures_in'] += np.bincount(dates[entrees].dt.hour.to_numpy(), minlength=HEURES)
+        sorties = datees & (direction == "out")
+        d_out, p_out = dates[sorties], profits[sorties]
+        for periode, indices, taille in (('heure', d_out.dt.hour.to_numpy(), HEURES),
+                                         ('jour', d_out.dt.dayofweek.to_numpy(), JOURS),
+                                         ('mois', d_out.dt.month.to_numpy() - 1, MOIS)):
+            agregats[f"profits_{periode}"] += np.bincount(indices, weights=p_out, minlength=taille)
+            agregats[f"profits_pos_{periode}"] += np.bincount(indices, weights=np.where(p_out > 0, p_out, 0.0), minlength=taille)
+            agregats[f"pertes_abs_{periode}"] += np.bincount(indices, weights=np.where(p_out < 0, -p_out, 0.0), minlength=taille)
+
+        # Trades complets touchés : retrait de l'ancienne contribution, ajout de la nouvelle
+        avec_cle = lignes["Cle_Match"].notna().to_numpy()
+        if not avec_cle.any():
+            return
+        cles = lignes["Cle_Match"].astype(object).to_numpy()
+        table = pd.DataFrame({'cle': cles[avec_cle], 'profit': profits[avec_cle], 'date': dates.to_numpy()[avec_cle],
+                              'datee': datees[avec_cle], 'direction': direction[avec_cle]})
+        profit_total = table.groupby('cle', sort=False)['profit'].sum()
+        datees_table = table[table['datee']]
+        profit_date = datees_table.groupby('cle', sort=False)['profit'].sum()
+        premier_in = datees_table[datees_table['direction'] == "in"].groupby('cle', sort=False)['date'].min()
+        dernier_out = datees_table[datees_table['direction'] == "out"].groupby('cle', sort=False)['date'].max()
+        for cle, profit in profit_total.items():
+            ancien = self.trades.get(cle)
+            if ancien is not None:
+                self._contribuer(ancien, -1)
+                nouveau = [ancien[0] + profit, ancien[1] + profit_date.get(cle, 0.0),
+                           _extreme(min, ancien[2], premier_in.get(cle, pd.NaT)),
+                           _extreme(max, ancien[3], dernier_out.get(cle, pd.NaT))]
+            else:
+                nouveau = [profit, profit_date.get(cle, 0.0), premier_in.get(cle, pd.NaT), dernier_out.get(cle, pd.NaT)]
+            self.trades[cle] = nouveau
+            self._contribuer(nouveau, 1)
+
+    def _contribuer(self, trade, signe):
+        """Ajoute (signe=1) ou retire (signe=-1) un trade complet des comptes"""
+        agregats = self.agregats
+        profit, profit_date, entree, sortie = trade
+        agregats['total'] += signe
+        agregats['gagnants' if profit > 0 else 'perdants' if profit < 0 else 'neutres'] += signe
+        if pd.isna(sortie):
+            return
+        sortie = pd.Timestamp(sortie)
+        agregats['heures_out'][sortie.hour] += signe
+        if profit_date != 0:
+            prefixe = 'tp' if profit_date > 0 else 'sl'
+            agregats[f"{prefixe}_heure"][sortie.hour] += signe
+            agregats[f"{prefixe}_jour"][sortie.dayofweek] += signe
+            agregats[f"{prefixe}_mois"][sortie.month - 1] += signe
+        if pd.notna(entree):
+            agregats['duree_somme'] += signe * (sortie - pd.Timestamp(entree)).total_seconds() / 60.0
+            agregats['duree_nb'] += signe
+
+    # ------------------------------------------------------------------
+    def _origine_par_defaut(self, nom):
+        """Fichier d'origine connu portant ce nom (préfixé d'un horodatage d'upload ou membre d'archive)"""
+        sources = set(self.df["Fichier_Source"].dropna().astype(str).unique()) if len(self.df) else set()
+        if nom in sources:
+            return nom
+        candidats = [source for source in sources if source.endswith((f"_{nom}", f"/{nom}"))]
+        return candidats[0] if len(candidats) == 1 else nom
+
+    def _preparer_lot(self, file_path, origine):
+        """
+        Deals nouveaux d'un export, appariés avec les positions ouvertes de l'analyse.
+
+        Returns:
+            (DataFrame final des nouveaux deals ou None, statistiques du fichier)
+        """
+        analyzer = self.analyseur()
+        nom = os.path.basename(file_path)
+        try:
+            fusion_df, message, exclus = analyzer.preparer_deals(file_path, self.filter_type)
+            if fusion_df is None:
+                return None, {'trades': 0, 'exclus': exclus, 'doublons': 0, 'deja_connus': 0, 'erreur': message}
+            origine = origine or self._origine_par_defaut(nom)
+            fusion_df["Fichier_Source"] = pd.Categorical([origine] * len(fusion_df))
+
+            # Deals déjà présents dans l'analyse (export recouvrant l'historique)
+            connus = np.fromiter((cle in self.deals_connus for cle in _cles_deals(fusion_df)), dtype=bool, count=len(fusion_df))
+            fusion_df = fusion_df[~connus]
+            stats = {'trades': 0, 'exclus': exclus, 'doublons': 0, 'deja_connus': int(connus.sum()), 'erreur': None}
+            if len(fusion_df) == 0:
+                return None, stats
+
+            # Positions ouvertes du même fichier d'origine : candidates pour les OUT du nouvel export
+            ouvertes = self.positions_ouvertes
+            if len(ouvertes):
+                symboles = set(fusion_df["Symbole_ordre"].astype(str))
+                ouvertes = ouvertes[(ouvertes["Fichier_Source"].astype(str) == origine)
+                                    & ouvertes["Symbole_ordre"].astype(str).isin(symboles)]
+            reinjectees = set()
+            if len(ouvertes):
+                ouvertes = ouvertes.astype({"Ordre_ordre": object, "Cle_Match": object, "Symbole_ordre": object,
+                                            "Fichier_Source": object, "Direction": object})
+                ouvertes["Cle_Match"] = None
+                # Position partiellement fermée : le matching n'a plus que le volume restant à couvrir
+                ouvertes["Volume_execute"] = ouvertes.pop("Volume_restant")
+                reinjectees = set(_cles_deals(ouvertes))
+                # Colonnes finales seulement (le rapport brut peut contenir des en-têtes en double)
+                fusion_df = fusion_df[[c for c in ouvertes.columns if c in fusion_df.columns]]
+                fusion_df = fusion_df.astype({"Symbole_ordre": object, "Fichier_Source": object, "Direction": object})
+                fusion_df = appliquer_schema_deals(pd.concat([ouvertes, fusion_df], ignore_index=True), coder_cles=False)
+                print(f"[DEBUG] {nom}: {len(ouvertes)} position(s) ouverte(s) réinjectée(s) dans le matching")
+
+            lot, doublons = analyzer.apparier_et_recalculer(fusion_df)
+            if reinjectees:
+                deja_la = np.fromiter((cle in reinjectees for cle in _cles_deals(lot)), dtype=bool, count=len(lot))
+                lot = lot[~(deja_la & (lot["Direction"] == "in").to_numpy())].reset_index(drop=True)
+            stats.update(trades=int(lot["Cle_Match"].nunique()), doublons=doublons)
+            return lot, stats
+        except Exception as e:
+            print(f"[ERROR] Ajout de {nom} impossible: {str(e)}")
+            import traceback
+            print(f"[ERROR] Traceback: {traceback.format_exc()}")
+            return None, {'trades': 0, 'exclus': 0, 'doublons': 0, 'deja_connus': 0, 'erreur': str(e)}
+
+    def ajouter(self, file_paths, origine=None):
+        """
+        Intègre de nouveaux exports à l'analyse.
+
+        Args:
+            file_paths: rapports (xlsx / html) à ajouter
+            origine: fichier d'origine (Fichier_Source) auquel rattacher les deals, pour
+                     dédoublonner et fermer les positions d'un export précédent renommé
+                     (défaut: source existante de même nom, préfixe d'horodatage d'upload
+                     ou d'archive compris, sinon nom du fichier ajouté)
+
+        Returns:
+            dict {'deals_ajoutes', 'positions_fermees', 'recalcul_complet', 'fichiers', 'lignes'}
+            ('lignes' : deals ajoutés avec leurs cumuls, ou tout l'historique si recalcul complet)
+        """
+        lots, fichiers = [], {}
+        for file_path in file_paths:
+            lot, stats = self._preparer_lot(file_path, origine)
+            fichiers[os.path.basename(file_path)] = stats
+            if lot is not None and len(lot):
+                lots.append(lot)
+                # Un export suivant peut fermer les positions ouvertes par celui-ci
+                self._integrer_positions(lot)
+                self.deals_connus.update(_cles_deals(lot))
+
+        resume = self._integrer_lots(lots)
+        resume['fichiers'] = fichiers
+        return resume
+
+    def ajouter_resultats(self, lots):
+        """
+        Intègre les DataFrames de rapports déjà analysés (process_single_file), chacun d'un
+        fichier d'origine nouveau : aucun deal déjà connu, aucune position ouverte à réinjecter.
+
+        Returns:
+            dict {'deals_ajoutes', 'positions_fermees', 'recalcul_complet', 'lignes'} (comme ajouter)
+        """
+        lots = [lot for lot in lots if lot is not None and len(lot)]
+        for lot in lots:
+            self._integrer_positions(lot)
+            self.deals_connus.update(_cles_deals(lot))
+        return self._integrer_lots(lots)
+
+    def _integrer_lots(self, lots):
+        """Cumuls (repris ou recalculés) et agrégats des lignes nouvelles, ajoutées au DataFrame"""
+        resume = {'deals_ajoutes': 0, 'positions_fermees': 0, 'recalcul_complet': False, 'lignes': None}
+        if not lots:
+            return resume
+        lot = concatener_deals(lots)
+        lot["Date_parsed"] = pd.to_datetime(lot[COLONNE_DATE], errors='coerce')
+        lot = lot.sort_values("Date_parsed").reset_index(drop=True)
+        dates_lot = lot.pop("Date_parsed")
+
+        cles_existantes = set(self.trades)
+        resume['positions_fermees'] = int(lot.loc[(lot["Direction"] == "out") & lot["Cle_Match"].isin(cles_existantes),
+                                                  "Cle_Match"].nunique())
+        derniere_date = pd.to_datetime(self.df[COLONNE_DATE].iloc[-1], errors='coerce') if len(self.df) else None
+        a_la_suite = dates_lot.notna().all() and (derniere_date is None
+                                                  or (pd.notna(derniere_date) and dates_lot.iloc[0] >= derniere_date))
+        if a_la_suite:
+            # Reprise de la récurrence là où l'historique s'est arrêté
+            self.etat_cumuls = moteur_rapide.calculer_cumuls(lot, self.solde_initial, self.solde_initial_reference,
+                                                             etat=self.etat_cumuls)
+            self.df = concatener_deals([self.df, lot])
+            self.agregats['drawdown_max'] = max(self.agregats['drawdown_max'], float(lot["Drawdown_pct"].max()))
+            resume['lignes'] = self.df.iloc[len(self.df) - len(lot):]
+        else:
+            # Deals antérieurs à l'historique (ou sans date) : cumuls recalculés depuis le début
+            print("[WARNING] Deals ajoutés antérieurs au dernier deal connu : recalcul complet des cumuls")
+            analyzer = self.analyseur()
+            self.df = analyzer.fusionner_et_calculer_cumuls([self.df.drop(columns=COLONNES_CUMULS, errors='ignore'), lot],
+                                                            solde_initial_reference=self.solde_initial_reference)
+            self.etat_cumuls = dict(analyzer.etat_cumuls)
+            self.agregats['drawdown_max'] = float(self.df["Drawdown_pct"].max())
+            resume['recalcul_complet'] = True
+            resume['lignes'] = self.df
+        self._agreger(lot)
+        resume['deals_ajoutes'] = len(lot)
+        print(f"[DEBUG] Ajout incrémental: {resume['deals_ajoutes']} deal(s), {resume['positions_fermees']} position(s) "
+              f"fermée(s), solde final {self.etat_cumuls['solde_courant']:.2f}")
+        return resume
+
+    def _integrer_positions(self, lignes):
+        """
+        Positions encore ouvertes après des lignes nouvelles : IN dont les OUT rattachés
+        n'atteignent pas le volume (même tolérance que le matching), avec le volume restant.
+        """
+        if len(lignes) == 0:
+            return
+        direction = lignes["Direction"].astype(object)
+        entrees = lignes.loc[(direction == "in") & lignes["Cle_Match"].notna(),
+                             [c for c in lignes.columns if c not in COLONNES_CUMULS]].copy()
+        entrees["Volume_restant"] = entrees["Volume_execute"]
+        positions = concatener_deals([self.positions_ouvertes, entrees]) if len(self.positions_ouvertes) else entrees
+        cles = positions["Cle_Match"].astype(object)
+        sorties = lignes[(direction == "out") & lignes["Cle_Match"].notna()]
+        cles_sorties = sorties["Cle_Match"].astype(object)
+        # Seuls les OUT postérieurs au IN le ferment (un OUT orphelin antérieur peut lui être rattaché d'urgence)
+        ordre_in = pd.Series(pd.to_numeric(positions["Ordre_ordre"]).to_numpy(), index=cles.to_numpy())
+        ordre_in = ordre_in[~ordre_in.index.duplicated()]
+        apres_in = pd.to_numeric(sorties["Ordre_ordre"]).to_numpy() > cles_sorties.map(ordre_in).to_numpy(dtype='float64')
+        consommes = sorties["Volume_execute"].fillna(0.0)[apres_in].groupby(cles_sorties[apres_in]).sum()
+        restant = positions["Volume_restant"] - cles.map(consommes).fillna(0.0).to_numpy()
+        # Volume consommé proche du volume du IN (math.isclose du matching) ou dépassé : position fermée
+        volume, consomme = positions["Volume_execute"], positions["Volume_execute"] - restant
+        fermee = ((consomme - volume).abs() <= np.maximum(moteur_rapide.TOLERANCE_VOLUME * np.maximum(consomme.abs(), volume.abs()), 1e-6)) \
+            | (consomme > volume) | volume.isna()
+        positions = positions.assign(Volume_restant=restant)
+        self.positions_ouvertes = positions[~fermee.to_numpy()].reset_index(drop=True)
+
+    # ------------------------------------------------------------------
+    def statistiques(self):
+        """Statistiques additives au format de task_status['statistics'] (mêmes clés)"""
+        agregats = self.agregats
+        df = self.df
+        dernier = df.iloc[-1] if len(df) else None
+        solde_final = float(dernier["Solde_cumule"]) if dernier is not None else self.solde_initial
+        gagnants, perdants = agregats['gagnants'], agregats['perdants']
+        durees = [(t[3] - t[2]).total_seconds() / 60.0 for t in self.trades.values() if pd.notna(t[2]) and pd.notna(t[3])]
+
+        def par_indice(valeurs, debut=0, entier=False):
+            return {i + debut: (int(v) if entier else float(v)) for i, v in enumerate(valeurs)}
+
+        stats = {
+            'total_trades': agregats['total'],
+            'profit_total': round(agregats['profit_total'], 2),
+            'profit_compose': round(float(dernier["Profit_cumule"]), 2) if dernier is not None else 0.0,
+            'pips_totaux': round(float(dernier["Profit_pips_cumule"]), 2) if dernier is not None else 0.0,
+            'solde_final': round(solde_final, 2),
+            'rendement_pct': round((solde_final - self.solde_initial) / self.solde_initial * 100, 2) if self.solde_initial else 0.0,
+            'solde_initial': round(self.solde_initial, 2),
+            'trades_gagnants': gagnants,
+            'trades_perdants': perdants,
+            'taux_reussite': round(gagnants / (gagnants + perdants) * 100, 1) if (gagnants + perdants) > 0 else 0,
+            'drawdown_max': round(agregats['drawdown_max'], 2),
+            'heures_in_counts': par_indice(agregats['heures_in'], entier=True),
+            'heures_out_counts': par_indice(agregats['heures_out'], entier=True),
+            'duree_moyenne_minutes': agregats['duree_somme'] / agregats['duree_nb'] if agregats['duree_nb'] else None,
+            'duree_mediane_minutes': float(np.median(durees)) if durees else None,
+            'pairs': sorted(self.symboles),
+        }
+        for periode, cle, debut in (('heure', 'heure', 0), ('jour', 'jour', 0), ('mois', 'mois', 1)):
+            stats[f"profits_par_{cle}_out"] = par_indice(agregats[f"profits_{periode}"], debut)
+            stats[f"profits_pos_par_{cle}_out"] = par_indice(agregats[f"profits_pos_{periode}"], debut)
+            stats[f"pertes_abs_par_{cle}_out"] = par_indice(agregats[f"pertes_abs_{periode}"], debut)
+            stats[f"tp_par_{cle}"] = par_indice(agregats[f"tp_{periode}"], debut, entier=True)
+            stats[f"sl_par_{cle}"] = par_indice(agregats[f"sl_{periode}"], debut, entier=True)
+        return stats
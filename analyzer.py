@@ -0,0 +1,532 @@
+#!/usr/bin/env python3
+"""
+Analyse des rapports MT5 en ligne de commande (traitements par lots, cron)
+Utilise le même chemin que l'application web : pool d'ingestion parallèle,
+matching / recalcul / cumuls de TradingAnalyzer, rapport Excel.
+
+Usage:
+    python analyzer.py run <dossier|glob|fichier>... [--broker avatrade] [--solde 10000]
+        [--multiplier 1.0] [--filter forex|autres] [--jobs N] [--format xlsx|parquet|json]
+        [--sortie reports] [--engine legacy|fast]
+    python analyzer.py watch <dossier>... [--intervalle 30] [--iterations N] [options de run]
+    python analyzer.py portefeuille <resultat.json|parquet>... [--frequence h|D] [--sortie reports]
+    python analyzer.py comparer <dossier|glob|fichier>... [--critere rendement_pct] [--jobs N] [options de run]
+    python analyzer.py prix <csv|dossier|glob>... [--magasin prix] [--symbole EURUSD] [--periode M1]
+    python analyzer.py excursions <resultat.json|parquet> [--magasin prix] [--tp 0.5 1] [--sl 0.25 0.5]
+        [--unite pct|prix] [--sortie reports]
+
+Écrit le résultat (classeur Excel, Parquet ou JSON), un résumé JSON (statistiques
+par fichier et globales, durées des étapes) et le journal de l'analyse dans le
+dossier de sortie.
+
+Codes de sortie :
+    0  tous les rapports ont été analysés
+    1  analyse partielle : au moins un rapport en échec
+    2  arguments invalides ou aucun rapport trouvé
+    3  aucune donnée exploitable (tous les rapports en échec)
+    4  écriture du résultat impossible (ex: pyarrow absent pour --format parquet)
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from archive_ingestion import est_archive
+from profiling import ProfilEtapes, etape
+
+CODE_SUCCES = 0
+CODE_PARTIEL = 1
+CODE_ARGUMENTS = 2
+CODE_AUCUNE_DONNEE = 3
+CODE_SORTIE = 4
+
+EXTENSIONS_RAPPORTS = ('.xlsx', '.xls', '.html', '.htm')
+FORMATS = ('xlsx', 'parquet', 'json')
+
+
+def lister_rapports(entrees):
+    """Rapports (et archives) désignés par des dossiers, motifs glob ou fichiers ; sans doublon, dans l'ordre"""
+    fichiers = []
+    for entree in entrees:
+        if os.path.isdir(entree):
+            candidats = sorted(os.path.join(entree, nom) for nom in os.listdir(entree))
+        else:
+            candidats = sorted(glob.glob(entree, recursive=True)) if glob.has_magic(entree) else [entree]
+        for chemin in candidats:
+            if not os.path.isfile(chemin):
+                continue
+            if chemin.lower().endswith(EXTENSIONS_RAPPORTS) or est_archive(chemin):
+                fichiers.append(os.path.abspath(chemin))
+    return list(dict.fromkeys(fichiers))
+
+
+def _json(valeur):
+    """Conversion des types numpy / pandas pour json.dump"""
+    if isinstance(valeur, (np.integer,)):
+        return int(valeur)
+    if isinstance(valeur, (np.floating,)):
+        return None if np.isnan(valeur) else float(valeur)
+    if isinstance(valeur, (pd.Timestamp, datetime)):
+        return valeur.isoformat()
+    return str(valeur)
+
+
+def statistiques_globales(analyzer, df_final, solde_initial):
+    """Statistiques de synthèse (mêmes définitions que la tâche web)"""
+    trades_gagnants, trades_perdants, trades_neutres, total_trades = analyzer.calculer_trades_par_resultat(df_final)
+    solde_final = float(df_final['Solde_cumule'].iloc[-1])
+    decides = trades_gagnants + trades_perdants
+    return {
+        'lignes': len(df_final),
+        'total_trades': total_trades,
+        'trades_gagnants': trades_gagnants,
+        'trades_perdants': trades_perdants,
+        'trades_neutres': trades_neutres,
+        'taux_reussite': round(trades_gagnants / decides * 100, 1) if decides else 0,
+        'profit_total': round(float(df_final['Profit'].sum()), 2),
+        'profit_compose': round(float(df_final['Profit_cumule'].iloc[-1]), 2),
+        'pips_totaux': round(float(df_final['Profit_pips_cumule'].iloc[-1]), 2),
+        'solde_initial': round(float(solde_initial), 2),
+        'solde_final': round(solde_final, 2),
+        'rendement_pct': round((solde_final - solde_initial) / solde_initial * 100, 2) if solde_initial else 0,
+        'drawdown_max': round(float(df_final['Drawdown_pct'].max()), 2),
+    }
+
+
+def statistiques_par_fichier(analyzer, df_final, filter_type=None):
+    """
+    Statut d'ingestion de chaque rapport, complété du profit et des trades retenus.
+    Statuts : 'ok', 'filtre' (aucun instrument du type demandé, pas une erreur), 'echec'.
+    """
+    par_source = {}
+    if df_final is not None and len(df_final) > 0:
+        groupes = df_final.groupby('Fichier_Source', observed=True)
+        par_source = pd.DataFrame({
+            'lignes': groupes.size(),
+            'trades': groupes['Cle_Match'].nunique(),
+            'profit': groupes['Profit'].sum().round(2),
+        }).to_dict(orient='index')
+    resultat = {}
+    for nom, stats in analyzer.statistiques_fichiers.items():
+        if stats.get('trades'):
+            statut = 'ok'
+        elif filter_type and str(stats.get('erreur') or '').startswith('Aucun instrument'):
+            statut = 'filtre'
+        else:
+            statut = 'echec'
+        entree = {
+            'statut': statut,
+            'trades': stats.get('trades', 0),
+            'exclus': stats.get('exclus', 0),
+            'doublons': stats.get('doublons', 0),
+            'message': stats.get('erreur'),
+        }
+        # Membres d'archive : Fichier_Source 'archive.zip/rapport.xlsx', comme la clé des statistiques
+        source = par_source.get(nom)
+        if source is not None:
+            entree['lignes'] = source['lignes']
+            entree['profit'] = source['profit']
+        resultat[nom] = entree
+    return resultat
+
+
+def _parquet_disponible():
+    return importlib.util.find_spec('pyarrow') is not None or importlib.util.find_spec('fastparquet') is not None
+
+
+def ecrire_resultat(analyzer, df_final, format_fichier, dossier, horodatage, filter_type):
+    """Écrit le DataFrame final au format demandé et retourne le chemin"""
+    if format_fichier == 'xlsx':
+        return analyzer.create_excel_report(df_final, dossier, horodatage, filter_type)
+    suffixe = f"_{filter_type.upper()}" if filter_type else "_UNIFIED"
+    chemin = os.path.join(dossier, f"ANALYSE{suffixe}_{horodatage}.{format_fichier}")
+    if format_fichier == 'parquet':
+        if not _parquet_disponible():
+            raise RuntimeError("--format parquet nécessite pyarrow (pip install pyarrow)")
+        df_final.to_parquet(chemin, index=False)
+    else:
+        df_final.to_json(chemin, orient='records', date_format='iso', force_ascii=False)
+    return chemin
+
+
+def commande_run(args):
+    from ingestion import IngestionPool
+    from trading_analyzer_unified import TradingAnalyzer
+
+    fichiers = lister_rapports(args.entrees)
+    if not fichiers:
+        print(f"[ERROR] Aucun rapport trouvé dans: {' '.join(args.entrees)}", file=sys.stderr)
+        return CODE_ARGUMENTS
+    if args.format == 'parquet' and not _parquet_disponible():
+        print("[ERROR] --format parquet nécessite pyarrow (pip install pyarrow)", file=sys.stderr)
+        return CODE_SORTIE
+    os.makedirs(args.sortie, exist_ok=True)
+    horodatage = datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"[INFO] {len(fichiers)} rapport(s), {args.jobs} worker(s), sortie: {args.sortie}", file=sys.stderr)
+
+    analyzer = TradingAnalyzer(solde_initial=args.solde, multiplier=args.multiplier, broker=args.broker, engine=args.engine)
+    profil = ProfilEtapes(f"cli_{horodatage}")
+    # Traces [DEBUG] de l'analyse : console avec --verbeux, sinon journal à côté du résumé
+    # (ouvert en ajout : les processus de travail y écrivent aussi)
+    chemin_journal = None
+    if args.verbeux:
+        journal = contextlib.nullcontext()
+    else:
+        chemin_journal = os.path.join(args.sortie, f"JOURNAL_{horodatage}.log")
+        fichier_journal = open(chemin_journal, 'a', encoding='utf-8', buffering=1)
+        journal = contextlib.redirect_stdout(fichier_journal)
+    pool = IngestionPool(max_workers=args.jobs, journal=chemin_journal) if args.jobs > 1 else None
+    debut = time.perf_counter()
+    resume = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'parametres': {'entrees': args.entrees, 'broker': args.broker, 'solde': args.solde,
+                       'multiplier': args.multiplier, 'filter': args.filter, 'jobs': args.jobs,
+                       'format': args.format, 'engine': analyzer.engine},
+        'fichiers': {},
+        'global': None,
+        'resultat': None,
+        'journal': chemin_journal,
+    }
+    code = CODE_SUCCES
+    try:
+        with journal, profil.actif():
+            try:
+                df_final = analyzer.process_files(fichiers, 'cli', {'cli': {}}, args.filter, pool=pool)
+            except Exception as e:
+                print(f"[ERROR] Analyse en échec: {str(e)}", file=sys.stderr)
+                df_final = None
+            resume['fichiers'] = statistiques_par_fichier(analyzer, df_final, args.filter)
+            if df_final is None or len(df_final) == 0:
+                code = CODE_AUCUNE_DONNEE
+            else:
+                resume['global'] = statistiques_globales(analyzer, df_final, args.solde)
+                try:
+                    with etape("ecriture_resultat", lignes_entree=df_final, format=args.format):
+                        resume['resultat'] = ecrire_resultat(analyzer, df_final, args.format, args.sortie,
+                                                             horodatage, args.filter)
+                except Exception as e:
+                    print(f"[ERROR] Écriture du résultat impossible: {str(e)}", file=sys.stderr)
+                    code = CODE_SORTIE
+                if code == CODE_SUCCES and any(f['statut'] == 'echec' for f in resume['fichiers'].values()):
+                    code = CODE_PARTIEL
+    finally:
+        if pool is not None:
+            pool.arreter()
+        if chemin_journal is not None:
+            fichier_journal.close()
+
+    resume['duree_s'] = round(time.perf_counter() - debut, 3)
+    resume['timings'] = profil.resume()['par_etape']
+    resume['code_sortie'] = code
+    chemin_resume = os.path.join(args.sortie, f"RESUME_{horodatage}.json")
+    with open(chemin_resume, 'w', encoding='utf-8') as f:
+        json.dump(resume, f, indent=2, ensure_ascii=False, default=_json)
+
+    echecs = [nom for nom, stats in resume['fichiers'].items() if stats['statut'] == 'echec']
+    for nom in echecs:
+        print(f"[WARNING] {nom}: {resume['fichiers'][nom]['message']}", file=sys.stderr)
+    if resume['global']:
+        stats = resume['global']
+        print(f"[INFO] {len(fichiers) - len(echecs)}/{len(fichiers)} rapport(s) analysé(s), "
+              f"{stats['total_trades']} trades, profit {stats['profit_total']}, "
+              f"solde final {stats['solde_final']}, drawdown max {stats['drawdown_max']}%", file=sys.stderr)
+    print(f"[INFO] Résumé: {chemin_resume}" + (f" - résultat: {resume['resultat']}" if resume['resultat'] else ""),
+          file=sys.stderr)
+    return code
+
+
+def commande_watch(args):
+    from surveillance import SurveillanceDossier
+
+    if args.format == 'parquet' and not _parquet_disponible():
+        print("[ERROR] --format parquet nécessite pyarrow (pip install pyarrow)", file=sys.stderr)
+        return CODE_SORTIE
+    os.makedirs(args.sortie, exist_ok=True)
+    print(f"[INFO] Surveillance de {' '.join(args.entrees)} toutes les {args.intervalle:g} s, sortie: {args.sortie}",
+          file=sys.stderr)
+    chemin_journal = None if args.verbeux else os.path.join(args.sortie, "JOURNAL_surveillance.log")
+    surveillance = SurveillanceDossier(args.entrees, args.sortie, solde_initial=args.solde, multiplier=args.multiplier,
+                                       broker=args.broker, filter_type=args.filter, engine=args.engine, jobs=args.jobs,
+                                       format_fichier=args.format, journal=chemin_journal)
+    if args.verbeux:
+        journal = contextlib.nullcontext()
+    else:
+        fichier_journal = open(chemin_journal, 'a', encoding='utf-8', buffering=1)
+        journal = contextlib.redirect_stdout(fichier_journal)
+    try:
+        with journal:
+            surveillance.executer(args.intervalle, args.iterations)
+    finally:
+        if not args.verbeux:
+            fichier_journal.close()
+    return CODE_SUCCES if surveillance.df_final is not None else CODE_AUCUNE_DONNEE
+
+
+def commande_portefeuille(args):
+    from portefeuille import agreger_portefeuille, charger_ledger, solde_initial_ledger
+
+    comptes = []
+    for chemin in args.resultats:
+        try:
+            df = charger_ledger(chemin)
+        except Exception as e:
+            print(f"[ERROR] {chemin}: lecture impossible ({str(e)})", file=sys.stderr)
+            return CODE_ARGUMENTS
+        if len(df) == 0:
+            print(f"[WARNING] {chemin}: aucun deal, ignoré", file=sys.stderr)
+            continue
+        comptes.append({'nom': os.path.basename(chemin), 'df': df, 'solde_initial': solde_initial_ledger(df)})
+    if not comptes:
+        return CODE_AUCUNE_DONNEE
+    try:
+        resultat = agreger_portefeuille(comptes, frequence=args.frequence)
+    except ValueError as e:
+        print(f"[ERROR] {str(e)}", file=sys.stderr)
+        return CODE_ARGUMENTS
+
+    os.makedirs(args.sortie, exist_ok=True)
+    chemin_sortie = os.path.join(args.sortie, f"PORTEFEUILLE_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    try:
+        with open(chemin_sortie, 'w', encoding='utf-8') as f:
+            json.dump(resultat, f, indent=2, ensure_ascii=False, default=_json)
+    except OSError as e:
+        print(f"[ERROR] Écriture impossible: {str(e)}", file=sys.stderr)
+        return CODE_SORTIE
+    for compte in resultat['comptes']:
+        print(f"[INFO] {compte['nom']}: profit {compte['profit']} ({compte['contribution_pct']}% du total), "
+              f"drawdown max {compte['drawdown_max_pct']}%", file=sys.stderr)
+    print(f"[INFO] Portefeuille: {len(comptes)} compte(s), solde final {resultat['solde_final']}, "
+          f"drawdown max {resultat['drawdown_max_pct']}% - résultat: {chemin_sortie}", file=sys.stderr)
+    return CODE_SUCCES
+
+
+def commande_comparer(args):
+    from comparaison_optimisation import comparer_rapports, ecrire_classeur
+
+    fichiers = [f for f in lister_rapports(args.entrees) if not est_archive(f)]
+    if not fichiers:
+        print(f"[ERROR] Aucun rapport trouvé dans: {' '.join(args.entrees)}", file=sys.stderr)
+        return CODE_ARGUMENTS
+    os.makedirs(args.sortie, exist_ok=True)
+    horodatage = datetime.now().strftime("%Y%m%d_%H%M%S")
+    print(f"[INFO] Comparaison de {len(fichiers)} rapport(s), {args.jobs} worker(s), critère: {args.critere}",
+          file=sys.stderr)
+    chemin_journal = None
+    if args.verbeux:
+        journal = contextlib.nullcontext()
+    else:
+        chemin_journal = os.path.join(args.sortie, f"JOURNAL_{horodatage}.log")
+        fichier_journal = open(chemin_journal, 'a', encoding='utf-8', buffering=1)
+        journal = contextlib.redirect_stdout(fichier_journal)
+    try:
+        with journal:
+            resultat = comparer_rapports(fichiers, critere=args.critere, jobs=args.jobs, solde_initial=args.solde,
+                                         multiplier=args.multiplier, broker=args.broker, filter_type=args.filter,
+                                         engine=args.engine, journal=chemin_journal)
+    finally:
+        if not args.verbeux:
+            fichier_journal.close()
+
+    for echec in resultat['echecs']:
+        print(f"[WARNING] {echec['fichier']}: {echec['erreur']}", file=sys.stderr)
+    classement = resultat['classement']
+    if len(classement) == 0:
+        return CODE_AUCUNE_DONNEE
+    chemin_sortie = os.path.join(args.sortie, f"COMPARAISON_{horodatage}.xlsx")
+    try:
+        ecrire_classeur(resultat, chemin_sortie)
+    except Exception as e:
+        print(f"[ERROR] Écriture du classeur impossible: {str(e)}", file=sys.stderr)
+        return CODE_SORTIE
+    for ligne in classement.head(5).itertuples(index=False):
+        print(f"[INFO] #{ligne.rang} {ligne.fichier}: {args.critere} {getattr(ligne, args.critere)}, "
+              f"rendement {ligne.rendement_pct}%, drawdown max {ligne.drawdown_max}%", file=sys.stderr)
+    if len(resultat['impact']):
+        print(f"[INFO] Paramètres les plus influents: "
+              f"{', '.join(resultat['impact']['parametre'].head(5).astype(str))}", file=sys.stderr)
+    print(f"[INFO] {len(classement)}/{len(fichiers)} rapport(s) classé(s) - résultat: {chemin_sortie}", file=sys.stderr)
+    return CODE_PARTIEL if resultat['echecs'] else CODE_SUCCES
+
+
+def commande_prix(args):
+    from magasin_prix import MagasinPrix
+
+    fichiers = []
+    for entree in args.entrees:
+        if os.path.isdir(entree):
+            candidats = sorted(os.path.join(entree, nom) for nom in os.listdir(entree))
+        else:
+            candidats = sorted(glob.glob(entree, recursive=True)) if glob.has_magic(entree) else [entree]
+        fichiers.extend(c for c in candidats if os.path.isfile(c) and c.lower().endswith(('.csv', '.txt')))
+    fichiers = list(dict.fromkeys(fichiers))
+    if not fichiers:
+        print(f"[ERROR] Aucun export CSV trouvé dans: {' '.join(args.entrees)}", file=sys.stderr)
+        return CODE_ARGUMENTS
+    magasin = MagasinPrix(args.magasin)
+    echecs = 0
+    for chemin in fichiers:
+        try:
+            infos = magasin.importer_csv(chemin, symbole=args.symbole, periode=args.periode)
+        except Exception as e:
+            print(f"[WARNING] {chemin}: {str(e)}", file=sys.stderr)
+            echecs += 1
+            continue
+        print(f"[INFO] {infos['fichier']}: {infos['symbole']} {infos['periode']}, {infos['barres_importees']} barre(s) "
+              f"du {infos['debut']} au {infos['fin']} ({infos['barres_total']} au total)", file=sys.stderr)
+    if echecs == len(fichiers):
+        return CODE_AUCUNE_DONNEE
+    return CODE_PARTIEL if echecs else CODE_SUCCES
+
+
+def commande_excursions(args):
+    from excursions import calculer_excursions, ecrire_classeur, rejouer_tp_sl, resume_excursions
+    from magasin_prix import MagasinPrix
+    from portefeuille import charger_ledger
+
+    try:
+        df = charger_ledger(args.resultat)
+    except Exception as e:
+        print(f"[ERROR] {args.resultat}: lecture impossible ({str(e)})", file=sys.stderr)
+        return CODE_ARGUMENTS
+    magasin = MagasinPrix(args.magasin)
+    if not magasin.contenu():
+        print(f"[ERROR] Magasin de prix vide: {args.magasin} (importer les exports avec `analyzer.py prix`)", file=sys.stderr)
+        return CODE_ARGUMENTS
+    trades = calculer_excursions(df, magasin)
+    resume = resume_excursions(trades)
+    if resume['trades_couverts'] == 0:
+        print(f"[ERROR] Aucun trade couvert par le magasin de prix ({resume['trades']} trade(s) complet(s))", file=sys.stderr)
+        return CODE_AUCUNE_DONNEE
+    rejeu = None
+    if args.tp or args.sl:
+        try:
+            rejeu = rejouer_tp_sl(trades, magasin, tps=args.tp, sls=args.sl, unite=args.unite)
+        except ValueError as e:
+            print(f"[ERROR] {str(e)}", file=sys.stderr)
+            return CODE_ARGUMENTS
+
+    os.makedirs(args.sortie, exist_ok=True)
+    chemin_sortie = os.path.join(args.sortie, f"EXCURSIONS_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+    try:
+        ecrire_classeur(trades, rejeu, chemin_sortie)
+    except Exception as e:
+        print(f"[ERROR] Écriture du classeur impossible: {str(e)}", file=sys.stderr)
+        return CODE_SORTIE
+    global_ = resume['global']
+    print(f"[INFO] MAE médiane {global_['mae_pct']['p50']}%, MFE médiane {global_['mfe_pct']['p50']}%, "
+          f"capture médiane {global_['capture_pct']['p50']}%", file=sys.stderr)
+    if rejeu is not None:
+        meilleur = max(rejeu['scenarios'], key=lambda scenario: scenario['profit_total'])
+        print(f"[INFO] Meilleur rejeu: TP {meilleur['tp']} / SL {meilleur['sl']} ({args.unite}), profit "
+              f"{meilleur['profit_total']} ({meilleur['ecart_historique']:+} vs historique)", file=sys.stderr)
+    print(f"[INFO] {resume['trades_couverts']}/{resume['trades']} trade(s) couvert(s) - résultat: {chemin_sortie}",
+          file=sys.stderr)
+    return CODE_SUCCES
+
+
+def _distances(valeur):
+    """Distance de TP / SL ; 'aucun' pour un scénario sans niveau"""
+    if valeur.strip().lower() in ('aucun', 'none'):
+        return None
+    try:
+        distance = float(valeur)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"nombre ou 'aucun' attendu: {valeur}")
+    if distance <= 0:
+        raise argparse.ArgumentTypeError("doit être > 0")
+    return distance
+
+
+def _nombre_positif(valeur):
+    nombre = int(valeur)
+    if nombre < 1:
+        raise argparse.ArgumentTypeError("doit être >= 1")
+    return nombre
+
+
+def _options_analyse(parser, jobs_defaut, avec_format=True):
+    """Options communes à run, watch et comparer"""
+    parser.add_argument('entrees', nargs='+', help="dossiers, motifs glob ou fichiers (xlsx, html, zip, tar.gz)")
+    parser.add_argument('--broker', default=None, help="broker pour les valeurs de contrat réelles (ex: avatrade)")
+    parser.add_argument('--solde', type=float, default=10000.0, help="solde initial")
+    parser.add_argument('--multiplier', type=float, default=1.0, help="multiplicateur de taille de position")
+    parser.add_argument('--filter', choices=['forex', 'autres'], default=None, help="type d'instruments retenus")
+    parser.add_argument('--jobs', type=_nombre_positif, default=jobs_defaut,
+                        help="processus d'ingestion en parallèle")
+    if avec_format:
+        parser.add_argument('--format', choices=FORMATS, default='xlsx', help="format du résultat")
+    parser.add_argument('--sortie', default='reports', help="dossier de sortie")
+    parser.add_argument('--engine', choices=['legacy', 'fast'], default=None,
+                        help="moteur de matching / recalcul (défaut: ANALYZER_ENGINE ou legacy)")
+    parser.add_argument('--verbeux', action='store_true', help="affiche les traces [DEBUG] de l'analyse")
+
+
+def construire_parser():
+    from comparaison_optimisation import CRITERES
+    from excursions import UNITES
+    from magasin_prix import PERIODES
+    from ingestion import nombre_workers_defaut
+
+    parser = argparse.ArgumentParser(prog='analyzer', description="Analyse des rapports de trading MT5")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    run = commandes.add_parser('run', help="analyse un lot de rapports et écrit résultat + résumé")
+    _options_analyse(run, nombre_workers_defaut())
+    run.set_defaults(executer=commande_run)
+
+    watch = commandes.add_parser('watch', help="surveille un dossier et ré-analyse les rapports nouveaux ou modifiés")
+    _options_analyse(watch, nombre_workers_defaut())
+    watch.add_argument('--intervalle', type=float, default=30.0, help="secondes entre deux passages")
+    watch.add_argument('--iterations', type=_nombre_positif, default=None,
+                       help="nombre de passages avant arrêt (défaut: jusqu'à Ctrl+C)")
+    watch.set_defaults(executer=commande_watch)
+
+    portefeuille = commandes.add_parser('portefeuille', help="agrège les résultats (json / parquet) de plusieurs comptes")
+    portefeuille.add_argument('resultats', nargs='+', help="résultats de `run --format json|parquet`, un par compte")
+    portefeuille.add_argument('--frequence', default=None,
+                              help="pas de la grille commune (ex: h, D ; défaut: instants des deals)")
+    portefeuille.add_argument('--sortie', default='reports', help="dossier de sortie")
+    portefeuille.set_defaults(executer=commande_portefeuille)
+
+    comparer = commandes.add_parser('comparer', help="classe des passes d'optimisation et mesure la sensibilité des paramètres")
+    _options_analyse(comparer, nombre_workers_defaut(), avec_format=False)
+    comparer.add_argument('--critere', choices=CRITERES, default='rendement_pct', help="mesure du classement")
+    comparer.set_defaults(executer=commande_comparer, engine='fast')
+
+    magasin_defaut = os.environ.get('ANALYZER_MAGASIN_PRIX') or 'prix'
+    prix = commandes.add_parser('prix', help="importe des exports CSV MT5 (barres M1, M15...) dans le magasin de prix local")
+    prix.add_argument('entrees', nargs='+', help="dossiers, motifs glob ou fichiers CSV (ex: EURUSD_M1_....csv)")
+    prix.add_argument('--magasin', default=magasin_defaut, help="dossier du magasin (défaut: ANALYZER_MAGASIN_PRIX ou prix)")
+    prix.add_argument('--symbole', default=None, help="symbole des barres (défaut: lu dans le nom du fichier)")
+    prix.add_argument('--periode', choices=PERIODES, type=str.upper, default=None,
+                      help="période des barres (défaut: lue dans le nom du fichier)")
+    prix.set_defaults(executer=commande_prix)
+
+    excursions = commandes.add_parser('excursions', help="MAE / MFE par trade et rejeu de TP / SL sur le magasin de prix")
+    excursions.add_argument('resultat', help="résultat de `run --format json|parquet`")
+    excursions.add_argument('--magasin', default=magasin_defaut, help="dossier du magasin (défaut: ANALYZER_MAGASIN_PRIX ou prix)")
+    excursions.add_argument('--tp', nargs='+', type=_distances, default=None, help="distances de TP à rejouer ('aucun' : sans TP)")
+    excursions.add_argument('--sl', nargs='+', type=_distances, default=None, help="distances de SL à rejouer ('aucun' : sans SL)")
+    excursions.add_argument('--unite', choices=UNITES, default='pct',
+                            help="unité des distances : pct (%% du prix d'entrée) ou prix (écart de prix)")
+    excursions.add_argument('--sortie', default='reports', help="dossier de sortie")
+    excursions.set_defaults(executer=commande_excursions)
+    return parser
+
+
+def main(argv=None):
+    args = construire_parser().parse_args(argv)
+    return args.executer(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,9 +4,10 @@ Application web pour l'Analyseur de Trading
 Interface simple et professionnelle pour analyser les fichiers de trading
 """
 
-from flask import Flask, request, jsonify, send_file, send_from_directory, url_for, flash, redirect
+from flask import Flask, request, jsonify, send_file, send_from_directory, url_for, flash, redirect, g, Response
 from flask_cors import CORS
 import os
+import json
 import uuid
 import threading
 import time
@@ -15,6 +16,22 @@ import shutil
 from werkzeug.utils import secure_filename
 from trading_analyzer_unified import TradingAnalyzer
 from broker_manager import get_broker_manager
+from trade_explorer import TradeExplorer, CurseurInvalide
+from ingestion import get_ingestion_pool
+from archive_ingestion import est_archive
+from chunked_upload import ChunkedUploadStore
+from profiling import ProfilEtapes, etape, collecteur_courant
+from analyse_incrementale import AnalysePersistee
+import scenarios_capital
+import monte_carlo
+import metriques_glissantes
+import sequences_trades
+import matrices_croisees
+import excursions
+from magasin_prix import MagasinPrix
+import portefeuille
+import metrics
+from collections import OrderedDict
 import pandas as pd
 
 app = Flask(__name__)
@@ -25,7 +42,7 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # Limite de 50MB
 # Configuration des dossiers
 UPLOAD_FOLDER = os.path.join(os.getcwd(), 'uploads')
 REPORTS_FOLDER = os.path.join(os.getcwd(), 'reports')
-ALLOWED_EXTENSIONS = {'xlsx', 'xls'}
+ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'html', 'htm', 'zip', 'tar', 'gz', 'tgz'}
 
 # Créer les dossiers s'ils n'existent pas
 for folder in [UPLOAD_FOLDER, REPORTS_FOLDER]:
@@ -35,8 +52,52 @@ for folder in [UPLOAD_FOLDER, REPORTS_FOLDER]:
 # Stockage des tâches en cours
 task_status = {}
 
+# Upload par morceaux : sessions sur disque + analyses déjà lancées par fichier terminé
+CHUNKED_FOLDER = os.path.join(UPLOAD_FOLDER, 'chunked')
+chunked_store = ChunkedUploadStore(CHUNKED_FOLDER, ALLOWED_EXTENSIONS)
+upload_futures = {}
+upload_futures_lock = threading.Lock()
+
+# Résultats de /filter_stats conservés par tâche (sélections récentes)
+TAILLE_CACHE_FILTRES = 32
+
+# Un seul ajout incrémental à la fois par tâche
+ajouts_lock = threading.Lock()
+
+def _jauges_processus():
+    """Jauges propres à ce worker (tâches en mémoire, file d'ingestion)"""
+    etats = {'running': 0, 'succeeded': 0, 'failed': 0}
+    memoire = 0
+    for statut in list(task_status.values()):
+        succes = statut.get('success')
+        etats['running' if succes is None else 'succeeded' if succes else 'failed'] += 1
+        memoire += statut.get('_memoire', 0)
+    for etat, nombre in etats.items():
+        yield 'analyzer_jobs', {'state': etat}, nombre
+    yield 'analyzer_task_memory_bytes', {}, memoire
+    yield 'analyzer_job_queue_depth', {}, get_ingestion_pool().en_attente()
+
+# Seul le service écrit ses métriques (et ses processus d'ingestion, qui héritent de l'activation)
+metrics.activer()
+metrics.enregistrer_jauge(_jauges_processus)
+
+@app.before_request
+def _debut_requete():
+    g.debut_requete = time.perf_counter()
+
+@app.after_request
+def _fin_requete(response):
+    debut = g.get('debut_requete')
+    if debut is not None:
+        # Route déclarée (et non l'URL) : cardinalité bornée
+        route = request.url_rule.rule if request.url_rule is not None else 'inconnue'
+        metrics.observer_requete(route, request.method, response.status_code, time.perf_counter() - debut)
+    return response
+
 def allowed_file(filename):
     """Vérifie si le fichier est autorisé"""
+    if filename.lower().endswith('.gz') and not filename.lower().endswith('.tar.gz'):
+        return False
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def cleanup_old_files():
@@ -52,9 +113,37 @@ def cleanup_old_files():
                             os.remove(file_path)
                         except Exception:
                             pass
+    chunked_store.nettoyer_sessions()
+
+def _points_equity(df, solde_initial):
+    """Série d'équity (date, Solde_cumule) des lignes datées, dans l'ordre chronologique"""
+    evolution_equity = []
+    try:
+        temp = df.copy()
+        if "Heure d'ouverture" in temp.columns:
+            temp['__dt'] = pd.to_datetime(temp["Heure d'ouverture"], errors='coerce')
+            temp = temp[temp['__dt'].notna()].sort_values('__dt')
+            for _, r in temp.iterrows():
+                evolution_equity.append({'date': r['__dt'].isoformat(), 'solde': float(r.get('Solde_cumule', solde_initial))})
+    except Exception:
+        pass
+    return evolution_equity
 
-def process_files_background(task_id, file_paths, filter_type, solde_initial, multiplier, broker=None):
-    """Traite les fichiers en arrière-plan"""
+def process_files_background(task_id, file_paths, filter_type, solde_initial, multiplier, broker=None, futures=None, upload_id=None):
+    """Traite les fichiers en arrière-plan (mesures par étape dans task_status[task_id]['timings'])"""
+    profil = ProfilEtapes(task_id)
+    debut = time.perf_counter()
+    try:
+        with profil.actif():
+            _executer_analyse(task_id, file_paths, filter_type, solde_initial, multiplier, broker, futures, upload_id)
+    finally:
+        task_status[task_id]['timings'] = profil.resume()
+        df_final = task_status[task_id].get('_df')
+        metrics.observer_tache('succeeded' if task_status[task_id].get('success') else 'failed', profil.etapes,
+                               len(df_final) if df_final is not None else 0, time.perf_counter() - debut)
+
+def _executer_analyse(task_id, file_paths, filter_type, solde_initial, multiplier, broker=None, futures=None, upload_id=None):
+    """Corps de l'analyse en arrière-plan"""
     try:
         # Initialiser le statut de la tâche
         task_status[task_id]['progress'] = 10
@@ -76,7 +165,8 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
         
         print(f"[DEBUG] Starting process_files with {len(file_paths)} files, multiplier={m}")
         try:
-            df_final = analyzer.process_files(file_paths, task_id, task_status, filter_type)
+            df_final = analyzer.process_files(file_paths, task_id, task_status, filter_type,
+                                              pool=get_ingestion_pool(), futures=futures)
         except Exception as e:
             print(f"[ERROR] Exception dans process_files: {str(e)}")
             import traceback
@@ -90,7 +180,9 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
                 # On suppose que les profits dans Excel sont calculés avec un solde de référence de 10000
                 # Si l'utilisateur change le solde initial, on ajuste proportionnellement
                 solde_reference_excel = 10000.0
-                df_final = analyzer.fusionner_et_calculer_cumuls([df_final], solde_initial_reference=solde_reference_excel)
+                with etape("recalcul_cumuls", lignes_entree=df_final) as mesure:
+                    df_final = analyzer.fusionner_et_calculer_cumuls([df_final], solde_initial_reference=solde_reference_excel)
+                    mesure.sortie(df_final)
             except Exception as e:
                 print(f"[ERROR] Erreur lors du recalcul des cumuls: {str(e)}")
                 import traceback
@@ -120,22 +212,50 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
         
         # Conserver le DataFrame pour filtres temps réel (mémoire only)
         task_status[task_id]['_df'] = df_final
+        task_status[task_id]['_memoire'] = int(df_final.memory_usage(deep=True).sum())
+        task_status[task_id]['_filtres'] = OrderedDict()
+        task_status[task_id]['_etat_cumuls'] = analyzer.etat_cumuls
         task_status[task_id]['solde_initial'] = solde_initial
 
         # Créer le rapport Excel
         task_status[task_id]['progress'] = 85
         task_status[task_id]['message'] = 'Génération du rapport Excel...'
         
+        # Distribution du drawdown / rendement selon l'ordre des trades (API et onglet Monte Carlo)
+        try:
+            with etape("monte_carlo", lignes_entree=df_final):
+                resultat_monte_carlo = monte_carlo.simuler_analyse(df_final, solde_initial=analyzer.solde_initial)
+        except Exception as e:
+            print(f"[WARNING] Monte Carlo non calculé: {e}")
+            resultat_monte_carlo = None
+        # Séries glissantes des fenêtres par défaut (API et onglet Métriques Glissantes)
+        try:
+            with etape("metriques_glissantes", lignes_entree=df_final):
+                resultat_glissantes = metriques_glissantes.calculer_metriques_glissantes(df_final, solde_initial=analyzer.solde_initial)
+        except Exception as e:
+            print(f"[WARNING] Métriques glissantes non calculées: {e}")
+            resultat_glissantes = None
+
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        rapport_path = analyzer.create_excel_report(df_final, REPORTS_FOLDER, timestamp, filter_type)
+        with etape("rapport_excel", lignes_entree=df_final):
+            rapport_path = analyzer.create_excel_report(df_final, REPORTS_FOLDER, timestamp, filter_type,
+                                                        resultat_monte_carlo=resultat_monte_carlo,
+                                                        resultat_glissantes=resultat_glissantes)
 
         # Agrégations pour graphiques côté Web
         try:
-            aggs = analyzer.calculer_agregations_graphes(df_final)
-            sessions = analyzer.calculer_performance_par_session(df_final)
+            with etape("agregations_web", lignes_entree=df_final):
+                aggs = analyzer.calculer_agregations_graphes(df_final)
+                sessions = analyzer.calculer_performance_par_session(df_final)
         except Exception:
             aggs = {}
             sessions = {}
+        try:
+            with etape("sequences", lignes_entree=df_final):
+                sequences = sequences_trades.analyser_sequences(df_final)
+        except Exception as e:
+            print(f"[WARNING] Séquences non calculées: {e}")
+            sequences = None
         
         # Calculer les statistiques finales basées sur les trades complets
         trades_gagnants, trades_perdants, trades_neutres, total_trades = analyzer.calculer_trades_par_resultat(df_final)
@@ -153,18 +273,12 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
         drawdown_max = df_final['Drawdown_pct'].max() if 'Drawdown_pct' in df_final.columns else 0
         
         # Construire série d'équity (solde_initial + cumul profits)
-        evolution_equity = []
-        try:
-            temp = df_final.copy()
-            if "Heure d'ouverture" in temp.columns:
-                temp['__dt'] = pd.to_datetime(temp["Heure d'ouverture"], errors='coerce')
-                temp = temp[temp['__dt'].notna()].sort_values('__dt')
-                for _, r in temp.iterrows():
-                    evolution_equity.append({'date': r['__dt'].isoformat(), 'solde': float(r.get('Solde_cumule', solde_initial))})
-        except Exception:
-            pass
+        evolution_equity = _points_equity(df_final, solde_initial)
 
         # Finaliser la tâche
+        profil = collecteur_courant()
+        if profil is not None:
+            task_status[task_id]['timings'] = profil.resume()
         task_status[task_id]['success'] = True
         task_status[task_id]['progress'] = 100
         task_status[task_id]['message'] = 'Analyse terminée avec succès!'
@@ -207,11 +321,20 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
             'duree_mediane_minutes': aggs.get('duree_mediane_minutes') if aggs.get('duree_mediane_minutes') is not None else None,
             'evolution_somme_cumulee': aggs.get('evolution_somme_cumulee') if aggs.get('evolution_somme_cumulee') is not None else [],
             'evolution_equity': evolution_equity,
-            # Sessions (Asie/Europe/Amérique)
+            # Matrices croisées heure × jour, session × symbole, mois × symbole (heatmaps)
+            'matrices_croisees': aggs.get('matrices_croisees'),
+            # Sessions (Asie/Europe/Amérique par défaut, ANALYZER_SESSIONS) dans l'ordre de la configuration
+            'sessions': sessions.get('sessions', []),
             'sessions_total': sessions.get('sessions_total', {}),
             'sessions_par_pair': sessions.get('sessions_par_pair', {}),
             # Liste des paires disponibles (pour l'UI)
-            'pairs': list(df_final['Symbole_ordre'].dropna().unique()) if 'Symbole_ordre' in df_final.columns else []
+            'pairs': list(df_final['Symbole_ordre'].dropna().unique()) if 'Symbole_ordre' in df_final.columns else [],
+            # Distribution du drawdown / rendement selon l'ordre des trades
+            'monte_carlo': resultat_monte_carlo,
+            # Séries glissantes précalculées pour les fenêtres par défaut (changement de fenêtre sans requête)
+            'metriques_glissantes': resultat_glissantes,
+            # Séries gagnantes / perdantes (distribution, plus longues, taux après k pertes), globales et par paire
+            'sequences': sequences
         }
         
         # Nettoyer les fichiers uploadés
@@ -220,6 +343,10 @@ def process_files_background(task_id, file_paths, filter_type, solde_initial, mu
                 os.remove(file_path)
             except Exception:
                 pass
+        if upload_id:
+            chunked_store.supprimer(upload_id)
+            with upload_futures_lock:
+                upload_futures.pop(upload_id, None)
                 
     except Exception as e:
         import traceback
@@ -244,6 +371,14 @@ def filter_stats(task_id):
         date_start = payload.get('date_start')
         date_end = payload.get('date_end')
 
+        # Même sélection déjà calculée pour cette tâche : réponse directe
+        filtres = task_status[task_id].setdefault('_filtres', OrderedDict())
+        cle_filtre = (tuple(sorted(str(p) for p in pairs)), str(date_start or ''), str(date_end or ''))
+        metrics.compter_cache('filtres', cle_filtre in filtres)
+        if cle_filtre in filtres:
+            filtres.move_to_end(cle_filtre)
+            return jsonify({'success': True, 'statistics': filtres[cle_filtre]})
+
         df = task_status[task_id]['_df'].copy()
         # Filtre par paires
         if pairs and 'Symbole_ordre' in df.columns:
@@ -309,6 +444,8 @@ def filter_stats(task_id):
             'duree_moyenne_minutes': aggs.get('duree_moyenne_minutes'),
             'duree_mediane_minutes': aggs.get('duree_mediane_minutes'),
             'evolution_somme_cumulee': [],
+            'matrices_croisees': aggs.get('matrices_croisees'),
+            'sessions': sessions.get('sessions', []),
             'sessions_total': sessions.get('sessions_total', {}),
             'sessions_par_pair': sessions.get('sessions_par_pair', {}),
             'pairs': list(df['Symbole_ordre'].dropna().unique()) if 'Symbole_ordre' in df.columns else []
@@ -387,6 +524,9 @@ def filter_stats(task_id):
                 'evolution_somme_cumulee': []
             })
 
+        filtres[cle_filtre] = stats
+        while len(filtres) > TAILLE_CACHE_FILTRES:
+            filtres.popitem(last=False)
         return jsonify({'success': True, 'statistics': stats})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -422,6 +562,16 @@ def spa(path: str):
 def api_health():
     return jsonify({"status": "ok"})
 
+@app.route('/metrics')
+def metrics_prometheus():
+    """Métriques Prometheus agrégées sur tous les workers"""
+    octets, fichiers = metrics.taille_dossier(REPORTS_FOLDER)
+    texte = metrics.exposition([
+        ('analyzer_reports_disk_bytes', {}, octets),
+        ('analyzer_reports_files', {}, fichiers),
+    ])
+    return Response(texte, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/api/brokers')
 def api_brokers():
     """Liste tous les brokers disponibles"""
@@ -445,6 +595,353 @@ def api_status(task_id):
 def api_report(filename):
     return download_report(filename)
 
+def _get_explorer(task_id):
+    """Retourne (en le créant au besoin) l'explorateur de trades associé à une tâche"""
+    tache = task_status[task_id]
+    df = tache.get('_df')
+    explorer = tache.get('_explorer')
+    if explorer is None or explorer.source is not df:
+        explorer = TradeExplorer(df)
+        tache['_explorer'] = explorer
+    return explorer
+
+@app.route('/api/tasks/<task_id>/trades')
+def api_task_trades(task_id):
+    """Liste paginée des trades d'une tâche (tri serveur, filtres, curseur)"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    if task_status[task_id].get('_df') is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+    try:
+        explorer = _get_explorer(task_id)
+        filtres = {cle: request.args.get(cle) for cle in ('symbol', 'direction', 'date_start', 'date_end', 'profit', 'cle_match')}
+        resultat = explorer.page(
+            tri=request.args.get('sort') or None,
+            ordre=request.args.get('order', 'asc'),
+            filtres=filtres,
+            curseur=request.args.get('cursor') or None,
+            limite=request.args.get('limit')
+        )
+        resultat['success'] = True
+        return jsonify(resultat)
+    except CurseurInvalide as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except KeyError as e:
+        return jsonify({'success': False, 'error': str(e).strip("'")}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_task_trades: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/tasks/<task_id>/what_if', methods=['GET', 'POST'])
+def api_task_what_if(task_id):
+    """Grille solde initial × multiplicateur évaluée sur les deals de la tâche (JSON 'soldes', 'multiplicateurs')"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    tache = task_status[task_id]
+    df = tache.get('_df')
+    if df is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+    payload = (request.get_json(force=True, silent=True) or {}) if request.method == 'POST' else {}
+    soldes_defaut, multiplicateurs_defaut = scenarios_capital.grille_par_defaut(tache.get('solde_initial'), tache.get('multiplier'))
+    try:
+        solde_reference = float(payload.get('solde_initial_reference') or 10000.0)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'solde_initial_reference invalide'}), 400
+    try:
+        analyzer = TradingAnalyzer(solde_initial=tache.get('solde_initial'), multiplier=tache.get('multiplier'),
+                                   broker=tache.get('broker'))
+        resultat = scenarios_capital.evaluer_grille(
+            analyzer, df,
+            payload.get('soldes') or soldes_defaut,
+            payload.get('multiplicateurs') or multiplicateurs_defaut,
+            solde_initial_reference=solde_reference
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_task_what_if: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    resultat['success'] = True
+    return jsonify(resultat)
+
+@app.route('/api/tasks/<task_id>/rolling')
+def api_task_rolling(task_id):
+    """Métriques glissantes pour d'autres fenêtres (paramètres 'trades' et 'jours' : listes séparées par des virgules)"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    tache = task_status[task_id]
+    df = tache.get('_df')
+    if df is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+    trades = request.args.get('trades')
+    jours = request.args.get('jours')
+    try:
+        resultat = metriques_glissantes.calculer_metriques_glissantes(
+            df, solde_initial=tache.get('solde_initial') or 10000,
+            fenetres_trades=trades.split(',') if trades else metriques_glissantes.FENETRES_TRADES_DEFAUT,
+            fenetres_jours=jours.split(',') if jours else metriques_glissantes.FENETRES_JOURS_DEFAUT
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_task_rolling: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    resultat['success'] = True
+    return jsonify(resultat)
+
+EXCURSIONS_TRADES_MAX = 1000
+
+def _magasin_prix():
+    """Magasin de prix local (ANALYZER_MAGASIN_PRIX), None s'il n'est pas configuré"""
+    dossier = os.environ.get('ANALYZER_MAGASIN_PRIX')
+    return MagasinPrix(dossier) if dossier else None
+
+@app.route('/api/tasks/<task_id>/excursions')
+def api_task_excursions(task_id):
+    """MAE / MFE des trades de la tâche sur le magasin de prix (paramètre 'limit' : trades renvoyés, plus fortes MAE d'abord)"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    df = task_status[task_id].get('_df')
+    if df is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+    magasin = _magasin_prix()
+    if magasin is None:
+        return jsonify({'success': False, 'error': 'Magasin de prix non configuré (ANALYZER_MAGASIN_PRIX)'}), 400
+    try:
+        limite = int(request.args.get('limit') or 200)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit invalide'}), 400
+    if limite < 1:
+        return jsonify({'success': False, 'error': 'limit doit être >= 1'}), 400
+    limite = min(limite, EXCURSIONS_TRADES_MAX)
+    try:
+        trades = excursions.calculer_excursions(df, magasin)
+        resultat = excursions.resume_excursions(trades)
+        couverts = trades[trades['couvert']].sort_values('mae_pct', ascending=False).head(limite)
+        resultat['liste_trades'] = json.loads(couverts.to_json(orient='records', date_format='iso'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_task_excursions: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    resultat['success'] = True
+    return jsonify(resultat)
+
+@app.route('/api/tasks/<task_id>/excursions/what_if', methods=['POST'])
+def api_task_excursions_what_if(task_id):
+    """Rejeu des trades de la tâche avec d'autres TP / SL (JSON 'tp', 'sl' : listes de distances, null : sans niveau ; 'unite' : pct ou prix)"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    df = task_status[task_id].get('_df')
+    if df is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+    magasin = _magasin_prix()
+    if magasin is None:
+        return jsonify({'success': False, 'error': 'Magasin de prix non configuré (ANALYZER_MAGASIN_PRIX)'}), 400
+    payload = request.get_json(force=True, silent=True) or {}
+    tps, sls = payload.get('tp'), payload.get('sl')
+    if any(valeurs is not None and not isinstance(valeurs, list) for valeurs in (tps, sls)):
+        return jsonify({'success': False, 'error': 'tp / sl : listes de distances attendues'}), 400
+    try:
+        trades = excursions.calculer_excursions(df, magasin)
+        resultat = excursions.rejouer_tp_sl(trades, magasin, tps=tps, sls=sls, unite=payload.get('unite') or 'pct')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_task_excursions_what_if: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    resultat['success'] = True
+    return jsonify(resultat)
+
+@app.route('/api/portfolio', methods=['POST'])
+def api_portfolio():
+    """Vue portefeuille de plusieurs tâches terminées (JSON 'task_ids', 'frequence' optionnelle : 'h', 'D'...)"""
+    payload = request.get_json(force=True, silent=True) or {}
+    task_ids = payload.get('task_ids') or []
+    if not isinstance(task_ids, list) or not task_ids:
+        return jsonify({'success': False, 'error': 'task_ids : liste de tâches attendue'}), 400
+    comptes = []
+    for task_id in dict.fromkeys(task_ids):
+        tache = task_status.get(task_id)
+        if tache is None:
+            return jsonify({'success': False, 'error': f'Tâche inconnue: {task_id}'}), 404
+        df = tache.get('_df')
+        if df is None:
+            return jsonify({'success': False, 'error': f'Données non disponibles en mémoire: {task_id}'}), 400
+        comptes.append({'nom': task_id, 'df': df, 'solde_initial': tache.get('solde_initial') or 10000})
+    try:
+        resultat = portefeuille.agreger_portefeuille(comptes, frequence=payload.get('frequence') or None)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"[ERROR] Erreur dans api_portfolio: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    # Fichiers de chaque tâche, pour l'affichage
+    for compte, detail in zip(comptes, resultat['comptes']):
+        detail['fichiers'] = sorted(compte['df']['Fichier_Source'].dropna().astype(str).unique().tolist())
+    resultat['success'] = True
+    return jsonify(resultat)
+
+def _ajouter_background(task_id, file_paths, origine):
+    """Intègre de nouveaux exports à une tâche terminée (matching, cumuls et agrégats incrémentaux)"""
+    tache = task_status[task_id]
+    try:
+        analyse = tache.get('_analyse')
+        if analyse is None:
+            try:
+                multiplier = float(tache.get('multiplier') or 1.0)
+            except Exception:
+                multiplier = 1.0
+            analyse = AnalysePersistee(tache['_df'], solde_initial=tache.get('solde_initial'), multiplier=multiplier,
+                                       broker=tache.get('broker'), filter_type=tache.get('filter_type'),
+                                       etat_cumuls=tache.get('_etat_cumuls'))
+            tache['_analyse'] = analyse
+
+        resume = analyse.ajouter(file_paths, origine=origine)
+        if resume['deals_ajoutes']:
+            df = analyse.df
+            statistiques = dict(tache.get('statistics') or {})
+            statistiques.update(analyse.statistiques())
+            # Équity : seuls les nouveaux points, sauf si les cumuls ont été recalculés depuis le début
+            if resume['recalcul_complet']:
+                statistiques['evolution_equity'] = _points_equity(df, analyse.solde_initial)
+            else:
+                statistiques['evolution_equity'] = list(statistiques.get('evolution_equity') or []) + \
+                    _points_equity(resume['lignes'], analyse.solde_initial)
+            # Somme cumulée : ordre chronologique des trades complets, recalculée sur le DataFrame fusionné
+            try:
+                evolution = analyse.analyseur().calculer_agregations_graphes(df).get('evolution_somme_cumulee')
+                statistiques['evolution_somme_cumulee'] = evolution if evolution is not None else []
+            except Exception as e:
+                print(f"[WARNING] Somme cumulée non recalculée après l'ajout: {e}")
+            # Sessions : agrégats non additifs (fuseaux, paires), recalculés
+            try:
+                sessions = analyse.analyseur().calculer_performance_par_session(df)
+            except Exception:
+                sessions = {}
+            statistiques['sessions'] = sessions.get('sessions', [])
+            statistiques['sessions_total'] = sessions.get('sessions_total', {})
+            statistiques['sessions_par_pair'] = sessions.get('sessions_par_pair', {})
+            try:
+                statistiques['monte_carlo'] = monte_carlo.simuler_analyse(df, solde_initial=analyse.solde_initial,
+                                                                          solde_initial_reference=analyse.solde_initial_reference)
+            except Exception as e:
+                print(f"[WARNING] Monte Carlo non recalculé après l'ajout: {e}")
+            try:
+                statistiques['matrices_croisees'] = matrices_croisees.calculer_matrices(df, analyse.analyseur().sessions)
+            except Exception as e:
+                print(f"[WARNING] Matrices croisées non recalculées après l'ajout: {e}")
+            try:
+                statistiques['sequences'] = sequences_trades.analyser_sequences(df)
+            except Exception as e:
+                print(f"[WARNING] Séquences non recalculées après l'ajout: {e}")
+            try:
+                statistiques['metriques_glissantes'] = metriques_glissantes.calculer_metriques_glissantes(df, solde_initial=analyse.solde_initial)
+            except Exception as e:
+                print(f"[WARNING] Métriques glissantes non recalculées après l'ajout: {e}")
+            tache['statistics'] = statistiques
+            tache['_df'] = df
+            tache['_memoire'] = int(df.memory_usage(deep=True).sum())
+            tache['_filtres'] = OrderedDict()
+
+        tache['ajout'] = {
+            'en_cours': False,
+            'success': True,
+            'deals_ajoutes': resume['deals_ajoutes'],
+            'positions_fermees': resume['positions_fermees'],
+            'recalcul_complet': resume['recalcul_complet'],
+            'fichiers': resume['fichiers']
+        }
+    except Exception as e:
+        import traceback
+        print(f"[ERROR] Erreur dans l'ajout incrémental: {str(e)}")
+        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        tache['ajout'] = {'en_cours': False, 'success': False, 'error': str(e)}
+    finally:
+        for file_path in file_paths:
+            try:
+                os.remove(file_path)
+            except Exception:
+                pass
+
+@app.route('/api/tasks/<task_id>/append', methods=['POST'])
+def api_task_append(task_id):
+    """Ajoute de nouveaux exports (champ 'files', 'origine' optionnel) à une analyse terminée"""
+    if task_id not in task_status:
+        return jsonify({'success': False, 'error': 'Tâche inconnue'}), 404
+    tache = task_status[task_id]
+    if tache.get('_df') is None:
+        return jsonify({'success': False, 'error': 'Données non disponibles en mémoire'}), 400
+
+    files = [f for f in request.files.getlist('files') if f and f.filename and allowed_file(f.filename)]
+    if not files:
+        return jsonify({'success': False, 'error': 'Aucun rapport (Excel, HTML) valide fourni'}), 400
+    origine = (request.form.get('origine') or '').strip() or None
+
+    with ajouts_lock:
+        if (tache.get('ajout') or {}).get('en_cours'):
+            return jsonify({'success': False, 'error': 'Un ajout est déjà en cours pour cette tâche'}), 409
+        tache['ajout'] = {'en_cours': True}
+
+    file_paths = []
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    for file in files:
+        # Le nom d'origine est conservé (Fichier_Source) : préfixe dans un sous-dossier dédié
+        dossier = os.path.join(UPLOAD_FOLDER, f"ajout_{timestamp}_{uuid.uuid4().hex[:8]}")
+        os.makedirs(dossier, exist_ok=True)
+        file_path = os.path.join(dossier, secure_filename(file.filename))
+        file.save(file_path)
+        file_paths.append(file_path)
+
+    thread = threading.Thread(target=_ajouter_background, args=(task_id, file_paths, origine))
+    thread.daemon = True
+    thread.start()
+    return jsonify({'success': True, 'task_id': task_id}), 202
+
+def _parametres_analyse(source):
+    """Extrait filter_type, solde_initial, multiplier et broker d'un formulaire ou d'un JSON"""
+    filter_type = source.get('filter_type', 'tous')
+    if filter_type in ('tous', '', None):
+        filter_type = None
+    
+    try:
+        solde_initial = float(source.get('solde_initial', 10000))
+    except (TypeError, ValueError):
+        solde_initial = 10000
+
+    try:
+        multiplier = float(source.get('multiplier', 1))
+    except (TypeError, ValueError):
+        multiplier = 1
+    
+    # Récupérer le broker (optionnel)
+    broker = str(source.get('broker') or '').strip()
+    if broker == '':
+        broker = None
+    return filter_type, solde_initial, multiplier, broker
+
+def _lancer_tache(file_paths, filter_type, solde_initial, multiplier, broker, futures=None, upload_id=None):
+    """Crée une tâche et lance son traitement dans un thread"""
+    task_id = str(uuid.uuid4())
+    task_status[task_id] = {
+        'progress': 0,
+        'message': 'Initialisation...',
+        'success': None,
+        'error': None,
+        'solde_initial': solde_initial,
+        'multiplier': multiplier,
+        'broker': broker,
+        'filter_type': filter_type
+    }
+    
+    thread = threading.Thread(
+        target=process_files_background,
+        args=(task_id, file_paths, filter_type, solde_initial, multiplier, broker, futures, upload_id)
+    )
+    thread.daemon = True
+    thread.start()
+    return task_id
+
 @app.route('/upload', methods=['POST'])
 def upload_files():
     """Gère l'upload des fichiers et lance l'analyse"""
@@ -459,24 +956,7 @@ def upload_files():
             return jsonify({'success': False, 'error': 'Aucun fichier sélectionné'})
         
         # Récupérer les paramètres
-        filter_type = request.form.get('filter_type', 'tous')
-        if filter_type == 'tous':
-            filter_type = None
-        
-        try:
-            solde_initial = float(request.form.get('solde_initial', 10000))
-        except ValueError:
-            solde_initial = 10000
-
-        try:
-            multiplier = float(request.form.get('multiplier', 1))
-        except ValueError:
-            multiplier = 1
-        
-        # Récupérer le broker (optionnel)
-        broker = request.form.get('broker', '').strip()
-        if broker == '':
-            broker = None
+        filter_type, solde_initial, multiplier, broker = _parametres_analyse(request.form)
         
         # Sauvegarder les fichiers
         file_paths = []
@@ -491,27 +971,10 @@ def upload_files():
                 file_paths.append(file_path)
         
         if not file_paths:
-            return jsonify({'success': False, 'error': 'Aucun fichier Excel valide trouvé'})
-        
-        # Créer une tâche
-        task_id = str(uuid.uuid4())
-        task_status[task_id] = {
-            'progress': 0,
-            'message': 'Initialisation...',
-            'success': None,
-            'error': None,
-            'solde_initial': solde_initial,
-            'multiplier': multiplier,
-            'broker': broker
-        }
+            return jsonify({'success': False, 'error': 'Aucun rapport (Excel, HTML) ou archive valide trouvé'})
         
-        # Lancer le traitement en arrière-plan
-        thread = threading.Thread(
-            target=process_files_background,
-            args=(task_id, file_paths, filter_type, solde_initial, multiplier, broker)
-        )
-        thread.daemon = True
-        thread.start()
+        # Créer une tâche et lancer le traitement en arrière-plan
+        task_id = _lancer_tache(file_paths, filter_type, solde_initial, multiplier, broker)
         
         return jsonify({'success': True, 'task_id': task_id})
         
@@ -528,6 +991,84 @@ def upload_files():
             error_msg += f'\n\n{error_trace}'
         return jsonify({'success': False, 'error': error_msg}), 500
 
+# --- Upload par morceaux (reprenable) ---
+@app.route('/api/uploads', methods=['POST'])
+def api_upload_init():
+    """Crée une session d'upload par morceaux"""
+    payload = request.get_json(force=True, silent=True) or {}
+    filter_type, solde_initial, multiplier, broker = _parametres_analyse(payload)
+    try:
+        meta = chunked_store.creer(
+            payload.get('files') or [],
+            chunk_size=payload.get('chunk_size'),
+            parametres={'filter_type': filter_type, 'solde_initial': solde_initial,
+                        'multiplier': multiplier, 'broker': broker}
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({
+        'success': True,
+        'upload_id': meta['upload_id'],
+        'chunk_size': meta['chunk_size'],
+        'files': [{'index': f['index'], 'name': f['name'], 'size': f['size'], 'chunks': f['chunks']} for f in meta['files']]
+    })
+
+@app.route('/api/uploads/<upload_id>/files/<int:file_index>/chunks/<int:chunk_index>', methods=['PUT'])
+def api_upload_chunk(upload_id, file_index, chunk_index):
+    """Reçoit un morceau (corps brut) et l'écrit directement sur disque"""
+    try:
+        meta, fichier_complet = chunked_store.ecrire_morceau(upload_id, file_index, chunk_index, request.stream)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload inconnu'}), 404
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if fichier_complet:
+        # Le fichier est complet : son analyse démarre pendant que les autres arrivent
+        params = meta['parametres']
+        with upload_futures_lock:
+            futures = upload_futures.setdefault(upload_id, {})
+            # Les archives sont extraites au fil de l'eau par process_files
+            if file_index not in futures and not est_archive(meta['files'][file_index]['path']):
+                futures[file_index] = get_ingestion_pool().soumettre(
+                    meta['files'][file_index]['path'], params.get('filter_type'),
+                    params.get('solde_initial'), params.get('multiplier'), params.get('broker')
+                )
+                print(f"[DEBUG] Upload {upload_id}: fichier {file_index} complet, analyse lancée")
+    return jsonify({'success': True, 'file_complete': fichier_complet})
+
+@app.route('/api/uploads/<upload_id>')
+def api_upload_state(upload_id):
+    """État de reprise d'un upload (morceaux manquants)"""
+    try:
+        etat = chunked_store.etat(upload_id)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload inconnu'}), 404
+    etat['success'] = True
+    return jsonify(etat)
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+def api_upload_finalize(upload_id):
+    """Termine l'upload et lance la tâche d'analyse"""
+    try:
+        etat = chunked_store.etat(upload_id)
+        meta = chunked_store.charger(upload_id)
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Upload inconnu'}), 404
+    if not etat['complete']:
+        etat.update({'success': False, 'error': 'Upload incomplet'})
+        return jsonify(etat), 409
+
+    with upload_futures_lock:
+        futures_session = dict(upload_futures.get(upload_id, {}))
+    file_paths = [f['path'] for f in meta['files']]
+    futures = {meta['files'][i]['path']: fut for i, fut in futures_session.items()}
+    params = meta['parametres']
+    task_id = _lancer_tache(file_paths, params.get('filter_type'), params.get('solde_initial'),
+                            params.get('multiplier'), params.get('broker'),
+                            futures=futures, upload_id=upload_id)
+    return jsonify({'success': True, 'task_id': task_id})
+
 @app.route('/status/<task_id>')
 def get_status(task_id):
     """Récupère le statut d'une tâche"""
@@ -535,9 +1076,8 @@ def get_status(task_id):
         return jsonify({'error': 'Tâche non trouvée'}), 404
 
     # Copier le statut et retirer les objets non sérialisables
-    status = dict(task_status[task_id])
+    status = {k: v for k, v in task_status[task_id].items() if not k.startswith('_')}
     status.pop('df_final', None)
-    status.pop('_df', None)
     return jsonify(status)
 
 @app.route('/download_report/<filename>')
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Ingestion d'archives de rapports (zip, tar, tar.gz)
+Les membres sont extraits un par un en streaming et transmis au pool d'ingestion
+dès leur extraction ; le nombre de membres présents sur disque en même temps est
+borné, quelle que soit la taille de l'archive.
+"""
+
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from collections import deque
+from werkzeug.utils import secure_filename
+
+EXTENSIONS_ARCHIVE = ('.zip', '.tar', '.tar.gz', '.tgz')
+# Extensions des rapports reconnus à l'intérieur d'une archive
+EXTENSIONS_RAPPORT = ('.xlsx', '.xls', '.html', '.htm')
+# Taille maximale d'un membre décompressé (protection contre les archives piégées)
+TAILLE_MEMBRE_MAX = 512 * 1024 * 1024
+TAILLE_BLOC_COPIE = 1024 * 1024
+
+
+def est_archive(chemin):
+    """Indique si le fichier est une archive supportée (d'après son extension)"""
+    return str(chemin).lower().endswith(EXTENSIONS_ARCHIVE)
+
+
+def _est_rapport(nom):
+    return nom.lower().endswith(EXTENSIONS_RAPPORT) and not os.path.basename(nom).startswith(('.', '~$'))
+
+
+def _copier_borne(source, destination, limite=TAILLE_MEMBRE_MAX):
+    """Copie un flux par blocs en refusant de dépasser la limite"""
+    copie = 0
+    with open(destination, 'wb') as f:
+        while True:
+            bloc = source.read(TAILLE_BLOC_COPIE)
+            if not bloc:
+                break
+            copie += len(bloc)
+            if copie > limite:
+                raise ValueError(f"Membre d'archive trop volumineux (> {limite} octets)")
+            f.write(bloc)
+    return copie
+
+
+def _membres_zip(chemin_archive):
+    with zipfile.ZipFile(chemin_archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not _est_rapport(info.filename):
+                continue
+            if info.file_size > TAILLE_MEMBRE_MAX:
+                print(f"[WARNING] Membre ignoré (trop volumineux): {info.filename}")
+                continue
+            with zf.open(info) as flux:
+                yield info.filename, flux
+
+
+def _membres_tar(chemin_archive):
+    # Mode flux 'r|*' : lecture séquentielle, sans index ni décompression complète en mémoire
+    with tarfile.open(chemin_archive, mode='r|*') as tf:
+        for membre in tf:
+            if not membre.isfile() or not _est_rapport(membre.name):
+                continue
+            if membre.size > TAILLE_MEMBRE_MAX:
+                print(f"[WARNING] Membre ignoré (trop volumineux): {membre.name}")
+                continue
+            flux = tf.extractfile(membre)
+            if flux is None:
+                continue
+            yield membre.name, flux
+
+
+def extraire_membres(chemin_archive, dossier_travail):
+    """
+    Extrait les rapports d'une archive un par un.
+
+    Yields:
+        (nom_affiche, chemin_extrait) ; le fichier extrait appartient à l'appelant
+    """
+    if chemin_archive.lower().endswith('.zip'):
+        membres = _membres_zip(chemin_archive)
+    else:
+        membres = _membres_tar(chemin_archive)
+    for numero, (nom, flux) in enumerate(membres):
+        # Chemin interne aplati : deux membres homonymes dans des dossiers différents
+        # gardent des noms (et donc des clés de matching) distincts
+        nom_sur = secure_filename(nom.replace('\\', '/')) or f'membre_{numero}'
+        dossier_membre = os.path.join(dossier_travail, str(numero))
+        os.makedirs(dossier_membre, exist_ok=True)
+        destination = os.path.join(dossier_membre, nom_sur)
+        try:
+            _copier_borne(flux, destination)
+        except Exception as e:
+            print(f"[WARNING] Extraction impossible pour {nom}: {str(e)}")
+            shutil.rmtree(dossier_membre, ignore_errors=True)
+            continue
+        yield nom_sur, destination
+
+
+def ingerer_archive(chemin_archive, analyser, soumettre=None, max_en_vol=4):
+    """
+    Extrait et analyse les rapports d'une archive avec une empreinte bornée.
+
+    Args:
+        chemin_archive: archive zip / tar / tar.gz
+        analyser: callable(chemin) -> résultat, utilisé sans pool
+        soumettre: callable(chemin) -> Future (pool d'ingestion) ou None
+        max_en_vol: nombre maximal de membres extraits non encore analysés
+
+    Yields:
+        (nom_membre, résultat de process_single_file) dans l'ordre de l'archive
+    """
+    dossier_travail = tempfile.mkdtemp(prefix='archive_', dir=os.path.dirname(os.path.abspath(chemin_archive)))
+    en_vol = deque()
+
+    def terminer(element):
+        nom, chemin, future = element
+        try:
+            resultat = future.result() if future is not None else analyser(chemin)
+        except Exception as e:
+            print(f"[ERROR] Analyse en échec pour {nom}: {str(e)}")
+            resultat = (None, str(e), 0, 0)
+        finally:
+            # Le membre est supprimé dès qu'il est analysé : le disque reste borné
+            shutil.rmtree(os.path.dirname(chemin), ignore_errors=True)
+        return nom, resultat
+
+    try:
+        for nom, chemin in extraire_membres(chemin_archive, dossier_travail):
+            if soumettre is not None:
+                en_vol.append((nom, chemin, soumettre(chemin)))
+            else:
+                en_vol.append((nom, chemin, None))
+            while len(en_vol) >= max(1, max_en_vol):
+                yield terminer(en_vol.popleft())
+        while en_vol:
+            yield terminer(en_vol.popleft())
+    finally:
+        shutil.rmtree(dossier_travail, ignore_errors=True)
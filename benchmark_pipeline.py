@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Banc de performance du pipeline d'analyse
+Génère des rapports synthétiques (generateur_rapports_mt5) de tailles croissantes,
+chronomètre chaque étape de TradingAnalyzer et de create_excel_report (mesures de
+profiling.etape), enregistre les résultats en JSON et les compare à une référence.
+
+Usage:
+    python benchmark_pipeline.py [--tailles 1000,10000] [--format xlsx|html] [--moteur legacy|fast] [--repetitions N]
+        [--reference benchmarks/reference.json] [--tolerance 0.25] [--enregistrer-reference]
+
+Code de sortie : 0 si aucune régression, 1 sinon.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from generateur_rapports_mt5 import generer_rapports
+from profiling import ProfilEtapes, etape
+
+DOSSIER_BENCHMARKS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+REFERENCE_DEFAUT = os.path.join(DOSSIER_BENCHMARKS, 'reference.json')
+# Une étape plus lente de moins de SEUIL_ABSOLU_S n'est pas une régression (bruit de mesure)
+SEUIL_ABSOLU_S = 0.05
+
+
+def rapports_de_test(nb_deals, format_fichier, graine):
+    """Rapports synthétiques conservés entre deux exécutions (benchmarks/donnees)"""
+    dossier = os.path.join(DOSSIER_BENCHMARKS, 'donnees', f"{format_fichier}_{nb_deals}_{graine}")
+    marqueur = os.path.join(dossier, 'comptages.json')
+    if os.path.exists(marqueur):
+        with open(marqueur, 'r', encoding='utf-8') as f:
+            contenu = json.load(f)
+        if all(os.path.exists(c) for c in contenu['fichiers']):
+            return contenu['fichiers'], contenu['comptages']
+    shutil.rmtree(dossier, ignore_errors=True)
+    print(f"[INFO] Génération de {nb_deals} deals ({format_fichier})...")
+    fichiers, comptages = generer_rapports(nb_deals, dossier, format_fichier, graine)
+    with open(marqueur, 'w', encoding='utf-8') as f:
+        json.dump({'fichiers': fichiers, 'comptages': comptages}, f, indent=2)
+    return fichiers, comptages
+
+
+def executer_pipeline(fichiers, dossier_rapport, verbeux=False, engine=None):
+    """
+    Analyse complète (ingestion, cumuls, rapport Excel, agrégations web) sous profilage.
+
+    Returns:
+        (ProfilEtapes.resume(), nombre de lignes finales)
+    """
+    from trading_analyzer_unified import TradingAnalyzer
+
+    profil = ProfilEtapes('benchmark')
+    sortie = contextlib.nullcontext() if verbeux else contextlib.redirect_stdout(io.StringIO())
+    lignes = 0
+    with sortie, profil.actif():
+        with etape("total"):
+            analyzer = TradingAnalyzer(solde_initial=10000, engine=engine)
+            task_status = {'benchmark': {}}
+            df_final = analyzer.process_files(fichiers, 'benchmark', task_status)
+            if df_final is not None and len(df_final) > 0:
+                lignes = len(df_final)
+                analyzer.create_excel_report(df_final, dossier_rapport, 'benchmark')
+                with etape("agregations_web", lignes_entree=df_final):
+                    analyzer.calculer_agregations_graphes(df_final)
+                    analyzer.calculer_performance_par_session(df_final)
+    return profil.resume(), lignes
+
+
+def mesurer(nb_deals, format_fichier, repetitions, graine, verbeux=False, engine=None):
+    """Médiane des durées par étape sur plusieurs répétitions"""
+    fichiers, comptages = rapports_de_test(nb_deals, format_fichier, graine)
+    durees_par_etape, lignes, rss = {}, 0, None
+    for _ in range(repetitions):
+        dossier_rapport = tempfile.mkdtemp(prefix='benchmark_')
+        try:
+            resume, lignes = executer_pipeline(fichiers, dossier_rapport, verbeux, engine)
+        finally:
+            shutil.rmtree(dossier_rapport, ignore_errors=True)
+        for nom, cumul in resume['par_etape'].items():
+            durees_par_etape.setdefault(nom, []).append(cumul['duree_s'])
+        rss = max([e.get('rss_max_mo') or 0 for e in resume['etapes']] + [rss or 0])
+    etapes = {nom: round(float(np.median(durees)), 4) for nom, durees in durees_par_etape.items()}
+    total = etapes.pop('total', None)
+    return {
+        'deals': nb_deals,
+        'format': format_fichier,
+        'moteur': engine or 'legacy',
+        'fichiers': len(fichiers),
+        'comptages': comptages,
+        'lignes': lignes,
+        'total_s': total,
+        'lignes_par_s': round(lignes / total, 1) if total else None,
+        'rss_max_mo': rss,
+        'etapes': etapes,
+    }
+
+
+def comparer(resultats, reference, tolerance):
+    """
+    Compare chaque étape à la référence (même taille, même format, même moteur).
+
+    Returns:
+        liste de régressions {'deals', 'format', 'etape', 'reference_s', 'mesure_s', 'ratio'}
+    """
+    index = {(r['deals'], r['format'], r.get('moteur', 'legacy')): r for r in reference.get('resultats', [])}
+    regressions = []
+    for resultat in resultats:
+        ref = index.get((resultat['deals'], resultat['format'], resultat['moteur']))
+        if ref is None:
+            continue
+        etapes = dict(resultat['etapes'], total=resultat['total_s'])
+        etapes_ref = dict(ref['etapes'], total=ref['total_s'])
+        for nom, duree in etapes.items():
+            duree_ref = etapes_ref.get(nom)
+            if duree is None or not duree_ref:
+                continue
+            if duree > duree_ref * (1 + tolerance) and duree - duree_ref > SEUIL_ABSOLU_S:
+                regressions.append({'deals': resultat['deals'], 'format': resultat['format'], 'etape': nom,
+                                    'reference_s': duree_ref, 'mesure_s': duree,
+                                    'ratio': round(duree / duree_ref, 2)})
+    return regressions
+
+
+def environnement():
+    return {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'machine': platform.machine(),
+        'systeme': platform.platform(),
+        'processeurs': os.cpu_count(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc de performance du pipeline d'analyse")
+    parser.add_argument('--tailles', default='1000,10000',
+                        help="nombres de deals séparés par des virgules (ex: 1000,10000,100000)")
+    parser.add_argument('--format', dest='format_fichier', choices=['xlsx', 'html'], default='xlsx')
+    parser.add_argument('--moteur', choices=['legacy', 'fast'], default='legacy',
+                        help="moteur de matching / recalcul / cumuls de TradingAnalyzer")
+    parser.add_argument('--repetitions', type=int, default=1)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--sortie', help="fichier JSON des résultats (défaut: benchmarks/resultats/<date>.json)")
+    parser.add_argument('--reference', default=REFERENCE_DEFAUT)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="ralentissement toléré par étape (0.25 = +25 %%)")
+    parser.add_argument('--enregistrer-reference', action='store_true',
+                        help="enregistre ces résultats comme nouvelle référence")
+    parser.add_argument('--verbeux', action='store_true', help="affiche les traces [DEBUG] de l'analyseur")
+    args = parser.parse_args()
+
+    # Le cache des fichiers analysés fausserait les répétitions (lu à la création du cache, au premier fichier)
+    os.environ['ANALYZER_CACHE_FICHIERS_MO'] = '0'
+    tailles = [int(t) for t in args.tailles.split(',') if t.strip()]
+    resultats = []
+    for nb_deals in tailles:
+        resultat = mesurer(nb_deals, args.format_fichier, max(1, args.repetitions), args.graine, args.verbeux, args.moteur)
+        resultats.append(resultat)
+        print(f"{nb_deals:>9} deals ({args.format_fichier}, {args.moteur}) : {resultat['total_s']:.2f} s, "
+              f"{resultat['lignes_par_s']} lignes/s, RSS max {resultat['rss_max_mo']} Mo")
+        for nom, duree in sorted(resultat['etapes'].items(), key=lambda e: -e[1]):
+            print(f"    {nom:<24} {duree:>9.3f} s")
+
+    rapport = {'environnement': environnement(), 'parametres': vars(args), 'resultats': resultats}
+    sortie = args.sortie or os.path.join(DOSSIER_BENCHMARKS, 'resultats',
+                                          f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(sortie)), exist_ok=True)
+    with open(sortie, 'w', encoding='utf-8') as f:
+        json.dump(rapport, f, indent=2, ensure_ascii=False)
+    print(f"Résultats: {sortie}")
+
+    if args.enregistrer_reference:
+        os.makedirs(os.path.dirname(os.path.abspath(args.reference)), exist_ok=True)
+        with open(args.reference, 'w', encoding='utf-8') as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+        print(f"Référence enregistrée: {args.reference}")
+        return 0
+
+    if not os.path.exists(args.reference):
+        print(f"[INFO] Pas de référence ({args.reference}) : comparaison ignorée")
+        return 0
+    with open(args.reference, 'r', encoding='utf-8') as f:
+        reference = json.load(f)
+    regressions = comparer(resultats, reference, args.tolerance)
+    for r in regressions:
+        print(f"[WARNING] Régression {r['deals']} deals ({r['format']}) - {r['etape']}: "
+              f"{r['reference_s']:.3f} s -> {r['mesure_s']:.3f} s (x{r['ratio']})")
+    if regressions:
+        return 1
+    print("✅ Aucune régression par rapport à la référence")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,13 +3,46 @@
 Module de gestion des brokers et de leurs métadonnées de symboles.
 """
 
-import json
 import os
+import re
+import time
 from typing import Dict, Optional, Any
 
+import numpy as np
+import pandas as pd
+
+import metrics
+from broker_table import TableBroker, charger_table, signature_fichier
+
+# Préfixes / suffixes ajoutés par les brokers au nom "standard" du symbole
+# (EURUSD.m, EURUSD-ECN, #EURUSD, EURUSDmicro...). Les suffixes de place
+# (.DE, .CA...) font partie du nom et ne sont pas retirés.
+_PREFIXES_BROKER = re.compile(r'^[#_!.]+')
+_SUFFIXES_BROKER = re.compile(
+    r'([.\-_](M|R|I|C|PRO|ECN|RAW|STD|STP|MINI|MICRO|CASH|SPOT)|MICRO|[+!.])$'
+)
+
+
+def normaliser_symbole(symbol: str) -> str:
+    """
+    Forme normalisée d'un symbole pour la recherche : majuscules, sans espaces
+    ni préfixes / suffixes de broker ('eurusd.m' -> 'EURUSD', '#FXI' -> 'FXI').
+    """
+    cle = str(symbol).upper().replace(' ', '')
+    cle = _PREFIXES_BROKER.sub('', cle)
+    precedent = None
+    # Plusieurs suffixes peuvent s'empiler (EURUSD.MICRO+)
+    while cle and cle != precedent:
+        precedent = cle
+        cle = _SUFFIXES_BROKER.sub('', cle)
+    return cle or str(symbol).upper().replace(' ', '')
+
 class BrokerManager:
     """Gère les métadonnées des brokers pour les calculs de trading."""
     
+    # Délai minimal entre deux vérifications (stat) d'un fichier broker ou du dossier
+    INTERVALLE_VERIFICATION = 2.0
+
     def __init__(self, brokers_dir: str = None):
         """
         Initialise le gestionnaire de brokers.
@@ -21,69 +54,124 @@ class BrokerManager:
         if brokers_dir is None:
             brokers_dir = os.path.join(os.path.dirname(__file__), 'brokers')
         self.brokers_dir = brokers_dir
+        # Tables compilées (mémoire mappée) par broker, avec leur dernière vérification
+        self._tables: Dict[str, TableBroker] = {}
+        self._verifications: Dict[str, float] = {}
         self._brokers_cache: Dict[str, Dict] = {}
+        # Liste des brokers, invalidée par le mtime du dossier
+        self._liste_brokers = None
+        self._liste_signature = None
+        self._liste_verification = 0.0
     
-    def get_broker_data(self, broker_name: str) -> Optional[Dict]:
+    def _get_table(self, broker_name: str) -> Optional[TableBroker]:
         """
-        Charge les données d'un broker depuis son fichier JSON.
-        
-        Args:
-            broker_name: Nom du broker (ex: "avatrade")
-        
-        Returns:
-            Dict avec les métadonnées du broker, ou None si non trouvé
+        Table compilée d'un broker, rechargée à chaud si son JSON a été modifié.
         """
         if broker_name is None or broker_name == '':
             return None
+        nom = broker_name.lower()
+        table = self._tables.get(nom)
+        maintenant = time.monotonic()
+        if table is not None and maintenant - self._verifications.get(nom, 0.0) < self.INTERVALLE_VERIFICATION:
+            return table
+        self._verifications[nom] = maintenant
         
-        # Vérifier le cache
-        if broker_name in self._brokers_cache:
-            return self._brokers_cache[broker_name]
-        
-        # Charger depuis le fichier
-        broker_file = os.path.join(self.brokers_dir, f"{broker_name.lower()}.json")
-        
-        if not os.path.exists(broker_file):
-            print(f"[WARNING] Fichier broker non trouvé: {broker_file}")
+        broker_file = os.path.join(self.brokers_dir, f"{nom}.json")
+        try:
+            signature = signature_fichier(broker_file)
+        except OSError:
+            if table is not None:
+                print(f"[WARNING] Fichier broker supprimé: {broker_file}")
+                self._tables.pop(nom, None)
+                self._brokers_cache.pop(nom, None)
+            else:
+                print(f"[WARNING] Fichier broker non trouvé: {broker_file}")
             return None
+        if table is not None and table.signature == signature:
+            return table
         
         try:
-            with open(broker_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            self._brokers_cache[broker_name] = data
-            return data
+            nouvelle = charger_table(nom, broker_file)
+            self._indexer(nouvelle)
         except Exception as e:
             print(f"[ERROR] Erreur lors du chargement du broker {broker_name}: {str(e)}")
+            return table
+        if table is not None:
+            print(f"[INFO] Broker rechargé: {nom}")
+        self._tables[nom] = nouvelle
+        self._brokers_cache.pop(nom, None)
+        return nouvelle
+
+    def signature_broker(self, broker_name: str) -> Optional[list]:
+        """Version (mtime_ns, taille) du JSON chargé pour ce broker, None si inconnu"""
+        table = self._get_table(broker_name)
+        return table.signature if table is not None else None
+
+    def get_broker_data(self, broker_name: str) -> Optional[Dict]:
+        """
+        Charge les données d'un broker (même structure que son fichier JSON).
+        
+        Args:
+            broker_name: Nom du broker (ex: "avatrade")
+        
+        Returns:
+            Dict avec les métadonnées du broker, ou None si non trouvé
+        """
+        table = self._get_table(broker_name)
+        if table is None:
             return None
+        nom = broker_name.lower()
+        if nom not in self._brokers_cache:
+            self._brokers_cache[nom] = table.en_dict()
+        return self._brokers_cache[nom]
     
+    @staticmethod
+    def _indexer(table: TableBroker):
+        """
+        Construit la table de recherche d'un broker (forme du symbole -> ligne).
+
+        Les clés exactes (majuscules, sans espaces) sont prioritaires sur les formes
+        normalisées : '#FXI' et 'FXI' restent deux symboles distincts s'ils existent tous deux.
+        """
+        index = {}
+        for position, key in enumerate(table.symbols):
+            index.setdefault(key.upper().replace(' ', ''), position)
+        for position, key in enumerate(table.symbols):
+            index.setdefault(normaliser_symbole(key), position)
+        table.index = index
+
+    @staticmethod
+    def _position(table: TableBroker, symbol: str) -> Optional[int]:
+        """Ligne du symbole dans la table : exact, sans espaces, puis forme normalisée"""
+        symbol_upper = str(symbol).upper().replace(' ', '')
+        position = table.index.get(symbol_upper)
+        if position is None:
+            position = table.index.get(normaliser_symbole(symbol_upper))
+        return position
+
     def get_symbol_metadata(self, broker_name: str, symbol: str) -> Optional[Dict]:
         """
         Récupère les métadonnées d'un symbole spécifique pour un broker.
         
         Args:
             broker_name: Nom du broker
-            symbol: Symbole à rechercher (ex: "BTCEUR", "EURUSD")
+            symbol: Symbole à rechercher (ex: "BTCEUR", "EURUSD", "eurusd.m", "#EURUSD")
         
         Returns:
             Dict avec les métadonnées du symbole, ou None si non trouvé
         """
-        broker_data = self.get_broker_data(broker_name)
-        if broker_data is None:
+        table = self._get_table(broker_name)
+        if table is None:
             return None
-        
-        symbols = broker_data.get('symbols', {})
-        symbol_upper = symbol.upper()
-        
-        # Chercher le symbole exact
-        if symbol_upper in symbols:
-            return symbols[symbol_upper]
-        
-        # Chercher avec variations (sans espaces, etc.)
-        for key, value in symbols.items():
-            if key.replace(' ', '').upper() == symbol_upper.replace(' ', '').upper():
-                return value
-        
-        return None
+        # Mémo porté par la table : vidé de fait quand le broker est rechargé
+        if symbol in table.memo:
+            metrics.compter_cache('broker', True)
+            return table.memo[symbol]
+        metrics.compter_cache('broker', False)
+        position = self._position(table, symbol)
+        metadata = table.ligne(position) if position is not None else None
+        table.memo[symbol] = metadata
+        return metadata
     
     def get_pip_value(self, broker_name: str, symbol: str, currency: str = 'USD') -> Optional[float]:
         """
@@ -92,7 +180,7 @@ class BrokerManager:
         Args:
             broker_name: Nom du broker
             symbol: Symbole
-            currency: Devise souhaitée ('USD', 'EUR', ou 'account_currency')
+            currency: Devise souhaitée ('USD', 'EUR', autre devise importée, ou 'account_currency')
         
         Returns:
             Valeur d'un pip par lot, ou None si non trouvé
@@ -101,13 +189,15 @@ class BrokerManager:
         if metadata is None:
             return None
         
-        if currency.upper() == 'USD':
-            return metadata.get('pip_value_usd')
-        elif currency.upper() == 'EUR':
-            return metadata.get('pip_value_eur')
-        else:
-            # Devise du compte
-            return metadata.get('pip_value_account_currency')
+        return metadata.get(self._champ_pip_value(currency, metadata))
+    
+    @staticmethod
+    def _champ_pip_value(currency: str, champs) -> str:
+        """Champ de valeur du pip pour une devise (pip_value_<devise> si importé, sinon devise du compte)"""
+        champ = f"pip_value_{currency.lower()}"
+        if currency.upper() in ('USD', 'EUR') or champ in champs:
+            return champ
+        return 'pip_value_account_currency'
     
     def get_pip_size(self, broker_name: str, symbol: str) -> Optional[float]:
         """Récupère la taille d'un pip pour un symbole."""
@@ -133,12 +223,23 @@ class BrokerManager:
     def list_available_brokers(self) -> list:
         """
         Liste tous les brokers disponibles (fichiers JSON dans le dossier brokers).
+        La liste est mise en cache et relue seulement quand le dossier change.
         
         Returns:
             Liste des noms de brokers disponibles
         """
-        if not os.path.exists(self.brokers_dir):
+        maintenant = time.monotonic()
+        if self._liste_brokers is not None and maintenant - self._liste_verification < self.INTERVALLE_VERIFICATION:
+            return list(self._liste_brokers)
+        self._liste_verification = maintenant
+        
+        try:
+            signature = signature_fichier(self.brokers_dir)
+        except OSError:
+            self._liste_brokers, self._liste_signature = [], None
             return []
+        if self._liste_brokers is not None and signature == self._liste_signature:
+            return list(self._liste_brokers)
         
         brokers = []
         for filename in os.listdir(self.brokers_dir):
@@ -146,7 +247,48 @@ class BrokerManager:
                 broker_name = filename[:-5]  # Enlever .json
                 brokers.append(broker_name)
         
-        return sorted(brokers)
+        self._liste_brokers = sorted(brokers)
+        self._liste_signature = signature
+        return list(self._liste_brokers)
+
+    # ------------------------------------------------------------------
+    # API vectorisées : une valeur par ligne d'une colonne de symboles
+    # ------------------------------------------------------------------
+    def _valeurs_par_symbole(self, broker_name: str, symbols, champ: str) -> np.ndarray:
+        """
+        Résout chaque symbole distinct une seule fois et lit la valeur directement
+        dans la colonne de la table compilée.
+
+        Returns:
+            np.ndarray float64 aligné sur `symbols` (NaN si symbole ou champ inconnu)
+        """
+        codes, uniques = pd.factorize(pd.Series(symbols, copy=False), sort=False)
+        table = self._get_table(broker_name)
+        colonne = table.colonne(champ) if table is not None else None
+        if colonne is None:
+            return np.full(len(codes), np.nan, dtype=np.float64)
+        positions = []
+        for symbol in uniques:
+            position = self._position(table, str(symbol))
+            positions.append(-1 if position is None else position)
+        # -1 (symbole inconnu, ou code -1 de factorize pour une valeur manquante)
+        # désigne la case NaN ajoutée en fin de colonne
+        positions = np.array(positions + [-1], dtype=np.int64)
+        return np.append(colonne, np.nan)[positions[codes]]
+
+    def get_pip_sizes(self, broker_name: str, symbols) -> np.ndarray:
+        """Tailles de pip pour une colonne de symboles (NaN si inconnu)."""
+        return self._valeurs_par_symbole(broker_name, symbols, 'pip_size')
+
+    def get_pip_values(self, broker_name: str, symbols, currency: str = 'USD') -> np.ndarray:
+        """Valeurs d'un pip par lot pour une colonne de symboles (NaN si inconnu)."""
+        table = self._get_table(broker_name)
+        champs = table.numeriques if table is not None else ()
+        return self._valeurs_par_symbole(broker_name, symbols, self._champ_pip_value(currency, champs))
+
+    def get_contract_sizes(self, broker_name: str, symbols) -> np.ndarray:
+        """Tailles de contrat pour une colonne de symboles (NaN si inconnu)."""
+        return self._valeurs_par_symbole(broker_name, symbols, 'contract_size')
 
 # Instance globale pour faciliter l'utilisation
 _broker_manager_instance = None
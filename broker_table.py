@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Table binaire compilée des métadonnées d'un broker
+Le JSON du broker est compilé une fois en tableau NumPy structuré (.npy, une ligne
+par symbole) puis ouvert en mémoire mappée : les workers gunicorn partagent les
+mêmes pages via le cache du système au lieu de parser chacun 13k lignes de JSON.
+
+Étape de build :  python broker_table.py [dossier_brokers]
+"""
+
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DOSSIER_COMPILE = 'compiled'
+# Incrémenter si le format du fichier compilé change
+VERSION_FORMAT = 1
+
+
+def chemins_compiles(broker_file: str):
+    """(chemin .npy, chemin de la description) associés à un JSON de broker"""
+    dossier = os.path.join(os.path.dirname(os.path.abspath(broker_file)), DOSSIER_COMPILE)
+    nom = os.path.splitext(os.path.basename(broker_file))[0]
+    return os.path.join(dossier, f'{nom}.npy'), os.path.join(dossier, f'{nom}.meta.json')
+
+
+def signature_fichier(chemin: str):
+    """Signature (mtime_ns, taille) utilisée pour détecter une modification"""
+    st = os.stat(chemin)
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _est_nombre(valeur) -> bool:
+    return isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+
+
+def construire_tableau(data: Dict):
+    """
+    Convertit le JSON d'un broker en tableau structuré.
+
+    Les champs dont toutes les valeurs sont numériques deviennent des float64 (NaN si
+    absents), les autres des chaînes de largeur fixe.
+
+    Returns:
+        (tableau, description) ; la description liste les champs entiers à restaurer
+    """
+    symbols = data.get('symbols', {})
+    champs: List[str] = []
+    for metadata in symbols.values():
+        for champ in metadata:
+            if champ not in champs:
+                champs.append(champ)
+
+    numeriques, entiers = [], []
+    for champ in champs:
+        valeurs = [m[champ] for m in symbols.values() if m.get(champ) is not None]
+        if valeurs and all(_est_nombre(v) for v in valeurs):
+            numeriques.append(champ)
+            if all(isinstance(v, int) for v in valeurs):
+                entiers.append(champ)
+
+    def largeur(valeurs):
+        return max([len(str(v)) for v in valeurs] + [1])
+
+    dtype = [('symbol', f'U{largeur(symbols.keys())}')]
+    for champ in champs:
+        if champ in numeriques:
+            dtype.append((champ, 'f8'))
+        else:
+            dtype.append((champ, f'U{largeur(m.get(champ, "") for m in symbols.values())}'))
+
+    tableau = np.zeros(len(symbols), dtype=dtype)
+    for i, (symbol, metadata) in enumerate(symbols.items()):
+        tableau['symbol'][i] = symbol
+        for champ in champs:
+            valeur = metadata.get(champ)
+            if champ in numeriques:
+                tableau[champ][i] = np.nan if valeur is None else float(valeur)
+            else:
+                tableau[champ][i] = '' if valeur is None else str(valeur)
+
+    description = {
+        'version': VERSION_FORMAT,
+        'broker': data.get('broker'),
+        'champs': champs,
+        'numeriques': numeriques,
+        'entiers': entiers,
+    }
+    return tableau, description
+
+
+def _ecrire_atomique(chemin: str, ecrire):
+    """Écrit via un fichier temporaire + os.replace : un worker ne lit jamais un fichier partiel"""
+    dossier = os.path.dirname(chemin)
+    fd, temporaire = tempfile.mkstemp(dir=dossier, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            ecrire(f)
+        # mkstemp crée le fichier en 0600 : lisible aussi par le service s'il tourne sous un autre utilisateur
+        os.chmod(temporaire, 0o644)
+        os.replace(temporaire, chemin)
+    except Exception:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def compiler_broker(broker_file: str) -> Dict:
+    """
+    Compile le JSON d'un broker en .npy (+ description) à côté du dossier brokers.
+
+    Returns:
+        La description écrite (contient la signature du JSON source)
+    """
+    signature = signature_fichier(broker_file)
+    with open(broker_file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    tableau, description = construire_tableau(data)
+    description['source'] = signature
+
+    chemin_npy, chemin_meta = chemins_compiles(broker_file)
+    os.makedirs(os.path.dirname(chemin_npy), exist_ok=True)
+    _ecrire_atomique(chemin_npy, lambda f: np.save(f, tableau, allow_pickle=False))
+    _ecrire_atomique(chemin_meta, lambda f: f.write(json.dumps(description).encode('utf-8')))
+    return description
+
+
+def patcher_table(broker_file: str, symbols: Dict[str, Dict], signature_precedente) -> bool:
+    """
+    Met à jour les seules lignes des symboles modifiés dans la table compilée, réécrite
+    ensuite via un fichier temporaire (un lecteur ne voit jamais de ligne à moitié écrite).
+
+    Possible uniquement si la table correspond à la version précédente du JSON
+    (signature_precedente), que les symboles existent déjà et que leurs champs tiennent
+    dans le format actuel (mêmes champs, chaînes pas plus longues) ; sinon retourne
+    False et l'appelant recompile la table complète.
+    """
+    chemin_npy, chemin_meta = chemins_compiles(broker_file)
+    try:
+        with open(chemin_meta, 'r', encoding='utf-8') as f:
+            description = json.load(f)
+        tableau = np.load(chemin_npy, allow_pickle=False)
+    except (OSError, ValueError):
+        return False
+    if description.get('version') != VERSION_FORMAT or description.get('source') != signature_precedente:
+        return False
+
+    champs = description.get('champs', [])
+    numeriques = set(description.get('numeriques', []))
+    entiers = set(description.get('entiers', []))
+    positions = {str(symbol): i for i, symbol in enumerate(tableau['symbol'])}
+    lignes = []
+    for symbol, metadata in symbols.items():
+        if symbol not in positions or any(champ not in champs for champ in metadata):
+            return False
+        valeurs = {}
+        for champ in champs:
+            valeur = metadata.get(champ)
+            if champ in numeriques:
+                if valeur is not None and (not _est_nombre(valeur)
+                                           or (champ in entiers and not isinstance(valeur, int))):
+                    return False
+                valeurs[champ] = np.nan if valeur is None else float(valeur)
+            else:
+                texte = '' if valeur is None else str(valeur)
+                if len(texte) > tableau.dtype[champ].itemsize // 4:
+                    return False
+                valeurs[champ] = texte
+        lignes.append((positions[symbol], valeurs))
+
+    for position, valeurs in lignes:
+        for champ, valeur in valeurs.items():
+            tableau[champ][position] = valeur
+    _ecrire_atomique(chemin_npy, lambda f: np.save(f, tableau, allow_pickle=False))
+    description['source'] = signature_fichier(broker_file)
+    _ecrire_atomique(chemin_meta, lambda f: f.write(json.dumps(description).encode('utf-8')))
+    return True
+
+
+class TableBroker:
+    """Métadonnées d'un broker, colonne par colonne, lues depuis la table compilée"""
+
+    def __init__(self, nom: str, tableau: np.ndarray, description: Dict):
+        self.nom = nom
+        self.tableau = tableau
+        self.description = description
+        self.signature = description.get('source')
+        self.champs = description.get('champs', [])
+        self.numeriques = set(description.get('numeriques', []))
+        self.entiers = set(description.get('entiers', []))
+        self.symbols = [str(s) for s in tableau['symbol']]
+        # Table de recherche et mémo propres à cette version du fichier :
+        # un rechargement repart de zéro sans invalidation explicite
+        self.index: Dict[str, int] = {}
+        self.memo: Dict[str, Optional[Dict]] = {}
+        self._colonnes: Dict[str, np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def ligne(self, position: int) -> Dict:
+        """Métadonnées d'un symbole sous forme de dict (même forme que le JSON)"""
+        enregistrement = self.tableau[position]
+        metadata = {}
+        for champ in self.champs:
+            valeur = enregistrement[champ]
+            if champ in self.numeriques:
+                if np.isnan(valeur):
+                    continue
+                metadata[champ] = int(valeur) if champ in self.entiers else float(valeur)
+            else:
+                metadata[champ] = str(valeur)
+        return metadata
+
+    def colonne(self, champ: str) -> Optional[np.ndarray]:
+        """Colonne numérique complète (float64), None si le champ n'existe pas"""
+        if champ not in self.numeriques:
+            return None
+        if champ not in self._colonnes:
+            self._colonnes[champ] = np.asarray(self.tableau[champ], dtype=np.float64)
+        return self._colonnes[champ]
+
+    def en_dict(self) -> Dict:
+        """Reconstitue le JSON d'origine (compatibilité)"""
+        return {
+            'broker': self.description.get('broker') or self.nom,
+            'symbols': {symbol: self.ligne(i) for i, symbol in enumerate(self.symbols)},
+        }
+
+
+def charger_table(nom: str, broker_file: str) -> TableBroker:
+    """
+    Ouvre la table compilée d'un broker, en la (re)compilant si le JSON a changé.
+
+    Si le dossier n'est pas accessible en écriture, la table est construite en mémoire.
+    """
+    signature = signature_fichier(broker_file)
+    chemin_npy, chemin_meta = chemins_compiles(broker_file)
+    description = None
+    if os.path.exists(chemin_npy) and os.path.exists(chemin_meta):
+        try:
+            with open(chemin_meta, 'r', encoding='utf-8') as f:
+                description = json.load(f)
+        except Exception:
+            description = None
+    if (description is None or description.get('source') != signature
+            or description.get('version') != VERSION_FORMAT):
+        try:
+            description = compiler_broker(broker_file)
+            print(f"[INFO] Broker compilé: {nom} -> {chemin_npy}")
+        except OSError as e:
+            print(f"[WARNING] Compilation du broker {nom} impossible ({str(e)}), chargement en mémoire")
+            with open(broker_file, 'r', encoding='utf-8') as f:
+                tableau, description = construire_tableau(json.load(f))
+            description['source'] = signature
+            return TableBroker(nom, tableau, description)
+    tableau = np.load(chemin_npy, mmap_mode='r', allow_pickle=False)
+    return TableBroker(nom, tableau, description)
+
+
+def compiler_dossier(brokers_dir: str) -> List[str]:
+    """Compile tous les JSON d'un dossier brokers (étape de build)"""
+    compiles = []
+    for filename in sorted(os.listdir(brokers_dir)):
+        if filename.endswith('.json'):
+            compiler_broker(os.path.join(brokers_dir, filename))
+            compiles.append(filename[:-5])
+    return compiles
+
+
+if __name__ == '__main__':
+    dossier = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), 'brokers')
+    noms = compiler_dossier(dossier)
+    print(f"Brokers compilés: {', '.join(noms) if noms else 'aucun'}")
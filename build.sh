@@ -32,6 +32,9 @@ echo "=== Installation des dépendances Python ==="
 pip install --upgrade pip
 pip install -r requirements.txt
 
+echo "=== Compilation des métadonnées brokers ==="
+python broker_table.py
+
 echo "✅ Build terminé"
 
 
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Upload par morceaux (init -> PUT des morceaux -> finalisation)
+Les morceaux sont écrits directement à leur position dans le fichier de destination ;
+l'état de réception est conservé sur disque (un marqueur par morceau) afin de
+reprendre un upload interrompu, y compris après redémarrage ou sur un autre worker.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+from werkzeug.utils import secure_filename
+
+# Taille de lecture du flux HTTP (le morceau n'est jamais chargé en mémoire d'un bloc)
+TAILLE_BLOC_LECTURE = 1024 * 1024
+TAILLE_MORCEAU_DEFAUT = 5 * 1024 * 1024
+TAILLE_MORCEAU_MAX = 32 * 1024 * 1024
+TAILLE_FICHIER_MAX = 2 * 1024 * 1024 * 1024
+
+_ID_VALIDE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ChunkedUploadStore:
+    """Sessions d'upload par morceaux stockées dans un dossier"""
+
+    def __init__(self, racine, extensions_autorisees=None):
+        self.racine = racine
+        self.extensions_autorisees = set(extensions_autorisees or [])
+        os.makedirs(self.racine, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Chemins
+    # ------------------------------------------------------------------
+    def _dossier(self, upload_id):
+        if not _ID_VALIDE.match(str(upload_id)):
+            raise KeyError(upload_id)
+        return os.path.join(self.racine, upload_id)
+
+    def _chemin_meta(self, upload_id):
+        return os.path.join(self._dossier(upload_id), 'meta.json')
+
+    def _marqueur(self, upload_id, index_fichier, index_morceau):
+        return os.path.join(self._dossier(upload_id), 'parts', f'{index_fichier}.{index_morceau}')
+
+    # ------------------------------------------------------------------
+    # Session
+    # ------------------------------------------------------------------
+    def creer(self, fichiers, chunk_size=None, parametres=None):
+        """
+        Crée une session d'upload.
+
+        Args:
+            fichiers: liste de {'name': nom, 'size': taille en octets}
+            chunk_size: taille des morceaux (octets)
+            parametres: paramètres d'analyse conservés jusqu'à la finalisation
+
+        Returns:
+            Métadonnées de la session
+        """
+        if not fichiers:
+            raise ValueError('Aucun fichier déclaré')
+        try:
+            chunk_size = int(chunk_size or TAILLE_MORCEAU_DEFAUT)
+        except (TypeError, ValueError):
+            raise ValueError('chunk_size invalide')
+        if chunk_size <= 0 or chunk_size > TAILLE_MORCEAU_MAX:
+            raise ValueError(f'chunk_size doit être compris entre 1 et {TAILLE_MORCEAU_MAX} octets')
+
+        valides = []
+        for fichier in fichiers:
+            nom = secure_filename(str(fichier.get('name') or ''))
+            extension_ok = '.' in nom and (not self.extensions_autorisees
+                                           or nom.rsplit('.', 1)[1].lower() in self.extensions_autorisees)
+            if not nom or not extension_ok:
+                raise ValueError(f"Fichier non autorisé: {fichier.get('name')}")
+            try:
+                taille = int(fichier.get('size'))
+            except (TypeError, ValueError):
+                raise ValueError(f"Taille invalide pour {nom}")
+            if taille <= 0 or taille > TAILLE_FICHIER_MAX:
+                raise ValueError(f"Taille hors limites pour {nom}")
+            valides.append((nom, taille))
+
+        upload_id = uuid.uuid4().hex
+        dossier = self._dossier(upload_id)
+        os.makedirs(os.path.join(dossier, 'parts'))
+
+        decrits = []
+        for index, (nom, taille) in enumerate(valides):
+            chemin = os.path.join(dossier, f'{index}_{nom}')
+            # Pré-allocation : chaque morceau est ensuite écrit à sa position
+            with open(chemin, 'wb') as f:
+                f.truncate(taille)
+            decrits.append({
+                'index': index,
+                'name': nom,
+                'size': taille,
+                'chunks': (taille + chunk_size - 1) // chunk_size,
+                'path': chemin,
+            })
+
+        meta = {
+            'upload_id': upload_id,
+            'created': time.time(),
+            'chunk_size': chunk_size,
+            'files': decrits,
+            'parametres': parametres or {},
+        }
+        with open(self._chemin_meta(upload_id), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return meta
+
+    def charger(self, upload_id):
+        """Métadonnées d'une session (KeyError si inconnue)"""
+        chemin = self._chemin_meta(upload_id)
+        if not os.path.exists(chemin):
+            raise KeyError(upload_id)
+        with open(chemin, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def supprimer(self, upload_id):
+        try:
+            shutil.rmtree(self._dossier(upload_id), ignore_errors=True)
+        except KeyError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Morceaux
+    # ------------------------------------------------------------------
+    def ecrire_morceau(self, upload_id, index_fichier, index_morceau, flux):
+        """
+        Écrit un morceau en streaming depuis le flux HTTP.
+
+        Returns:
+            (meta, fichier_complet) où fichier_complet indique que tous les
+            morceaux du fichier sont maintenant reçus
+        """
+        meta = self.charger(upload_id)
+        if index_fichier < 0 or index_fichier >= len(meta['files']):
+            raise ValueError('Index de fichier invalide')
+        fichier = meta['files'][index_fichier]
+        if index_morceau < 0 or index_morceau >= fichier['chunks']:
+            raise ValueError('Index de morceau invalide')
+
+        debut = index_morceau * meta['chunk_size']
+        attendu = min(meta['chunk_size'], fichier['size'] - debut)
+        recu = 0
+        with open(fichier['path'], 'r+b') as f:
+            f.seek(debut)
+            while recu < attendu:
+                bloc = flux.read(min(TAILLE_BLOC_LECTURE, attendu - recu))
+                if not bloc:
+                    break
+                f.write(bloc)
+                recu += len(bloc)
+        if recu != attendu or flux.read(1):
+            # Morceau tronqué (déconnexion) ou trop long : non marqué, à renvoyer
+            raise ValueError(f'Morceau incomplet: {recu} octets reçus, {attendu} attendus')
+
+        with open(self._marqueur(upload_id, index_fichier, index_morceau), 'w') as f:
+            f.write(str(recu))
+        return meta, not self.morceaux_manquants(meta, index_fichier)
+
+    def morceaux_manquants(self, meta, index_fichier):
+        fichier = meta['files'][index_fichier]
+        dossier_parts = os.path.join(self._dossier(meta['upload_id']), 'parts')
+        presents = set(os.listdir(dossier_parts))
+        return [i for i in range(fichier['chunks']) if f'{index_fichier}.{i}' not in presents]
+
+    def etat(self, upload_id):
+        """État de reprise : morceaux manquants par fichier"""
+        meta = self.charger(upload_id)
+        fichiers = []
+        for fichier in meta['files']:
+            manquants = self.morceaux_manquants(meta, fichier['index'])
+            fichiers.append({
+                'index': fichier['index'],
+                'name': fichier['name'],
+                'size': fichier['size'],
+                'chunks': fichier['chunks'],
+                'missing_chunks': manquants,
+                'complete': not manquants,
+            })
+        return {
+            'upload_id': upload_id,
+            'chunk_size': meta['chunk_size'],
+            'files': fichiers,
+            'complete': all(f['complete'] for f in fichiers),
+        }
+
+    def nettoyer_sessions(self, age_max_secondes=24 * 3600):
+        """Supprime les sessions abandonnées"""
+        maintenant = time.time()
+        if not os.path.exists(self.racine):
+            return
+        for nom in os.listdir(self.racine):
+            dossier = os.path.join(self.racine, nom)
+            if os.path.isdir(dossier) and maintenant - os.path.getmtime(dossier) > age_max_secondes:
+                shutil.rmtree(dossier, ignore_errors=True)
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+Comparaison des passes d'optimisation du testeur de stratégie MT5
+Chaque rapport porte dans son en-tête l'expert, le symbole, la période et tous les
+paramètres d'entrée ("Données d'entrée" : lot_r1=0.1, perTP1=50...). Ici chaque rapport
+est analysé séparément (moteur fast, un processus par rapport) et réduit à une ligne :
+en-tête + paramètres en colonnes + mesures principales. On en tire :
+- un classement des passes selon un critère (rendement, facteur de profit...)
+- des tables de sensibilité : mesures moyennes par valeur de chaque paramètre qui varie
+- un classeur Excel de comparaison
+
+Usage:
+    resultat = comparer_rapports(fichiers, critere='rendement_pct', jobs=4)
+    ecrire_classeur(resultat, 'reports/COMPARAISON_20250101_120000.xlsx')
+"""
+
+import codecs
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from ingestion import rediriger_traces
+from mt5_html_reader import (TAILLE_BLOC_LECTURE, TITRES_ORDRES, LecteurRapportHTML, _detecter_encodage,
+                             _normaliser, est_rapport_html)
+
+# Libellés de l'en-tête (rapports localisés, comparés sans accents ni casse)
+LIBELLES_ENTETE = {
+    'expert': 'expert',
+    'symbole': 'symbole', 'symbol': 'symbole',
+    'periode': 'periode', 'period': 'periode',
+    "donnees d'entree": 'parametres', 'inputs': 'parametres',
+}
+# Mesures du classement ; le drawdown est le seul critère à minimiser
+CRITERES = ('rendement_pct', 'profit_compose', 'facteur_profit', 'facteur_recuperation',
+            'esperance', 'taux_reussite', 'drawdown_max')
+CRITERES_CROISSANTS = ('drawdown_max',)
+COLONNES_ENTETE = ('fichier', 'expert', 'symbole', 'periode', 'debut', 'fin')
+COLONNES_MESURES = ('total_trades', 'taux_reussite', 'profit_total', 'profit_compose', 'solde_final',
+                    'rendement_pct', 'drawdown_max', 'facteur_profit', 'esperance', 'facteur_recuperation')
+# Paramètre numérique avec plus de valeurs distinctes : regroupé en quantiles
+VALEURS_MAX_SENSIBILITE = 10
+QUANTILES_SENSIBILITE = 5
+
+_PERIODE = re.compile(r'^\s*(\S+)\s*\((\d{4}\.\d{2}\.\d{2})\s*-\s*(\d{4}\.\d{2}\.\d{2})\)')
+
+# Analyseurs réutilisés dans chaque processus de travail (clé = paramètres)
+_analyseurs_worker = {}
+
+
+def convertir_valeur(texte):
+    """Valeur d'un paramètre d'entrée : booléen, entier, décimal ou texte"""
+    texte = str(texte).strip()
+    if texte.lower() in ('true', 'false'):
+        return texte.lower() == 'true'
+    for conversion in (int, float):
+        try:
+            return conversion(texte)
+        except ValueError:
+            pass
+    return texte
+
+
+def _texte(valeur):
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return None
+    texte = str(valeur).strip()
+    return texte or None
+
+
+def analyser_entete(lignes):
+    """
+    Réglages d'un rapport à partir des lignes précédant la section Ordres.
+
+    Args:
+        lignes: lignes de cellules (libellé en première colonne, valeur dans une colonne suivante)
+
+    Returns:
+        dict {'expert', 'symbole', 'periode', 'debut', 'fin', 'parametres'} ; les paramètres
+        gardent l'ordre du rapport, les séparateurs ("str45=====  Titre ====") sont ignorés
+    """
+    entete = {'expert': None, 'symbole': None, 'periode': None, 'debut': None, 'fin': None, 'parametres': {}}
+    dans_parametres = False
+    for ligne in lignes:
+        cellules = [_texte(c) for c in ligne]
+        libelle = cellules[0] if cellules else None
+        valeurs = [c for c in cellules[1:] if c is not None]
+        if libelle is not None:
+            cle = LIBELLES_ENTETE.get(_normaliser(libelle))
+            dans_parametres = cle == 'parametres'
+            if cle is None or not valeurs:
+                continue
+            if cle != 'parametres':
+                entete[cle] = valeurs[0]
+                continue
+        elif not dans_parametres:
+            continue
+        for valeur in valeurs[:1]:
+            nom, egal, brut = valeur.partition('=')
+            if not egal or brut.startswith('='):
+                continue
+            entete['parametres'][nom.strip()] = convertir_valeur(brut)
+
+    # "M15 (2021.01.01 - 2025.09.17)" -> unité de temps + bornes du test
+    correspondance = _PERIODE.match(entete['periode'] or '')
+    if correspondance:
+        entete['periode'] = correspondance.group(1)
+        entete['debut'] = correspondance.group(2).replace('.', '-')
+        entete['fin'] = correspondance.group(3).replace('.', '-')
+    return entete
+
+
+def _est_titre_ordres(ligne):
+    remplies = [c for c in ligne if _texte(c) is not None]
+    return len(remplies) == 1 and _normaliser(remplies[0]) in TITRES_ORDRES
+
+
+def _lignes_entete_excel(chemin):
+    """Lignes du premier onglet jusqu'à la section Ordres (lecture openpyxl en flux, sans charger les deals)"""
+    from openpyxl import load_workbook
+
+    classeur = load_workbook(chemin, read_only=True, data_only=True)
+    try:
+        lignes = []
+        for ligne in classeur.worksheets[0].iter_rows(values_only=True):
+            if _est_titre_ordres(ligne):
+                break
+            lignes.append(list(ligne))
+        return lignes
+    finally:
+        classeur.close()
+
+
+def _lignes_entete_html(chemin):
+    """Lignes d'un rapport HTML jusqu'à la section Ordres (lecture par blocs arrêtée dès la section)"""
+    lecteur = LecteurRapportHTML()
+    with open(chemin, 'rb') as f:
+        bloc = f.read(TAILLE_BLOC_LECTURE)
+        encodage, decalage = _detecter_encodage(bloc[:4])
+        decodeur = codecs.getincrementaldecoder(encodage)(errors='replace')
+        bloc = bloc[decalage:]
+        while bloc and lecteur.section == 'entete':
+            lecteur.feed(decodeur.decode(bloc))
+            bloc = f.read(TAILLE_BLOC_LECTURE)
+    return lecteur.lignes_entete
+
+
+def lire_entete(chemin):
+    """Réglages (expert, symbole, période, paramètres d'entrée) d'un rapport Excel ou HTML"""
+    if est_rapport_html(chemin):
+        return analyser_entete(_lignes_entete_html(chemin))
+    return analyser_entete(_lignes_entete_excel(chemin))
+
+
+def mesures_rapport(analyzer, df_final, solde_initial):
+    """Mesures principales d'une passe (statistiques de la CLI + facteur de profit, espérance, récupération)"""
+    from analyzer import statistiques_globales
+
+    mesures = statistiques_globales(analyzer, df_final, solde_initial)
+    profits = df_final.groupby("Cle_Match", observed=True)["Profit"].sum()
+    gains = float(profits[profits > 0].sum())
+    pertes = float(-profits[profits < 0].sum())
+    drawdown_euros = float(df_final["Drawdown_euros"].max()) if "Drawdown_euros" in df_final.columns else 0.0
+    mesures['facteur_profit'] = round(gains / pertes, 3) if pertes > 0 else None
+    mesures['esperance'] = round(float(profits.mean()), 2) if len(profits) else 0.0
+    mesures['facteur_recuperation'] = round(mesures['profit_compose'] / drawdown_euros, 3) if drawdown_euros > 0 else None
+    return mesures
+
+
+def evaluer_rapport(file_path, filter_type=None, solde_initial=10000, multiplier=1.0, broker=None, engine='fast'):
+    """
+    Analyse complète d'un rapport isolé (exécuté dans un processus du pool).
+
+    Returns:
+        dict {'fichier', 'entete', 'mesures', 'erreur'} ; 'mesures' est None si le rapport est en échec
+    """
+    from trading_analyzer_unified import TradingAnalyzer
+
+    resultat = {'fichier': os.path.basename(file_path), 'entete': None, 'mesures': None, 'erreur': None}
+    try:
+        resultat['entete'] = lire_entete(file_path)
+    except Exception as e:
+        print(f"[WARNING] En-tête illisible ({file_path}): {str(e)}")
+    try:
+        cle = (solde_initial, multiplier, broker, engine)
+        analyzer = _analyseurs_worker.get(cle)
+        if analyzer is None:
+            analyzer = TradingAnalyzer(solde_initial=solde_initial, multiplier=multiplier, broker=broker, engine=engine)
+            _analyseurs_worker[cle] = analyzer
+        df, message, _, _ = analyzer.process_single_file(file_path, filter_type)
+        if df is None or len(df) == 0:
+            resultat['erreur'] = message or "Aucune donnée trouvée"
+            return resultat
+        df_final = analyzer.fusionner_et_calculer_cumuls([df])
+        resultat['mesures'] = mesures_rapport(analyzer, df_final, solde_initial)
+    except Exception as e:
+        print(f"[ERROR] Comparaison: échec de {file_path}: {str(e)}")
+        import traceback
+        print(f"[ERROR] Traceback: {traceback.format_exc()}")
+        resultat['erreur'] = str(e)
+    return resultat
+
+
+def _evaluer_tous(fichiers, jobs, options, journal=None):
+    """Résultats de evaluer_rapport dans l'ordre des fichiers (pool 'spawn' comme l'ingestion si jobs > 1)"""
+    if jobs <= 1 or len(fichiers) <= 1:
+        return [evaluer_rapport(chemin, **options) for chemin in fichiers]
+    resultats = [None] * len(fichiers)
+    with ProcessPoolExecutor(max_workers=min(jobs, len(fichiers)),
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=rediriger_traces, initargs=(journal,)) as pool:
+        futures = {pool.submit(evaluer_rapport, chemin, **options): i for i, chemin in enumerate(fichiers)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                resultats[i] = future.result()
+            except BrokenProcessPool as e:
+                # Worker tué (OOM...) : le rapport est compté en échec, les autres continuent d'être collectés
+                resultats[i] = {'fichier': os.path.basename(fichiers[i]), 'entete': None, 'mesures': None,
+                                'erreur': f"Processus d'analyse interrompu ({str(e)})"}
+    return resultats
+
+
+def _colonne_parametre(nom, reservees):
+    return f"param_{nom}" if nom in reservees else nom
+
+
+def tableau_classement(resultats, critere='rendement_pct'):
+    """
+    Une ligne par rapport analysé, triée selon le critère (drawdown en départage).
+
+    Returns:
+        (classement, parametres) : DataFrame avec 'rang' en première colonne et liste des
+        colonnes de paramètres (dans l'ordre de première apparition)
+    """
+    if critere not in CRITERES:
+        raise ValueError(f"Critère inconnu: {critere} (attendu: {', '.join(CRITERES)})")
+    reservees = set(COLONNES_ENTETE) | set(COLONNES_MESURES) | {'rang'}
+    lignes, parametres = [], {}
+    for resultat in resultats:
+        if resultat['mesures'] is None:
+            continue
+        entete = resultat['entete'] or {'parametres': {}}
+        ligne = {'fichier': resultat['fichier']}
+        ligne.update({c: entete.get(c) for c in COLONNES_ENTETE[1:]})
+        ligne.update({c: resultat['mesures'].get(c) for c in COLONNES_MESURES})
+        for nom, valeur in entete['parametres'].items():
+            colonne = parametres.setdefault(nom, _colonne_parametre(nom, reservees))
+            ligne[colonne] = valeur
+        lignes.append(ligne)
+    colonnes = ['rang', *COLONNES_ENTETE, *COLONNES_MESURES, *parametres.values()]
+    if not lignes:
+        return pd.DataFrame(columns=colonnes), []
+
+    classement = pd.DataFrame(lignes)
+    croissant = critere in CRITERES_CROISSANTS
+    classement = classement.sort_values([critere, 'drawdown_max'], ascending=[croissant, True],
+                                        na_position='last', kind='stable').reset_index(drop=True)
+    classement['rang'] = np.arange(1, len(classement) + 1)
+    return classement.reindex(columns=colonnes), list(parametres.values())
+
+
+def _groupes_parametre(valeurs):
+    """Clés de regroupement : valeurs telles quelles, ou quantiles pour un paramètre numérique très varié"""
+    numeriques = pd.to_numeric(valeurs, errors='coerce')
+    est_numerique = numeriques.notna().sum() == valeurs.notna().sum() and valeurs.map(type).ne(bool).all()
+    if est_numerique and numeriques.nunique() > VALEURS_MAX_SENSIBILITE:
+        return pd.qcut(numeriques, QUANTILES_SENSIBILITE, duplicates='drop').astype(str)
+    return valeurs.astype(str)
+
+
+def tables_sensibilite(classement, parametres, critere='rendement_pct'):
+    """
+    Mesures par valeur de chaque paramètre (ou réglage d'en-tête) qui varie entre les passes.
+
+    Returns:
+        (impact, tables) : impact trie les paramètres par écart du critère moyen entre leur
+        meilleure et leur pire valeur ; tables[parametre] est le DataFrame de ses valeurs
+    """
+    tables, impacts = {}, []
+    candidats = [c for c in ('expert', 'symbole', 'periode') if c in classement.columns] + list(parametres)
+    for parametre in candidats:
+        valeurs = classement[parametre]
+        if valeurs.nunique(dropna=True) < 2:
+            continue
+        groupes = classement.groupby(_groupes_parametre(valeurs), sort=False, dropna=False)
+        table = groupes.agg(
+            rapports=('fichier', 'size'),
+            critere_moyen=(critere, 'mean'),
+            critere_median=(critere, 'median'),
+            critere_max=(critere, 'max'),
+            rendement_moyen_pct=('rendement_pct', 'mean'),
+            drawdown_moyen=('drawdown_max', 'mean'),
+            trades_moyens=('total_trades', 'mean'),
+        ).round(3)
+        table.index.name = parametre
+        croissant = critere in CRITERES_CROISSANTS
+        table = table.sort_values('critere_moyen', ascending=croissant, na_position='last').reset_index()
+        tables[parametre] = table
+        impacts.append({'parametre': parametre, 'valeurs': len(table),
+                        'ecart_critere': round(float(table['critere_moyen'].max() - table['critere_moyen'].min()), 3),
+                        'meilleure_valeur': table[parametre].iloc[0]})
+    impact = pd.DataFrame(impacts, columns=['parametre', 'valeurs', 'ecart_critere', 'meilleure_valeur'])
+    impact = impact.sort_values('ecart_critere', ascending=False, kind='stable').reset_index(drop=True)
+    return impact, {nom: tables[nom] for nom in impact['parametre']}
+
+
+def comparer_rapports(fichiers, critere='rendement_pct', jobs=1, solde_initial=10000, multiplier=1.0,
+                      broker=None, filter_type=None, engine='fast', journal=None):
+    """
+    Compare des rapports de passes d'optimisation.
+
+    Args:
+        fichiers: chemins des rapports (xlsx / html), un par passe
+        critere: mesure du classement (voir CRITERES)
+        jobs: processus d'analyse en parallèle (1 : dans le processus courant)
+        journal: fichier recevant les traces des processus d'analyse (None : console)
+
+    Returns:
+        dict {'critere', 'classement', 'parametres', 'impact', 'sensibilite', 'echecs'}
+    """
+    if critere not in CRITERES:
+        raise ValueError(f"Critère inconnu: {critere} (attendu: {', '.join(CRITERES)})")
+    options = {'filter_type': filter_type, 'solde_initial': solde_initial, 'multiplier': multiplier,
+               'broker': broker, 'engine': engine}
+    resultats = _evaluer_tous(list(fichiers), jobs, options, journal)
+    classement, parametres = tableau_classement(resultats, critere)
+    impact, sensibilite = tables_sensibilite(classement, parametres, critere)
+    echecs = [{'fichier': r['fichier'], 'erreur': r['erreur']} for r in resultats if r['mesures'] is None]
+    print(f"[DEBUG] Comparaison: {len(classement)} passe(s) classée(s) par {critere}, {len(echecs)} échec(s), "
+          f"{len(sensibilite)} paramètre(s) variable(s)")
+    return {
+        'critere': critere,
+        'classement': classement,
+        'parametres': parametres,
+        'impact': impact,
+        'sensibilite': sensibilite,
+        'echecs': echecs,
+    }
+
+
+def _ecrire_tableau(ws, df, ligne_depart=1):
+    """Écrit un DataFrame avec l'en-tête du rapport principal ; retourne la ligne suivante"""
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
+    for decalage, valeurs in enumerate(dataframe_to_rows(df, index=False, header=True)):
+        for colonne, valeur in enumerate(valeurs, start=1):
+            if isinstance(valeur, float) and np.isnan(valeur):
+                valeur = None
+            cellule = ws.cell(row=ligne_depart + decalage, column=colonne, value=valeur)
+            if decalage == 0:
+                cellule.font = Font(bold=True, color="FFFFFF")
+                cellule.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                cellule.alignment = Alignment(horizontal="center")
+    return ligne_depart + len(df) + 1
+
+
+def ecrire_classeur(resultat, chemin):
+    """Classeur de comparaison : classement, sensibilité des paramètres, rapports en échec"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    wb = Workbook()
+    wb.remove(wb.active)
+
+    # === ONGLET 1: CLASSEMENT ===
+    ws_classement = wb.create_sheet("🏆 Classement")
+    _ecrire_tableau(ws_classement, resultat['classement'])
+    ws_classement.freeze_panes = 'C2'
+
+    # === ONGLET 2: SENSIBILITÉ DES PARAMÈTRES ===
+    ws_sensibilite = wb.create_sheet("📊 Sensibilité")
+    ws_sensibilite['A1'] = f"Impact des paramètres sur {resultat['critere']} (écart du critère moyen entre valeurs)"
+    ws_sensibilite['A1'].font = Font(bold=True, color="366092", size=14)
+    ligne = _ecrire_tableau(ws_sensibilite, resultat['impact'], 3) + 1
+    for parametre, table in resultat['sensibilite'].items():
+        ws_sensibilite.cell(row=ligne, column=1, value=parametre).font = Font(bold=True, color="366092", size=12)
+        ligne = _ecrire_tableau(ws_sensibilite, table, ligne + 1) + 1
+
+    # === ONGLET 3: ÉCHECS ===
+    if resultat['echecs']:
+        ws_echecs = wb.create_sheet("⚠️ Échecs")
+        _ecrire_tableau(ws_echecs, pd.DataFrame(resultat['echecs'], columns=['fichier', 'erreur']))
+
+    wb.save(chemin)
+    return chemin
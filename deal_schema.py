@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Schéma canonique des deals (lignes ordres + transactions fusionnées)
+Toutes les étapes (lecture, matching, cumuls, agrégations, rapport) produisent et
+consomment des DataFrames typés selon ce schéma :
+- colonnes à faible cardinalité en catégories (groupby/filtres sur des codes entiers)
+- Cle_Match codée en entier (catégorie)
+- volume parsé une fois en deux colonnes float (exécuté / total)
+- horodatage en datetime64
+"""
+
+import numpy as np
+import pandas as pd
+
+COLONNE_DATE = "Heure d'ouverture"
+FORMAT_DATE_MT5 = "%Y.%m.%d %H:%M:%S"
+
+COLONNES_CATEGORIELLES = ["Symbole_ordre", "Type_ordre", "Direction", "Fichier_Source", "Volume_ordre", "Type_Instrument"]
+COLONNE_CLE = "Cle_Match"
+
+# float64 conservé pour les prix et montants : cotations à 5 décimales et profits
+# arrondis au centime ne tolèrent pas la précision float32
+COLONNES_FLOAT = [
+    "S / L", "T / P", "Prix_transaction", "Profit", "Profit_pips",
+    "Volume_execute", "Volume_total",
+    "Profit_compose", "Profit_cumule", "Solde_cumule", "Profit_pips_cumule",
+    "Drawdown_pct", "Drawdown_euros", "Drawdown_running_pct",
+]
+
+
+def parser_volumes(serie):
+    """
+    Parse une colonne de volumes MT5 ('0.56 / 0.56' ou '0.56') en deux séries float.
+
+    Returns:
+        (volume_execute, volume_total) ; NaN si illisible
+    """
+    texte = serie.astype(str).str.strip()
+    parties = texte.str.split("/", n=1, expand=True)
+    execute = pd.to_numeric(parties[0].str.strip(), errors='coerce').astype('float64')
+    if parties.shape[1] > 1:
+        total = pd.to_numeric(parties[1].str.strip(), errors='coerce').astype('float64')
+        total = total.where(parties[1].notna(), execute)
+    else:
+        total = execute.copy()
+    return execute, total
+
+
+def parser_dates(serie):
+    """Convertit l'horodatage MT5 en datetime64 (format natif d'abord, puis détection générique)"""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    dates = pd.to_datetime(serie, format=FORMAT_DATE_MT5, errors='coerce')
+    manquantes = dates.isna() & serie.notna()
+    if manquantes.any():
+        dates.loc[manquantes] = pd.to_datetime(serie[manquantes].astype(str), errors='coerce')
+    return dates
+
+
+def _en_categorie(serie):
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    return serie.astype('category')
+
+
+def appliquer_schema_deals(df, coder_cles=True):
+    """
+    Applique le schéma canonique (en place sur les colonnes présentes).
+
+    Args:
+        df: DataFrame de deals
+        coder_cles: coder aussi Cle_Match et Ordre_ordre (faux pendant le matching,
+                    qui écrit encore les clés ligne par ligne)
+
+    Returns:
+        Le DataFrame typé
+    """
+    if df is None or len(df.columns) == 0:
+        return df
+    if "Volume_ordre" in df.columns and "Volume_execute" not in df.columns:
+        df["Volume_execute"], df["Volume_total"] = parser_volumes(df["Volume_ordre"])
+    for col in COLONNES_CATEGORIELLES:
+        if col in df.columns:
+            df[col] = _en_categorie(df[col])
+    for col in COLONNES_FLOAT:
+        if col in df.columns and df[col].dtype != np.float64:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    if COLONNE_DATE in df.columns:
+        df[COLONNE_DATE] = parser_dates(df[COLONNE_DATE])
+    if coder_cles:
+        if COLONNE_CLE in df.columns:
+            df[COLONNE_CLE] = _en_categorie(df[COLONNE_CLE])
+        if "Ordre_ordre" in df.columns and not pd.api.types.is_integer_dtype(df["Ordre_ordre"]):
+            ordres = pd.to_numeric(df["Ordre_ordre"], errors='coerce')
+            if ordres.notna().all() and (ordres % 1 == 0).all():
+                df["Ordre_ordre"] = ordres.astype('int64')
+            else:
+                df["Ordre_ordre"] = ordres.astype('float64')
+    return df
+
+
+def concatener_deals(dfs):
+    """
+    Concatène des DataFrames de deals en conservant les catégories
+    (pd.concat retombe sur des objets si les catégories diffèrent).
+    """
+    dfs = [df for df in dfs if df is not None]
+    if not dfs:
+        return pd.DataFrame()
+    colonnes = [c for c in COLONNES_CATEGORIELLES + [COLONNE_CLE] if any(c in df.columns for df in dfs)]
+    unions = {}
+    for col in colonnes:
+        valeurs = set()
+        for df in dfs:
+            if col in df.columns:
+                serie = df[col]
+                if isinstance(serie.dtype, pd.CategoricalDtype):
+                    valeurs.update(serie.cat.categories)
+                else:
+                    valeurs.update(serie.dropna().unique())
+        unions[col] = sorted(valeurs, key=str)
+    alignes = []
+    for df in dfs:
+        remplacements = {col: pd.Categorical(df[col], categories=unions[col]) for col in colonnes if col in df.columns}
+        alignes.append(df.assign(**remplacements) if remplacements else df)
+    return appliquer_schema_deals(pd.concat(alignes, ignore_index=True))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test différentiel des moteurs d'analyse (legacy vs fast)
+Analyse les mêmes rapports avec TradingAnalyzer(engine='legacy') et
+TradingAnalyzer(engine='fast') puis compare colonne par colonne le résultat final
+(Cle_Match, Profit, Profit_pips, cumuls, drawdowns...).
+
+Rapports analysés : fichiers / dossiers passés en argument, sinon les rapports de
+PAIRES/ et des rapports synthétiques (generateur_rapports_mt5).
+
+Usage:
+    python differentiel_moteurs.py [rapports...] [--tailles 2000] [--broker avatrade]
+        [--multiplicateurs 1,2.5] [--soldes 10000,2500] [--tolerance 1e-9]
+
+Code de sortie : 0 si les deux moteurs concordent, 1 sinon.
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from generateur_rapports_mt5 import generer_rapports
+from trading_analyzer_unified import TradingAnalyzer
+
+DOSSIER_PAIRES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PAIRES')
+EXTENSIONS = ('.xlsx', '.xls', '.html', '.htm')
+EXEMPLES_MAX = 5
+
+
+def lister_rapports(chemins):
+    rapports = []
+    for chemin in chemins:
+        if os.path.isdir(chemin):
+            rapports.extend(sorted(f for f in glob.glob(os.path.join(chemin, '*')) if f.lower().endswith(EXTENSIONS)))
+        else:
+            rapports.append(chemin)
+    return rapports
+
+
+def analyser(fichiers, engine, solde_initial, multiplier, broker, filter_type, verbeux=False):
+    """DataFrame final de process_files avec le moteur demandé, durée et replis sur le moteur legacy"""
+    analyzer = TradingAnalyzer(solde_initial=solde_initial, multiplier=multiplier, broker=broker, engine=engine)
+    sortie = contextlib.nullcontext() if verbeux else contextlib.redirect_stdout(io.StringIO())
+    debut = time.perf_counter()
+    with sortie:
+        df = analyzer.process_files(fichiers, engine, {engine: {}}, filter_type)
+    return df, time.perf_counter() - debut, analyzer.replis_legacy
+
+
+def comparer_resultats(df_legacy, df_fast, tolerance):
+    """
+    Compare deux DataFrames finaux colonne par colonne.
+
+    Returns:
+        liste d'écarts {'colonne', 'lignes', 'exemples': [(ligne, legacy, fast), ...]}
+    """
+    if df_legacy is None or df_fast is None:
+        if df_legacy is None and df_fast is None:
+            return []
+        return [{'colonne': '<résultat>', 'lignes': 1,
+                 'exemples': [(None, df_legacy is None and 'aucun' or len(df_legacy), df_fast is None and 'aucun' or len(df_fast))]}]
+    ecarts = []
+    colonnes = sorted(set(df_legacy.columns) ^ set(df_fast.columns))
+    for colonne in colonnes:
+        ecarts.append({'colonne': colonne, 'lignes': 0,
+                       'exemples': [(None, colonne in df_legacy.columns, colonne in df_fast.columns)]})
+    if len(df_legacy) != len(df_fast):
+        ecarts.append({'colonne': '<lignes>', 'lignes': abs(len(df_legacy) - len(df_fast)),
+                       'exemples': [(None, len(df_legacy), len(df_fast))]})
+        return ecarts
+
+    for colonne in [c for c in df_legacy.columns if c in df_fast.columns]:
+        a, b = df_legacy[colonne], df_fast[colonne]
+        if pd.api.types.is_float_dtype(a) and pd.api.types.is_float_dtype(b):
+            va, vb = a.to_numpy(dtype='float64'), b.to_numpy(dtype='float64')
+            with np.errstate(invalid='ignore'):
+                identiques = (np.isnan(va) & np.isnan(vb)) | (np.abs(va - vb) <= tolerance) | (va == vb)
+        else:
+            va, vb = a.astype(object).to_numpy(), b.astype(object).to_numpy()
+            manquants = pd.isna(va) & pd.isna(vb)
+            identiques = manquants | (pd.Series(va).astype(str).to_numpy() == pd.Series(vb).astype(str).to_numpy())
+        differentes = np.flatnonzero(~identiques)
+        if len(differentes):
+            ecarts.append({'colonne': colonne, 'lignes': len(differentes),
+                           'exemples': [(int(i), va[i], vb[i]) for i in differentes[:EXEMPLES_MAX]]})
+    return ecarts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparaison des moteurs legacy et fast")
+    parser.add_argument('rapports', nargs='*', help="fichiers ou dossiers de rapports (défaut: PAIRES/)")
+    parser.add_argument('--tailles', default='2000',
+                        help="rapports synthétiques à générer, en nombre de deals (vide pour aucun)")
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--broker', default=None)
+    parser.add_argument('--filtre', choices=['forex', 'autres'], default=None)
+    parser.add_argument('--multiplicateurs', default='1')
+    parser.add_argument('--soldes', default='10000')
+    parser.add_argument('--tolerance', type=float, default=1e-9, help="écart absolu toléré sur les colonnes numériques")
+    parser.add_argument('--verbeux', action='store_true')
+    args = parser.parse_args()
+
+    # Le cache des fichiers analysés renverrait le résultat du premier moteur (lu à la création du cache)
+    os.environ['ANALYZER_CACHE_FICHIERS_MO'] = '0'
+    rapports = lister_rapports(args.rapports or [DOSSIER_PAIRES])
+    dossier_synthetique = tempfile.TemporaryDirectory(prefix='differentiel_')
+    for taille in [int(t) for t in args.tailles.split(',') if t.strip()]:
+        for format_fichier in ('xlsx', 'html'):
+            fichiers, _ = generer_rapports(taille, dossier_synthetique.name, format_fichier, args.graine,
+                                           prefixe=f"synthetique_{format_fichier}")
+            rapports.extend(fichiers)
+    if not rapports:
+        print("[ERROR] Aucun rapport à comparer")
+        return 1
+
+    # Chaque rapport seul (matching + recalcul), puis tous ensemble (cumuls multi-fichiers)
+    scenarios = [[r] for r in rapports] + ([rapports] if len(rapports) > 1 else [])
+    multiplicateurs = [float(m) for m in args.multiplicateurs.split(',')]
+    soldes = [float(s) for s in args.soldes.split(',')]
+
+    nb_ecarts = 0
+    for fichiers in scenarios:
+        nom = os.path.basename(fichiers[0]) if len(fichiers) == 1 else f"{len(fichiers)} rapports"
+        for multiplier in multiplicateurs:
+            for solde in soldes:
+                df_legacy, duree_legacy, _ = analyser(fichiers, 'legacy', solde, multiplier, args.broker, args.filtre, args.verbeux)
+                df_fast, duree_fast, replis = analyser(fichiers, 'fast', solde, multiplier, args.broker, args.filtre, args.verbeux)
+                ecarts = comparer_resultats(df_legacy, df_fast, args.tolerance)
+                lignes = 0 if df_legacy is None else len(df_legacy)
+                acceleration = duree_legacy / duree_fast if duree_fast > 0 else float('inf')
+                statut = "✅" if not ecarts and not replis else "❌"
+                print(f"{statut} {nom} (x{multiplier:g}, solde {solde:g}) : {lignes} lignes, "
+                      f"legacy {duree_legacy:.2f} s, fast {duree_fast:.2f} s (x{acceleration:.1f})")
+                # Un repli sur le moteur legacy comparerait legacy à legacy : c'est un échec du moteur fast
+                for repli in replis:
+                    nb_ecarts += 1
+                    print(f"    [ERROR] Moteur fast en échec, repli sur le moteur legacy ({repli})")
+                for ecart in ecarts:
+                    nb_ecarts += 1
+                    print(f"    [ERROR] {ecart['colonne']}: {ecart['lignes']} ligne(s) différente(s)")
+                    for ligne, valeur_legacy, valeur_fast in ecart['exemples']:
+                        print(f"        ligne {ligne}: legacy={valeur_legacy!r} fast={valeur_fast!r}")
+
+    dossier_synthetique.cleanup()
+    if nb_ecarts:
+        print(f"❌ {nb_ecarts} écart(s) entre les moteurs")
+        return 1
+    print("✅ Moteurs legacy et fast identiques")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+MAE / MFE par trade et rejeu de TP / SL sur l'historique OHLC local (magasin_prix)
+Le rapport ne connaît que les prix d'entrée et de sortie. Pour chaque trade complet, les
+barres entre l'entrée et la sortie sont repérées par searchsorted dans les colonnes du
+symbole (barre contenant l'entrée à barre contenant la sortie), puis réduites :
+- MAE (excursion défavorable max) et MFE (excursion favorable max), en prix, en % du prix
+  d'entrée et en devise du compte (valeur d'un point déduite du trade : profit / écart réalisé)
+- part de la MFE capturée à la sortie
+- rejeu « et si le TP / SL était à X » : première barre qui touche chaque niveau ; si TP et SL
+  sont touchés dans la même barre, le SL est retenu (hypothèse prudente)
+
+Sans boucle par trade : les barres de tous les trades d'un symbole sont mises bout à bout
+(indices répétés) par blocs de taille bornée, et réduites par ufunc.reduceat. Le coût est
+proportionnel au nombre de barres couvertes, la mémoire bornée par ELEMENTS_MAX_BLOC.
+Approximation à la résolution de la barre : la barre d'entrée et celle de sortie comptent
+entières (M1 de préférence à M15, période plus large pour les trades hors de l'historique M1).
+
+Usage:
+    magasin = MagasinPrix('prix')
+    trades = calculer_excursions(df_final, magasin)
+    scenarios = rejouer_tp_sl(trades, magasin, tps=[0.5, 1.0], sls=[0.25, 0.5], unite='pct')
+"""
+
+import numpy as np
+import pandas as pd
+
+from broker_manager import normaliser_symbole
+from deal_schema import COLONNE_DATE
+from magasin_prix import DUREES_PERIODES
+
+# Nombre maximal de barres (toutes fenêtres confondues) rassemblées en une fois
+ELEMENTS_MAX_BLOC = 2_000_000
+UNITES = ('pct', 'prix')
+SCENARIOS_MAX = 400
+# Écart maximal entre deux barres consécutives d'une fenêtre (fermeture de week-end / jour férié) ;
+# au-delà, l'historique a un trou et le trade n'est pas couvert
+ECART_FERMETURE_MAX = '3D'
+COLONNES_EXCURSIONS = ['cle', 'symbole', 'sens', 'entree', 'sortie', 'prix_entree', 'prix_sortie', 'profit',
+                       'periode', 'barres', 'couvert', 'mae_prix', 'mfe_prix', 'mae_pct', 'mfe_pct',
+                       'valeur_point', 'mae_euros', 'mfe_euros', 'capture_pct']
+
+
+def positions(df):
+    """
+    Un trade par Cle_Match ayant un IN et un OUT datés : sens (1 achat, -1 vente, type du
+    premier IN), premier IN, dernier OUT, prix moyens pondérés par le volume, profit total.
+
+    Returns:
+        DataFrame (cle, symbole, sens, entree, sortie, prix_entree, prix_sortie, profit)
+    """
+    colonnes = ['cle', 'symbole', 'sens', 'entree', 'sortie', 'prix_entree', 'prix_sortie', 'profit']
+    requises = ("Cle_Match", "Direction", "Prix_transaction", "Type_ordre")
+    if len(df) == 0 or any(c not in df.columns for c in requises):
+        return pd.DataFrame(columns=colonnes)
+    codes, cles = pd.factorize(df["Cle_Match"].astype(object).to_numpy(), use_na_sentinel=True)
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    direction = df["Direction"].astype(object).to_numpy()
+    entrees, sorties = direction == "in", direction == "out"
+    prix = df["Prix_transaction"].to_numpy(dtype='float64')
+    volumes = df["Volume_execute"].to_numpy(dtype='float64') if "Volume_execute" in df.columns else np.ones(len(df))
+    volumes = np.where(np.isfinite(volumes) & (volumes > 0), volumes, 1.0)
+    types = df["Type_ordre"].astype(str).str.strip().str.lower()
+    sens = np.where(types.str.startswith('buy'), 1.0, np.where(types.str.startswith('sell'), -1.0, np.nan))
+    symboles = df["Symbole_ordre"].astype(object).to_numpy() if "Symbole_ordre" in df.columns else np.full(len(df), '', dtype=object)
+
+    lignes = pd.DataFrame({
+        'trade': codes,
+        'profit': np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0),
+        'symbole': symboles,
+        'entree': np.where(entrees, dates, np.datetime64('NaT')),
+        'sortie': np.where(sorties, dates, np.datetime64('NaT')),
+        'montant_in': np.where(entrees, prix * volumes, np.nan),
+        'volume_in': np.where(entrees & np.isfinite(prix), volumes, np.nan),
+        'montant_out': np.where(sorties, prix * volumes, np.nan),
+        'volume_out': np.where(sorties & np.isfinite(prix), volumes, np.nan),
+        'sens': np.where(entrees, sens, np.nan),
+    })
+    lignes = lignes[(codes >= 0) & ~np.isnat(dates)]
+    trades = lignes.groupby('trade').agg(
+        profit=('profit', 'sum'), symbole=('symbole', 'first'), sens=('sens', 'first'),
+        entree=('entree', 'min'), sortie=('sortie', 'max'),
+        montant_in=('montant_in', 'sum'), volume_in=('volume_in', 'sum'),
+        montant_out=('montant_out', 'sum'), volume_out=('volume_out', 'sum'))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trades['prix_entree'] = trades['montant_in'] / trades['volume_in']
+        trades['prix_sortie'] = trades['montant_out'] / trades['volume_out']
+    trades['cle'] = cles[trades.index.to_numpy()]
+    complets = (trades['entree'].notna() & trades['sortie'].notna() & (trades['sortie'] >= trades['entree'])
+                & trades['sens'].notna() & np.isfinite(trades['prix_entree']) & np.isfinite(trades['prix_sortie']))
+    return trades.loc[complets, colonnes].reset_index(drop=True)
+
+
+def _blocs(longueurs, budget=ELEMENTS_MAX_BLOC):
+    """Tranches [debut, fin) de trades dont le total de barres reste sous le budget (au moins un trade)"""
+    cumul = np.concatenate([[0], np.cumsum(longueurs)])
+    debut = 0
+    while debut < len(longueurs):
+        fin = max(debut + 1, int(np.searchsorted(cumul, cumul[debut] + budget, side='right')) - 1)
+        yield debut, fin
+        debut = fin
+
+
+def _fenetres(debuts, longueurs):
+    """Indices des barres de fenêtres mises bout à bout, et position du début de chaque fenêtre"""
+    decalages = np.concatenate([[0], np.cumsum(longueurs)[:-1]])
+    indices = np.arange(int(longueurs.sum())) - np.repeat(decalages - debuts, longueurs)
+    return indices, decalages
+
+
+def extremes_fenetres(haut, bas, debuts, fins):
+    """Plus haut et plus bas de chaque fenêtre de barres [debut, fin] (fenêtres non vides)"""
+    longueurs = fins - debuts + 1
+    plus_haut = np.empty(len(debuts))
+    plus_bas = np.empty(len(debuts))
+    for a, b in _blocs(longueurs):
+        indices, decalages = _fenetres(debuts[a:b], longueurs[a:b])
+        plus_haut[a:b] = np.maximum.reduceat(haut[indices], decalages)
+        plus_bas[a:b] = np.minimum.reduceat(bas[indices], decalages)
+    return plus_haut, plus_bas
+
+
+def premier_franchissement(haut, bas, debuts, fins, sens, niveaux, favorable):
+    """
+    Rang (depuis la barre d'entrée) de la première barre qui touche le niveau de chaque trade,
+    -1 si aucune (ou niveau NaN).
+    favorable (TP) : plus haut >= niveau à l'achat, plus bas <= niveau à la vente ;
+    défavorable (SL) : plus bas <= niveau à l'achat, plus haut >= niveau à la vente.
+    """
+    longueurs = fins - debuts + 1
+    resultat = np.full(len(debuts), -1, dtype='int64')
+    jamais = np.iinfo('int64').max
+    for a, b in _blocs(longueurs):
+        indices, decalages = _fenetres(debuts[a:b], longueurs[a:b])
+        sens_barres = np.repeat(sens[a:b], longueurs[a:b])
+        niveaux_barres = np.repeat(niveaux[a:b], longueurs[a:b])
+        achat = sens_barres > 0
+        if favorable:
+            extreme = np.where(achat, haut[indices], bas[indices])
+            touche = sens_barres * (extreme - niveaux_barres) >= 0
+        else:
+            extreme = np.where(achat, bas[indices], haut[indices])
+            touche = sens_barres * (extreme - niveaux_barres) <= 0
+        rangs = np.arange(len(indices)) - np.repeat(decalages, longueurs[a:b])
+        premier = np.minimum.reduceat(np.where(touche, rangs, jamais), decalages)
+        resultat[a:b] = np.where(premier < jamais, premier, -1)
+    return resultat
+
+
+def _fenetres_couvertes(temps, periode, entrees, sorties):
+    """
+    Fenêtres [debut, fin] des trades dans les barres d'une période, et masque des trades couverts :
+    entrée et sortie dans une barre existante, sans trou de plus de ECART_FERMETURE_MAX entre les deux.
+    """
+    duree = np.timedelta64(pd.Timedelta(DUREES_PERIODES[periode]))
+    debuts = np.searchsorted(temps, entrees, side='right') - 1
+    fins = np.searchsorted(temps, sorties, side='right') - 1
+    couverts = debuts >= 0
+    indices_debuts, indices_fins = np.maximum(debuts, 0), np.maximum(fins, 0)
+    couverts &= (temps[indices_debuts] + duree > entrees) & (temps[indices_fins] + duree > sorties)
+    # Trous de l'historique (au-delà d'une fermeture de marché) : barre k suivie d'un écart trop long
+    trous = np.flatnonzero(np.diff(temps) > np.timedelta64(pd.Timedelta(ECART_FERMETURE_MAX)))
+    couverts &= np.searchsorted(trous, indices_fins) == np.searchsorted(trous, indices_debuts)
+    return debuts, fins, couverts
+
+
+def _par_symbole(trades, magasin):
+    """
+    Fenêtres de barres des trades couverts, symbole par symbole : chaque trade prend la période
+    la plus fine qui le couvre (ex. M1 récent, M15 pour les années sans M1).
+
+    Yields:
+        (positions des trades, période, colonnes du magasin, débuts, fins)
+    """
+    noms = trades['symbole'].astype(str).map(normaliser_symbole)
+    toutes_entrees = trades['entree'].to_numpy(dtype='datetime64[ns]')
+    toutes_sorties = trades['sortie'].to_numpy(dtype='datetime64[ns]')
+    for symbole, selection in noms.groupby(noms, sort=True).groups.items():
+        restants = trades.index.get_indexer(selection)
+        for periode in magasin.periodes(symbole):
+            if len(restants) == 0:
+                break
+            _, barres = magasin.barres(symbole, periode)
+            debuts, fins, couverts = _fenetres_couvertes(barres['temps'], periode, toutes_entrees[restants],
+                                                         toutes_sorties[restants])
+            if couverts.any():
+                yield restants[couverts], periode, barres, debuts[couverts], fins[couverts]
+            restants = restants[~couverts]
+
+
+def calculer_excursions(df, magasin):
+    """
+    MAE / MFE de chaque trade complet d'un DataFrame final.
+
+    Returns:
+        DataFrame (COLONNES_EXCURSIONS) : un trade par ligne ; couvert=False (mesures NaN) si
+        le magasin n'a pas les barres du trade
+    """
+    trades = positions(df)
+    n = len(trades)
+    for colonne in ('barres', 'mae_prix', 'mfe_prix'):
+        trades[colonne] = np.nan
+    trades['periode'] = None
+    trades['couvert'] = False
+    barres_total = 0
+    for positions_trades, periode, barres, debuts, fins in _par_symbole(trades, magasin):
+        if len(positions_trades) == 0:
+            continue
+        plus_haut, plus_bas = extremes_fenetres(barres['haut'], barres['bas'], debuts, fins)
+        prix_entree = trades['prix_entree'].to_numpy()[positions_trades]
+        achat = trades['sens'].to_numpy()[positions_trades] > 0
+        trades.loc[positions_trades, 'mfe_prix'] = np.maximum(np.where(achat, plus_haut - prix_entree, prix_entree - plus_bas), 0.0)
+        trades.loc[positions_trades, 'mae_prix'] = np.maximum(np.where(achat, prix_entree - plus_bas, plus_haut - prix_entree), 0.0)
+        trades.loc[positions_trades, 'barres'] = fins - debuts + 1
+        trades.loc[positions_trades, 'periode'] = periode
+        trades.loc[positions_trades, 'couvert'] = True
+        barres_total += int((fins - debuts + 1).sum())
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ecart = trades['sens'] * (trades['prix_sortie'] - trades['prix_entree'])
+        # Valeur d'un point de prix pour le trade (volume et contrat compris), si profit et écart concordent
+        trades['valeur_point'] = (trades['profit'] / ecart).where((ecart != 0) & (np.sign(trades['profit']) == np.sign(ecart)))
+        trades['mae_pct'] = trades['mae_prix'] / trades['prix_entree'] * 100
+        trades['mfe_pct'] = trades['mfe_prix'] / trades['prix_entree'] * 100
+        trades['capture_pct'] = (ecart / trades['mfe_prix'] * 100).where(trades['mfe_prix'] > 0)
+    trades['mae_euros'] = trades['mae_prix'] * trades['valeur_point']
+    trades['mfe_euros'] = trades['mfe_prix'] * trades['valeur_point']
+    print(f"[DEBUG] Excursions: {int(trades['couvert'].sum())}/{n} trade(s) couvert(s) par le magasin de prix, "
+          f"{barres_total} barre(s) parcourue(s)")
+    return trades[COLONNES_EXCURSIONS]
+
+
+def _quantiles(serie):
+    serie = serie.dropna()
+    if len(serie) == 0:
+        return {'p50': None, 'p90': None}
+    return {'p50': round(float(serie.quantile(0.5)), 4), 'p90': round(float(serie.quantile(0.9)), 4)}
+
+
+def resume_excursions(trades):
+    """Médiane / P90 des MAE, MFE (% du prix d'entrée) et de la part capturée, globaux et par symbole"""
+    couverts = trades[trades['couvert']]
+
+    def bloc(groupe):
+        return {
+            'trades': int(len(groupe)),
+            'mae_pct': _quantiles(groupe['mae_pct']),
+            'mfe_pct': _quantiles(groupe['mfe_pct']),
+            'capture_pct': _quantiles(groupe['capture_pct']),
+            'mae_euros_moyenne': round(float(groupe['mae_euros'].mean()), 2) if groupe['mae_euros'].notna().any() else None,
+            'mfe_euros_moyenne': round(float(groupe['mfe_euros'].mean()), 2) if groupe['mfe_euros'].notna().any() else None,
+        }
+
+    return {
+        'trades': int(len(trades)),
+        'trades_couverts': int(len(couverts)),
+        'periodes': {str(p): int(n) for p, n in couverts['periode'].value_counts().items()},
+        'global': bloc(couverts),
+        'par_symbole': {str(s): bloc(g) for s, g in couverts.groupby('symbole', sort=True)},
+    }
+
+
+def _distances(valeurs, nom):
+    """Liste de distances positives (None : pas de niveau)"""
+    if valeurs is None or len(valeurs) == 0:
+        return [None]
+    distances = []
+    for valeur in valeurs:
+        if valeur is None or (isinstance(valeur, str) and valeur.strip().lower() in ('', 'none', 'aucun')):
+            distances.append(None)
+            continue
+        try:
+            distance = float(valeur)
+        except (TypeError, ValueError):
+            raise ValueError(f"{nom} invalide: {valeur!r}")
+        if not distance > 0:
+            raise ValueError(f"{nom} doit être strictement positif: {valeur!r}")
+        distances.append(distance)
+    return list(dict.fromkeys(distances))
+
+
+def rejouer_tp_sl(trades, magasin, tps=None, sls=None, unite='pct'):
+    """
+    Rejoue les trades couverts avec d'autres TP / SL (la sortie historique reste la sortie
+    si aucun niveau n'est touché avant elle).
+
+    Args:
+        trades: résultat de calculer_excursions
+        tps, sls: distances du TP / SL au prix d'entrée (None dans la liste : pas de niveau)
+        unite: 'pct' (% du prix d'entrée) ou 'prix' (écart de prix, pour un seul symbole)
+
+    Returns:
+        dict : une entrée par combinaison TP × SL (trades sortis au TP / SL, profit total et
+        écart à l'historique, taux de réussite, espérance)
+    """
+    if unite not in UNITES:
+        raise ValueError(f"Unité inconnue: {unite} (attendu: {', '.join(UNITES)})")
+    tps, sls = _distances(tps, "TP"), _distances(sls, "SL")
+    if len(tps) * len(sls) > SCENARIOS_MAX:
+        raise ValueError(f"Trop de combinaisons ({len(tps) * len(sls)}, max {SCENARIOS_MAX})")
+
+    trades = trades.reset_index(drop=True)
+    rejoues = trades['couvert'].to_numpy(dtype=bool) & trades['valeur_point'].notna().to_numpy()
+    sens = trades['sens'].to_numpy(dtype='float64')
+    prix_entree = trades['prix_entree'].to_numpy(dtype='float64')
+    echelle = prix_entree / 100 if unite == 'pct' else np.ones(len(trades))
+
+    # Premier franchissement de chaque niveau (une passe par distance de TP et par distance de SL)
+    premiers = {('tp', d): np.full(len(trades), -1, dtype='int64') for d in tps if d is not None}
+    premiers.update({('sl', d): np.full(len(trades), -1, dtype='int64') for d in sls if d is not None})
+    for positions_trades, _, barres, debuts, fins in _par_symbole(trades, magasin):
+        garder = rejoues[positions_trades]
+        positions_trades, debuts, fins = positions_trades[garder], debuts[garder], fins[garder]
+        if len(positions_trades) == 0:
+            continue
+        for (cote, distance), premier in premiers.items():
+            signe = 1 if cote == 'tp' else -1
+            niveaux = prix_entree[positions_trades] + signe * sens[positions_trades] * distance * echelle[positions_trades]
+            premier[positions_trades] = premier_franchissement(barres['haut'], barres['bas'], debuts, fins,
+                                                               sens[positions_trades], niveaux, favorable=cote == 'tp')
+
+    profits_historiques = trades['profit'].to_numpy(dtype='float64')
+    valeur_point = trades['valeur_point'].to_numpy(dtype='float64')
+    scenarios = []
+    for tp in tps:
+        rang_tp = premiers[('tp', tp)] if tp is not None else np.full(len(trades), -1)
+        for sl in sls:
+            rang_sl = premiers[('sl', sl)] if sl is not None else np.full(len(trades), -1)
+            sortie_sl = (rang_sl >= 0) & ((rang_tp < 0) | (rang_sl <= rang_tp))
+            sortie_tp = (rang_tp >= 0) & ~sortie_sl
+            ecart = np.where(sortie_tp, (tp or 0) * echelle, np.where(sortie_sl, -(sl or 0) * echelle, np.nan))
+            profits = np.where(sortie_tp | sortie_sl, ecart * valeur_point, profits_historiques)
+            decides = int(((profits > 0) | (profits < 0)).sum())
+            scenarios.append({
+                'tp': tp, 'sl': sl,
+                'trades_tp': int(sortie_tp.sum()),
+                'trades_sl': int(sortie_sl.sum()),
+                'profit_total': round(float(profits.sum()), 2),
+                'ecart_historique': round(float(profits.sum() - profits_historiques.sum()), 2),
+                'taux_reussite': round(float((profits > 0).sum() / decides * 100), 2) if decides else None,
+                'esperance': round(float(profits.mean()), 2) if len(profits) else None,
+            })
+    print(f"[DEBUG] Rejeu TP/SL: {len(scenarios)} combinaison(s), {int(rejoues.sum())}/{len(trades)} trade(s) rejoué(s)")
+    return {
+        'unite': unite,
+        'trades': int(len(trades)),
+        'trades_rejoues': int(rejoues.sum()),
+        'profit_historique': round(float(profits_historiques.sum()), 2),
+        'scenarios': scenarios,
+    }
+
+
+def _ecrire_tableau(ws, df, ligne_depart=1):
+    """Écrit un DataFrame avec l'en-tête du rapport principal ; retourne la ligne suivante"""
+    from openpyxl.styles import Alignment, Font, PatternFill
+    from openpyxl.utils.dataframe import dataframe_to_rows
+
+    for decalage, valeurs in enumerate(dataframe_to_rows(df, index=False, header=True)):
+        for colonne, valeur in enumerate(valeurs, start=1):
+            if isinstance(valeur, float) and np.isnan(valeur):
+                valeur = None
+            cellule = ws.cell(row=ligne_depart + decalage, column=colonne, value=valeur)
+            if decalage == 0:
+                cellule.font = Font(bold=True, color="FFFFFF")
+                cellule.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                cellule.alignment = Alignment(horizontal="center")
+    return ligne_depart + len(df) + 1
+
+
+def ecrire_classeur(trades, rejeu, chemin):
+    """Classeur des excursions : résumé par symbole, trades, rejeu TP / SL"""
+    from openpyxl import Workbook
+    from openpyxl.styles import Font
+
+    resume = resume_excursions(trades)
+    wb = Workbook()
+    wb.remove(wb.active)
+
+    # === ONGLET 1: RÉSUMÉ ===
+    ws_resume = wb.create_sheet("📐 MAE MFE")
+    ws_resume['A1'] = (f"MAE / MFE : {resume['trades_couverts']}/{resume['trades']} trade(s) couvert(s) par le magasin de prix "
+                       f"({', '.join(f'{p}: {n}' for p, n in resume['periodes'].items()) or 'aucune barre'})")
+    ws_resume['A1'].font = Font(bold=True, color="366092", size=14)
+    blocs = dict(resume['par_symbole'], **{'TOTAL': resume['global']})
+    _ecrire_tableau(ws_resume, pd.DataFrame([{
+        'symbole': symbole, 'trades': bloc['trades'],
+        'mae_pct_mediane': bloc['mae_pct']['p50'], 'mae_pct_p90': bloc['mae_pct']['p90'],
+        'mfe_pct_mediane': bloc['mfe_pct']['p50'], 'mfe_pct_p90': bloc['mfe_pct']['p90'],
+        'capture_pct_mediane': bloc['capture_pct']['p50'],
+        'mae_euros_moyenne': bloc['mae_euros_moyenne'], 'mfe_euros_moyenne': bloc['mfe_euros_moyenne'],
+    } for symbole, bloc in blocs.items()]), 3)
+
+    # === ONGLET 2: TRADES ===
+    ws_trades = wb.create_sheet("📋 Trades")
+    _ecrire_tableau(ws_trades, trades)
+    ws_trades.freeze_panes = 'C2'
+
+    # === ONGLET 3: REJEU TP / SL ===
+    if rejeu is not None:
+        ws_rejeu = wb.create_sheet("🔁 Rejeu TP SL")
+        unite = "% du prix d'entrée" if rejeu['unite'] == 'pct' else "prix"
+        ws_rejeu['A1'] = (f"Rejeu TP / SL (distances en {unite}) : {rejeu['trades_rejoues']}/{rejeu['trades']} trade(s) "
+                          f"rejoué(s), profit historique {rejeu['profit_historique']}")
+        ws_rejeu['A1'].font = Font(bold=True, color="366092", size=14)
+        _ecrire_tableau(ws_rejeu, pd.DataFrame(rejeu['scenarios']).sort_values('profit_total', ascending=False), 3)
+
+    wb.save(chemin)
+    return chemin
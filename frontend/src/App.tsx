@@ -245,7 +245,7 @@ export const App: React.FC = () => {
     e.stopPropagation()
     setIsDragOver(false)
     if (e.dataTransfer?.files?.length) {
-      const dropped = Array.from(e.dataTransfer.files).filter(f => /\.xlsx$|\.xls$/i.test(f.name))
+      const dropped = Array.from(e.dataTransfer.files).filter(f => /\.xlsx$|\.xls$|\.html?$|\.zip$|\.tar$|\.tar\.gz$|\.tgz$/i.test(f.name))
       setFiles(prev => {
         const names = new Set(prev.map(f => f.name))
         return [...prev, ...dropped.filter(f => !names.has(f.name))]
@@ -359,11 +359,11 @@ export const App: React.FC = () => {
               <i className="fas fa-cloud-upload-alt" />
             </div>
             <h3 style={{ fontSize: '1.5rem', color: '#333', fontWeight: 600, marginBottom: 10 }}>Glissez vos fichiers ici</h3>
-            <p style={{ color: '#666', marginBottom: 20 }}>ou cliquez pour sélectionner vos fichiers Excel (.xlsx, .xls)</p>
+            <p style={{ color: '#666', marginBottom: 20 }}>ou cliquez pour sélectionner vos rapports MT5 (.xlsx, .xls, .html) ou une archive (.zip, .tar.gz)</p>
             <button type="button" className="btn" style={{ background: 'linear-gradient(135deg, #667eea 0%, #764ba2 100%)', color: '#fff', padding: '15px 30px', borderRadius: 10, border: 0 }}>
               <i className="fas fa-folder-open" /> Sélectionner les fichiers
             </button>
-            <input id="fileInput" type="file" multiple accept=".xlsx,.xls" style={{ display: 'none' }} onChange={onFileChange} />
+            <input id="fileInput" type="file" multiple accept=".xlsx,.xls,.html,.htm,.zip,.tar,.gz,.tgz" style={{ display: 'none' }} onChange={onFileChange} />
           </div>
 
           {files.length > 0 && (
@@ -584,9 +584,9 @@ export const App: React.FC = () => {
                 <div style={{ height: 280 }}>
                   <SafeBar
                     data={() => ((() => {
-                      const labels = ['Asie','Europe','Amérique']
+                      const labels: string[] = status.statistics.sessions || ['Asie','Europe','Amérique']
                       const src = status.statistics.sessions_total?.taux_reussite_in_pct || {}
-                      return { labels, datasets: [{ label: 'Taux de réussite IN (%)', data: labels.map(l => src[l] || 0), backgroundColor: ['#6687ea','#56ab2f','#e53e3e'].map(c=>c+'AA') }] }
+                      return { labels, datasets: [{ label: 'Taux de réussite IN (%)', data: labels.map(l => src[l] || 0), backgroundColor: labels.map((_, i) => ['#6687ea','#56ab2f','#e53e3e','#dd6b20','#805ad5'][i % 5] + 'AA') }] }
                     })())}
                     options={{ responsive: true, maintainAspectRatio: false, scales: { y: { beginAtZero: true, max: 100 } } }}
                   />
@@ -594,7 +594,7 @@ export const App: React.FC = () => {
                 <div style={{ height: 280 }}>
                   <SafeBar
                     data={() => ((() => {
-                      const labels = ['Asie','Europe','Amérique']
+                      const labels: string[] = status.statistics.sessions || ['Asie','Europe','Amérique']
                       const src = status.statistics.sessions_total?.pnl_out || {}
                       return { labels, datasets: [{ label: 'PnL (€) au dernier OUT', data: labels.map(l => src[l] || 0), backgroundColor: 'rgba(118,75,162,0.6)' }] }
                     })())}
@@ -606,7 +606,7 @@ export const App: React.FC = () => {
                 <div style={{ height: 260 }}>
                   <SafeBar
                     data={() => ((() => {
-                      const labels = ['Asie','Europe','Amérique']
+                      const labels: string[] = status.statistics.sessions || ['Asie','Europe','Amérique']
                       const src = status.statistics.sessions_total?.tp_out || {}
                       return { labels, datasets: [{ label: 'TP (nb)', data: labels.map(l => src[l] || 0), backgroundColor: 'rgba(86,171,47,0.7)' }] }
                     })())}
@@ -616,7 +616,7 @@ export const App: React.FC = () => {
                 <div style={{ height: 260 }}>
                   <SafeBar
                     data={() => ((() => {
-                      const labels = ['Asie','Europe','Amérique']
+                      const labels: string[] = status.statistics.sessions || ['Asie','Europe','Amérique']
                       const src = status.statistics.sessions_total?.sl_out || {}
                       return { labels, datasets: [{ label: 'SL (nb)', data: labels.map(l => src[l] || 0), backgroundColor: 'rgba(229,62,62,0.7)' }] }
                     })())}
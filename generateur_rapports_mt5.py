@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Générateur de rapports synthétiques du testeur de stratégie MT5 (XLSX et HTML)
+Produit des rapports de même structure que les exports réels (en-tête, Données
+d'entrée, sections Ordres et Transactions) avec un nombre de deals configurable,
+un mélange de symboles couvrant tous les InstrumentType et les cas limites du
+matching : clôtures partielles (plusieurs OUT par IN), positions restées
+ouvertes, OUT orphelins et volumes incohérents.
+
+Usage:
+    python generateur_rapports_mt5.py <nb_deals> [--format xlsx|html] [--sortie dossier] [--graine N]
+"""
+
+import argparse
+import html
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+# Limite de lignes d'une feuille Excel : au-delà, le rapport est découpé en plusieurs fichiers
+LIGNES_MAX_XLSX = 1048576
+# Marge pour l'en-tête, les titres de sections et la ligne de totaux
+_LIGNES_HORS_DEALS = 200
+
+COLONNES_ORDRES = ["Heure d'ouverture", "Ordre", "Symbole", "Type", "Volume", None, "Prix",
+                   "S / L", "T / P", "Heure", None, "État", "Commentaire"]
+COLONNES_TRANSACTIONS = ["Heure", "Opération", "Symbole", "Type", "Direction", "Volume", "Prix",
+                         "Ordre", "Commission", "Echange", "Profit", "Solde", "Commentaire"]
+
+
+@dataclass(frozen=True)
+class SymboleSynthetique:
+    nom: str
+    prix: float
+    digits: int
+    pip: float
+    contrat: float
+    # Conversion approximative d'une unité de la devise de cotation en EUR (devise du compte)
+    vers_eur: float
+    # Amplitude typique d'un trade, en pips
+    amplitude_pips: float
+
+
+# Au moins un symbole par InstrumentType (forex, métaux, indices, crypto, énergie, actions)
+SYMBOLES = (
+    SymboleSynthetique('EURUSD', 1.10, 5, 0.0001, 100000, 0.92, 40),
+    SymboleSynthetique('GBPUSD', 1.27, 5, 0.0001, 100000, 0.92, 50),
+    SymboleSynthetique('USDJPY', 148.0, 3, 0.01, 100000, 0.0062, 45),
+    SymboleSynthetique('USDCHF', 0.90, 5, 0.0001, 100000, 1.05, 35),
+    SymboleSynthetique('XAUUSD', 2000.0, 2, 0.1, 100, 0.92, 150),
+    SymboleSynthetique('XAGUSD', 24.0, 3, 0.01, 5000, 0.92, 40),
+    SymboleSynthetique('UK100', 7600.0, 1, 1.0, 1, 1.17, 40),
+    SymboleSynthetique('US30', 36000.0, 1, 1.0, 1, 0.92, 120),
+    SymboleSynthetique('GER40', 16500.0, 1, 1.0, 1, 1.0, 60),
+    SymboleSynthetique('BTCUSD', 42000.0, 2, 1.0, 1, 0.92, 600),
+    SymboleSynthetique('ETHUSD', 2300.0, 2, 0.1, 1, 0.92, 400),
+    SymboleSynthetique('USOIL', 78.0, 3, 0.01, 1000, 0.92, 60),
+    SymboleSynthetique('AAPL', 190.0, 2, 0.01, 100, 0.92, 150),
+    SymboleSynthetique('TSLA', 240.0, 2, 0.01, 100, 0.92, 300),
+)
+
+
+@dataclass
+class ParametresGeneration:
+    """Proportions des cas particuliers (par position)"""
+    proba_partielle: float = 0.15   # position fermée en 2 ou 3 OUT
+    proba_ouverte: float = 0.005    # IN sans OUT (position ouverte à la fin du test)
+    proba_orpheline: float = 0.005  # OUT sans IN (position ouverte avant le début)
+    proba_anomalie: float = 0.005   # volume de sortie différent du volume d'entrée
+    proba_gain: float = 0.55
+    debut: str = '2021.01.01'
+    jours: int = 1500
+    solde_initial: float = 10000.0
+    commission_par_lot: float = 3.5
+
+
+def _repartir_volumes(volumes, nb_parts, rng):
+    """Découpe chaque volume en nb_parts morceaux de 0.01 lot minimum (somme exacte)"""
+    centiemes = np.round(volumes * 100).astype(np.int64)
+    parts = np.zeros((len(volumes), 3), dtype=np.int64)
+    restant = centiemes.copy()
+    for k in range(3):
+        dernier = nb_parts == k + 1
+        actif = nb_parts > k
+        # Part k : au moins 1 centième, en laissant 1 centième à chaque part restante
+        maximum = np.maximum(restant - (nb_parts - k - 1), 1)
+        tirage = np.maximum(1, np.round(rng.uniform(0.3, 0.7, len(volumes)) * maximum)).astype(np.int64)
+        part = np.where(dernier, restant, np.minimum(tirage, maximum))
+        parts[:, k] = np.where(actif, part, 0)
+        restant = restant - parts[:, k]
+    return parts / 100.0
+
+
+def generer_deals(nb_deals, graine=0, parametres=None):
+    """
+    Génère les deals d'un test synthétique.
+
+    Args:
+        nb_deals: nombre approximatif de deals (IN + OUT)
+        graine: graine du générateur aléatoire (résultat reproductible)
+        parametres: ParametresGeneration
+
+    Returns:
+        (DataFrame des deals triés chronologiquement, dict de comptages)
+    """
+    p = parametres or ParametresGeneration()
+    rng = np.random.default_rng(graine)
+
+    deals_par_position = 2 + p.proba_partielle * 1.5
+    nb_positions = max(1, int(round(nb_deals / deals_par_position)))
+    symboles = rng.integers(0, len(SYMBOLES), nb_positions)
+
+    # Positions successives par symbole (compte en netting) : début = fin précédente + pause
+    duree_totale = p.jours * 86400.0
+    par_symbole = np.bincount(symboles, minlength=len(SYMBOLES))
+    pas_moyen = duree_totale / np.maximum(par_symbole, 1)
+    ordre_tri = np.argsort(symboles, kind='stable')
+    pas = pas_moyen[symboles[ordre_tri]]
+    durees = np.maximum(60.0, rng.exponential(0.4 * pas))
+    pauses = np.maximum(60.0, rng.exponential(0.6 * pas))
+    cumul = np.cumsum(durees + pauses)
+    premiers = np.r_[0, np.flatnonzero(np.diff(symboles[ordre_tri])) + 1]
+    avant_groupe = np.repeat(cumul[premiers] - (durees + pauses)[premiers], np.diff(np.r_[premiers, nb_positions]))
+    ouvertures = np.empty(nb_positions)
+    duree_pos = np.empty(nb_positions)
+    # Début = somme des positions précédentes du symbole + pause avant celle-ci
+    ouvertures[ordre_tri] = np.floor(cumul - avant_groupe - durees)
+    duree_pos[ordre_tri] = np.floor(durees)
+
+    specs = {champ: np.array([getattr(s, champ) for s in SYMBOLES]) for champ in
+             ('prix', 'digits', 'pip', 'contrat', 'vers_eur', 'amplitude_pips')}
+    sens = np.where(rng.random(nb_positions) < 0.5, 1, -1)
+    volumes = np.round(rng.choice([0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0], nb_positions,
+                                  p=[.1, .1, .15, .2, .15, .1, .1, .07, .03]), 2)
+    # Dérive lente du prix de chaque symbole au fil du test
+    derive = np.exp(rng.normal(0, 0.02, nb_positions) + np.sin(ouvertures / duree_totale * 6 + symboles) * 0.1)
+    prix_in = specs['prix'][symboles] * derive
+    pip = specs['pip'][symboles]
+    amplitude = specs['amplitude_pips'][symboles] * rng.uniform(0.5, 1.5, nb_positions) * pip
+    gagnant = rng.random(nb_positions) < p.proba_gain
+    tp = prix_in + sens * amplitude
+    sl = prix_in - sens * amplitude * rng.uniform(0.6, 1.2, nb_positions)
+
+    # Nombre d'OUT par position (0 = restée ouverte)
+    nb_out = np.ones(nb_positions, dtype=np.int64)
+    partielle = (rng.random(nb_positions) < p.proba_partielle) & (volumes >= 0.03)
+    nb_out[partielle] = rng.integers(2, 4, partielle.sum())
+    ouverte = rng.random(nb_positions) < p.proba_ouverte
+    nb_out[ouverte] = 0
+    volumes_out = _repartir_volumes(volumes, np.maximum(nb_out, 1), rng)
+    derniers = np.maximum(nb_out, 1) - 1
+    # Le dernier OUT est amputé de 0.01 lot (il en garde au moins 0.01)
+    anomalie = ((rng.random(nb_positions) < p.proba_anomalie) & (nb_out > 0)
+                & (volumes_out[np.arange(nb_positions), derniers] >= 0.02))
+    volumes_out[np.flatnonzero(anomalie), derniers[anomalie]] -= 0.01
+
+    # --- Deals IN ---
+    lignes = {
+        'temps': [ouvertures], 'symbole': [symboles], 'sens': [sens], 'direction': [np.zeros(nb_positions, np.int8)],
+        'volume': [volumes], 'prix': [prix_in], 'sl': [sl], 'tp': [tp], 'sortie': [np.zeros(nb_positions, np.int8)],
+        'position': [np.arange(nb_positions)], 'profit': [np.zeros(nb_positions)],
+    }
+    # --- Deals OUT : partiels à prix intermédiaire, dernier au TP / SL ---
+    for k in range(3):
+        sel = np.flatnonzero(nb_out > k)
+        if len(sel) == 0:
+            continue
+        dernier = nb_out[sel] == k + 1
+        fraction = np.where(dernier, 1.0, (k + 1) / (nb_out[sel] + 1.0))
+        temps = ouvertures[sel] + np.maximum(1, np.floor(duree_pos[sel] * fraction))
+        cible = np.where(gagnant[sel], tp[sel], sl[sel])
+        prix_out = np.where(dernier, cible, prix_in[sel] + (cible - prix_in[sel]) * rng.uniform(0.2, 0.8, len(sel)))
+        # 1 = TP, 2 = SL, 0 = clôture partielle sans commentaire
+        sortie = np.where(dernier, np.where(gagnant[sel], 1, 2), 0)
+        vol = volumes_out[sel, k]
+        profit = sens[sel] * (prix_out - prix_in[sel]) * vol * specs['contrat'][symboles[sel]] * specs['vers_eur'][symboles[sel]]
+        for cle, valeur in (('temps', temps), ('symbole', symboles[sel]), ('sens', -sens[sel]),
+                            ('direction', np.ones(len(sel), np.int8)), ('volume', vol), ('prix', prix_out),
+                            ('sl', np.full(len(sel), np.nan)), ('tp', np.full(len(sel), np.nan)),
+                            ('sortie', sortie.astype(np.int8)), ('position', sel), ('profit', profit)):
+            lignes[cle].append(valeur)
+
+    # --- OUT orphelins : positions ouvertes avant le début du test ---
+    nb_orphelins = int(rng.binomial(nb_positions, p.proba_orpheline))
+    if nb_orphelins:
+        symb = rng.integers(0, len(SYMBOLES), nb_orphelins)
+        prix_o = specs['prix'][symb] * np.exp(rng.normal(0, 0.02, nb_orphelins))
+        vol = np.round(rng.choice([0.01, 0.1, 0.5], nb_orphelins), 2)
+        for cle, valeur in (('temps', np.floor(rng.uniform(0, 3600, nb_orphelins))), ('symbole', symb),
+                            ('sens', np.where(rng.random(nb_orphelins) < 0.5, 1, -1)),
+                            ('direction', np.ones(nb_orphelins, np.int8)), ('volume', vol), ('prix', prix_o),
+                            ('sl', np.full(nb_orphelins, np.nan)), ('tp', np.full(nb_orphelins, np.nan)),
+                            ('sortie', np.zeros(nb_orphelins, np.int8)), ('position', np.full(nb_orphelins, -1)),
+                            ('profit', np.round(rng.normal(0, 20, nb_orphelins), 2))):
+            lignes[cle].append(valeur)
+
+    deals = pd.DataFrame({cle: np.concatenate(valeurs) for cle, valeurs in lignes.items()})
+    # Ordre chronologique ; à égalité l'IN précède ses OUT (numéros d'ordre croissants)
+    deals = deals.sort_values(['temps', 'direction', 'position'], kind='stable').reset_index(drop=True)
+    deals['numero'] = np.arange(2, len(deals) + 2)  # le deal 1 est le dépôt initial
+    digits_deal = specs['digits'][deals['symbole'].to_numpy()]
+    facteur = 10.0 ** digits_deal
+    for col in ('prix', 'sl', 'tp'):
+        deals[col] = np.round(deals[col].to_numpy() * facteur) / facteur
+    deals['profit'] = np.round(deals['profit'].to_numpy(), 2)
+    deals['commission'] = np.round(-p.commission_par_lot * deals['volume'].to_numpy(), 2)
+    deals['echange'] = np.where(deals['direction'] == 1, np.round(rng.normal(0, 0.5, len(deals)), 2) * (rng.random(len(deals)) < 0.2), 0.0)
+    deals['solde'] = np.round(p.solde_initial + np.cumsum(deals['profit'] + deals['commission'] + deals['echange']), 2)
+    debut = pd.Timestamp(p.debut.replace('.', '-'))
+    deals['heure'] = (debut + pd.to_timedelta(deals['temps'], unit='s')).dt.strftime('%Y.%m.%d %H:%M:%S')
+
+    comptages = {
+        'deals': int(len(deals)),
+        'positions': int(nb_positions),
+        'positions_partielles': int((nb_out > 1).sum()),
+        'positions_ouvertes': int(ouverte.sum()),
+        'out_orphelins': nb_orphelins,
+        'volumes_incoherents': int(anomalie.sum()),
+        'symboles': sorted({SYMBOLES[i].nom for i in np.unique(deals['symbole'])}),
+    }
+    return deals, comptages
+
+
+def _texte_prix(valeur, digits):
+    return '' if np.isnan(valeur) else f"{valeur:.{digits}f}"
+
+
+def _lignes_entete(nb_deals, graine, parametres):
+    p = parametres or ParametresGeneration()
+    entrees = [f"lot_r{i}={v}" for i, v in enumerate((0.1, 0.2, 0.3), start=1)]
+    entrees += [f"perTP{i}=50" for i in (1, 2, 3)] + ["max_trades=1", f"seed={graine}", "Magic=243"]
+    lignes = [
+        ["Rapport du Testeur de Stratégie"],
+        ["Synthetic-Server (Build 5260)"],
+        ["Réglages"],
+        ["Expert:", None, None, "SYNTHETIQUE_V1"],
+        ["Symbole:", None, None, "MULTI"],
+        ["Période:", None, None, f"M15 ({p.debut} - synthétique, {nb_deals} deals)"],
+    ]
+    for i, entree in enumerate(entrees):
+        lignes.append(["Données d'entrée:" if i == 0 else None, None, None, entree])
+    lignes += [
+        ["Courtier:", None, None, "Synthetic Markets Ltd"],
+        ["Devise:", None, None, "EUR"],
+        ["Dépôt initial:", None, None, p.solde_initial],
+        ["Levier:", None, None, "1:100"],
+        ["Résultats"],
+        [],
+    ]
+    return lignes
+
+
+def _lignes_ordres(deals):
+    digits = np.array([s.digits for s in SYMBOLES])[deals['symbole'].to_numpy()]
+    noms = np.array([s.nom for s in SYMBOLES], dtype=object)[deals['symbole'].to_numpy()]
+    types = np.where(deals['sens'].to_numpy() > 0, 'buy', 'sell')
+    for i, (heure, numero, volume, sl, tp, sortie, prix) in enumerate(zip(
+            deals['heure'], deals['numero'], deals['volume'], deals['sl'], deals['tp'], deals['sortie'], deals['prix'])):
+        commentaire = None
+        if sortie:
+            commentaire = f"{'tp' if sortie == 1 else 'sl'} {prix:.{digits[i]}f}"
+        volume_txt = f"{volume:g} / {volume:g}"
+        yield [heure, int(numero), noms[i], types[i], volume_txt, None, 0,
+               None if np.isnan(sl) else float(sl), None if np.isnan(tp) else float(tp),
+               heure, None, 'filled', commentaire]
+
+
+def _lignes_transactions(deals, parametres):
+    p = parametres or ParametresGeneration()
+    digits = np.array([s.digits for s in SYMBOLES])[deals['symbole'].to_numpy()]
+    noms = np.array([s.nom for s in SYMBOLES], dtype=object)[deals['symbole'].to_numpy()]
+    types = np.where(deals['sens'].to_numpy() > 0, 'buy', 'sell')
+    directions = np.where(deals['direction'].to_numpy() == 1, 'out', 'in')
+    premiere = deals['heure'].iloc[0][:10] + ' 00:00:00' if len(deals) else p.debut + ' 00:00:00'
+    yield [premiere, 1, None, 'balance', None, None, None, None, 0, 0, p.solde_initial, p.solde_initial, None]
+    for i, (heure, numero, volume, prix, sortie, commission, echange, profit, solde) in enumerate(zip(
+            deals['heure'], deals['numero'], deals['volume'], deals['prix'], deals['sortie'],
+            deals['commission'], deals['echange'], deals['profit'], deals['solde'])):
+        commentaire = f"{'tp' if sortie == 1 else 'sl'} {prix:.{digits[i]}f}" if sortie else None
+        yield [heure, int(numero), noms[i], types[i], directions[i], float(volume), float(prix), int(numero),
+               float(commission), float(echange), float(profit), float(solde), commentaire]
+    # Ligne de totaux (sans horodatage, ignorée par l'analyseur)
+    yield [None, None, None, None, None, None, None, None, round(float(deals['commission'].sum()), 2),
+           round(float(deals['echange'].sum()), 2), round(float(deals['profit'].sum()), 2),
+           float(deals['solde'].iloc[-1]) if len(deals) else p.solde_initial, None]
+
+
+def ecrire_xlsx(deals, chemin, graine=0, parametres=None):
+    """Écrit un rapport XLSX (openpyxl en écriture seule, une ligne à la fois)"""
+    from openpyxl import Workbook
+
+    if 2 * len(deals) + _LIGNES_HORS_DEALS > LIGNES_MAX_XLSX:
+        raise ValueError(f"{len(deals)} deals dépassent la limite de {LIGNES_MAX_XLSX} lignes d'une feuille Excel")
+    classeur = Workbook(write_only=True)
+    feuille = classeur.create_sheet('Rapport')
+    for ligne in _lignes_entete(len(deals), graine, parametres):
+        feuille.append(ligne)
+    feuille.append(['Ordres'])
+    feuille.append(COLONNES_ORDRES)
+    for ligne in _lignes_ordres(deals):
+        feuille.append(ligne)
+    feuille.append(['Transactions'])
+    feuille.append(COLONNES_TRANSACTIONS)
+    for ligne in _lignes_transactions(deals, parametres):
+        feuille.append(ligne)
+    classeur.save(chemin)
+    return chemin
+
+
+def _cellule_html(valeur):
+    if valeur is None or (isinstance(valeur, float) and np.isnan(valeur)):
+        return '<td></td>'
+    if isinstance(valeur, float):
+        valeur = f"{valeur:.10g}"
+    return f'<td>{html.escape(str(valeur))}</td>'
+
+
+def ecrire_html(deals, chemin, graine=0, parametres=None, encodage='utf-16'):
+    """Écrit un rapport HTML comme MT5 (UTF-16 avec BOM par défaut), en flux"""
+    largeur = len(COLONNES_ORDRES)
+    with open(chemin, 'w', encoding=encodage, newline='\r\n') as f:
+        f.write('<!DOCTYPE html>\n<html>\n<head>\n<title>Rapport du Testeur de Stratégie</title>\n'
+                '<meta charset="utf-16">\n</head>\n<body>\n<table>\n')
+        for ligne in _lignes_entete(len(deals), graine, parametres):
+            if len(ligne) > 1:
+                f.write(f'<tr><td colspan="3">{html.escape(str(ligne[0] or ""))}</td>'
+                        f'<td colspan="{largeur - 3}"><b>{html.escape(str(ligne[3]))}</b></td></tr>\n')
+            elif ligne:
+                f.write(f'<tr><th colspan="{largeur}"><div><b>{html.escape(str(ligne[0]))}</b></div></th></tr>\n')
+        for titre, colonnes, lignes in (('Ordres', COLONNES_ORDRES, _lignes_ordres(deals)),
+                                        ('Transactions', COLONNES_TRANSACTIONS, _lignes_transactions(deals, parametres))):
+            f.write(f'<tr><th colspan="{largeur}"><div><b>{titre}</b></div></th></tr>\n')
+            f.write('<tr>' + ''.join(_cellule_html(c) for c in colonnes) + '</tr>\n')
+            tampon = []
+            for ligne in lignes:
+                tampon.append('<tr>' + ''.join(_cellule_html(c) for c in ligne) + '</tr>\n')
+                if len(tampon) >= 10000:
+                    f.write(''.join(tampon))
+                    tampon = []
+            f.write(''.join(tampon))
+        f.write('</table>\n</body>\n</html>\n')
+    return chemin
+
+
+def generer_rapports(nb_deals, dossier, format_fichier='xlsx', graine=0, parametres=None, prefixe='synthetique'):
+    """
+    Génère un rapport (ou plusieurs si un XLSX dépasserait la limite de lignes).
+
+    Returns:
+        (liste des chemins écrits, comptages cumulés)
+    """
+    os.makedirs(dossier, exist_ok=True)
+    if format_fichier == 'xlsx':
+        par_fichier = (LIGNES_MAX_XLSX - _LIGNES_HORS_DEALS) // 2
+        nb_fichiers = max(1, -(-nb_deals // par_fichier))
+    else:
+        nb_fichiers = 1
+    if nb_fichiers > 1:
+        print(f"[INFO] {nb_deals} deals découpés en {nb_fichiers} fichiers XLSX (limite {LIGNES_MAX_XLSX} lignes)")
+
+    chemins, total = [], {}
+    for partie in range(nb_fichiers):
+        deals_partie = nb_deals // nb_fichiers + (1 if partie < nb_deals % nb_fichiers else 0)
+        # Marge de 10 % : le nombre de deals générés fluctue autour de la cible
+        if format_fichier == 'xlsx' and nb_fichiers > 1:
+            deals_partie = int(deals_partie * 0.9)
+        deals, comptages = generer_deals(deals_partie, graine=graine + partie, parametres=parametres)
+        suffixe = f"_{partie + 1}" if nb_fichiers > 1 else ''
+        chemin = os.path.join(dossier, f"{prefixe}_{nb_deals}_{graine}{suffixe}.{format_fichier}")
+        if format_fichier == 'xlsx':
+            ecrire_xlsx(deals, chemin, graine + partie, parametres)
+        elif format_fichier == 'html':
+            ecrire_html(deals, chemin, graine + partie, parametres)
+        else:
+            raise ValueError(f"Format non supporté: {format_fichier}")
+        chemins.append(chemin)
+        for cle, valeur in comptages.items():
+            if isinstance(valeur, int):
+                total[cle] = total.get(cle, 0) + valeur
+            else:
+                total[cle] = sorted(set(total.get(cle, [])) | set(valeur))
+    return chemins, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Génère des rapports MT5 synthétiques")
+    parser.add_argument('nb_deals', type=int, help="nombre de deals (IN + OUT), de 1k à 2M")
+    parser.add_argument('--format', dest='format_fichier', choices=['xlsx', 'html'], default='xlsx')
+    parser.add_argument('--sortie', default='.', help="dossier de sortie")
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--partielles', type=float, default=ParametresGeneration.proba_partielle,
+                        help="proportion de positions fermées en plusieurs OUT")
+    args = parser.parse_args()
+
+    parametres = ParametresGeneration(proba_partielle=args.partielles)
+    chemins, comptages = generer_rapports(args.nb_deals, args.sortie, args.format_fichier, args.graine, parametres)
+    for chemin in chemins:
+        print(f"✅ {chemin}")
+    print(f"Deals: {comptages['deals']}, positions: {comptages['positions']}, "
+          f"partielles: {comptages['positions_partielles']}, ouvertes: {comptages['positions_ouvertes']}, "
+          f"OUT orphelins: {comptages['out_orphelins']}, volumes incohérents: {comptages['volumes_incoherents']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Pool d'ingestion parallèle des rapports MT5
+Chaque fichier est analysé (lecture + matching + recalcul) dans un processus
+séparé ; les résultats sont ensuite fusionnés par TradingAnalyzer.process_files.
+
+Les résultats sont aussi conservés dans un cache par empreinte de contenu : un
+rapport ré-uploadé (même contenu, mêmes paramètres) n'est pas ré-analysé.
+"""
+
+import os
+import sys
+import hashlib
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool as BrokenExecutor
+
+import pandas as pd
+
+import metrics
+from deal_schema import appliquer_schema_deals
+
+# Analyseurs réutilisés dans chaque processus de travail (clé = paramètres)
+_analyseurs_worker = {}
+
+
+def _analyser_fichier(file_path, filter_type, solde_initial, multiplier, broker, engine=None):
+    """Point d'entrée exécuté dans un processus du pool"""
+    from trading_analyzer_unified import TradingAnalyzer
+
+    cle = (solde_initial, multiplier, broker, engine)
+    analyzer = _analyseurs_worker.get(cle)
+    if analyzer is None:
+        analyzer = TradingAnalyzer(solde_initial=solde_initial, multiplier=multiplier, broker=broker, engine=engine)
+        _analyseurs_worker[cle] = analyzer
+    return analyzer.process_single_file(file_path, filter_type)
+
+
+def rediriger_traces(journal):
+    """
+    Initialisation d'un processus de travail : ses traces (print) vont dans le journal de la CLI.
+    redirect_stdout dans le processus parent ne s'applique pas aux processus 'spawn'.
+    """
+    if journal:
+        sys.stdout = open(journal, 'a', encoding='utf-8', buffering=1)
+
+
+def nombre_workers_defaut():
+    """Nombre de processus d'ingestion (variable ANALYZER_INGEST_WORKERS, sinon CPU disponibles)"""
+    valeur = os.environ.get('ANALYZER_INGEST_WORKERS')
+    if valeur:
+        try:
+            return max(1, int(valeur))
+        except ValueError:
+            print(f"[WARNING] ANALYZER_INGEST_WORKERS invalide: {valeur}")
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+class IngestionPool:
+    """Pool de processus partagé pour l'analyse des fichiers"""
+
+    def __init__(self, max_workers=None, journal=None):
+        self.max_workers = max_workers or nombre_workers_defaut()
+        # Journal des traces des processus de travail (None : console)
+        self.journal = journal
+        self._executor = None
+        self._lock = threading.Lock()
+        self._en_attente = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.max_workers <= 1:
+                    # Un seul worker : inutile de payer le coût d'un processus séparé
+                    self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ingestion')
+                else:
+                    # 'spawn' : le serveur Flask est multi-threadé, un fork pourrait hériter de verrous pris
+                    contexte = multiprocessing.get_context('spawn')
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=contexte,
+                                                         initializer=rediriger_traces, initargs=(self.journal,))
+                print(f"[INFO] Pool d'ingestion démarré ({self.max_workers} worker(s))")
+            return self._executor
+
+    def soumettre(self, file_path, filter_type=None, solde_initial=10000, multiplier=1.0, broker=None, engine=None):
+        """
+        Soumet l'analyse d'un fichier.
+
+        Returns:
+            Future dont le résultat est le tuple de process_single_file
+            (df, message, exclus, doublons)
+        """
+        try:
+            future = self._get_executor().submit(
+                _analyser_fichier, file_path, filter_type, solde_initial, multiplier, broker, engine
+            )
+        except BrokenExecutor:
+            # Un worker a été tué (OOM...) : on recrée le pool une fois
+            print("[WARNING] Pool d'ingestion cassé, redémarrage")
+            with self._lock:
+                self._executor = None
+            future = self._get_executor().submit(
+                _analyser_fichier, file_path, filter_type, solde_initial, multiplier, broker, engine
+            )
+        with self._lock:
+            self._en_attente += 1
+        future.add_done_callback(self._terminer)
+        return future
+
+    def _terminer(self, future):
+        with self._lock:
+            self._en_attente -= 1
+
+    def en_attente(self):
+        """Nombre de fichiers soumis et pas encore analysés (profondeur de la file)"""
+        return self._en_attente
+
+    def arreter(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def _renommer_source(df, ancien, nouveau):
+    """Réattribue un résultat en cache à un autre nom de fichier (Fichier_Source et préfixe de Cle_Match)"""
+    if ancien == nouveau:
+        return df
+    for col in [c for c in df.columns if c.startswith('Fichier_Source')]:
+        df[col] = df[col].astype(object).where(df[col].astype(object) != ancien, nouveau)
+    if 'Cle_Match' in df.columns:
+        prefixe = f"{ancien}|"
+
+        def renommer(cle):
+            return f"{nouveau}|{cle[len(prefixe):]}" if isinstance(cle, str) and cle.startswith(prefixe) else cle
+        if isinstance(df['Cle_Match'].dtype, pd.CategoricalDtype):
+            categories = [renommer(c) for c in df['Cle_Match'].cat.categories]
+            if len(set(categories)) == len(categories):
+                df['Cle_Match'] = df['Cle_Match'].cat.rename_categories(categories)
+            else:
+                df['Cle_Match'] = df['Cle_Match'].astype(object).map(renommer)
+        else:
+            df['Cle_Match'] = df['Cle_Match'].map(renommer)
+    return appliquer_schema_deals(df)
+
+
+class CacheFichiers:
+    """
+    Cache LRU des résultats de process_single_file, par empreinte du contenu.
+
+    La clé combine le SHA-256 du fichier, le filtre, le solde, le multiplicateur, le
+    moteur et la version du broker : un nouvel import de métadonnées invalide de fait les entrées.
+    Taille bornée en mémoire (ANALYZER_CACHE_FICHIERS_MO, 0 pour désactiver).
+    """
+
+    def __init__(self, taille_max_mo=None):
+        if taille_max_mo is None:
+            try:
+                taille_max_mo = float(os.environ.get('ANALYZER_CACHE_FICHIERS_MO', 256))
+            except ValueError:
+                taille_max_mo = 256
+        self.taille_max = int(taille_max_mo * 1024 * 1024)
+        self.taille = 0
+        self._entrees = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def empreinte(file_path):
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for bloc in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(bloc)
+        return sha.hexdigest()
+
+    def cle(self, file_path, filter_type, solde_initial, multiplier, broker, engine=None):
+        """Clé du fichier, ou None si le cache est désactivé / le fichier illisible"""
+        if self.taille_max <= 0:
+            return None
+        try:
+            empreinte = self.empreinte(file_path)
+        except OSError:
+            return None
+        version_broker = None
+        if broker:
+            from broker_manager import get_broker_manager
+            version_broker = get_broker_manager().signature_broker(broker)
+        return (empreinte, filter_type, float(solde_initial), float(multiplier), broker,
+                tuple(version_broker) if version_broker else None, engine)
+
+    def obtenir(self, cle, nom_fichier):
+        """Résultat (df, erreur, exclus, doublons) en cache pour ce nom de fichier, ou None"""
+        if cle is None:
+            return None
+        with self._lock:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                self._entrees.move_to_end(cle)
+        metrics.compter_cache('fichiers', entree is not None)
+        if entree is None:
+            return None
+        nom_origine, df, erreur, exclus, doublons, _ = entree
+        return _renommer_source(df.copy(), nom_origine, nom_fichier), erreur, exclus, doublons
+
+    def mettre(self, cle, nom_fichier, resultat):
+        df, erreur, exclus, doublons = resultat
+        if cle is None or df is None or len(df) == 0:
+            return
+        copie = df.copy()
+        copie.attrs.pop('timings', None)
+        taille = int(copie.memory_usage(deep=True).sum())
+        if taille > self.taille_max:
+            return
+        with self._lock:
+            ancienne = self._entrees.pop(cle, None)
+            if ancienne is not None:
+                self.taille -= ancienne[-1]
+            self._entrees[cle] = (nom_fichier, copie, erreur, exclus, doublons, taille)
+            self.taille += taille
+            while self.taille > self.taille_max and self._entrees:
+                _, evincee = self._entrees.popitem(last=False)
+                self.taille -= evincee[-1]
+
+
+# Instances globales
+_ingestion_pool_instance = None
+_cache_fichiers_instance = None
+
+
+def get_ingestion_pool():
+    """Retourne l'instance globale du pool d'ingestion"""
+    global _ingestion_pool_instance
+    if _ingestion_pool_instance is None:
+        _ingestion_pool_instance = IngestionPool()
+    return _ingestion_pool_instance
+
+
+def get_cache_fichiers():
+    """Retourne l'instance globale du cache des fichiers analysés"""
+    global _cache_fichiers_instance
+    if _cache_fichiers_instance is None:
+        _cache_fichiers_instance = CacheFichiers()
+    return _cache_fichiers_instance
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Magasin local de prix OHLC (historique M1 / M15... exporté de MT5 en CSV)
+Chaque symbole et période est rangé en colonnes NumPy (.npy) triées par date :
+    <dossier>/<période>/<SYMBOLE>/temps.npy, ouverture.npy, haut.npy, bas.npy, cloture.npy
+Les colonnes sont ouvertes en mémoire mappée (np.load(mmap_mode='r')) : des années de M1
+ne sont pas chargées en RAM, seules les pages des barres lues le sont. Un nouvel export est
+fusionné avec l'existant (dédoublonné par date, l'export le plus récent l'emporte).
+
+Formats CSV reconnus :
+- export MT5 (« Barres ») : en-têtes <DATE> <TIME> <OPEN> <HIGH> <LOW> <CLOSE>..., tabulations
+- historique MT4 / centre d'historique : date,heure,ouverture,haut,bas,clôture,volume sans en-tête
+Symbole et période sont lus dans le nom du fichier (ex. EURUSD_M1_202301020000_202312292358.csv,
+EURUSDM15.csv) ou passés explicitement.
+
+Usage:
+    magasin = MagasinPrix('prix')
+    magasin.importer_csv('EURUSD_M1_202301020000_202312292358.csv')
+    periode, barres = magasin.barres('EURUSD')   # période la plus fine disponible
+"""
+
+import csv
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from broker_manager import normaliser_symbole
+
+PERIODES = ('M1', 'M5', 'M15', 'M30', 'H1', 'H4', 'D1')
+DUREES_PERIODES = {'M1': '1min', 'M5': '5min', 'M15': '15min', 'M30': '30min', 'H1': '1h', 'H4': '4h', 'D1': '1D'}
+COLONNES_BARRES = ('temps', 'ouverture', 'haut', 'bas', 'cloture')
+ENTETES_MT5 = {'<DATE>': 'date', '<TIME>': 'heure', '<OPEN>': 'ouverture', '<HIGH>': 'haut', '<LOW>': 'bas', '<CLOSE>': 'cloture'}
+MOTIF_FICHIER = re.compile(r'^(?P<symbole>.+?)[_ .-]?(?P<periode>M15|M30|M1|M5|H1|H4|D1)(?:[_ .-].*)?$', re.IGNORECASE)
+
+
+def infos_fichier(chemin):
+    """(symbole, période) lus dans le nom d'un export, ou (None, None)"""
+    nom = os.path.splitext(os.path.basename(chemin))[0]
+    correspondance = MOTIF_FICHIER.match(nom)
+    if not correspondance:
+        return None, None
+    return normaliser_symbole(correspondance.group('symbole')), correspondance.group('periode').upper()
+
+
+def lire_csv_mt5(chemin):
+    """
+    Barres d'un export CSV MT5 / MT4.
+
+    Returns:
+        DataFrame (temps, ouverture, haut, bas, cloture) trié par date, barres illisibles écartées
+    """
+    with open(chemin, 'r', encoding='utf-8-sig', errors='replace') as f:
+        premiere = f.readline()
+    if premiere.lstrip().startswith('<DATE>'):
+        brut = pd.read_csv(chemin, sep='\t', encoding='utf-8-sig', dtype=str)
+        brut = brut.rename(columns=lambda c: ENTETES_MT5.get(c.strip(), c.strip()))
+    else:
+        try:
+            separateur = csv.Sniffer().sniff(premiere, delimiters=',;\t').delimiter
+        except csv.Error:
+            separateur = ','
+        brut = pd.read_csv(chemin, sep=separateur, header=None, dtype=str, encoding='utf-8-sig')
+        if brut.shape[1] < 6:
+            raise ValueError(f"{os.path.basename(chemin)}: colonnes date, heure, ouverture, haut, bas, clôture attendues")
+        brut = brut.iloc[:, :6]
+        brut.columns = ['date', 'heure', 'ouverture', 'haut', 'bas', 'cloture']
+    manquantes = [c for c in ('date', 'ouverture', 'haut', 'bas', 'cloture') if c not in brut.columns]
+    if manquantes:
+        raise ValueError(f"{os.path.basename(chemin)}: colonnes manquantes {', '.join(manquantes)}")
+
+    # Barres D1 exportées sans heure
+    heures = brut['heure'].str.strip() if 'heure' in brut.columns else pd.Series('00:00', index=brut.index)
+    horodatage = brut['date'].str.strip() + ' ' + heures
+    temps = pd.to_datetime(horodatage, format='%Y.%m.%d %H:%M', errors='coerce')
+    manquants = temps.isna()
+    if manquants.any():
+        temps[manquants] = pd.to_datetime(horodatage[manquants], format='%Y.%m.%d %H:%M:%S', errors='coerce')
+        manquants = temps.isna()
+        if manquants.any():
+            temps[manquants] = pd.to_datetime(horodatage[manquants], errors='coerce')
+    barres = pd.DataFrame({'temps': temps.astype('datetime64[ns]')})
+    for colonne in COLONNES_BARRES[1:]:
+        barres[colonne] = pd.to_numeric(brut[colonne], errors='coerce').astype('float64')
+    barres = barres.dropna()
+    return barres.sort_values('temps', kind='stable').drop_duplicates('temps', keep='last').reset_index(drop=True)
+
+
+class MagasinPrix:
+    """Barres OHLC par symbole et période, en colonnes .npy mappées en mémoire"""
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        self._ouvertes = {}
+
+    def _chemin(self, symbole, periode):
+        return os.path.join(self.dossier, periode, normaliser_symbole(symbole))
+
+    def _lire(self, symbole, periode):
+        """Colonnes mappées d'un symbole / période (None si absent)"""
+        cle = (normaliser_symbole(symbole), periode)
+        if cle not in self._ouvertes:
+            chemin = self._chemin(symbole, periode)
+            if not os.path.isfile(os.path.join(chemin, 'temps.npy')):
+                return None
+            self._ouvertes[cle] = {c: np.load(os.path.join(chemin, f"{c}.npy"), mmap_mode='r') for c in COLONNES_BARRES}
+        return self._ouvertes[cle]
+
+    def importer(self, barres, symbole, periode):
+        """
+        Fusionne des barres (DataFrame temps, ouverture, haut, bas, cloture) avec l'existant.
+
+        Returns:
+            nombre total de barres du symbole / période
+        """
+        periode = str(periode).upper()
+        if periode not in PERIODES:
+            raise ValueError(f"Période inconnue: {periode} (attendu: {', '.join(PERIODES)})")
+        symbole = normaliser_symbole(symbole)
+        if not symbole.strip('.') or re.search(r'[\\/:]', symbole):
+            raise ValueError(f"Symbole invalide: {symbole!r}")
+        existantes = self._lire(symbole, periode)
+        if existantes is not None:
+            # Copie, puis fermeture des colonnes mappées avant le remplacement des fichiers
+            anciennes = pd.DataFrame({c: np.array(existantes[c]) for c in COLONNES_BARRES})
+            existantes = None
+            self._ouvertes.pop((symbole, periode), None)
+            barres = pd.concat([anciennes, barres[list(COLONNES_BARRES)]], ignore_index=True)
+        barres = barres.sort_values('temps', kind='stable').drop_duplicates('temps', keep='last')
+
+        # Écriture dans un dossier temporaire puis remplacement (pas de magasin à moitié écrit)
+        chemin = self._chemin(symbole, periode)
+        temporaire, ancien = f"{chemin}.tmp", f"{chemin}.old"
+        shutil.rmtree(temporaire, ignore_errors=True)
+        os.makedirs(temporaire)
+        np.save(os.path.join(temporaire, 'temps.npy'), barres['temps'].to_numpy(dtype='datetime64[ns]'))
+        for colonne in COLONNES_BARRES[1:]:
+            np.save(os.path.join(temporaire, f"{colonne}.npy"), barres[colonne].to_numpy(dtype='float64'))
+        shutil.rmtree(ancien, ignore_errors=True)
+        if os.path.isdir(chemin):
+            os.replace(chemin, ancien)
+        os.replace(temporaire, chemin)
+        shutil.rmtree(ancien, ignore_errors=True)
+        return int(len(barres))
+
+    def importer_csv(self, chemin, symbole=None, periode=None):
+        """Importe un export CSV ; symbole / période déduits du nom du fichier s'ils ne sont pas fournis"""
+        symbole_nom, periode_nom = infos_fichier(chemin)
+        symbole = symbole or symbole_nom
+        periode = periode or periode_nom
+        if not symbole or not periode:
+            raise ValueError(f"{os.path.basename(chemin)}: symbole / période introuvables dans le nom (ex. EURUSD_M1.csv)")
+        barres = lire_csv_mt5(chemin)
+        if len(barres) == 0:
+            raise ValueError(f"{os.path.basename(chemin)}: aucune barre lisible")
+        total = self.importer(barres, symbole, periode)
+        print(f"[DEBUG] Prix: {len(barres)} barre(s) {normaliser_symbole(symbole)} {periode.upper()} importée(s) "
+              f"depuis {os.path.basename(chemin)} ({total} au total)")
+        return {'fichier': os.path.basename(chemin), 'symbole': normaliser_symbole(symbole), 'periode': periode.upper(),
+                'barres_importees': int(len(barres)), 'barres_total': total,
+                'debut': barres['temps'].iloc[0].isoformat(), 'fin': barres['temps'].iloc[-1].isoformat()}
+
+    def barres(self, symbole, periode=None):
+        """
+        Colonnes mappées d'un symbole, pour la période demandée ou la plus fine disponible.
+
+        Returns:
+            (période, {colonne: tableau}) ou (None, None)
+        """
+        for candidate in ([str(periode).upper()] if periode else PERIODES):
+            colonnes = self._lire(symbole, candidate)
+            if colonnes is not None and len(colonnes['temps']):
+                return candidate, colonnes
+        return None, None
+
+    def periodes(self, symbole):
+        """Périodes disponibles pour un symbole, de la plus fine à la plus large"""
+        return [periode for periode in PERIODES if self.barres(symbole, periode)[1] is not None]
+
+    def contenu(self):
+        """Symboles et périodes disponibles (nombre de barres, première / dernière date)"""
+        resultat = []
+        for periode in PERIODES:
+            dossier = os.path.join(self.dossier, periode)
+            if not os.path.isdir(dossier):
+                continue
+            for symbole in sorted(os.listdir(dossier)):
+                if symbole.endswith(('.tmp', '.old')):
+                    continue
+                colonnes = self._lire(symbole, periode)
+                if colonnes is None or len(colonnes['temps']) == 0:
+                    continue
+                resultat.append({'symbole': symbole, 'periode': periode, 'barres': int(len(colonnes['temps'])),
+                                 'debut': pd.Timestamp(colonnes['temps'][0]).isoformat(),
+                                 'fin': pd.Timestamp(colonnes['temps'][-1]).isoformat()})
+        return resultat
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Matrices croisées (heatmaps) des trades complets
+Les répartitions par heure, jour ou mois prises séparément ne montrent pas les effets
+conjoints (ex. mardi 14h, EURUSD en session Europe). Chaque trade complet (lignes de même
+Cle_Match) est daté par son dernier OUT, comme les comptes TP/SL de calculer_agregations_graphes,
+et codé en entiers (heure, jour, mois, symbole). Une seule réduction groupée (np.bincount sur
+le code combiné des cellules occupées) donne les comptes, PnL, TP et SL de chaque cellule ;
+les matrices en sont des sommes partielles :
+- heure × jour de la semaine
+- session × symbole (sessions de sessions_trading, qui peuvent se chevaucher : le masque des
+  sessions de la clôture est une dimension de plus du code des cellules)
+- mois × symbole
+avec le taux de réussite TP / (TP + SL) de chaque case. Heures, jours et mois sont ceux des
+dates du rapport (heure du serveur).
+
+Usage:
+    matrices = calculer_matrices(df_final)
+    matrices['heure_jour']['pnl'][14][1]  # PnL des trades clôturés un mardi à 14h
+"""
+
+import numpy as np
+import pandas as pd
+
+import sessions_trading
+from deal_schema import COLONNE_DATE
+
+HEURES, JOURS, MOIS = 24, 7, 12
+JOURS_NOMS = ('Lun', 'Mar', 'Mer', 'Jeu', 'Ven', 'Sam', 'Dim')
+MESURES = ('trades', 'pnl', 'tp', 'sl')
+
+
+def trades_clotures(df):
+    """
+    Un trade par Cle_Match ayant un OUT daté : profit total (lignes datées), date du dernier OUT
+    et symbole.
+
+    Returns:
+        DataFrame (profit, cloture, symbole)
+    """
+    vide = pd.DataFrame({'profit': pd.Series(dtype='float64'), 'cloture': pd.Series(dtype='datetime64[ns]'),
+                         'symbole': pd.Series(dtype=object)})
+    if len(df) == 0 or "Cle_Match" not in df.columns or "Direction" not in df.columns:
+        return vide
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    codes, _ = pd.factorize(df["Cle_Match"].astype(object).to_numpy(), use_na_sentinel=True)
+    symboles = df["Symbole_ordre"].astype(object) if "Symbole_ordre" in df.columns else pd.Series('', index=df.index)
+    sorties = df["Direction"].astype(object).to_numpy() == "out"
+    lignes = pd.DataFrame({
+        'trade': codes,
+        'profit': np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0),
+        # Seules les dates des OUT comptent pour la clôture
+        'sortie': np.where(sorties, dates, np.datetime64('NaT')),
+        'symbole': symboles.to_numpy(),
+    })
+    lignes = lignes[(codes >= 0) & ~np.isnat(dates)]
+    if len(lignes) == 0:
+        return vide
+    trades = lignes.groupby('trade', sort=False).agg(
+        profit=('profit', 'sum'), cloture=('sortie', 'max'), symbole=('symbole', 'first'))
+    return trades[trades['cloture'].notna()].reset_index(drop=True)
+
+
+def _taux(tp, sl):
+    decides = tp + sl
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(decides > 0, tp / decides * 100, np.nan)
+
+
+def _matrice(valeurs, lignes, colonnes):
+    """Matrice compacte JSON : libellés, puis une liste de lignes par mesure"""
+    trades, pnl, tp, sl = valeurs
+    taux = _taux(tp, sl)
+    return {
+        'lignes': list(lignes),
+        'colonnes': list(colonnes),
+        'trades': trades.astype('int64').tolist(),
+        'pnl': np.round(pnl, 2).tolist(),
+        'tp': tp.astype('int64').tolist(),
+        'sl': sl.astype('int64').tolist(),
+        'taux_reussite': [[None if np.isnan(v) else round(float(v), 2) for v in ligne] for ligne in taux],
+    }
+
+
+def calculer_matrices(df, config_sessions=None):
+    """
+    Matrices heure × jour, session × symbole et mois × symbole d'un DataFrame final.
+
+    Args:
+        config_sessions: configuration de sessions_trading (None : ANALYZER_SESSIONS /
+            ANALYZER_FUSEAU_SERVEUR)
+
+    Returns:
+        dict {'trades': nombre de trades, 'heure_jour', 'session_symbole', 'mois_symbole'} ;
+        chaque matrice contient 'lignes', 'colonnes' et, par mesure ('trades', 'pnl', 'tp',
+        'sl', 'taux_reussite' en %, None sans TP ni SL), une liste de lignes
+    """
+    config_sessions = config_sessions or sessions_trading.configuration_environnement()
+    sessions = sessions_trading.noms_sessions(config_sessions)
+    trades = trades_clotures(df)
+    codes_symboles, symboles = pd.factorize(trades['symbole'].astype(str), sort=True)
+    nb_symboles = len(symboles)
+    cloture = pd.DatetimeIndex(trades['cloture'])
+    heures = cloture.hour.to_numpy(dtype='int64')
+    jours = cloture.dayofweek.to_numpy(dtype='int64')
+    mois = cloture.month.to_numpy(dtype='int64') - 1
+    masques = sessions_trading.masques_sessions(
+        sessions_trading.instants_utc(trades['cloture'], config_sessions['fuseau_serveur']), config_sessions)
+    nb_masques = 1 << len(sessions)
+    profits = trades['profit'].to_numpy(dtype='float64')
+
+    # Réduction unique sur les cellules occupées du cube heure × jour × mois × sessions × symbole
+    cellules = (((heures * JOURS + jours) * MOIS + mois) * nb_masques + masques) * nb_symboles + codes_symboles
+    occupees, inverse = np.unique(cellules, return_inverse=True)
+    inverse = inverse.ravel()
+    valeurs = np.vstack([
+        np.bincount(inverse, minlength=len(occupees)),
+        np.bincount(inverse, weights=profits, minlength=len(occupees)),
+        np.bincount(inverse, weights=profits > 0, minlength=len(occupees)),
+        np.bincount(inverse, weights=profits < 0, minlength=len(occupees)),
+    ]).astype('float64')
+    h, j, m, masque, s = np.unravel_index(occupees, (HEURES, JOURS, MOIS, nb_masques, max(nb_symboles, 1)))
+
+    def sommer(lignes, colonnes, forme, poids=valeurs):
+        matrice = np.zeros((len(MESURES),) + forme, dtype='float64')
+        for k in range(len(MESURES)):
+            np.add.at(matrice[k], (lignes, colonnes), poids[k])
+        return matrice
+
+    heure_jour = sommer(h, j, (HEURES, JOURS))
+    # Une cellule compte dans chacune des sessions de son masque
+    cellule_session, session = np.nonzero((masque[:, None] >> np.arange(len(sessions))) & 1)
+    session_symbole = sommer(session, s[cellule_session], (len(sessions), nb_symboles), valeurs[:, cellule_session])
+    mois_symbole = sommer(m, s, (MOIS, nb_symboles))
+    noms_symboles = [str(x) for x in symboles]
+    print(f"[DEBUG] Matrices croisées: {len(trades)} trades, {len(occupees)} cellule(s) occupée(s), {nb_symboles} symbole(s)")
+    return {
+        'trades': int(len(trades)),
+        'heure_jour': _matrice(heure_jour, range(HEURES), JOURS_NOMS),
+        'session_symbole': _matrice(session_symbole, sessions, noms_symboles),
+        'mois_symbole': _matrice(mois_symbole, range(1, MOIS + 1), noms_symboles),
+    }
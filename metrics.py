@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Métriques du service au format texte Prometheus (route /metrics)
+Chaque processus (workers gunicorn, processus du pool d'ingestion) accumule ses
+compteurs en mémoire et les écrit périodiquement dans son propre fichier
+<pid>.json d'un dossier partagé ; l'exposition additionne tous les fichiers, quel
+que soit le worker qui reçoit le scrape.
+
+Les compteurs d'un processus terminé sont reportés dans archive.json (ils restent
+monotones) ; ses jauges sont abandonnées.
+
+L'écriture n'est faite que par le service web (metrics.activer() dans app.py) et ses
+processus d'ingestion, qui héritent de l'activation : la CLI et les outils de test
+(differentiel_moteurs, benchmark_pipeline) comptent en mémoire sans rien écrire.
+
+Variables d'environnement :
+- ANALYZER_METRICS_DIR : dossier partagé (défaut : <tmp>/analyzer_metrics)
+- ANALYZER_METRICS_ACTIF : '1' dans les processus qui écrivent (posée par activer())
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Délai maximal entre une mesure et son écriture dans le fichier du processus
+INTERVALLE_ECRITURE = 2.0
+
+BORNES_LATENCE = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BORNES_ETAPES = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Nom -> (type, aide, bornes des histogrammes)
+METRIQUES = {
+    'analyzer_http_requests_total': ('counter', "Requêtes HTTP par route, méthode et statut", None),
+    'analyzer_http_request_duration_seconds': ('histogram', "Latence des requêtes HTTP par route", BORNES_LATENCE),
+    'analyzer_jobs': ('gauge', "Tâches d'analyse conservées en mémoire, par état", None),
+    'analyzer_jobs_finished_total': ('counter', "Tâches d'analyse terminées, par état", None),
+    'analyzer_job_queue_depth': ('gauge', "Fichiers soumis au pool d'ingestion et pas encore analysés", None),
+    'analyzer_stage_duration_seconds': ('histogram', "Durée des étapes du pipeline", BORNES_ETAPES),
+    'analyzer_stage_rows_total': ('counter', "Lignes produites par étape", None),
+    'analyzer_rows_processed_total': ('counter', "Lignes de deals produites par les analyses", None),
+    'analyzer_processing_seconds_total': ('counter', "Durée cumulée des analyses", None),
+    'analyzer_rows_per_second': ('gauge', "Débit moyen des analyses (lignes par seconde)", None),
+    'analyzer_cache_requests_total': ('counter', "Accès aux caches, par résultat (hit / miss)", None),
+    'analyzer_cache_hit_ratio': ('gauge', "Taux de succès des caches", None),
+    'analyzer_task_memory_bytes': ('gauge', "Mémoire des DataFrames conservés pour les tâches", None),
+    'analyzer_process_resident_memory_bytes': ('gauge', "Mémoire résidente cumulée des processus", None),
+    'analyzer_reports_disk_bytes': ('gauge', "Espace disque occupé par le dossier des rapports", None),
+    'analyzer_reports_files': ('gauge', "Nombre de fichiers dans le dossier des rapports", None),
+}
+
+
+def activer():
+    """Active l'écriture des métriques dans ce processus et ceux qu'il lance (spawn, fork)"""
+    os.environ['ANALYZER_METRICS_ACTIF'] = '1'
+
+
+def est_actif():
+    return os.environ.get('ANALYZER_METRICS_ACTIF') == '1'
+
+
+def dossier_metriques():
+    return os.environ.get('ANALYZER_METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'analyzer_metrics')
+
+
+def _cle_labels(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def _ecrire_json(chemin, contenu):
+    fd, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(contenu, f)
+        os.replace(temporaire, chemin)
+    except Exception:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def _memoire_residente():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+class _Registre:
+    """Mesures du processus courant + écriture périodique dans <pid>.json"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._jauges = []
+        self._reinitialiser()
+
+    def _reinitialiser(self):
+        self.compteurs = {}
+        self.histogrammes = {}
+        self._pid = os.getpid()
+        self._jeton = uuid.uuid4().hex
+        self._premiere_ecriture = True
+        self._thread = None
+
+    def _verifier_processus(self):
+        # Processus forké (gunicorn --preload) : repartir d'un registre vierge
+        if self._pid != os.getpid():
+            self._reinitialiser()
+        if self._thread is None and est_actif():
+            self._thread = threading.Thread(target=self._boucle_ecriture, name='metrics', daemon=True)
+            self._thread.start()
+
+    def incrementer(self, nom, valeur=1.0, labels=None):
+        cle = (nom, _cle_labels(labels or {}))
+        with self._lock:
+            self._verifier_processus()
+            self.compteurs[cle] = self.compteurs.get(cle, 0.0) + valeur
+
+    def observer(self, nom, valeur, labels=None):
+        bornes = METRIQUES[nom][2]
+        cle = (nom, _cle_labels(labels or {}))
+        with self._lock:
+            self._verifier_processus()
+            histo = self.histogrammes.get(cle)
+            if histo is None:
+                # un compteur par borne + '+Inf', puis somme et nombre d'observations
+                histo = self.histogrammes[cle] = [0] * (len(bornes) + 1) + [0.0, 0]
+            for i, borne in enumerate(bornes):
+                if valeur <= borne:
+                    histo[i] += 1
+                    break
+            else:
+                histo[len(bornes)] += 1
+            histo[-2] += valeur
+            histo[-1] += 1
+
+    def enregistrer_jauge(self, fonction):
+        """fonction() -> itérable de (nom, labels, valeur), évaluée à chaque écriture"""
+        with self._lock:
+            self._jauges.append(fonction)
+            self._verifier_processus()
+
+    def _valeurs_jauges(self):
+        jauges = []
+        memoire = _memoire_residente()
+        if memoire is not None:
+            jauges.append(['analyzer_process_resident_memory_bytes', [], memoire])
+        for fonction in list(self._jauges):
+            try:
+                for nom, labels, valeur in fonction():
+                    jauges.append([nom, list(_cle_labels(labels)), valeur])
+            except Exception as e:
+                print(f"[WARNING] Jauge de métriques en échec: {str(e)}")
+        return jauges
+
+    def ecrire(self):
+        """Écrit l'état du processus dans son fichier (atomique)"""
+        with self._lock:
+            self._verifier_processus()
+            contenu = {
+                'pid': self._pid,
+                'jeton': self._jeton,
+                'compteurs': [[nom, list(labels), valeur] for (nom, labels), valeur in self.compteurs.items()],
+                'histogrammes': [[nom, list(labels), list(h)] for (nom, labels), h in self.histogrammes.items()],
+            }
+            premiere = self._premiere_ecriture
+            self._premiere_ecriture = False
+        contenu['jauges'] = self._valeurs_jauges()
+        dossier = dossier_metriques()
+        os.makedirs(dossier, exist_ok=True)
+        chemin = os.path.join(dossier, f"{contenu['pid']}.json")
+        if premiere and os.path.exists(chemin):
+            # Fichier laissé par un ancien processus de même PID : ses compteurs sont archivés
+            _archiver(dossier, chemin, jeton_actif=contenu['jeton'])
+        _ecrire_json(chemin, contenu)
+
+    def _boucle_ecriture(self):
+        while True:
+            time.sleep(INTERVALLE_ECRITURE)
+            if self._pid != os.getpid():
+                return
+            try:
+                # Les jauges évoluent sans mesure : écriture même sans modification
+                self.ecrire()
+            except Exception as e:
+                print(f"[WARNING] Écriture des métriques impossible: {str(e)}")
+
+
+_registre = _Registre()
+
+
+def incrementer(nom, valeur=1.0, **labels):
+    _registre.incrementer(nom, valeur, labels)
+
+
+def observer(nom, valeur, **labels):
+    _registre.observer(nom, valeur, labels)
+
+
+def enregistrer_jauge(fonction):
+    _registre.enregistrer_jauge(fonction)
+
+
+def compter_cache(cache, succes):
+    """Accès à un cache (fichiers, filtres, broker...)"""
+    _registre.incrementer('analyzer_cache_requests_total', 1, {'cache': cache, 'result': 'hit' if succes else 'miss'})
+
+
+def observer_requete(route, methode, statut, duree):
+    _registre.incrementer('analyzer_http_requests_total', 1, {'route': route, 'method': methode, 'status': statut})
+    _registre.observer('analyzer_http_request_duration_seconds', duree, {'route': route, 'method': methode})
+
+
+def observer_tache(etat, etapes, lignes, duree):
+    """Fin d'une tâche d'analyse : état, mesures par étape (profiling.ProfilEtapes.etapes), débit"""
+    _registre.incrementer('analyzer_jobs_finished_total', 1, {'state': etat})
+    for enregistrement in etapes or []:
+        _registre.observer('analyzer_stage_duration_seconds', enregistrement['duree_s'], {'stage': enregistrement['etape']})
+        if enregistrement.get('lignes_sortie'):
+            _registre.incrementer('analyzer_stage_rows_total', enregistrement['lignes_sortie'], {'stage': enregistrement['etape']})
+    if lignes:
+        _registre.incrementer('analyzer_rows_processed_total', lignes)
+        _registre.incrementer('analyzer_processing_seconds_total', duree)
+
+
+def taille_dossier(chemin):
+    """(octets, fichiers) d'un dossier, récursivement"""
+    octets, fichiers = 0, 0
+    for racine, _, noms in os.walk(chemin):
+        for nom in noms:
+            try:
+                octets += os.path.getsize(os.path.join(racine, nom))
+                fichiers += 1
+            except OSError:
+                pass
+    return octets, fichiers
+
+
+# ----------------------------------------------------------------------
+# Agrégation des fichiers de tous les processus
+
+def _processus_vivant(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) termine le processus sous Windows : pas de vérification
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _lire(chemin):
+    try:
+        with open(chemin, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _cumuler(compteurs, histogrammes, contenu):
+    for nom, labels, valeur in contenu.get('compteurs', []):
+        cle = (nom, tuple(tuple(l) for l in labels))
+        compteurs[cle] = compteurs.get(cle, 0.0) + valeur
+    for nom, labels, valeurs in contenu.get('histogrammes', []):
+        cle = (nom, tuple(tuple(l) for l in labels))
+        existant = histogrammes.get(cle)
+        histogrammes[cle] = list(valeurs) if existant is None else [a + b for a, b in zip(existant, valeurs)]
+
+
+def _archiver(dossier, chemin, jeton_actif=None):
+    """Reporte les compteurs d'un processus terminé dans archive.json puis supprime son fichier"""
+    if fcntl is None:
+        return
+    with open(os.path.join(dossier, 'archive.lock'), 'a') as verrou:
+        fcntl.flock(verrou, fcntl.LOCK_EX)
+        contenu = _lire(chemin)
+        # Relu sous verrou : un autre worker a pu l'archiver entre-temps
+        if contenu is None or (jeton_actif is not None and contenu.get('jeton') == jeton_actif):
+            return
+        compteurs, histogrammes = {}, {}
+        archive_chemin = os.path.join(dossier, 'archive.json')
+        _cumuler(compteurs, histogrammes, _lire(archive_chemin) or {})
+        _cumuler(compteurs, histogrammes, contenu)
+        _ecrire_json(archive_chemin, {
+            'compteurs': [[nom, list(labels), valeur] for (nom, labels), valeur in compteurs.items()],
+            'histogrammes': [[nom, list(labels), h] for (nom, labels), h in histogrammes.items()],
+        })
+        os.remove(chemin)
+
+
+def collecter():
+    """
+    Additionne les mesures de tous les processus.
+
+    Returns:
+        (compteurs, histogrammes, jauges) indexés par (nom, labels)
+    """
+    _registre.ecrire()
+    dossier = dossier_metriques()
+    compteurs, histogrammes, jauges = {}, {}, {}
+    for nom_fichier in sorted(os.listdir(dossier)):
+        if not nom_fichier.endswith('.json') or nom_fichier == 'archive.json':
+            continue
+        chemin = os.path.join(dossier, nom_fichier)
+        contenu = _lire(chemin)
+        if contenu is None:
+            continue
+        pid = contenu.get('pid')
+        if pid is not None and not _processus_vivant(pid):
+            try:
+                _archiver(dossier, chemin)
+            except OSError as e:
+                print(f"[WARNING] Archivage des métriques de {pid} impossible: {str(e)}")
+            if not os.path.exists(chemin):
+                # Compteurs désormais dans archive.json, lu en dernier
+                continue
+            contenu['jauges'] = []
+        _cumuler(compteurs, histogrammes, contenu)
+        for nom, labels, valeur in contenu.get('jauges', []):
+            cle = (nom, tuple(tuple(l) for l in labels))
+            jauges[cle] = jauges.get(cle, 0.0) + valeur
+    _cumuler(compteurs, histogrammes, _lire(os.path.join(dossier, 'archive.json')) or {})
+    return compteurs, histogrammes, jauges
+
+
+def _echapper(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_texte(labels, supplementaires=()):
+    paires = list(labels) + list(supplementaires)
+    if not paires:
+        return ''
+    return '{' + ','.join(f'{k}="{_echapper(v)}"' for k, v in paires) + '}'
+
+
+def _nombre(valeur):
+    if isinstance(valeur, float) and valeur.is_integer():
+        return str(int(valeur))
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+def exposition(jauges_supplementaires=()):
+    """
+    Texte Prometheus (format 0.0.4) de toutes les métriques.
+
+    Args:
+        jauges_supplementaires: (nom, labels, valeur) calculées au moment du scrape
+                                (état partagé comme l'occupation disque)
+    """
+    compteurs, histogrammes, jauges = collecter()
+    for nom, labels, valeur in jauges_supplementaires:
+        jauges[(nom, _cle_labels(labels))] = valeur
+
+    # Ratios dérivés des compteurs agrégés
+    acces = {}
+    for (nom, labels), valeur in compteurs.items():
+        if nom == 'analyzer_cache_requests_total':
+            etiquettes = dict(labels)
+            cumul = acces.setdefault(etiquettes['cache'], [0.0, 0.0])
+            cumul[0 if etiquettes['result'] == 'hit' else 1] += valeur
+    for cache, (succes, echecs) in acces.items():
+        if succes + echecs > 0:
+            jauges[('analyzer_cache_hit_ratio', (('cache', cache),))] = round(succes / (succes + echecs), 4)
+    secondes = compteurs.get(('analyzer_processing_seconds_total', ()), 0.0)
+    if secondes > 0:
+        lignes = compteurs.get(('analyzer_rows_processed_total', ()), 0.0)
+        jauges[('analyzer_rows_per_second', ())] = round(lignes / secondes, 2)
+
+    series = {}
+    for (nom, labels), valeur in list(compteurs.items()) + list(jauges.items()):
+        series.setdefault(nom, []).append(f"{nom}{_labels_texte(labels)} {_nombre(valeur)}")
+    for (nom, labels), valeurs in histogrammes.items():
+        bornes = METRIQUES[nom][2]
+        lignes_histo = series.setdefault(nom, [])
+        cumul = 0
+        for borne, compte in zip(list(bornes) + ['+Inf'], valeurs):
+            cumul += compte
+            le = borne if borne == '+Inf' else _nombre(float(borne))
+            lignes_histo.append(f"{nom}_bucket{_labels_texte(labels, [('le', le)])} {cumul}")
+        lignes_histo.append(f"{nom}_sum{_labels_texte(labels)} {_nombre(valeurs[-2])}")
+        lignes_histo.append(f"{nom}_count{_labels_texte(labels)} {valeurs[-1]}")
+
+    sortie = []
+    for nom in sorted(series):
+        type_metrique, aide, _ = METRIQUES.get(nom, ('untyped', nom, None))
+        sortie.append(f"# HELP {nom} {aide}")
+        sortie.append(f"# TYPE {nom} {type_metrique}")
+        sortie.extend(sorted(series[nom]))
+    return '\n'.join(sortie) + '\n'
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Métriques glissantes sur le registre des trades (fenêtres de N trades et de N jours ouvrés)
+calculer_statistiques_avancees ne donne que des valeurs sur toute la période ; ici chaque
+mesure est suivie dans le temps :
+- par fenêtre de N trades : taux de réussite, facteur de profit, espérance, drawdown max
+- par fenêtre de N jours ouvrés : les mêmes mesures sur les trades clôturés dans la fenêtre,
+  plus Sharpe / Sortino annualisés des rendements quotidiens du solde
+
+Les sommes de fenêtre viennent de sommes cumulées (cumul[i] - cumul[i - N]) et les
+bornes des fenêtres de jours d'un searchsorted sur les dates de clôture : aucune boucle
+par trade. Le drawdown max d'une fenêtre est calculé sur une vue glissante du solde, par
+blocs de taille bornée.
+
+Toutes les fenêtres d'une famille partagent le même axe de dates (séries « cube ») :
+le tableau de bord change de fenêtre sans recalcul.
+
+Usage:
+    resultat = calculer_metriques_glissantes(df_final, solde_initial=10000)
+    resultat['trades']['series']['50']['taux_reussite']
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from deal_schema import COLONNE_DATE
+
+FENETRES_TRADES_DEFAUT = (20, 50, 100)
+# ~ 1, 3 et 6 mois de bourse
+FENETRES_JOURS_DEFAUT = (21, 63, 126)
+FENETRES_MAX = 8
+JOURS_OUVRES_PAR_AN = 252
+POINTS_SERIE_MAX = 2000
+# Nombre maximal de valeurs (points × largeur de fenêtre) de la vue glissante traitée en une fois
+ELEMENTS_MAX_BLOC = 5_000_000
+MESURES_TRADES = ('taux_reussite', 'facteur_profit', 'esperance', 'drawdown_max_pct')
+MESURES_JOURS = MESURES_TRADES + ('sharpe', 'sortino')
+
+
+def valider_fenetres(fenetres):
+    """Fenêtres entières > 1, sans doublon, triées ; ValueError sinon"""
+    try:
+        fenetres = sorted({int(f) for f in fenetres})
+    except (TypeError, ValueError):
+        raise ValueError("Les fenêtres doivent être des entiers")
+    if not fenetres:
+        raise ValueError("Au moins une fenêtre est nécessaire")
+    if fenetres[0] < 2:
+        raise ValueError("Une fenêtre couvre au moins 2 trades / jours")
+    if len(fenetres) > FENETRES_MAX:
+        raise ValueError(f"Trop de fenêtres ({len(fenetres)}, max {FENETRES_MAX})")
+    return fenetres
+
+
+def registre_trades(df):
+    """
+    Un trade par Cle_Match (les lignes sans clé comptent chacune pour un trade), dans l'ordre
+    de clôture du DataFrame final : date et solde de la dernière ligne, profit du trade.
+    """
+    if len(df) == 0:
+        return pd.DataFrame({'cloture': pd.Series(dtype='datetime64[ns]'), 'profit': pd.Series(dtype='float64'),
+                             'solde': pd.Series(dtype='float64')})
+    cles = df["Cle_Match"].astype(object).to_numpy() if "Cle_Match" in df.columns else np.full(len(df), None, dtype=object)
+    codes, _ = pd.factorize(cles, use_na_sentinel=True)
+    sans_cle = codes < 0
+    codes[sans_cle] = codes.max(initial=-1) + 1 + np.arange(int(sans_cle.sum()))
+    profits = np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0)
+    trades = pd.DataFrame({'trade': codes, 'profit': profits, 'position': np.arange(len(df))}) \
+        .groupby('trade').agg(profit=('profit', 'sum'), position=('position', 'max')).sort_values('position')
+    positions = trades['position'].to_numpy()
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce').ffill().bfill()
+    return pd.DataFrame({
+        'cloture': dates.to_numpy(dtype='datetime64[ns]')[positions],
+        'profit': trades['profit'].to_numpy(dtype='float64'),
+        'solde': df["Solde_cumule"].to_numpy(dtype='float64')[positions],
+    })
+
+
+def _cumul(valeurs):
+    """Somme cumulée précédée de 0 : somme de ]i, j] = cumul[j] - cumul[i]"""
+    return np.concatenate([[0.0], np.cumsum(valeurs, dtype='float64')])
+
+
+def _ratio(numerateur, denominateur, facteur=1.0):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominateur > 0, numerateur / denominateur * facteur, np.nan)
+
+
+def _mesures_fenetres(cumuls, debuts, fins):
+    """Taux de réussite, facteur de profit et espérance des trades d'indices ]debut, fin]"""
+    gagnants, perdants, gains, pertes, profits = (c[fins] - c[debuts] for c in cumuls)
+    nombre = (fins - debuts).astype('float64')
+    return {
+        'taux_reussite': _ratio(gagnants, gagnants + perdants, 100.0),
+        'facteur_profit': _ratio(gains, pertes),
+        'esperance': _ratio(profits, nombre),
+    }
+
+
+def _cumuls_trades(profits):
+    return (_cumul(profits > 0), _cumul(profits < 0), _cumul(np.maximum(profits, 0.0)),
+            _cumul(np.maximum(-profits, 0.0)), _cumul(profits))
+
+
+def drawdown_max_glissant(soldes, largeur):
+    """
+    Drawdown max (%) de chaque fenêtre de `largeur` points se terminant au point i
+    (NaN tant que la fenêtre n'est pas complète).
+    """
+    soldes = np.asarray(soldes, dtype='float64')
+    resultat = np.full(len(soldes), np.nan)
+    if largeur > len(soldes):
+        return resultat
+    vues = sliding_window_view(soldes, largeur)
+    taille_bloc = max(1, ELEMENTS_MAX_BLOC // largeur)
+    for debut in range(0, len(vues), taille_bloc):
+        bloc = vues[debut:debut + taille_bloc]
+        sommets = np.maximum.accumulate(bloc, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdowns = np.where(sommets > 0, (sommets - bloc) / sommets * 100, 0.0)
+        resultat[largeur - 1 + debut:largeur - 1 + debut + len(bloc)] = drawdowns.max(axis=1)
+    return resultat
+
+
+def glissant_trades(trades, solde_initial, fenetre):
+    """Mesures de chaque fenêtre des `fenetre` derniers trades (une valeur par trade)"""
+    nombre = len(trades)
+    fins = np.arange(1, nombre + 1)
+    debuts = fins - fenetre
+    completes = debuts >= 0
+    mesures = _mesures_fenetres(_cumuls_trades(trades['profit'].to_numpy(dtype='float64')),
+                                np.maximum(debuts, 0), fins)
+    # Le solde avant le premier trade de la fenêtre compte comme point de départ du drawdown
+    soldes = np.concatenate([[float(solde_initial)], trades['solde'].to_numpy(dtype='float64')])
+    mesures['drawdown_max_pct'] = drawdown_max_glissant(soldes, fenetre + 1)[1:]
+    return {cle: np.where(completes, valeurs, np.nan) for cle, valeurs in mesures.items()}
+
+
+def soldes_quotidiens(trades, solde_initial):
+    """
+    Solde en fin de jour ouvré, du premier au dernier jour de clôture (les clôtures du week-end
+    comptent dans le jour ouvré suivant).
+
+    Returns:
+        (jours, soldes, fins) : DatetimeIndex, solde de fin de jour, nombre de trades clôturés à la fin du jour
+    """
+    if len(trades) == 0:
+        return pd.DatetimeIndex([]), np.empty(0), np.empty(0, dtype='int64')
+    clotures = trades['cloture'].to_numpy(dtype='datetime64[ns]')
+    premier, dernier = pd.Timestamp(clotures[0]).normalize(), pd.Timestamp(clotures[-1]).normalize()
+    jours = pd.bdate_range(premier, pd.offsets.BDay().rollforward(dernier))
+    fin_jours = (jours + pd.Timedelta(days=1)).to_numpy(dtype='datetime64[ns]')
+    fins = np.searchsorted(clotures, fin_jours, side='left')
+    soldes = np.concatenate([[float(solde_initial)], trades['solde'].to_numpy(dtype='float64')])[fins]
+    return jours, soldes, fins
+
+
+def glissant_jours(trades, solde_initial, jours, soldes, fins, fenetre):
+    """Mesures de chaque fenêtre des `fenetre` derniers jours ouvrés (une valeur par jour)"""
+    nombre = len(jours)
+    indices = np.arange(nombre)
+    completes = indices >= fenetre - 1
+    # Trades clôturés dans la fenêtre : de la fin du jour précédant la fenêtre à la fin du jour courant
+    fins_avant = np.concatenate([[0], fins])[np.maximum(indices - fenetre + 1, 0)]
+    mesures = _mesures_fenetres(_cumuls_trades(trades['profit'].to_numpy(dtype='float64')), fins_avant, fins)
+
+    # Rendements quotidiens du solde (le premier jour part du solde initial)
+    precedents = np.concatenate([[float(solde_initial)], soldes[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rendements = np.where(precedents > 0, soldes / precedents - 1.0, 0.0)
+    debuts = np.maximum(indices - fenetre + 1, 0)
+    taille = (indices - debuts + 1).astype('float64')
+    cumul, cumul_carres = _cumul(rendements), _cumul(rendements ** 2)
+    cumul_baisses = _cumul(np.minimum(rendements, 0.0) ** 2)
+    moyenne = (cumul[indices + 1] - cumul[debuts]) / taille
+    with np.errstate(divide='ignore', invalid='ignore'):
+        variance = ((cumul_carres[indices + 1] - cumul_carres[debuts]) - taille * moyenne ** 2) / (taille - 1)
+        ecart_type = np.sqrt(np.maximum(variance, 0.0))
+        ecart_baisses = np.sqrt((cumul_baisses[indices + 1] - cumul_baisses[debuts]) / taille)
+    annualisation = np.sqrt(JOURS_OUVRES_PAR_AN)
+    mesures['sharpe'] = _ratio(moyenne, ecart_type, annualisation)
+    mesures['sortino'] = _ratio(moyenne, ecart_baisses, annualisation)
+    mesures['drawdown_max_pct'] = drawdown_max_glissant(np.concatenate([[float(solde_initial)], soldes]), fenetre + 1)[1:]
+    return {cle: np.where(completes, valeurs, np.nan) for cle, valeurs in mesures.items()}
+
+
+def _liste(valeurs, indices, decimales):
+    """Valeurs aux indices retenus, NaN / infini -> None (JSON)"""
+    extraites = np.round(np.asarray(valeurs, dtype='float64')[indices], decimales)
+    return [None if not np.isfinite(v) else float(v) for v in extraites.tolist()]
+
+
+def _indices_echantillon(nombre, points_max):
+    """Indices conservés pour l'affichage (pas régulier, dernier point inclus)"""
+    if not points_max or nombre <= points_max:
+        return np.arange(nombre)
+    pas = int(np.ceil(nombre / points_max))
+    return np.unique(np.concatenate([np.arange(0, nombre, pas), [nombre - 1]]))
+
+
+def calculer_metriques_glissantes(df, solde_initial=10000, fenetres_trades=FENETRES_TRADES_DEFAUT,
+                                  fenetres_jours=FENETRES_JOURS_DEFAUT, points_max=POINTS_SERIE_MAX):
+    """
+    Métriques glissantes d'un DataFrame final (sortie de fusionner_et_calculer_cumuls).
+
+    Args:
+        fenetres_trades: tailles de fenêtre en nombre de trades
+        fenetres_jours: tailles de fenêtre en jours ouvrés
+        points_max: nombre maximal de points par série (mêmes points pour toutes les fenêtres)
+
+    Returns:
+        dict {'trades': {...}, 'jours': {...}} ; chaque famille contient 'fenetres', 'dates',
+        'solde' et 'series' (fenêtre -> mesure -> liste alignée sur 'dates', None hors fenêtre complète)
+    """
+    fenetres_trades = valider_fenetres(fenetres_trades)
+    fenetres_jours = valider_fenetres(fenetres_jours)
+    trades = registre_trades(df)
+
+    indices = _indices_echantillon(len(trades), points_max)
+    resultat_trades = {
+        'fenetres': fenetres_trades,
+        'dates': [pd.Timestamp(d).isoformat() for d in trades['cloture'].to_numpy()[indices]],
+        'solde': _liste(trades['solde'], indices, 2),
+        'series': {},
+    }
+    for fenetre in fenetres_trades:
+        mesures = glissant_trades(trades, solde_initial, fenetre)
+        resultat_trades['series'][str(fenetre)] = {cle: _liste(mesures[cle], indices, 3) for cle in MESURES_TRADES}
+
+    jours, soldes, fins = soldes_quotidiens(trades, solde_initial)
+    indices = _indices_echantillon(len(jours), points_max)
+    resultat_jours = {
+        'fenetres': fenetres_jours,
+        'dates': [d.date().isoformat() for d in jours[indices]],
+        'solde': _liste(soldes, indices, 2),
+        'series': {},
+    }
+    for fenetre in fenetres_jours:
+        mesures = glissant_jours(trades, solde_initial, jours, soldes, fins, fenetre)
+        resultat_jours['series'][str(fenetre)] = {cle: _liste(mesures[cle], indices, 3) for cle in MESURES_JOURS}
+
+    print(f"[DEBUG] Métriques glissantes: {len(trades)} trades, {len(jours)} jours ouvrés, "
+          f"fenêtres {fenetres_trades} trades / {fenetres_jours} jours")
+    return {'trades': resultat_trades, 'jours': resultat_jours}
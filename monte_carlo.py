@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Simulation Monte Carlo de l'ordre des trades (risque de drawdown)
+Le rapport ne montre qu'un drawdown maximum historique ; pour dimensionner une position,
+on rejoue la série des trades dans d'autres ordres :
+- 'permutation' : mêmes trades mélangés (solde final identique, seul le chemin change)
+- 'bootstrap' : trades tirés avec remise (le solde final varie aussi)
+
+Chaque trade (lignes de même Cle_Match) est réduit à son facteur de croissance du solde,
+produit des facteurs des lignes dans la récurrence composée de fusionner_et_calculer_cumuls
+(1 + profit × solde_initial / reference²). Les chemins sont une matrice NumPy
+(chemins × trades) générée par blocs de taille bornée ; chaque bloc a son propre générateur
+dérivé de la graine (SeedSequence.spawn) : mêmes résultats quel que soit le nombre de
+processus.
+
+Usage:
+    resultat = simuler_analyse(df_final, solde_initial=10000, nb_chemins=5000, graine=42, jobs=4)
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+METHODES = ('bootstrap', 'permutation')
+# Description d'une méthode dans le rapport
+DESCRIPTIONS_METHODES = {'bootstrap': "trades tirés avec remise", 'permutation': "trades mélangés, sans remise"}
+NB_CHEMINS_DEFAUT = 5000
+GRAINE_DEFAUT = 42
+SEUIL_RUINE_PCT_DEFAUT = 50.0
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+# Nombre maximal de valeurs (chemins × trades) générées en une fois
+ELEMENTS_MAX_BLOC = 2_000_000
+
+
+def facteurs_trades(df, solde_initial, solde_initial_reference=10000):
+    """
+    Facteur de croissance du solde de chaque trade, dans l'ordre de clôture (dernière ligne).
+    Les lignes sans Cle_Match comptent comme des trades d'une ligne, pour que le produit
+    de tous les facteurs redonne le solde final historique.
+    """
+    if len(df) == 0:
+        return np.empty(0, dtype='float64')
+    profits = np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0)
+    if solde_initial_reference > 0:
+        facteurs = 1.0 + profits * (solde_initial / solde_initial_reference ** 2)
+    else:
+        facteurs = 1.0 + profits / solde_initial
+    # Solde nul ou négatif : le compte est ruiné, le facteur est borné à 0
+    facteurs = np.maximum(facteurs, 0.0)
+
+    cles = df["Cle_Match"].astype(object).to_numpy() if "Cle_Match" in df.columns else np.full(len(df), None, dtype=object)
+    codes, _ = pd.factorize(cles, use_na_sentinel=True)
+    sans_cle = codes < 0
+    codes[sans_cle] = codes.max(initial=-1) + 1 + np.arange(int(sans_cle.sum()))
+    trades = pd.DataFrame({'trade': codes, 'facteur': facteurs, 'position': np.arange(len(df))}) \
+        .groupby('trade').agg(facteur=('facteur', 'prod'), cloture=('position', 'max'))
+    return trades.sort_values('cloture')['facteur'].to_numpy(dtype='float64')
+
+
+def mesures_chemins(facteurs, seuil_ruine_pct=SEUIL_RUINE_PCT_DEFAUT):
+    """
+    Mesures de chaque chemin (ligne de la matrice des facteurs, solde initial = 1).
+
+    Returns:
+        (drawdown_max_pct, rendement_pct, ruine) : tableaux d'une valeur par chemin
+    """
+    soldes = np.cumprod(facteurs, axis=1)
+    sommets = np.maximum(np.maximum.accumulate(soldes, axis=1), 1.0)
+    drawdown_max = ((sommets - soldes) / sommets).max(axis=1, initial=0.0) * 100
+    rendement = (soldes[:, -1] - 1.0) * 100 if soldes.shape[1] else np.zeros(len(soldes))
+    ruine = soldes.min(axis=1, initial=1.0) <= 1.0 - seuil_ruine_pct / 100.0
+    return drawdown_max, rendement, ruine
+
+
+def _simuler_bloc(facteurs, methode, nb_chemins, graine, seuil_ruine_pct):
+    """Un bloc de chemins (exécuté dans le processus courant ou dans un worker du pool)"""
+    rng = np.random.default_rng(graine)
+    if methode == 'permutation':
+        chemins = rng.permuted(np.broadcast_to(facteurs, (nb_chemins, len(facteurs))), axis=1)
+    else:
+        chemins = facteurs[rng.integers(0, len(facteurs), size=(nb_chemins, len(facteurs)))]
+    return mesures_chemins(chemins, seuil_ruine_pct)
+
+
+def _distribution(valeurs):
+    return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(valeurs, PERCENTILES))}
+
+
+def simuler(facteurs, nb_chemins=NB_CHEMINS_DEFAUT, methode='bootstrap', graine=GRAINE_DEFAUT,
+            seuil_ruine_pct=SEUIL_RUINE_PCT_DEFAUT, jobs=1):
+    """
+    Simule nb_chemins ordres de trades.
+
+    Args:
+        facteurs: facteurs de croissance par trade (facteurs_trades)
+        methode: 'bootstrap' (tirage avec remise) ou 'permutation' (mélange)
+        graine: graine du générateur (None : aléatoire, la graine tirée est renvoyée pour rejouer)
+        seuil_ruine_pct: perte (en % du solde initial) considérée comme une ruine
+        jobs: processus pour les blocs (1 : dans le processus courant)
+
+    Returns:
+        dict : percentiles du drawdown max et du rendement, probabilité de ruine, historique
+    """
+    if methode not in METHODES:
+        raise ValueError(f"Méthode inconnue: {methode} (attendu: {', '.join(METHODES)})")
+    nb_chemins = int(nb_chemins)
+    if nb_chemins <= 0:
+        raise ValueError("Le nombre de chemins doit être strictement positif")
+    if not 0 < float(seuil_ruine_pct) <= 100:
+        raise ValueError("Le seuil de ruine doit être compris entre 0 et 100 %")
+    facteurs = np.asarray(facteurs, dtype='float64')
+    if len(facteurs) == 0:
+        raise ValueError("Aucun trade à simuler")
+
+    sequence = np.random.SeedSequence(graine)
+    taille_bloc = max(1, ELEMENTS_MAX_BLOC // len(facteurs))
+    tailles = [min(taille_bloc, nb_chemins - debut) for debut in range(0, nb_chemins, taille_bloc)]
+    graines = sequence.spawn(len(tailles))
+    arguments = [(facteurs, methode, taille, graine_bloc, seuil_ruine_pct) for taille, graine_bloc in zip(tailles, graines)]
+
+    if jobs > 1 and len(tailles) > 1:
+        # 'spawn' comme le pool d'ingestion (serveur multi-threadé)
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tailles)), mp_context=multiprocessing.get_context('spawn')) as pool:
+            blocs = list(pool.map(_simuler_bloc, *zip(*arguments)))
+    else:
+        blocs = [_simuler_bloc(*args) for args in arguments]
+    drawdowns = np.concatenate([b[0] for b in blocs])
+    rendements = np.concatenate([b[1] for b in blocs])
+    ruines = np.concatenate([b[2] for b in blocs])
+
+    historique = mesures_chemins(facteurs[None, :], seuil_ruine_pct)
+    print(f"[DEBUG] Monte Carlo ({methode}): {nb_chemins} chemins × {len(facteurs)} trades en {len(tailles)} bloc(s)")
+    return {
+        'methode': methode,
+        'nb_chemins': nb_chemins,
+        'nb_trades': int(len(facteurs)),
+        'graine': sequence.entropy,
+        'seuil_ruine_pct': float(seuil_ruine_pct),
+        'drawdown_max_pct': _distribution(drawdowns),
+        'rendement_pct': _distribution(rendements),
+        'rendement_moyen_pct': round(float(rendements.mean()), 2),
+        'probabilite_ruine_pct': round(float(ruines.mean() * 100), 2),
+        'historique': {
+            'drawdown_max_pct': round(float(historique[0][0]), 2),
+            'rendement_pct': round(float(historique[1][0]), 2),
+        },
+    }
+
+
+def simuler_analyse(df, solde_initial=10000, solde_initial_reference=10000, **options):
+    """Monte Carlo sur le DataFrame final d'une analyse (options : voir simuler)"""
+    return simuler(facteurs_trades(df, solde_initial, solde_initial_reference), **options)
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Moteur rapide du pipeline d'analyse (matching, recalcul des profits/pips, cumuls)
+Reproduit à l'identique les résultats du moteur historique ligne à ligne
+(apply_matching_logic, recalculer_profit_manuel, calculer_pips_ou_points,
+fusionner_et_calculer_cumuls), y compris ses particularités :
+- un OUT déjà attribué peut être repris par un IN suivant du même symbole
+  (la dernière attribution l'emporte) ;
+- repli 1:1 sur le premier OUT de volume proche, puis rattachement d'urgence
+  au IN le plus proche en numéro d'ordre ;
+- volume illisible dans le fichier : profits et pips recalculés abandonnés ;
+- clé IN en double : profit non recalculé, pips estimés depuis le profit.
+
+Les cas que ce moteur ne sait pas reproduire exactement (numéros d'ordre non
+numériques, numéros d'OUT en double, colonnes de date de tri) sont délégués au
+moteur historique. Sélection : TradingAnalyzer(engine='fast') ou ANALYZER_ENGINE=fast.
+"""
+
+import os
+import math
+
+import numpy as np
+import pandas as pd
+
+MOTEURS = ('legacy', 'fast')
+TOLERANCE_VOLUME = 0.02
+
+def moteur_par_defaut():
+    """Moteur choisi par la variable ANALYZER_ENGINE ('legacy' par défaut)"""
+    valeur = os.environ.get('ANALYZER_ENGINE', 'legacy').strip().lower() or 'legacy'
+    if valeur not in MOTEURS:
+        print(f"[WARNING] ANALYZER_ENGINE invalide: {valeur} (legacy utilisé)")
+        return 'legacy'
+    return valeur
+
+
+def _decimales(x):
+    try:
+        s = f"{float(x):.10f}".rstrip("0").rstrip(".")
+        return len(s.split(".")[1]) if "." in s else 0
+    except Exception:
+        return 0
+
+
+def _arrondir(valeurs, masque):
+    """round(x, 2) Python (arrondi exact, différent de np.round) sur les positions du masque, NaN ailleurs"""
+    resultat = np.full(len(valeurs), np.nan)
+    positions = np.flatnonzero(masque)
+    resultat[positions] = [round(v, 2) for v in valeurs[positions].tolist()]
+    return resultat
+
+
+def _ordres_numeriques(serie):
+    ordres = pd.to_numeric(serie, errors='coerce')
+    if ordres.isna().any():
+        return None
+    return ordres.to_numpy(dtype='float64')
+
+
+# ----------------------------------------------------------------------
+# Matching IN / OUT
+# ----------------------------------------------------------------------
+def apparier(analyzer, fusion_df):
+    """
+    Équivalent de apply_matching_logic : renseigne Cle_Match en place.
+
+    Returns:
+        True si le moteur rapide a été utilisé, False s'il a délégué au moteur historique
+    """
+    colonnes_tri = [c for c in ("Date_ordre", "Date_transaction") if c in fusion_df.columns]
+    ordres = _ordres_numeriques(fusion_df["Ordre_ordre"])
+    if colonnes_tri or ordres is None or "Fichier_Source" not in fusion_df.columns:
+        print("[DEBUG] Matching rapide non applicable, moteur historique utilisé")
+        analyzer.apply_matching_logic(fusion_df)
+        return False
+
+    direction = fusion_df["Direction"]
+    est_in = (direction == "in").to_numpy(dtype=bool)
+    est_out = (direction == "out").to_numpy(dtype=bool)
+    fichiers = fusion_df["Fichier_Source"].to_numpy(dtype=object)
+    symboles = fusion_df["Symbole_ordre"].to_numpy(dtype=object)
+    volumes = fusion_df["Volume_execute"].fillna(0.0).to_numpy(dtype='float64')
+
+    # ÉTAPE 1 : clé unique fichier|symbole-ordre pour chaque IN (texte identique au moteur historique)
+    cles = np.full(len(fusion_df), None, dtype=object)
+    positions_in = np.flatnonzero(est_in)
+    cles[positions_in] = [f"{f}|{s}-{o}" for f, s, o in zip(fichiers[positions_in], symboles[positions_in],
+                                                          fusion_df["Ordre_ordre"].to_numpy(dtype=object)[positions_in])]
+
+    groupes = fusion_df.groupby(["Symbole_ordre", "Fichier_Source"], sort=False, observed=True).indices
+    urgences = 0
+    for membres in groupes.values():
+        ins = membres[est_in[membres]]
+        outs = membres[est_out[membres]]
+        if len(outs) == 0:
+            continue
+        # Même numéro d'OUT en double : l'ordre des ex aequo du tri historique n'est pas reproductible
+        if len(np.unique(ordres[outs])) != len(outs):
+            print("[DEBUG] Numéros d'OUT en double, moteur historique utilisé pour le matching")
+            analyzer.apply_matching_logic(fusion_df)
+            return False
+        if len(ins) == 0:
+            continue
+
+        # ÉTAPE 2 : agrégation séquentielle des OUT suivants jusqu'au volume du IN.
+        # Les candidats ne sont pas retirés une fois attribués : un IN suivant peut reprendre un OUT
+        outs = outs[np.argsort(ordres[outs], kind='stable')]
+        ordres_out = ordres[outs]
+        volumes_out = volumes[outs].tolist()
+        for pos_in in ins.tolist():
+            volume_in = volumes[pos_in]
+            premier = int(np.searchsorted(ordres_out, ordres[pos_in], side='right'))
+            cumul = 0.0
+            fin = premier
+            for k in range(premier, len(outs)):
+                cumul += volumes_out[k]
+                fin = k + 1
+                if math.isclose(cumul, volume_in, rel_tol=TOLERANCE_VOLUME, abs_tol=1e-6) or cumul > volume_in:
+                    break
+            if fin == premier:
+                continue
+            if math.isclose(cumul, volume_in, rel_tol=TOLERANCE_VOLUME, abs_tol=1e-6):
+                cles[outs[premier:fin]] = cles[pos_in]
+            else:
+                # Repli 1:1 sur le premier OUT de volume proche
+                for k in range(premier, len(outs)):
+                    if math.isclose(volumes_out[k], volume_in, rel_tol=TOLERANCE_VOLUME, abs_tol=1e-6):
+                        cles[outs[k]] = cles[pos_in]
+                        break
+
+        # ÉTAPE 3 : OUT restants rattachés au IN le plus proche en numéro d'ordre (premier en cas d'égalité)
+        for pos_out in outs[pd.isna(cles[outs])].tolist():
+            cles[pos_out] = cles[ins[int(np.argmin(np.abs(ordres[ins] - ordres[pos_out])))]]
+            urgences += 1
+
+    fusion_df["Cle_Match"] = pd.Series(cles, index=fusion_df.index, dtype=object)
+    avec_cle = int(pd.notna(cles[est_in | est_out]).sum())
+    print(f"[DEBUG] Matching rapide: {avec_cle}/{len(fusion_df)} lignes avec clé "
+          f"({urgences} rattachement(s) d'urgence)")
+    return True
+
+
+# ----------------------------------------------------------------------
+# Recalcul des profits et pips
+# ----------------------------------------------------------------------
+def _types_lignes(analyzer, fusion_df):
+    """Valeur InstrumentType de chaque ligne (comme _type_instrument_ligne)"""
+    if "Type_Instrument" in fusion_df.columns:
+        types = fusion_df["Type_Instrument"].astype(object).to_numpy()
+    else:
+        types = np.full(len(fusion_df), None, dtype=object)
+    manquants = pd.isna(types)
+    if manquants.any():
+        symboles = fusion_df["Symbole_ordre"].astype(object).to_numpy()[manquants]
+        types[manquants] = [analyzer.type_instrument(s).value for s in symboles]
+    return types.astype(str)
+
+
+def recalculer(analyzer, fusion_df):
+    """
+    Équivalent vectorisé de recalculer_profit_manuel + calculer_pips_ou_points.
+
+    Returns:
+        (Profit_recalcule, Profit_pips) en Series float alignées sur fusion_df (NaN = non calculé)
+    """
+    n = len(fusion_df)
+    index = fusion_df.index
+    volumes_base = fusion_df["Volume_execute"].to_numpy(dtype='float64')
+    if np.isnan(volumes_base).any():
+        # Le moteur historique lève une erreur sur la ligne illisible et abandonne tout le recalcul
+        print(f"[ERROR] Erreur lors du recalcul manuel: volume illisible")
+        return pd.Series(np.nan, index=index), pd.Series(np.nan, index=index)
+
+    multiplicateur = getattr(analyzer, "multiplier", 1.0)
+    volumes = volumes_base * multiplicateur
+    symboles = fusion_df["Symbole_ordre"].astype(str).str.lower().to_numpy(dtype=object)
+    types = _types_lignes(analyzer, fusion_df)
+    prix = fusion_df["Prix_transaction"].to_numpy(dtype='float64')
+    profits_excel = fusion_df["Profit"].to_numpy(dtype='float64')
+    est_in = (fusion_df["Direction"] == "in").to_numpy(dtype=bool)
+    est_out = (fusion_df["Direction"] == "out").to_numpy(dtype=bool)
+    cles = fusion_df["Cle_Match"].to_numpy(dtype=object)
+
+    # IN de chaque OUT : clés IN uniques seulement (une clé en double renvoie plusieurs lignes)
+    masque_in = est_in & pd.notna(cles)
+    position_in = pd.Series(np.flatnonzero(masque_in), index=cles[masque_in])
+    position_in = position_in[~position_in.index.duplicated(keep=False)]
+    pos_in = pd.Series(np.where(est_out, cles, None)).map(position_in).to_numpy(dtype='float64')
+    apparie = est_out & ~np.isnan(pos_in)
+    pos_in = np.where(apparie, pos_in, 0).astype(np.int64)
+
+    prix_in = prix[pos_in]
+    achat = (fusion_df["Type_ordre"] == "buy").to_numpy(dtype=bool)[pos_in]
+    prix_valides = apparie & ~np.isnan(prix_in) & ~np.isnan(prix)
+
+    broker = analyzer.broker_manager is not None and bool(analyzer.broker)
+    nan = np.full(n, np.nan)
+    # Une résolution par symbole distinct, valeurs lues dans les colonnes de la table compilée
+    taille_pip_broker = analyzer.broker_manager.get_pip_sizes(analyzer.broker, symboles) if broker else nan
+    valeur_pip_broker = analyzer.broker_manager.get_pip_values(analyzer.broker, symboles, 'USD') if broker else nan
+    contrat_broker = analyzer.broker_manager.get_contract_sizes(analyzer.broker, symboles) if broker else nan
+
+    forex = types == 'forex'
+    jpy = np.array(["jpy" in s for s in symboles], dtype=bool)
+    decimales = np.zeros(n, dtype=np.int64)
+    a_compter = np.flatnonzero(forex & apparie)
+    if len(a_compter):
+        memo = {}
+        for valeurs in (prix_in[a_compter], prix[a_compter]):
+            nb = np.array([memo[v] if v in memo else memo.setdefault(v, _decimales(v)) for v in valeurs.tolist()])
+            decimales[a_compter] = np.maximum(decimales[a_compter], nb)
+    taille_pip_defaut = np.where((decimales == 2) | (decimales == 3), 0.01, 0.0001)
+    taille_pip = np.where(~np.isnan(taille_pip_broker), taille_pip_broker, taille_pip_defaut)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        # --- Profit (recalculer_profit_manuel) ---
+        ecart = (prix - prix_in) * np.where(achat, 1.0, -1.0)
+        # Forex : valeurs broker seulement si taille ET valeur du pip sont connues
+        broker_forex = ~np.isnan(taille_pip_broker) & ~np.isnan(valeur_pip_broker)
+        taille_pip_profit = np.where(broker_forex, taille_pip_broker, taille_pip_defaut)
+        valeur_par_pip = np.where(broker_forex, valeur_pip_broker * (volumes / 1.0),
+                                  np.where(jpy, (volumes * 1000.0) / prix_in, volumes * 10.0))
+        pips = np.abs(ecart) / taille_pip_profit
+        pips_entiers = np.where(ecart >= 0, 1.0, -1.0) * np.trunc(pips)
+        profit_forex = pips_entiers * valeur_par_pip
+        forex_invalide = (taille_pip_profit == 0) | ~np.isfinite(pips) | (~broker_forex & jpy & (prix_in == 0))
+
+        # Autres instruments : écart × taille (contrat ou valeur du point) × volume
+        or_argent = np.array([("gold" in s or "xau" in s or "or" in s) for s in symboles], dtype=bool)
+        uk = np.array([("uk100" in s or "uk" in s) for s in symboles], dtype=bool)
+        taille = np.select(
+            [types == 'metaux', types == 'indices', types == 'energie'],
+            [np.where(or_argent, 100.0, 5000.0), np.where(uk, 1.17, 1.0), 100.0],
+            default=1.0,
+        )
+        taille_broker = np.where(types == 'indices', valeur_pip_broker, contrat_broker)
+        taille = np.where(~np.isnan(taille_broker), taille_broker, taille)
+        profit_autres = ecart * taille * volumes
+
+        profit_brut = np.where(forex, profit_forex, profit_autres)
+        profit_valide = prix_valides & ~(forex & forex_invalide)
+        profit_recalcule = _arrondir(profit_brut, profit_valide)
+
+        # --- Pips / points (calculer_pips_ou_points) ---
+        points_bruts = np.where(achat, prix - prix_in, prix_in - prix)
+        pips_floats = np.abs(points_bruts) / taille_pip
+        pips_forex = np.where(points_bruts >= 0, 1.0, -1.0) * np.trunc(pips_floats)
+        pips_forex_valide = (taille_pip != 0) & np.isfinite(pips_floats)
+
+        # Repli (non apparié) : profit Excel / valeur du pip ou du point
+        valeur_repli = np.where(~np.isnan(valeur_pip_broker), valeur_pip_broker * (volumes / 1.0),
+                                volumes * np.where(forex, 10.0, 1.0))
+        pips_repli = profits_excel / valeur_repli
+
+    profit_pips = np.full(n, np.nan)
+    sel = apparie & forex & pips_forex_valide
+    profit_pips[sel] = pips_forex[sel]
+    sel = apparie & ~forex
+    # Le moteur historique arrondit ici un scalaire numpy (prix lus via df_in.loc) : np.round, pas round()
+    profit_pips[sel] = np.round(points_bruts[sel], 2)
+    sel = ~apparie & (valeur_repli != 0)
+    profit_pips[sel] = _arrondir(pips_repli, sel)[sel]
+
+    nb_recalcules = int(profit_valide.sum())
+    nb_repli = int((~apparie & (valeur_repli != 0)).sum())
+    print(f"[DEBUG] Recalcul rapide: {nb_recalcules} profits recalculés, {nb_repli} pips estimés depuis le profit")
+    return pd.Series(profit_recalcule, index=index), pd.Series(profit_pips, index=index)
+
+
+# ----------------------------------------------------------------------
+# Cumuls (intérêts composés + drawdown)
+# ----------------------------------------------------------------------
+def etat_cumuls_initial(solde_initial):
+    """État de la récurrence des cumuls avant le premier deal"""
+    return {
+        'solde_courant': solde_initial,
+        'profit_cumule': 0.0,
+        'pips_cumule': 0.0,
+        'plus_haut_solde': solde_initial,
+        'drawdown_running_max': 0.0,
+    }
+
+
+def calculer_cumuls(df_complet, solde_initial, solde_initial_reference, etat=None):
+    """
+    Boucle des cumuls de fusionner_et_calculer_cumuls sur des listes plutôt que iterrows/.at
+    (mêmes opérations flottantes dans le même ordre, donc résultats identiques au bit près).
+    La récurrence (solde courant, plus haut, drawdown lissé) reste séquentielle.
+
+    Args:
+        etat: état (non arrondi) laissé par un calcul précédent, pour poursuivre les cumuls
+              sur des deals ajoutés après ceux déjà calculés (défaut: début d'historique)
+
+    Returns:
+        État final de la récurrence (voir etat_cumuls_initial)
+    """
+    profits = df_complet["Profit"].to_numpy(dtype='float64')
+    pips_lignes = df_complet["Profit_pips"].to_numpy(dtype='float64')
+    profits = np.where(np.isnan(profits), 0.0, profits).tolist()
+    pips_lignes = np.where(np.isnan(pips_lignes), 0.0, pips_lignes).tolist()
+
+    n = len(profits)
+    profit_compose_col = [0.0] * n
+    profit_cumule_col = [0.0] * n
+    solde_col = [0.0] * n
+    pips_col = [0.0] * n
+    dd_pct_col = [0.0] * n
+    dd_euros_col = [0.0] * n
+    dd_running_col = [0.0] * n
+
+    etat = etat or etat_cumuls_initial(solde_initial)
+    solde_courant = etat['solde_courant']
+    profit_cumule_reel = etat['profit_cumule']
+    pips_cumule = etat['pips_cumule']
+    plus_haut_solde = etat['plus_haut_solde']
+    drawdown_running_max = etat['drawdown_running_max']
+    facteur_ajustement_solde = solde_initial / solde_initial_reference if solde_initial_reference > 0 else 1.0
+
+    for i in range(n):
+        profit_ajuste_solde = profits[i] * facteur_ajustement_solde
+        if solde_courant > 0 and solde_initial_reference > 0:
+            profit_compose = profit_ajuste_solde * (solde_courant / solde_initial_reference)
+        else:
+            profit_compose = profit_ajuste_solde
+
+        solde_courant += profit_compose
+        profit_cumule_reel += profit_compose
+        pips_cumule += pips_lignes[i]
+
+        if solde_courant > plus_haut_solde:
+            plus_haut_solde = solde_courant
+
+        if solde_courant < plus_haut_solde:
+            drawdown_euros = plus_haut_solde - solde_courant
+            drawdown_pct = (drawdown_euros / plus_haut_solde * 100) if plus_haut_solde > 0 else 0.0
+        else:
+            drawdown_euros = 0.0
+            drawdown_pct = 0.0
+
+        drawdown_actuel = (plus_haut_solde - solde_courant) / plus_haut_solde * 100 if plus_haut_solde > 0 else 0.0
+        if drawdown_actuel > drawdown_running_max:
+            drawdown_running_max = drawdown_actuel
+        if drawdown_actuel < drawdown_running_max:
+            if profit_ajuste_solde > 0:
+                drawdown_running_max = max(drawdown_actuel, drawdown_running_max * 0.9)
+            else:
+                drawdown_running_max = max(drawdown_actuel, drawdown_running_max)
+
+        profit_compose_col[i] = round(profit_compose, 2)
+        profit_cumule_col[i] = round(profit_cumule_reel, 2)
+        solde_col[i] = round(solde_courant, 2)
+        pips_col[i] = round(pips_cumule, 2)
+        dd_pct_col[i] = round(drawdown_pct, 2)
+        dd_euros_col[i] = round(drawdown_euros, 2)
+        dd_running_col[i] = round(drawdown_running_max, 2)
+
+    df_complet["Profit_compose"] = np.asarray(profit_compose_col, dtype='float64')
+    df_complet["Profit_cumule"] = np.asarray(profit_cumule_col, dtype='float64')
+    df_complet["Solde_cumule"] = np.asarray(solde_col, dtype='float64')
+    df_complet["Profit_pips_cumule"] = np.asarray(pips_col, dtype='float64')
+    df_complet["Drawdown_pct"] = np.asarray(dd_pct_col, dtype='float64')
+    df_complet["Drawdown_euros"] = np.asarray(dd_euros_col, dtype='float64')
+    df_complet["Drawdown_running_pct"] = np.asarray(dd_running_col, dtype='float64')
+    return {
+        'solde_courant': solde_courant,
+        'profit_cumule': profit_cumule_reel,
+        'pips_cumule': pips_cumule,
+        'plus_haut_solde': plus_haut_solde,
+        'drawdown_running_max': drawdown_running_max,
+    }
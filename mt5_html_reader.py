@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Lecteur natif des rapports MT5 au format HTML
+Parcourt le fichier en streaming (HTMLParser incrémental, sans DOM complet) et
+reconstruit les tableaux "Ordres" et "Transactions" sous la même forme que la
+lecture Excel de process_single_file (mêmes colonnes, mêmes types de cellules).
+"""
+
+import codecs
+import re
+import unicodedata
+from html.parser import HTMLParser
+
+import numpy as np
+import pandas as pd
+
+TAILLE_BLOC_LECTURE = 1024 * 1024
+
+# Titres de sections reconnus (rapports MT5 localisés), comparés sans accents ni casse
+TITRES_ORDRES = {'ordres', 'orders', 'auftrage', 'ordenes'}
+TITRES_TRANSACTIONS = {'transactions', 'deals', 'transacciones', 'geschafte'}
+# Rapports localisés dont les en-têtes de colonnes ne sont pas traduits : rejetés dès le titre
+TITRES_LANGUES_NON_PRISES_EN_CHARGE = {
+    'ordini': 'italien', 'operazioni': 'italien', 'ordens': 'portugais', 'negocios': 'portugais',
+    'zlecenia': 'polonais', 'transakcje': 'polonais', 'emirler': 'turc', 'islemler': 'turc',
+    'ордера': 'russe', 'сделки': 'russe',
+}
+
+# En-têtes localisés -> noms utilisés par les rapports français (et donc par l'analyseur)
+ENTETES_CANONIQUES = {
+    # Anglais
+    'open time': "Heure d'ouverture", 'order': 'Ordre', 'symbol': 'Symbole', 'price': 'Prix',
+    'time': 'Heure', 'state': 'État', 'comment': 'Commentaire', 'deal': 'Opération',
+    'commission': 'Commission', 'swap': 'Echange', 'balance': 'Solde', 'fee': 'Frais',
+    # Allemand
+    'eroffnungszeit': "Heure d'ouverture", 'auftrag': 'Ordre', 'typ': 'Type', 'volumen': 'Volume',
+    'preis': 'Prix', 'zeit': 'Heure', 'status': 'État', 'kommentar': 'Commentaire',
+    'richtung': 'Direction', 'kommission': 'Commission', 'gewinn': 'Profit', 'kontostand': 'Solde',
+    # Espagnol
+    'hora de apertura': "Heure d'ouverture", 'orden': 'Ordre', 'simbolo': 'Symbole', 'tipo': 'Type',
+    'precio': 'Prix', 'hora': 'Heure', 'estado': 'État', 'comentario': 'Commentaire',
+    'transaccion': 'Opération', 'direccion': 'Direction', 'comision': 'Commission',
+    'beneficio': 'Profit',
+}
+
+_NOMBRE = re.compile(r'^[+-]?\d+(\.\d+)?$')
+
+
+def _normaliser(texte):
+    """Minuscules, sans accents ni ponctuation finale (comparaison des titres)"""
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode('ascii') or str(texte)
+    return texte.strip().strip(':').strip().lower()
+
+
+def convertir_cellule(texte):
+    """Convertit le texte d'une cellule comme le ferait la lecture Excel (nombre, texte ou NaN)"""
+    texte = texte.replace('\xa0', ' ').strip()
+    if texte == '':
+        return np.nan
+    compact = texte.replace(' ', '')
+    if _NOMBRE.match(compact):
+        return float(compact) if '.' in compact else int(compact)
+    return texte
+
+
+def canoniser_entete(entete):
+    """Traduit un en-tête localisé vers le nom français attendu par l'analyseur"""
+    if not isinstance(entete, str):
+        return entete
+    return ENTETES_CANONIQUES.get(_normaliser(entete), entete)
+
+
+class LecteurRapportHTML(HTMLParser):
+    """Parseur incrémental : alimenté par blocs via feed()"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.section = 'entete'
+        self.lignes_entete = []
+        self.sections = {'ordres': {'entete': None, 'lignes': []},
+                         'transactions': {'entete': None, 'lignes': []}}
+        self.termine = False
+        self._ligne = None
+        self._cellule = None
+        self._colspan = 1
+
+    # --- Événements HTMLParser ---
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            self._ligne = []
+        elif tag in ('td', 'th') and self._ligne is not None:
+            self._cellule = []
+            self._colspan = 1
+            for nom, valeur in attrs:
+                if nom == 'colspan':
+                    try:
+                        self._colspan = max(1, int(valeur))
+                    except (TypeError, ValueError):
+                        pass
+        elif tag == 'br' and self._cellule is not None:
+            self._cellule.append(' ')
+
+    def handle_data(self, data):
+        if self._cellule is not None:
+            self._cellule.append(data)
+
+    def handle_endtag(self, tag):
+        if tag in ('td', 'th') and self._cellule is not None:
+            # Une cellule fusionnée occupe plusieurs colonnes, comme dans l'export Excel
+            self._ligne.append(convertir_cellule(''.join(self._cellule)))
+            self._ligne.extend([np.nan] * (self._colspan - 1))
+            self._cellule = None
+        elif tag == 'tr' and self._ligne is not None:
+            self._terminer_ligne(self._ligne)
+            self._ligne = None
+        elif tag == 'table' and self.section == 'transactions' and self.sections['transactions']['entete'] is not None:
+            self.termine = True
+
+    # --- Sections ---
+    def _titre_section(self, ligne):
+        remplies = [c for c in ligne if isinstance(c, str)]
+        if len(remplies) != 1 or any(isinstance(c, (int, float)) and not pd.isna(c) for c in ligne):
+            return None
+        titre = _normaliser(remplies[0])
+        if titre in TITRES_LANGUES_NON_PRISES_EN_CHARGE:
+            raise ValueError(f"Rapport MT5 en {TITRES_LANGUES_NON_PRISES_EN_CHARGE[titre]} non pris en charge "
+                             f"(section '{remplies[0].strip()}') : exporter le rapport en français, anglais, "
+                             f"allemand ou espagnol.")
+        if titre in TITRES_ORDRES:
+            return 'ordres'
+        if titre in TITRES_TRANSACTIONS:
+            return 'transactions'
+        return None
+
+    def _terminer_ligne(self, ligne):
+        if not ligne or self.termine:
+            return
+        titre = self._titre_section(ligne)
+        if titre is not None and self.sections[titre]['entete'] is None:
+            self.section = titre
+            return
+        if self.section == 'entete':
+            self.lignes_entete.append(ligne)
+            return
+        section = self.sections[self.section]
+        if section['entete'] is None:
+            section['entete'] = [canoniser_entete(c) for c in ligne]
+        else:
+            section['lignes'].append(ligne)
+
+    # --- Résultat ---
+    def _dataframe(self, nom):
+        section = self.sections[nom]
+        if section['entete'] is None:
+            raise ValueError(f"Section '{nom}' non trouvée dans le rapport HTML.")
+        entete = section['entete']
+        largeur = len(entete)
+        # Les lignes plus courtes/longues que l'en-tête sont complétées/tronquées
+        lignes = [(l + [np.nan] * (largeur - len(l)))[:largeur] for l in section['lignes']]
+        return pd.DataFrame(lignes, columns=entete, dtype=object)
+
+    def dataframes(self):
+        """(ordres_df, transactions_df) avec le même découpage que la lecture Excel"""
+        ordres_df = self._dataframe('ordres')
+        transactions_df = self._dataframe('transactions')
+        transactions_df = transactions_df[transactions_df.iloc[:, 0].notna()]
+        transactions_df.reset_index(drop=True, inplace=True)
+        return ordres_df, transactions_df
+
+
+def _detecter_encodage(debut):
+    if debut.startswith(codecs.BOM_UTF16_LE):
+        return 'utf-16-le', len(codecs.BOM_UTF16_LE)
+    if debut.startswith(codecs.BOM_UTF16_BE):
+        return 'utf-16-be', len(codecs.BOM_UTF16_BE)
+    if debut.startswith(codecs.BOM_UTF8):
+        return 'utf-8', len(codecs.BOM_UTF8)
+    # Sans BOM, MT5 écrit quand même en UTF-16 : octets nuls alternés
+    if len(debut) >= 4 and debut[1] == 0 and debut[3] == 0:
+        return 'utf-16-le', 0
+    return 'utf-8', 0
+
+
+def lire_rapport_html(chemin):
+    """
+    Lit un rapport MT5 HTML en streaming.
+
+    Returns:
+        LecteurRapportHTML rempli (dataframes(), lignes_entete)
+    """
+    lecteur = LecteurRapportHTML()
+    with open(chemin, 'rb') as f:
+        bloc = f.read(TAILLE_BLOC_LECTURE)
+        encodage, decalage = _detecter_encodage(bloc[:4])
+        decodeur = codecs.getincrementaldecoder(encodage)(errors='replace')
+        bloc = bloc[decalage:]
+        while bloc and not lecteur.termine:
+            lecteur.feed(decodeur.decode(bloc))
+            bloc = f.read(TAILLE_BLOC_LECTURE)
+        if not lecteur.termine:
+            lecteur.feed(decodeur.decode(b'', final=True))
+        lecteur.close()
+    return lecteur
+
+
+def lire_sections_html(chemin):
+    """Raccourci : (ordres_df, transactions_df) d'un rapport HTML"""
+    return lire_rapport_html(chemin).dataframes()
+
+
+def est_rapport_html(chemin):
+    return str(chemin).lower().endswith(('.html', '.htm'))
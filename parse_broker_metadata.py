@@ -1,164 +1,291 @@
 #!/usr/bin/env python3
 """
-Script pour convertir le fichier symbols_metadata_summary.txt en JSON
-pour un broker donné.
+Script pour convertir les fichiers symbols_metadata_summary.txt en métadonnées broker
+(JSON + table compilée utilisée par BrokerManager).
+
+Plusieurs exports peuvent être importés en une passe (un par broker ou par devise de
+compte) ; chaque fichier est lu ligne par ligne, les champs numériques sont validés
+et seuls les symboles modifiés sont réécrits dans la table compilée.
+
+Usage:
+    python parse_broker_metadata.py <fichier_texte> <nom_broker> [<fichier_texte> <nom_broker> ...]
+        [--dossier brokers] [--strict]
 """
 
+import argparse
 import json
+import math
+import os
 import re
 import sys
-import os
 
-def parse_broker_file(file_path, broker_name):
+from broker_table import chemins_compiles, compiler_broker, patcher_table, signature_fichier
+
+# Libellé de l'export -> (champ JSON, type)
+CHAMPS_SUMMARY = {
+    'Classe': ('class', str),
+    'Path MT5': ('path_mt5', str),
+    'Digits': ('digits', int),
+    'Point': ('point', float),
+    'Pip size': ('pip_size', float),
+    'Contract size': ('contract_size', float),
+    'Devise compte': ('account_currency', str),
+    'Valeur 1 pip / lot (devise compte)': ('pip_value_account_currency', float),
+    'Spread moyen (pips)': ('spread_avg_pips', float),
+    'Valeur spread / lot (devise compte)': ('spread_value_account_currency', float),
+}
+# "Valeur 1 pip / lot en EUR", "Valeur spread / lot en GBP"... -> pip_value_eur, spread_value_gbp
+_VALEUR_EN_DEVISE = re.compile(r'^Valeur (1 pip|spread) / lot en ([A-Z]{3})$')
+_SEPARATEUR = re.compile(r'^-{50,}$')
+
+# Champs qui doivent être strictement positifs / positifs ou nuls
+CHAMPS_STRICTEMENT_POSITIFS = {'point', 'pip_size', 'contract_size'}
+
+
+class ErreurImport:
+    """Erreur de validation rattachée à une ligne d'un export"""
+
+    def __init__(self, fichier, ligne, message):
+        self.fichier = fichier
+        self.ligne = ligne
+        self.message = message
+
+    def __str__(self):
+        return f"{self.fichier}:{self.ligne}: {self.message}"
+
+
+def _champ_pour_libelle(libelle):
+    if libelle in CHAMPS_SUMMARY:
+        return CHAMPS_SUMMARY[libelle]
+    correspondance = _VALEUR_EN_DEVISE.match(libelle)
+    if correspondance:
+        prefixe = 'pip_value' if correspondance.group(1) == '1 pip' else 'spread_value'
+        return f"{prefixe}_{correspondance.group(2).lower()}", float
+    return None, None
+
+
+def _convertir(champ, type_champ, valeur):
+    """Convertit et valide une valeur ; lève ValueError avec un message explicite"""
+    if type_champ is str:
+        return valeur
+    try:
+        nombre = float(valeur)
+    except ValueError:
+        raise ValueError(f"valeur numérique invalide pour {champ}: {valeur!r}")
+    if not math.isfinite(nombre):
+        raise ValueError(f"valeur non finie pour {champ}: {valeur!r}")
+    if type_champ is int:
+        if nombre != int(nombre) or nombre < 0:
+            raise ValueError(f"entier positif attendu pour {champ}: {valeur!r}")
+        return int(nombre)
+    if champ in CHAMPS_STRICTEMENT_POSITIFS and nombre <= 0:
+        raise ValueError(f"{champ} doit être strictement positif: {valeur!r}")
+    if nombre < 0:
+        raise ValueError(f"{champ} ne peut pas être négatif: {valeur!r}")
+    return nombre
+
+
+def iterer_symboles(file_path, erreurs):
+    """
+    Lit un export symbols_metadata_summary.txt ligne par ligne.
+
+    Args:
+        file_path: chemin de l'export
+        erreurs: liste complétée avec les ErreurImport rencontrées
+
+    Yields:
+        (nom_symbole, métadonnées) ; un champ invalide est omis (et signalé)
+    """
+    symbol_name, symbol_data, ligne_symbole = None, {}, 0
+
+    def terminer():
+        if symbol_name:
+            return symbol_name, symbol_data
+        if symbol_data:
+            erreurs.append(ErreurImport(file_path, ligne_symbole, "bloc sans ligne 'Symbole', ignoré"))
+        return None
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for numero, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith('RÉFÉRENTIEL') or line.startswith('='):
+                continue
+            if _SEPARATEUR.match(line):
+                bloc = terminer()
+                if bloc:
+                    yield bloc
+                symbol_name, symbol_data, ligne_symbole = None, {}, numero
+                continue
+            if ':' not in line:
+                erreurs.append(ErreurImport(file_path, numero, f"ligne non reconnue: {line!r}"))
+                continue
+
+            libelle, valeur = (partie.strip() for partie in line.split(':', 1))
+            if libelle == 'Symbole':
+                # Nouveau symbole sans séparateur : on clôt le précédent
+                if symbol_name:
+                    yield symbol_name, symbol_data
+                    symbol_data = {}
+                symbol_name, ligne_symbole = valeur.upper(), numero
+                continue
+            champ, type_champ = _champ_pour_libelle(libelle)
+            if champ is None:
+                erreurs.append(ErreurImport(file_path, numero, f"champ inconnu ignoré: {libelle!r}"))
+                continue
+            try:
+                symbol_data[champ] = _convertir(champ, type_champ, valeur)
+            except ValueError as e:
+                erreurs.append(ErreurImport(file_path, numero, f"{symbol_name or '?'}: {str(e)}"))
+    bloc = terminer()
+    if bloc:
+        yield bloc
+
+
+def parse_broker_file(file_path, broker_name, erreurs=None):
     """
-    Parse le fichier symbols_metadata_summary.txt et crée un JSON structuré.
-    
+    Parse un fichier symbols_metadata_summary.txt et crée un JSON structuré.
+
     Args:
         file_path: Chemin vers le fichier symbols_metadata_summary.txt
         broker_name: Nom du broker (ex: "avatrade")
-    
+        erreurs: liste optionnelle recevant les erreurs de validation
+
     Returns:
         dict: Dictionnaire avec les métadonnées des symboles
     """
-    symbols = {}
-    
     if not os.path.exists(file_path):
         print(f"Erreur: Le fichier {file_path} n'existe pas.")
         return None
-    
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Diviser par les séparateurs "--------------------------------------------------------------------------------"
-    sections = re.split(r'-{50,}', content)
-    
-    for section in sections:
-        if not section.strip():
-            continue
-        
-        symbol_data = {}
-        lines = section.strip().split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('RÉFÉRENTIEL') or line.startswith('='):
+    erreurs = [] if erreurs is None else erreurs
+    symbols = {}
+    for symbol_name, symbol_data in iterer_symboles(file_path, erreurs):
+        symbols[symbol_name] = symbol_data
+    return {'broker': broker_name, 'symbols': symbols}
+
+
+def fusionner_exports(exports, erreurs):
+    """
+    Fusionne plusieurs exports d'un même broker.
+
+    Le premier export qui décrit un symbole fournit ses champs de base ; les exports
+    suivants (autres devises de compte) ajoutent leurs valeurs par devise
+    (pip_value_gbp, spread_value_gbp...).
+    """
+    symbols = {}
+    for file_path in exports:
+        for symbol_name, symbol_data in iterer_symboles(file_path, erreurs):
+            existant = symbols.get(symbol_name)
+            if existant is None:
+                symbols[symbol_name] = dict(symbol_data)
                 continue
-            
-            # Parser les lignes clé: valeur
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                
-                # Mapping des clés
-                if key == 'Symbole':
-                    symbol_name = value.upper()
-                elif key == 'Classe':
-                    symbol_data['class'] = value
-                elif key == 'Path MT5':
-                    symbol_data['path_mt5'] = value
-                elif key == 'Digits':
-                    try:
-                        symbol_data['digits'] = int(value)
-                    except ValueError:
-                        symbol_data['digits'] = 0
-                elif key == 'Point':
-                    try:
-                        symbol_data['point'] = float(value)
-                    except ValueError:
-                        symbol_data['point'] = 0.0
-                elif key == 'Pip size':
-                    try:
-                        symbol_data['pip_size'] = float(value)
-                    except ValueError:
-                        symbol_data['pip_size'] = 0.0
-                elif key == 'Contract size':
-                    try:
-                        symbol_data['contract_size'] = float(value)
-                    except ValueError:
-                        symbol_data['contract_size'] = 0.0
-                elif key == 'Devise compte':
-                    symbol_data['account_currency'] = value
-                elif key == 'Valeur 1 pip / lot (devise compte)':
-                    try:
-                        symbol_data['pip_value_account_currency'] = float(value)
-                    except ValueError:
-                        symbol_data['pip_value_account_currency'] = 0.0
-                elif key == 'Valeur 1 pip / lot en EUR':
-                    try:
-                        symbol_data['pip_value_eur'] = float(value)
-                    except ValueError:
-                        symbol_data['pip_value_eur'] = 0.0
-                elif key == 'Valeur 1 pip / lot en USD':
-                    try:
-                        symbol_data['pip_value_usd'] = float(value)
-                    except ValueError:
-                        symbol_data['pip_value_usd'] = 0.0
-                elif key == 'Spread moyen (pips)':
-                    try:
-                        symbol_data['spread_avg_pips'] = float(value)
-                    except ValueError:
-                        symbol_data['spread_avg_pips'] = 0.0
-                elif key == 'Valeur spread / lot (devise compte)':
-                    try:
-                        symbol_data['spread_value_account_currency'] = float(value)
-                    except ValueError:
-                        symbol_data['spread_value_account_currency'] = 0.0
-                elif key == 'Valeur spread / lot en EUR':
-                    try:
-                        symbol_data['spread_value_eur'] = float(value)
-                    except ValueError:
-                        symbol_data['spread_value_eur'] = 0.0
-                elif key == 'Valeur spread / lot en USD':
-                    try:
-                        symbol_data['spread_value_usd'] = float(value)
-                    except ValueError:
-                        symbol_data['spread_value_usd'] = 0.0
-        
-        # Ajouter le symbole au dictionnaire si on a trouvé un nom de symbole
-        if 'symbol_name' in locals() and symbol_name:
-            symbols[symbol_name] = symbol_data
-            del symbol_name
-    
-    # Créer la structure finale
-    result = {
-        'broker': broker_name,
-        'symbols': symbols
-    }
-    
-    return result
+            devise = str(symbol_data.get('account_currency', '')).lower()
+            if devise:
+                for source, cible in (('pip_value_account_currency', f'pip_value_{devise}'),
+                                      ('spread_value_account_currency', f'spread_value_{devise}')):
+                    if source in symbol_data:
+                        existant.setdefault(cible, symbol_data[source])
+            for champ, valeur in symbol_data.items():
+                if champ.startswith(('pip_value_', 'spread_value_')) and not champ.endswith('_account_currency'):
+                    existant.setdefault(champ, valeur)
+    return symbols
+
+
+def importer_broker(broker_name, exports, brokers_dir, erreurs):
+    """
+    Met à jour le JSON et la table compilée d'un broker à partir de ses exports.
+
+    Les symboles absents des exports sont conservés ; si rien ne change, aucun fichier
+    n'est réécrit (les workers ne rechargent donc rien).
+
+    Returns:
+        dict de compteurs {'ajoutes', 'modifies', 'inchanges'}
+    """
+    nouveaux = fusionner_exports(exports, erreurs)
+    output_file = os.path.join(brokers_dir, f"{broker_name}.json")
+    actuel = {'broker': broker_name, 'symbols': {}}
+    signature_precedente = None
+    if os.path.exists(output_file):
+        signature_precedente = signature_fichier(output_file)
+        with open(output_file, 'r', encoding='utf-8') as f:
+            actuel = json.load(f)
+
+    symbols = actuel.setdefault('symbols', {})
+    ajoutes, modifies = [], {}
+    for symbol_name, symbol_data in nouveaux.items():
+        precedent = symbols.get(symbol_name)
+        fusionne = dict(precedent or {})
+        fusionne.update(symbol_data)
+        if precedent is None:
+            ajoutes.append(symbol_name)
+        elif fusionne == precedent:
+            continue
+        else:
+            modifies[symbol_name] = fusionne
+        symbols[symbol_name] = fusionne
+
+    compteurs = {'ajoutes': len(ajoutes), 'modifies': len(modifies),
+                 'inchanges': len(nouveaux) - len(ajoutes) - len(modifies)}
+    chemin_npy, _ = chemins_compiles(output_file)
+    if not ajoutes and not modifies and os.path.exists(chemin_npy):
+        return compteurs
+
+    actuel['broker'] = broker_name
+    temporaire = output_file + '.tmp'
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        json.dump(actuel, f, indent=2, ensure_ascii=False)
+    os.replace(temporaire, output_file)
+
+    # Seules les lignes modifiées sont réécrites ; un ajout de symbole ou de champ
+    # impose de recompiler toute la table
+    if ajoutes or not patcher_table(output_file, modifies, signature_precedente):
+        compiler_broker(output_file)
+    return compteurs
+
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python parse_broker_metadata.py <fichier_texte> <nom_broker>")
+    parser = argparse.ArgumentParser(description="Import des exports symbols_metadata_summary.txt")
+    parser.add_argument('paires', nargs='+', metavar='FICHIER BROKER',
+                        help="couples <fichier_texte> <nom_broker>")
+    parser.add_argument('--dossier', help="dossier brokers (défaut: 'brokers' à côté du premier fichier)")
+    parser.add_argument('--strict', action='store_true',
+                        help="n'écrire aucun fichier si une valeur est invalide")
+    args = parser.parse_args()
+
+    if len(args.paires) % 2 != 0:
+        print("Usage: python parse_broker_metadata.py <fichier_texte> <nom_broker> [<fichier_texte> <nom_broker> ...]")
         print("Exemple: python parse_broker_metadata.py symbols_metadata_summary.txt avatrade")
         sys.exit(1)
-    
-    file_path = sys.argv[1]
-    broker_name = sys.argv[2]
-    
+
+    exports_par_broker = {}
+    for file_path, broker_name in zip(args.paires[0::2], args.paires[1::2]):
+        if not os.path.exists(file_path):
+            print(f"Erreur: Le fichier {file_path} n'existe pas.")
+            sys.exit(1)
+        exports_par_broker.setdefault(broker_name.lower(), []).append(file_path)
+
     # Créer le dossier brokers s'il n'existe pas
-    brokers_dir = os.path.join(os.path.dirname(file_path), 'brokers')
-    if not os.path.exists(brokers_dir):
-        os.makedirs(brokers_dir)
-    
-    # Parser le fichier
-    print(f"Parsing du fichier {file_path} pour le broker {broker_name}...")
-    data = parse_broker_file(file_path, broker_name)
-    
-    if data is None:
-        print("Erreur lors du parsing.")
-        sys.exit(1)
-    
-    # Sauvegarder en JSON
-    output_file = os.path.join(brokers_dir, f"{broker_name}.json")
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    
-    print(f"✅ Fichier JSON créé: {output_file}")
-    print(f"   Nombre de symboles: {len(data['symbols'])}")
+    brokers_dir = args.dossier or os.path.join(os.path.dirname(args.paires[0]), 'brokers')
+    os.makedirs(brokers_dir, exist_ok=True)
 
-if __name__ == '__main__':
-    main()
+    if args.strict:
+        # Validation complète avant toute écriture
+        erreurs = []
+        for exports in exports_par_broker.values():
+            fusionner_exports(exports, erreurs)
+        if erreurs:
+            for erreur in erreurs:
+                print(f"[ERROR] {erreur}")
+            print(f"Import annulé: {len(erreurs)} erreur(s).")
+            sys.exit(1)
 
+    for broker_name, exports in exports_par_broker.items():
+        print(f"Import de {len(exports)} fichier(s) pour le broker {broker_name}...")
+        erreurs = []
+        compteurs = importer_broker(broker_name, exports, brokers_dir, erreurs)
+        for erreur in erreurs:
+            print(f"[WARNING] {erreur}")
+        print(f"✅ {broker_name}: {compteurs['ajoutes']} ajouté(s), {compteurs['modifies']} modifié(s), "
+              f"{compteurs['inchanges']} inchangé(s)")
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Vue portefeuille : plusieurs comptes / EA analysés séparément, agrégés dans le temps
+Chaque compte garde sa propre récurrence des cumuls (Solde_cumule). Les courbes sont
+alignées sur une grille de temps commune par merge_asof (dernier solde connu à chaque
+instant, solde initial avant le premier deal), puis traitées comme une matrice
+(instants × comptes) :
+- courbe du portefeuille (somme des soldes) et son drawdown
+- contribution de chaque compte au résultat
+- corrélation des rendements quotidiens entre comptes
+
+Usage:
+    comptes = [{'nom': 'EA1', 'df': df_ea1, 'solde_initial': 10000}, ...]
+    resultat = agreger_portefeuille(comptes, frequence='h')
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from deal_schema import COLONNE_DATE
+
+POINTS_COURBE_MAX = 5000
+# Nombre maximal d'instants d'une grille régulière (fréquence choisie par l'utilisateur)
+POINTS_GRILLE_MAX = 1_000_000
+COLONNES_LEDGER = (COLONNE_DATE, "Solde_cumule", "Profit_compose")
+
+
+def courbe_compte(df):
+    """Solde après chaque instant daté du compte (dernier deal de l'instant), trié par date"""
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce')
+    courbe = pd.DataFrame({'date': dates.to_numpy(dtype='datetime64[ns]'),
+                           'solde': df["Solde_cumule"].to_numpy(dtype='float64')})
+    courbe = courbe[courbe['date'].notna()]
+    # Tri stable : à date égale, l'ordre des cumuls est conservé et le dernier solde l'emporte
+    courbe = courbe.sort_values('date', kind='stable').drop_duplicates('date', keep='last')
+    return courbe.reset_index(drop=True)
+
+
+def solde_initial_ledger(df):
+    """Solde initial d'un résultat exporté (solde après le premier deal moins son profit composé)"""
+    if len(df) == 0:
+        return 0.0
+    return round(float(df["Solde_cumule"].iloc[0]) - float(df["Profit_compose"].iloc[0]), 2)
+
+
+def charger_ledger(chemin):
+    """DataFrame final écrit par `analyzer.py run --format json|parquet`"""
+    if chemin.lower().endswith('.parquet'):
+        df = pd.read_parquet(chemin)
+    elif chemin.lower().endswith('.json'):
+        with open(chemin, 'r', encoding='utf-8') as f:
+            df = pd.read_json(f, orient='records', convert_dates=False)
+    else:
+        raise ValueError(f"Format non supporté: {os.path.basename(chemin)} (json ou parquet attendu)")
+    manquantes = [c for c in COLONNES_LEDGER if c not in df.columns]
+    if len(df) and manquantes:
+        raise ValueError(f"{os.path.basename(chemin)} n'est pas un résultat d'analyse (colonnes manquantes: {', '.join(manquantes)})")
+    return df
+
+
+def _grille(courbes, frequence):
+    """Instants communs : union des dates des comptes, ou grille régulière (frequence pandas, ex. 'h', 'D')"""
+    dates = [c['date'].to_numpy() for c in courbes if len(c)]
+    if not dates:
+        return pd.DatetimeIndex([])
+    toutes = np.concatenate(dates)
+    if frequence:
+        debut, fin = pd.Timestamp(toutes.min()), pd.Timestamp(toutes.max())
+        # Taille de la grille estimée avant de la construire (pas d'une période, calendaire compris)
+        decalage = to_offset(frequence)
+        pas = (debut + 2 * decalage) - (debut + decalage)
+        if pas <= pd.Timedelta(0):
+            raise ValueError("pas de temps nul")
+        points = (fin - debut) / pas + 1
+        if points > POINTS_GRILLE_MAX:
+            raise ValueError(f"grille de {int(points)} instants, max {POINTS_GRILLE_MAX} : choisir un pas plus large")
+        grille = pd.date_range(debut.floor(frequence), fin, freq=frequence)
+        # Le dernier instant est toujours inclus (soldes finaux exacts)
+        return grille.union(pd.DatetimeIndex([fin]))
+    return pd.DatetimeIndex(np.unique(toutes))
+
+
+def _drawdowns(soldes, soldes_initiaux):
+    """Drawdown (%) à chaque instant pour chaque colonne, le solde initial comptant comme premier sommet"""
+    sommets = np.maximum(np.maximum.accumulate(soldes, axis=0), soldes_initiaux)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(sommets > 0, (sommets - soldes) / sommets * 100, 0.0), sommets
+
+
+def agreger_portefeuille(comptes, frequence=None, points_max=POINTS_COURBE_MAX):
+    """
+    Agrège des comptes analysés.
+
+    Args:
+        comptes: liste de dict {'nom', 'df' (DataFrame final), 'solde_initial'}
+        frequence: pas de la grille commune (None : union des instants des comptes)
+        points_max: nombre maximal de points renvoyés pour la courbe (les mesures utilisent toute la grille)
+
+    Returns:
+        dict : courbe et drawdown du portefeuille, détail par compte, corrélation des rendements quotidiens
+    """
+    if not comptes:
+        raise ValueError("Aucun compte à agréger")
+    noms = [str(c['nom']) for c in comptes]
+    if len(set(noms)) != len(noms):
+        raise ValueError("Noms de comptes en double")
+    courbes = [courbe_compte(c['df']) for c in comptes]
+    soldes_initiaux = np.array([float(c['solde_initial']) for c in comptes], dtype='float64')
+    try:
+        grille = _grille(courbes, frequence)
+    except ValueError as e:
+        raise ValueError(f"Fréquence invalide: {frequence} ({e})")
+    if len(grille) == 0:
+        raise ValueError("Aucun deal daté dans les comptes")
+
+    # Solde de chaque compte à chaque instant de la grille (dernier connu)
+    base = pd.DataFrame({'date': grille.to_numpy(dtype='datetime64[ns]')})
+    soldes = np.empty((len(grille), len(comptes)), dtype='float64')
+    for j, courbe in enumerate(courbes):
+        alignee = pd.merge_asof(base, courbe, on='date', direction='backward')
+        soldes[:, j] = alignee['solde'].fillna(soldes_initiaux[j]).to_numpy()
+
+    capital = float(soldes_initiaux.sum())
+    portefeuille = soldes.sum(axis=1)
+    dd_comptes, _ = _drawdowns(soldes, soldes_initiaux)
+    dd_portefeuille, sommets = _drawdowns(portefeuille[:, None], np.array([capital]))
+    dd_portefeuille, sommets = dd_portefeuille[:, 0], sommets[:, 0]
+    pire = int(np.argmax(dd_portefeuille))
+
+    profits = soldes[-1] - soldes_initiaux
+    profit_total = float(profits.sum())
+    details = []
+    for j, nom in enumerate(noms):
+        details.append({
+            'nom': nom,
+            'solde_initial': round(float(soldes_initiaux[j]), 2),
+            'solde_final': round(float(soldes[-1, j]), 2),
+            'profit': round(float(profits[j]), 2),
+            'rendement_pct': round(float(profits[j] / soldes_initiaux[j] * 100), 2) if soldes_initiaux[j] else 0.0,
+            'contribution_pct': round(float(profits[j] / abs(profit_total) * 100), 2) if profit_total else 0.0,
+            'drawdown_max_pct': round(float(dd_comptes[:, j].max()), 2),
+            'deals': int(len(comptes[j]['df'])),
+        })
+
+    # Rendements quotidiens (dernier solde de chaque jour), corrélation entre comptes
+    quotidiens = pd.DataFrame(soldes, index=grille, columns=noms).resample('D').last().ffill()
+    rendements = quotidiens.pct_change(fill_method=None).iloc[1:]
+    correlation = rendements.corr().to_numpy() if len(rendements) > 1 else np.full((len(noms), len(noms)), np.nan)
+
+    pas = max(1, int(np.ceil(len(grille) / points_max))) if points_max else 1
+    indices = np.unique(np.concatenate([np.arange(0, len(grille), pas), [pire, len(grille) - 1]]))
+    print(f"[DEBUG] Portefeuille: {len(comptes)} compte(s), {len(grille)} instant(s), drawdown max {dd_portefeuille[pire]:.2f}%")
+    return {
+        'comptes': details,
+        'capital_initial': round(capital, 2),
+        'solde_final': round(float(portefeuille[-1]), 2),
+        'profit': round(profit_total, 2),
+        'rendement_pct': round(profit_total / capital * 100, 2) if capital else 0.0,
+        'drawdown_max_pct': round(float(dd_portefeuille[pire]), 2),
+        'drawdown_max_euros': round(float(sommets[pire] - portefeuille[pire]), 2),
+        'date_drawdown_max': grille[pire].isoformat(),
+        'instants': int(len(grille)),
+        'courbe': [{'date': grille[i].isoformat(), 'solde': round(float(portefeuille[i]), 2),
+                    'drawdown_pct': round(float(dd_portefeuille[i]), 2)} for i in indices.tolist()],
+        'correlation': {
+            'comptes': noms,
+            'matrice': [[None if np.isnan(v) else round(float(v), 4) for v in ligne] for ligne in correlation],
+        },
+    }
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Instrumentation légère des étapes du pipeline d'analyse
+Chaque étape (lecture, détection des sections, fusion, matching, recalcul, cumuls,
+agrégations, patterns, modèle d'influence, classeur...) est encadrée par
+`with etape("nom")` : durée réelle, temps CPU, lignes en entrée / sortie et pic
+mémoire sont enregistrés dans le collecteur actif du thread.
+
+Variables d'environnement :
+- ANALYZER_PROFILE_MEMOIRE=1 : pic mémoire par étape via tracemalloc (ralentit nettement)
+- ANALYZER_PROFILE_CPROFILE=1 ou <dossier> : un fichier .prof cProfile par étape
+  (dossier 'profiles' par défaut), exploitable avec pstats / snakeviz
+"""
+
+import os
+import re
+import time
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_local = threading.local()
+_NOM_FICHIER = re.compile(r'[^\w.-]')
+
+
+def _env_actif(nom):
+    return os.environ.get(nom, '').strip().lower() not in ('', '0', 'false', 'non', 'no')
+
+
+def dossier_cprofile():
+    """Dossier de sortie cProfile, ou None si le profilage détaillé est désactivé"""
+    valeur = os.environ.get('ANALYZER_PROFILE_CPROFILE', '').strip()
+    if not _env_actif('ANALYZER_PROFILE_CPROFILE'):
+        return None
+    return 'profiles' if valeur.lower() in ('1', 'true', 'oui', 'yes') else valeur
+
+
+def _rss_max_mo():
+    if resource is None:
+        return None
+    # ru_maxrss est en kilo-octets sous Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+class Mesure:
+    """Mesure d'une étape ; l'appelant peut renseigner les lignes en sortie"""
+
+    __slots__ = ('nom', 'infos', 'lignes_entree', 'lignes_sortie', 'parent', 'pic_enfants',
+                 '_debut', '_debut_cpu', '_profiler')
+
+    def __init__(self, nom, lignes_entree=None, infos=None):
+        self.nom = nom
+        self.infos = infos or {}
+        self.lignes_entree = lignes_entree
+        self.lignes_sortie = None
+        self.parent = None
+        self.pic_enfants = 0
+        self._debut = None
+        self._debut_cpu = None
+        self._profiler = None
+
+    def sortie(self, lignes):
+        """Nombre de lignes produites par l'étape (DataFrame ou entier)"""
+        self.lignes_sortie = _nombre_lignes(lignes)
+
+
+class _MesureInactive(Mesure):
+    def sortie(self, lignes):
+        pass
+
+
+def _nombre_lignes(valeur):
+    if valeur is None:
+        return None
+    if isinstance(valeur, int):
+        return valeur
+    try:
+        return len(valeur)
+    except TypeError:
+        return None
+
+
+class ProfilEtapes:
+    """Collecteur des mesures d'une tâche (ou d'un fichier dans un worker)"""
+
+    def __init__(self, nom_tache=None):
+        self.nom_tache = nom_tache
+        self.etapes = []
+        self._pile = []
+        self._compteur_prof = 0
+        self.memoire = _env_actif('ANALYZER_PROFILE_MEMOIRE')
+        self.dossier_prof = dossier_cprofile()
+
+    @contextmanager
+    def actif(self):
+        """Rend ce collecteur courant pour le thread (les `with etape(...)` y écrivent)"""
+        precedent = getattr(_local, 'profil', None)
+        _local.profil = self
+        if self.memoire and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        try:
+            yield self
+        finally:
+            _local.profil = precedent
+
+    # ------------------------------------------------------------------
+    def _demarrer(self, mesure):
+        parent = self._pile[-1] if self._pile else None
+        mesure.parent = parent.nom if parent is not None else None
+        if self.dossier_prof:
+            # Profil exclusif : le profil du parent est suspendu pendant l'étape enfant
+            if parent is not None and parent._profiler is not None:
+                parent._profiler.disable()
+            mesure._profiler = cProfile.Profile()
+        if self.memoire and tracemalloc.is_tracing():
+            if parent is not None:
+                parent.pic_enfants = max(parent.pic_enfants, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        self._pile.append(mesure)
+        mesure._debut = time.perf_counter()
+        mesure._debut_cpu = time.thread_time()
+        if mesure._profiler is not None:
+            mesure._profiler.enable()
+
+    def _terminer(self, mesure, erreur=None):
+        if mesure._profiler is not None:
+            mesure._profiler.disable()
+        duree = time.perf_counter() - mesure._debut
+        duree_cpu = time.thread_time() - mesure._debut_cpu
+        self._pile.pop()
+        parent = self._pile[-1] if self._pile else None
+
+        pic = None
+        if self.memoire and tracemalloc.is_tracing():
+            pic_octets = max(tracemalloc.get_traced_memory()[1], mesure.pic_enfants)
+            pic = round(pic_octets / (1024.0 * 1024.0), 2)
+            if parent is not None:
+                parent.pic_enfants = max(parent.pic_enfants, pic_octets)
+
+        enregistrement = {
+            'etape': mesure.nom,
+            'parent': mesure.parent,
+            'duree_s': round(duree, 4),
+            'cpu_s': round(duree_cpu, 4),
+            'lignes_entree': mesure.lignes_entree,
+            'lignes_sortie': mesure.lignes_sortie,
+            'memoire_pic_mo': pic,
+            'rss_max_mo': _rss_max_mo(),
+        }
+        enregistrement.update(mesure.infos)
+        if erreur is not None:
+            enregistrement['erreur'] = str(erreur)
+        if mesure._profiler is not None:
+            enregistrement['cprofile'] = self._ecrire_profil(mesure)
+            if parent is not None and parent._profiler is not None:
+                parent._profiler.enable()
+        self.etapes.append(enregistrement)
+
+    def _ecrire_profil(self, mesure):
+        try:
+            os.makedirs(self.dossier_prof, exist_ok=True)
+            self._compteur_prof += 1
+            prefixe = _NOM_FICHIER.sub('_', str(self.nom_tache or os.getpid()))
+            nom_etape = _NOM_FICHIER.sub('_', mesure.nom)
+            chemin = os.path.join(self.dossier_prof, f"{prefixe}_{self._compteur_prof:03d}_{nom_etape}.prof")
+            mesure._profiler.dump_stats(chemin)
+            return chemin
+        except Exception as e:
+            print(f"[WARNING] Écriture du profil cProfile impossible: {str(e)}")
+            return None
+
+    # ------------------------------------------------------------------
+    def ajouter(self, etapes, **infos):
+        """Ajoute des mesures faites ailleurs (worker d'ingestion) en les annotant"""
+        for enregistrement in etapes or []:
+            copie = dict(enregistrement)
+            copie.update(infos)
+            self.etapes.append(copie)
+
+    def resume(self):
+        """
+        Détail + cumul par étape, sérialisable en JSON.
+
+        Returns:
+            {'etapes': [...], 'par_etape': {nom: {'appels', 'duree_s', 'cpu_s', ...}}, 'total_s'}
+        """
+        par_etape = {}
+        for enregistrement in self.etapes:
+            cumul = par_etape.setdefault(enregistrement['etape'], {
+                'appels': 0, 'duree_s': 0.0, 'cpu_s': 0.0, 'lignes_entree': 0, 'lignes_sortie': 0,
+                'memoire_pic_mo': None,
+            })
+            cumul['appels'] += 1
+            cumul['duree_s'] = round(cumul['duree_s'] + enregistrement['duree_s'], 4)
+            cumul['cpu_s'] = round(cumul['cpu_s'] + enregistrement['cpu_s'], 4)
+            for cle in ('lignes_entree', 'lignes_sortie'):
+                cumul[cle] += enregistrement.get(cle) or 0
+            if enregistrement.get('memoire_pic_mo') is not None:
+                cumul['memoire_pic_mo'] = max(cumul['memoire_pic_mo'] or 0, enregistrement['memoire_pic_mo'])
+        # Total = étapes de premier niveau exécutées dans ce processus
+        total = sum(e['duree_s'] for e in self.etapes if e.get('parent') is None and 'fichier' not in e)
+        return {'etapes': list(self.etapes), 'par_etape': par_etape, 'total_s': round(total, 4)}
+
+
+def collecteur_courant():
+    return getattr(_local, 'profil', None)
+
+
+@contextmanager
+def etape(nom, lignes_entree=None, **infos):
+    """
+    Mesure une étape dans le collecteur courant (sans effet si aucun n'est actif).
+
+        with etape("matching", lignes_entree=df) as m:
+            ...
+            m.sortie(resultat)
+    """
+    profil = collecteur_courant()
+    if profil is None:
+        yield _MesureInactive(nom)
+        return
+    mesure = Mesure(nom, _nombre_lignes(lignes_entree), infos)
+    profil._demarrer(mesure)
+    try:
+        yield mesure
+    except BaseException as e:
+        profil._terminer(mesure, erreur=e)
+        raise
+    profil._terminer(mesure)
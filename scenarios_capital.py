@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Scénarios de capital (what-if) : solde initial × multiplicateur de position
+Le solde initial n'intervient que dans les cumuls (facteur_ajustement_solde) et le
+multiplicateur que dans le volume du recalcul des profits. Une grille N × M se calcule
+donc à partir d'un seul DataFrame final (deals déjà appariés) :
+- un recalcul vectorisé des profits par multiplicateur (M passes, moteur_rapide.recalculer)
+- les N courbes de solde d'un multiplicateur d'un seul coup : tant que le solde reste
+  positif, la récurrence de fusionner_et_calculer_cumuls est un produit
+  (solde × (1 + profit × solde_initial / reference²)), soit un cumprod par ligne
+- solde final, rendement, drawdown maximum et temps sous l'eau par ligne de la matrice
+
+Usage:
+    resultat = evaluer_grille(analyzer, df_final, soldes=[5000, 10000, 25000], multiplicateurs=[0.5, 1, 2])
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+import moteur_rapide
+from deal_schema import COLONNE_DATE
+
+FACTEURS_SOLDE_DEFAUT = (0.5, 1.0, 2.5)
+FACTEURS_MULTIPLICATEUR_DEFAUT = (0.5, 1.0, 2.0)
+TAILLE_MAX_GRILLE = 400
+# Nombre maximal de valeurs par matrice (soldes × deals) traitée en une fois
+ELEMENTS_MAX_BLOC = 5_000_000
+
+
+def grille_par_defaut(solde_initial, multiplier):
+    """Grille autour des paramètres de l'analyse (ex. 10k, 1× -> 5k / 10k / 25k × 0.5 / 1 / 2)"""
+    solde_initial = float(solde_initial or 10000)
+    multiplier = float(multiplier or 1.0)
+    return ([round(solde_initial * f, 2) for f in FACTEURS_SOLDE_DEFAUT],
+            [round(multiplier * f, 4) for f in FACTEURS_MULTIPLICATEUR_DEFAUT])
+
+
+def valider_grille(soldes, multiplicateurs):
+    """Convertit et contrôle une grille ; ValueError si elle est vide, invalide ou trop grande"""
+    try:
+        soldes = [float(s) for s in soldes]
+        multiplicateurs = [float(m) for m in multiplicateurs]
+    except (TypeError, ValueError):
+        raise ValueError("Soldes et multiplicateurs doivent être des listes de nombres")
+    if not soldes or not multiplicateurs:
+        raise ValueError("Grille vide : au moins un solde et un multiplicateur sont nécessaires")
+    if any(not np.isfinite(s) or s <= 0 for s in soldes):
+        raise ValueError("Les soldes initiaux doivent être strictement positifs")
+    if any(not np.isfinite(m) or m <= 0 for m in multiplicateurs):
+        raise ValueError("Les multiplicateurs doivent être strictement positifs")
+    if len(soldes) * len(multiplicateurs) > TAILLE_MAX_GRILLE:
+        raise ValueError(f"Grille trop grande ({len(soldes)} × {len(multiplicateurs)}, max {TAILLE_MAX_GRILLE} combinaisons)")
+    return soldes, multiplicateurs
+
+
+def profits_par_multiplicateur(analyzer, df, multiplicateurs):
+    """
+    Profits par deal pour chaque multiplicateur (recalcul vectorisé sur les deals appariés ;
+    les lignes non recalculées gardent le profit Excel, comme dans le pipeline).
+
+    Returns:
+        matrice (len(multiplicateurs), len(df)), NaN remplacés par 0 comme dans les cumuls
+    """
+    profits_excel = df["Profit"].to_numpy(dtype='float64')
+    matrice = np.empty((len(multiplicateurs), len(df)), dtype='float64')
+    for i, multiplicateur in enumerate(multiplicateurs):
+        scenario = copy.copy(analyzer)
+        scenario.multiplier = multiplicateur
+        profit_recalcule, _ = moteur_rapide.recalculer(scenario, df)
+        profit_recalcule = profit_recalcule.to_numpy(dtype='float64')
+        matrice[i] = np.where(np.isnan(profit_recalcule), profits_excel, profit_recalcule)
+    return np.nan_to_num(matrice, nan=0.0)
+
+
+def _soldes_sequentiels(profits, solde_initial, reference):
+    """Récurrence exacte de calculer_cumuls (solde seul), pour les scénarios passant par un solde <= 0"""
+    facteur = solde_initial / reference if reference > 0 else 1.0
+    solde = solde_initial
+    soldes = np.empty(len(profits), dtype='float64')
+    for i, profit in enumerate(profits.tolist()):
+        profit_ajuste = profit * facteur
+        solde += profit_ajuste * (solde / reference) if solde > 0 and reference > 0 else profit_ajuste
+        soldes[i] = solde
+    return soldes
+
+
+def courbes_solde(profits, soldes, reference):
+    """Soldes après chaque deal, une ligne par solde initial (matrice len(soldes) × len(profits))"""
+    soldes = np.asarray(soldes, dtype='float64')
+    if reference <= 0:
+        return np.vstack([_soldes_sequentiels(profits, s, reference) for s in soldes])
+    with np.errstate(over='ignore', invalid='ignore'):
+        courbes = soldes[:, None] * np.cumprod(1.0 + np.outer(soldes / reference ** 2, profits), axis=1)
+    # Solde nul ou négatif : la récurrence passe en profits non composés, on la rejoue exactement
+    ruines = np.flatnonzero(~(courbes > 0).all(axis=1))
+    for i in ruines:
+        courbes[i] = _soldes_sequentiels(profits, soldes[i], reference)
+    return courbes
+
+
+def _secondes(df):
+    """Instants des deals en secondes depuis le premier (dates manquantes : deal voisin)"""
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce') if COLONNE_DATE in df.columns else pd.Series(pd.NaT, index=df.index)
+    dates = dates.ffill().bfill()
+    if dates.isna().all():
+        return np.zeros(len(df), dtype='float64')
+    return (dates - dates.iloc[0]).dt.total_seconds().to_numpy(dtype='float64')
+
+
+def mesures_courbes(courbes, soldes, secondes):
+    """
+    Mesures par ligne de la matrice des soldes (solde initial en colonne 0 implicite).
+
+    Returns:
+        dict de tableaux : solde_final, rendement_pct, drawdown_max_pct,
+        sous_l_eau_max_jours (plus longue période sous le plus haut, jusqu'au retour au sommet),
+        sous_l_eau_pct (part du temps passée sous le plus haut)
+    """
+    soldes = np.asarray(soldes, dtype='float64')
+    valeurs = np.hstack([soldes[:, None], courbes])
+    instants = np.concatenate([secondes[:1] if len(secondes) else [0.0], secondes])
+    sommets = np.maximum.accumulate(valeurs, axis=1)
+    sous_l_eau = valeurs < sommets
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdowns = np.where(sous_l_eau & (sommets > 0), (sommets - valeurs) / sommets * 100, 0.0)
+
+    # Dernier sommet atteint avant chaque point ; une période sous l'eau dure jusqu'au retour au sommet
+    positions = np.arange(valeurs.shape[1])
+    dernier_sommet = np.maximum.accumulate(np.where(sous_l_eau, 0, positions), axis=1)
+    durees = instants[1:] - instants[dernier_sommet[:, :-1]]
+    durees = np.where(sous_l_eau[:, 1:] | sous_l_eau[:, :-1], durees, 0.0)
+    periode = instants[-1] - instants[0]
+    temps_sous_l_eau = sous_l_eau[:, :-1].astype('float64') @ np.diff(instants)
+
+    solde_final = valeurs[:, -1]
+    return {
+        'solde_final': solde_final,
+        'rendement_pct': (solde_final - soldes) / soldes * 100,
+        'drawdown_max_pct': drawdowns.max(axis=1),
+        'sous_l_eau_max_jours': durees.max(axis=1, initial=0.0) / 86400.0,
+        'sous_l_eau_pct': temps_sous_l_eau / periode * 100 if periode > 0 else np.zeros(len(soldes)),
+    }
+
+
+def evaluer_grille(analyzer, df, soldes, multiplicateurs, solde_initial_reference=10000):
+    """
+    Évalue toutes les combinaisons (solde initial, multiplicateur) sur un DataFrame final.
+
+    Args:
+        analyzer: TradingAnalyzer de l'analyse (broker, types d'instruments)
+        df: DataFrame final trié par date (sortie de fusionner_et_calculer_cumuls)
+        solde_initial_reference: solde de référence des profits Excel (comme fusionner_et_calculer_cumuls)
+
+    Returns:
+        dict {'soldes', 'multiplicateurs', 'solde_initial_reference', 'grille'} ; 'grille' liste une
+        entrée par combinaison (multiplicateur puis solde) avec ses mesures arrondies
+    """
+    soldes, multiplicateurs = valider_grille(soldes, multiplicateurs)
+    reference = float(solde_initial_reference)
+    secondes = _secondes(df)
+    profits = profits_par_multiplicateur(analyzer, df, multiplicateurs)
+    taille_bloc = max(1, ELEMENTS_MAX_BLOC // max(len(df), 1))
+
+    grille = []
+    for i, multiplicateur in enumerate(multiplicateurs):
+        for debut in range(0, len(soldes), taille_bloc):
+            bloc = np.asarray(soldes[debut:debut + taille_bloc], dtype='float64')
+            mesures = mesures_courbes(courbes_solde(profits[i], bloc, reference), bloc, secondes)
+            for j, solde in enumerate(bloc.tolist()):
+                grille.append({
+                    'solde_initial': round(solde, 2),
+                    'multiplicateur': multiplicateur,
+                    'solde_final': round(float(mesures['solde_final'][j]), 2),
+                    'rendement_pct': round(float(mesures['rendement_pct'][j]), 2),
+                    'drawdown_max_pct': round(float(mesures['drawdown_max_pct'][j]), 2),
+                    'sous_l_eau_max_jours': round(float(mesures['sous_l_eau_max_jours'][j]), 1),
+                    'sous_l_eau_pct': round(float(mesures['sous_l_eau_pct'][j]), 1),
+                })
+    print(f"[DEBUG] Scénarios de capital: {len(soldes)} solde(s) × {len(multiplicateurs)} multiplicateur(s) sur {len(df)} deals")
+    return {
+        'soldes': soldes,
+        'multiplicateurs': multiplicateurs,
+        'solde_initial_reference': reference,
+        'grille': grille,
+    }
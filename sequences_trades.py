@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Séries de trades gagnants / perdants (codage par plages, run-length encoding)
+Les trades complets (lignes de même Cle_Match) sont ordonnés par date de clôture, puis la
+suite des signes de profit est découpée en plages consécutives de même signe avec NumPy
+(ruptures de signe ou de groupe, sans boucle par trade). Un trade neutre interrompt la série.
+On en tire, pour tout le portefeuille et pour chaque symbole (un seul passage groupé) :
+- la distribution des longueurs de séries gagnantes et perdantes
+- les plus longues séries avec leurs dates et leur profit
+- le taux de réussite après k pertes consécutives (k = 0 : taux de base)
+
+Usage:
+    resultat = analyser_sequences(df_final)
+    resultat['global']['series_perdantes']['max'], resultat['par_symbole']['EURUSD']
+"""
+
+import numpy as np
+import pandas as pd
+
+from deal_schema import COLONNE_DATE
+
+K_PERTES_MAX = 5
+
+
+def trades_chronologiques(df):
+    """
+    Un trade par Cle_Match, trié par date de clôture (dernière ligne du trade), l'ordre du
+    DataFrame départageant les égalités.
+
+    Returns:
+        DataFrame (profit, ouverture, cloture, symbole)
+    """
+    if len(df) == 0:
+        return pd.DataFrame({'profit': pd.Series(dtype='float64'), 'ouverture': pd.Series(dtype='datetime64[ns]'),
+                             'cloture': pd.Series(dtype='datetime64[ns]'), 'symbole': pd.Series(dtype=object)})
+    cles = df["Cle_Match"].astype(object).to_numpy() if "Cle_Match" in df.columns else np.full(len(df), None, dtype=object)
+    codes, _ = pd.factorize(cles, use_na_sentinel=True)
+    symboles = df["Symbole_ordre"].astype(object) if "Symbole_ordre" in df.columns else pd.Series('', index=df.index)
+    lignes = pd.DataFrame({
+        'trade': codes,
+        'profit': np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0),
+        'date': pd.to_datetime(df[COLONNE_DATE], errors='coerce').to_numpy(dtype='datetime64[ns]'),
+        'symbole': symboles.to_numpy(),
+        'position': np.arange(len(df)),
+    })
+    # Lignes sans Cle_Match : hors trades complets, comme calculer_trades_par_resultat
+    lignes = lignes[codes >= 0]
+    trades = lignes.groupby('trade', sort=False).agg(
+        profit=('profit', 'sum'), ouverture=('date', 'min'), cloture=('date', 'max'),
+        symbole=('symbole', 'first'), position=('position', 'max'))
+    trades = trades.sort_values(['cloture', 'position'], kind='stable', na_position='last')
+    return trades.drop(columns='position').reset_index(drop=True)
+
+
+def plages(groupes, signes):
+    """
+    Plages consécutives de même signe dans chaque groupe (groupes contigus).
+
+    Returns:
+        (debuts, longueurs) : indice du premier trade et nombre de trades de chaque plage
+    """
+    if len(signes) == 0:
+        return np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+    ruptures = np.empty(len(signes), dtype=bool)
+    ruptures[0] = True
+    ruptures[1:] = (signes[1:] != signes[:-1]) | (groupes[1:] != groupes[:-1])
+    debuts = np.flatnonzero(ruptures)
+    longueurs = np.diff(np.append(debuts, len(signes)))
+    return debuts, longueurs
+
+
+def pertes_precedentes(groupes, signes, debuts, longueurs):
+    """Nombre de pertes consécutives juste avant chaque trade, dans son groupe"""
+    rang = np.arange(len(signes)) - np.repeat(debuts, longueurs)
+    avant = np.zeros(len(signes), dtype='int64')
+    if len(signes) > 1:
+        meme_groupe = groupes[1:] == groupes[:-1]
+        avant[1:] = np.where(meme_groupe & (signes[:-1] < 0), rang[:-1] + 1, 0)
+    return avant
+
+
+def _date(valeur):
+    return None if pd.isna(valeur) else pd.Timestamp(valeur).isoformat()
+
+
+def _resume_series(longueurs, debuts, signe_plages, groupe_plages, groupe, signe, trades, cumul_profits):
+    """Distribution, moyenne et plus longue série d'un signe dans un groupe"""
+    selection = (groupe_plages == groupe) & (signe_plages == signe)
+    longueurs_sel = longueurs[selection]
+    if len(longueurs_sel) == 0:
+        return {'nombre': 0, 'max': 0, 'moyenne': 0.0, 'distribution': {}, 'plus_longue': None}
+    valeurs, effectifs = np.unique(longueurs_sel, return_counts=True)
+    # Première plus longue série (ordre chronologique)
+    i = int(np.flatnonzero(selection)[np.argmax(longueurs_sel)])
+    debut, fin = int(debuts[i]), int(debuts[i] + longueurs[i] - 1)
+    return {
+        'nombre': int(len(longueurs_sel)),
+        'max': int(longueurs_sel.max()),
+        'moyenne': round(float(longueurs_sel.mean()), 2),
+        'distribution': {int(v): int(n) for v, n in zip(valeurs, effectifs)},
+        'plus_longue': {
+            'longueur': int(longueurs[i]),
+            'debut': _date(trades['ouverture'].iat[debut]),
+            'fin': _date(trades['cloture'].iat[fin]),
+            'profit': round(float(cumul_profits[fin + 1] - cumul_profits[debut]), 2),
+        },
+    }
+
+
+def _analyser_groupes(trades, groupes, nombre_groupes, k_max):
+    """Séries et taux conditionnels de chaque groupe (trades triés par groupe puis clôture)"""
+    profits = trades['profit'].to_numpy(dtype='float64')
+    signes = np.sign(profits).astype('int8')
+    debuts, longueurs = plages(groupes, signes)
+    signe_plages, groupe_plages = signes[debuts], groupes[debuts]
+    cumul_profits = np.concatenate([[0.0], np.cumsum(profits)])
+
+    # Taux de réussite après au moins k pertes consécutives : comptes par (groupe, min(pertes, k_max))
+    avant = np.minimum(pertes_precedentes(groupes, signes, debuts, longueurs), k_max)
+    cases = groupes * (k_max + 1) + avant
+    taille = nombre_groupes * (k_max + 1)
+    gagnants = np.bincount(cases, weights=signes > 0, minlength=taille).reshape(nombre_groupes, k_max + 1)
+    decides = np.bincount(cases, weights=signes != 0, minlength=taille).reshape(nombre_groupes, k_max + 1)
+    gagnants = np.cumsum(gagnants[:, ::-1], axis=1)[:, ::-1]
+    decides = np.cumsum(decides[:, ::-1], axis=1)[:, ::-1]
+
+    resultats = []
+    for groupe in range(nombre_groupes):
+        conditionnel = [{
+            'k': k,
+            'trades': int(decides[groupe, k]),
+            'taux_reussite': round(float(gagnants[groupe, k] / decides[groupe, k] * 100), 2) if decides[groupe, k] else None,
+        } for k in range(k_max + 1)]
+        resultats.append({
+            'trades': int((groupes == groupe).sum()),
+            'series_gagnantes': _resume_series(longueurs, debuts, signe_plages, groupe_plages, groupe, 1, trades, cumul_profits),
+            'series_perdantes': _resume_series(longueurs, debuts, signe_plages, groupe_plages, groupe, -1, trades, cumul_profits),
+            'taux_reussite_apres_pertes': conditionnel,
+        })
+    return resultats
+
+
+def analyser_sequences(df, k_max=K_PERTES_MAX):
+    """
+    Séries gagnantes / perdantes d'un DataFrame final, globales et par symbole.
+
+    Returns:
+        dict {'global': {...}, 'par_symbole': {symbole: {...}}} ; chaque bloc contient 'trades',
+        'series_gagnantes', 'series_perdantes' (nombre, max, moyenne, distribution longueur -> nombre
+        de séries, plus_longue) et 'taux_reussite_apres_pertes' (k = 0 à k_max, « au moins k pertes »)
+    """
+    trades = trades_chronologiques(df)
+    global_ = _analyser_groupes(trades, np.zeros(len(trades), dtype='int64'), 1, k_max)[0]
+
+    # Par symbole : tri stable par symbole (l'ordre chronologique est conservé dans chaque symbole)
+    codes, symboles = pd.factorize(trades['symbole'].astype(str), sort=True)
+    ordre = np.argsort(codes, kind='stable')
+    par_symbole = _analyser_groupes(trades.iloc[ordre].reset_index(drop=True), codes[ordre], len(symboles), k_max)
+    print(f"[DEBUG] Séquences: {len(trades)} trades, {len(symboles)} symbole(s), "
+          f"séries max {global_['series_gagnantes']['max']} gagnante(s) / {global_['series_perdantes']['max']} perdante(s)")
+    return {'global': global_, 'par_symbole': dict(zip([str(s) for s in symboles], par_symbole))}
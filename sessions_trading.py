@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Sessions de trading configurables, avec changements d'heure
+Les dates des rapports MT5 sont en heure du serveur du broker. Elles sont ramenées en UTC
+(décalage fixe en heures, ex. '+2', ou fuseau du serveur, ex. 'Europe/Athens' pour les
+serveurs GMT+2 / GMT+3), puis chaque session est définie en heure locale de sa place
+(Londres 08:00-17:00 heure de Londres...) : les bornes suivent l'heure d'été de chaque place.
+Les sessions peuvent se chevaucher, et une session peut être l'intersection d'autres
+sessions (ex. Londres/New York).
+
+Affectation vectorisée : pour chaque fuseau, minute locale de chaque instant, puis lecture
+dans une table de 1440 minutes donnant le masque (un bit par session) ; les intersections
+sont des ET sur les bits. Les agrégats de tous les symboles viennent d'un seul groupby
+(symbole, session), le total étant sa somme par session.
+
+Préréglages :
+- 'utc' (défaut) : Asie 00:00-08:00, Europe 08:00-16:00, Amérique 16:00-24:00 UTC
+- 'marches' : Asie (Tokyo 09:00-18:00), Europe (Londres 08:00-17:00), Amérique (New York
+  08:00-17:00), Londres/New York (chevauchement Europe / Amérique)
+
+Usage:
+    config = configuration_sessions('marches', fuseau_serveur='Europe/Athens')
+    resultat = performance_par_session(df_final, config)
+    resultat['sessions_total']['pnl_out']['Londres/New York']
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from deal_schema import COLONNE_DATE
+
+MINUTES_JOUR = 24 * 60
+SESSIONS_MAX = 16
+PRESETS_SESSIONS = {
+    'utc': [
+        {'nom': 'Asie', 'debut': '00:00', 'fin': '08:00', 'fuseau': 'UTC'},
+        {'nom': 'Europe', 'debut': '08:00', 'fin': '16:00', 'fuseau': 'UTC'},
+        {'nom': 'Amérique', 'debut': '16:00', 'fin': '24:00', 'fuseau': 'UTC'},
+    ],
+    'marches': [
+        {'nom': 'Asie', 'debut': '09:00', 'fin': '18:00', 'fuseau': 'Asia/Tokyo'},
+        {'nom': 'Europe', 'debut': '08:00', 'fin': '17:00', 'fuseau': 'Europe/London'},
+        {'nom': 'Amérique', 'debut': '08:00', 'fin': '17:00', 'fuseau': 'America/New_York'},
+        {'nom': 'Londres/New York', 'intersection': ['Europe', 'Amérique']},
+    ],
+}
+
+
+def _minutes(texte, nom):
+    """'HH:MM' -> minutes depuis minuit (24:00 accepté comme fin de journée)"""
+    try:
+        heures, minutes = str(texte).strip().split(':')
+        valeur = int(heures) * 60 + int(minutes)
+    except Exception:
+        raise ValueError(f"Session {nom}: heure invalide {texte!r} (attendu HH:MM)")
+    if not 0 <= int(minutes) < 60 or not 0 <= valeur <= MINUTES_JOUR:
+        raise ValueError(f"Session {nom}: heure invalide {texte!r} (attendu HH:MM)")
+    return valeur
+
+
+def _fuseau(nom_fuseau, contexte):
+    """Vérifie un nom de fuseau IANA (ex. 'Europe/London')"""
+    try:
+        pd.Timestamp('2000-01-01', tz=nom_fuseau)
+    except Exception:
+        raise ValueError(f"{contexte}: fuseau inconnu {nom_fuseau!r}")
+    return str(nom_fuseau)
+
+
+def decalage_serveur(fuseau_serveur):
+    """
+    Décalage fixe du serveur en minutes ('+2', '-5', '2.5', 'UTC+3'), ou None pour un fuseau
+    IANA (décalage variable selon l'heure d'été)
+    """
+    texte = str(fuseau_serveur if fuseau_serveur is not None else 'UTC').strip()
+    if texte.upper() in ('', 'UTC', 'GMT'):
+        return 0
+    numerique = texte.upper().removeprefix('UTC').removeprefix('GMT')
+    try:
+        heures = float(numerique)
+    except ValueError:
+        _fuseau(texte, "Fuseau du serveur")
+        return None
+    if not -14 <= heures <= 14:
+        raise ValueError(f"Fuseau du serveur: décalage hors limites {texte!r}")
+    return int(round(heures * 60))
+
+
+def configuration_sessions(definitions='utc', fuseau_serveur='UTC'):
+    """
+    Valide une configuration de sessions.
+
+    Args:
+        definitions: nom de préréglage ('utc', 'marches'), chemin d'un fichier JSON, ou liste de
+            dict {'nom', 'debut', 'fin', 'fuseau'} / {'nom', 'intersection': [noms]} ; une session
+            dont la fin précède le début passe minuit
+        fuseau_serveur: heure des dates du rapport (décalage en heures ou fuseau IANA)
+
+    Returns:
+        dict {'fuseau_serveur', 'sessions': [définitions normalisées]}
+    """
+    if isinstance(definitions, str):
+        cle = definitions.strip()
+        if cle in PRESETS_SESSIONS:
+            definitions = PRESETS_SESSIONS[cle]
+        elif os.path.isfile(cle):
+            with open(cle, 'r', encoding='utf-8') as f:
+                contenu = json.load(f)
+            # Fichier : liste de sessions, ou {'sessions': [...], 'fuseau_serveur': ...}
+            if isinstance(contenu, dict):
+                fuseau_serveur = contenu.get('fuseau_serveur', fuseau_serveur)
+                contenu = contenu.get('sessions')
+            definitions = contenu
+        else:
+            raise ValueError(f"Sessions inconnues: {cle} (préréglages: {', '.join(PRESETS_SESSIONS)}, ou fichier JSON)")
+    if not isinstance(definitions, (list, tuple)) or not definitions:
+        raise ValueError("Aucune session définie")
+    if len(definitions) > SESSIONS_MAX:
+        raise ValueError(f"Trop de sessions ({len(definitions)}, max {SESSIONS_MAX})")
+    decalage_serveur(fuseau_serveur)
+
+    sessions = []
+    noms = []
+    for definition in definitions:
+        nom = str(definition.get('nom') or '').strip()
+        if not nom or nom in noms:
+            raise ValueError(f"Nom de session vide ou en double: {nom!r}")
+        if 'intersection' in definition:
+            composantes = [str(n) for n in definition['intersection']]
+            inconnues = [n for n in composantes if n not in noms]
+            if len(composantes) < 2 or inconnues:
+                raise ValueError(f"Session {nom}: l'intersection doit porter sur au moins deux sessions définies avant elle")
+            sessions.append({'nom': nom, 'intersection': composantes})
+        else:
+            debut = _minutes(definition.get('debut'), nom)
+            fin = _minutes(definition.get('fin'), nom)
+            if debut == fin:
+                raise ValueError(f"Session {nom}: début et fin identiques")
+            sessions.append({'nom': nom, 'debut': f"{debut // 60:02d}:{debut % 60:02d}",
+                             'fin': f"{fin // 60:02d}:{fin % 60:02d}",
+                             'fuseau': _fuseau(definition.get('fuseau') or 'UTC', f"Session {nom}")})
+        noms.append(nom)
+    return {'fuseau_serveur': str(fuseau_serveur if fuseau_serveur is not None else 'UTC'), 'sessions': sessions}
+
+
+def configuration_environnement():
+    """Configuration lue dans ANALYZER_SESSIONS (préréglage ou fichier JSON) et ANALYZER_FUSEAU_SERVEUR"""
+    return configuration_sessions(os.environ.get('ANALYZER_SESSIONS', 'utc'),
+                                  os.environ.get('ANALYZER_FUSEAU_SERVEUR', 'UTC'))
+
+
+def noms_sessions(config):
+    return [s['nom'] for s in config['sessions']]
+
+
+def instants_utc(dates, fuseau_serveur):
+    """Dates du serveur (naïves) -> instants UTC naïfs (NaT conservés)"""
+    dates = pd.DatetimeIndex(pd.to_datetime(dates, errors='coerce'))
+    if dates.tz is not None:
+        return dates.tz_convert('UTC').tz_localize(None)
+    decalage = decalage_serveur(fuseau_serveur)
+    if decalage is not None:
+        return dates - pd.Timedelta(minutes=decalage)
+    # Heure répétée au passage à l'heure d'hiver : heure d'hiver ; heure sautée : décalée après le saut
+    return dates.tz_localize(str(fuseau_serveur), ambiguous=np.zeros(len(dates), dtype=bool),
+                             nonexistent='shift_forward').tz_convert('UTC').tz_localize(None)
+
+
+def masques_sessions(instants, config):
+    """
+    Masque des sessions de chaque instant UTC (bit i : i-ème session de la configuration ;
+    0 pour un instant hors session ou NaT)
+    """
+    instants = pd.DatetimeIndex(instants)
+    masques = np.zeros(len(instants), dtype='int64')
+    valides = ~np.asarray(instants.isna())
+    sessions = config['sessions']
+    fuseaux = {s['fuseau'] for s in sessions if 'fuseau' in s}
+    for fuseau in sorted(fuseaux):
+        # Une table par fuseau : minute locale -> bits des sessions de ce fuseau
+        table = np.zeros(MINUTES_JOUR, dtype='int64')
+        minutes = np.arange(MINUTES_JOUR)
+        for i, session in enumerate(sessions):
+            if session.get('fuseau') != fuseau:
+                continue
+            debut, fin = _minutes(session['debut'], session['nom']), _minutes(session['fin'], session['nom'])
+            dedans = (minutes >= debut) & (minutes < fin) if debut < fin else (minutes >= debut) | (minutes < fin)
+            table[dedans] |= 1 << i
+        locales = instants.tz_localize('UTC').tz_convert(fuseau)
+        minute_locale = np.where(valides, np.nan_to_num(locales.hour * 60 + locales.minute).astype('int64'), 0)
+        masques |= np.where(valides, table[minute_locale], 0)
+    for i, session in enumerate(sessions):
+        if 'intersection' in session:
+            bits = sum(1 << noms_sessions(config).index(n) for n in session['intersection'])
+            masques |= np.where((masques & bits) == bits, 1 << i, 0)
+    return masques
+
+
+def _bloc(table, noms):
+    """Bloc de sortie (une valeur par session) à partir des sommes par session"""
+    table = table.reindex(range(len(noms)), fill_value=0)
+    ouvertures = table['ouvertures'].to_numpy(dtype='float64')
+    taux = np.divide(table['gagnants_in'].to_numpy(dtype='float64') * 100, ouvertures,
+                     out=np.zeros(len(noms)), where=ouvertures > 0)
+    return {
+        'in_count': {nom: int(v) for nom, v in zip(noms, table['in_count'])},
+        'taux_reussite_in_pct': {nom: round(float(v), 2) for nom, v in zip(noms, taux)},
+        'pnl_out': {nom: round(float(v), 2) for nom, v in zip(noms, table['pnl_out'])},
+        'tp_out': {nom: int(v) for nom, v in zip(noms, table['tp_out'])},
+        'sl_out': {nom: int(v) for nom, v in zip(noms, table['sl_out'])},
+    }
+
+
+def performance_par_session(df, config=None):
+    """
+    Performance par session d'un DataFrame final.
+
+    - Côté IN : nombre de deals IN ouverts dans la session, taux de réussite des trades dont
+      le premier IN est dans la session (profit total > 0)
+    - Côté OUT : PnL total, TP et SL des trades attribués à la session de leur dernier OUT
+
+    Returns:
+        dict {'sessions': noms, 'fuseau_serveur', 'sessions_total': bloc, 'sessions_par_pair':
+        {symbole: bloc}} ; bloc : in_count, taux_reussite_in_pct, pnl_out, tp_out, sl_out
+        (une valeur par session)
+    """
+    config = config or configuration_environnement()
+    noms = noms_sessions(config)
+    result = {'sessions': noms, 'fuseau_serveur': config['fuseau_serveur'], 'sessions_total': {}, 'sessions_par_pair': {}}
+    if COLONNE_DATE not in df.columns or "Direction" not in df.columns:
+        return result
+
+    dates = pd.to_datetime(df[COLONNE_DATE], errors='coerce').to_numpy(dtype='datetime64[ns]')
+    datees = ~np.isnat(dates)
+    if not datees.any():
+        return result
+    direction = df["Direction"].astype(object).to_numpy()
+    profits = np.nan_to_num(df["Profit"].to_numpy(dtype='float64'), nan=0.0)
+    symboles = df["Symbole_ordre"].astype(object).to_numpy() if "Symbole_ordre" in df.columns else np.full(len(df), None, dtype=object)
+    # Symboles des lignes datées (les lignes sans symbole comptent seulement dans le total)
+    codes_symboles, liste_symboles = pd.factorize(symboles[datees], use_na_sentinel=True)
+    symbole_ligne = np.full(len(df), -1, dtype='int64')
+    symbole_ligne[datees] = codes_symboles
+
+    # Événements : deals IN (nombre), ouvertures de trades (premier IN), clôtures (dernier OUT)
+    entrees = datees & (direction == "in")
+    evenements = [pd.DataFrame({'symbole': symbole_ligne[entrees], 'instant': dates[entrees], 'in_count': 1})]
+    if "Cle_Match" in df.columns:
+        codes_trades, _ = pd.factorize(df["Cle_Match"].astype(object).to_numpy(), use_na_sentinel=True)
+        avec_cle = datees & (codes_trades >= 0)
+        lignes = pd.DataFrame({
+            'trade': codes_trades[avec_cle], 'profit': profits[avec_cle], 'symbole': symbole_ligne[avec_cle],
+            'entree': np.where(direction[avec_cle] == "in", dates[avec_cle], np.datetime64('NaT')),
+            'sortie': np.where(direction[avec_cle] == "out", dates[avec_cle], np.datetime64('NaT')),
+        })
+        trades = lignes.groupby('trade', sort=False).agg(profit=('profit', 'sum'), symbole=('symbole', 'first'),
+                                                         entree=('entree', 'min'), sortie=('sortie', 'max'))
+        ouverts = trades[trades['entree'].notna()]
+        evenements.append(pd.DataFrame({'symbole': ouverts['symbole'].to_numpy(), 'instant': ouverts['entree'].to_numpy(),
+                                        'ouvertures': 1, 'gagnants_in': (ouverts['profit'] > 0).to_numpy(dtype='int64')}))
+        fermes = trades[trades['sortie'].notna()]
+        evenements.append(pd.DataFrame({'symbole': fermes['symbole'].to_numpy(), 'instant': fermes['sortie'].to_numpy(),
+                                        'pnl_out': fermes['profit'].to_numpy(),
+                                        'tp_out': (fermes['profit'] > 0).to_numpy(dtype='int64'),
+                                        'sl_out': (fermes['profit'] < 0).to_numpy(dtype='int64')}))
+    evenements = pd.concat(evenements, ignore_index=True)
+    colonnes = ['in_count', 'ouvertures', 'gagnants_in', 'pnl_out', 'tp_out', 'sl_out']
+    evenements = evenements.reindex(columns=['symbole', 'instant'] + colonnes).fillna({c: 0 for c in colonnes})
+
+    # Une ligne par (événement, session) : les sessions qui se chevauchent comptent chacune l'événement
+    masques = masques_sessions(instants_utc(evenements['instant'], config['fuseau_serveur']), config)
+    indices, sessions = np.nonzero((masques[:, None] >> np.arange(len(noms))) & 1)
+    longues = evenements[colonnes].iloc[indices].assign(symbole=evenements['symbole'].to_numpy()[indices], session=sessions)
+    par_symbole = longues.groupby(['symbole', 'session'])[colonnes].sum()
+
+    result['sessions_total'] = _bloc(par_symbole.groupby(level='session').sum(), noms)
+    tables = {code: table.droplevel('symbole') for code, table in par_symbole.groupby(level='symbole')}
+    vide = pd.DataFrame(columns=colonnes, dtype='float64')
+    for code, symbole in enumerate(liste_symboles):
+        result['sessions_par_pair'][symbole] = _bloc(tables.get(code, vide), noms)
+    print(f"[DEBUG] Sessions: {len(noms)} session(s), {len(evenements)} événement(s), {len(liste_symboles)} symbole(s), "
+          f"serveur {config['fuseau_serveur']}")
+    return result
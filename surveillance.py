@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Surveillance d'un dossier de rapports MT5 (exports déposés par les terminaux)
+Scrute périodiquement le dossier (simple polling, aucune API système) et ne ré-analyse
+que les rapports nouveaux ou modifiés, identifiés par l'empreinte SHA-256 de leur
+contenu et non par leur nom. Les résultats par fichier sont conservés en mémoire et
+sur disque (<sortie>/.surveillance) : un redémarrage ne ré-analyse pas l'historique.
+
+L'analyse fusionnée est une AnalysePersistee (analyse_incrementale) : les rapports
+nouveaux y sont ajoutés en reprenant l'état des cumuls et les agrégats additifs, sans
+refusionner l'historique. Un recalcul complet (fusion des résultats conservés par fichier,
+sans ré-analyse) n'a lieu qu'au premier passage, quand un rapport déjà intégré est modifié
+ou retiré, ou quand des deals ajoutés sont antérieurs au dernier deal connu.
+
+Le rapport et le résumé (noms fixes, *_surveillance.*) sont ensuite réécrits à partir du
+DataFrame conservé : le fichier de rapport est toujours réécrit en entier (en xlsx, Monte
+Carlo et grille what-if compris ; --format json / parquet pour une réécriture légère).
+Les archives (zip / tar.gz) sont ignorées : utiliser `analyzer.py run` pour celles-ci.
+
+Usage:
+    python analyzer.py watch <dossier> [--intervalle 30] [options de run]
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from datetime import datetime
+
+from analyse_incrementale import AnalysePersistee
+from analyzer import lister_rapports, statistiques_par_fichier, ecrire_resultat, _json
+from archive_ingestion import est_archive
+from ingestion import CacheFichiers, IngestionPool, _renommer_source
+from profiling import ProfilEtapes, collecteur_courant, etape
+
+HORODATAGE_SURVEILLANCE = 'surveillance'
+
+
+class SurveillanceDossier:
+    """État de la surveillance : rapports connus, résultats par fichier, analyse fusionnée"""
+
+    def __init__(self, entrees, sortie, solde_initial=10000, multiplier=1.0, broker=None, filter_type=None,
+                 engine=None, jobs=1, format_fichier='xlsx', journal=None):
+        from trading_analyzer_unified import TradingAnalyzer
+
+        self.entrees = entrees
+        self.sortie = sortie
+        self.solde_initial = solde_initial
+        self.filter_type = filter_type
+        self.format_fichier = format_fichier
+        self.analyzer = TradingAnalyzer(solde_initial=solde_initial, multiplier=multiplier, broker=broker, engine=engine)
+        self.pool = IngestionPool(max_workers=jobs, journal=journal) if jobs > 1 else None
+        self.dossier_etat = os.path.join(sortie, '.surveillance')
+        os.makedirs(self.dossier_etat, exist_ok=True)
+        # chemin -> {'signature': (mtime_ns, taille), 'empreinte': sha256}
+        self.fichiers = {}
+        # chemin -> (df, erreur, exclus, doublons) du dernier contenu analysé
+        self.resultats = {}
+        # Ordre des rapports du dernier passage (ordre de fusion, comme process_files)
+        self.ordre = []
+        # chemin -> signature vue au dernier passage, pas encore stable (copie en cours)
+        self.en_attente = {}
+        # Analyse fusionnée (cumuls repris et agrégats additifs lors des ajouts)
+        self.analyse = None
+        # Dernier passage : cumuls recalculés sur tout l'historique (et non repris)
+        self.recalcul_complet = False
+        self.df_final = None
+        self.statistiques = None
+        self.derniere_mise_a_jour = None
+        # Fichiers du dernier passage dont le contenu était déjà analysé (autre nom, état sur disque)
+        self.reutilises = []
+
+    # ------------------------------------------------------------------
+    def _cle_parametres(self):
+        """Paramètres d'analyse qui invalident les résultats conservés sur disque"""
+        analyzer = self.analyzer
+        version_broker = None
+        if analyzer.broker:
+            from broker_manager import get_broker_manager
+            version_broker = get_broker_manager().signature_broker(analyzer.broker)
+        parametres = (self.filter_type, float(analyzer.solde_initial), float(analyzer.multiplier), analyzer.broker,
+                      tuple(version_broker) if version_broker else None, analyzer.engine)
+        return hashlib.sha1(repr(parametres).encode('utf-8')).hexdigest()[:16]
+
+    def _chemin_etat(self, empreinte):
+        return os.path.join(self.dossier_etat, f"{empreinte}_{self._cle_parametres()}.pkl")
+
+    def _charger_etat(self, empreinte):
+        chemin = self._chemin_etat(empreinte)
+        if not os.path.exists(chemin):
+            return None
+        try:
+            with open(chemin, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"[WARNING] Résultat conservé illisible ({os.path.basename(chemin)}): {str(e)}")
+            return None
+
+    def _sauver_etat(self, empreinte, nom_fichier, resultat):
+        if resultat[0] is None:
+            return
+        chemin = self._chemin_etat(empreinte)
+        temporaire = f"{chemin}.tmp"
+        with open(temporaire, 'wb') as f:
+            pickle.dump((nom_fichier, resultat), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporaire, chemin)
+
+    # ------------------------------------------------------------------
+    def detecter_changements(self, premier_passage=False):
+        """
+        Compare le dossier à l'état connu.
+
+        Un fichier dont la taille / date change n'est haché qu'une fois stable sur deux
+        passages (export encore en cours d'écriture) ; au premier passage tout est pris.
+
+        Returns:
+            (chemins à analyser {chemin: (signature, empreinte)}, chemins disparus)
+        """
+        presents = [chemin for chemin in lister_rapports(self.entrees) if not est_archive(chemin)]
+        self.ordre = presents
+        a_analyser = {}
+        for chemin in presents:
+            try:
+                stat = os.stat(chemin)
+            except OSError:
+                continue
+            signature = (stat.st_mtime_ns, stat.st_size)
+            connu = self.fichiers.get(chemin)
+            if connu is not None and connu['signature'] == signature:
+                self.en_attente.pop(chemin, None)
+                continue
+            if not premier_passage and self.en_attente.get(chemin) != signature:
+                self.en_attente[chemin] = signature
+                continue
+            self.en_attente.pop(chemin, None)
+            try:
+                empreinte = CacheFichiers.empreinte(chemin)
+            except OSError:
+                continue
+            if connu is not None and connu['empreinte'] == empreinte:
+                # Même contenu (copie, touch) : rien à refaire
+                connu['signature'] = signature
+                continue
+            a_analyser[chemin] = (signature, empreinte)
+        restants = set(presents)
+        disparus = [chemin for chemin in self.fichiers if chemin not in restants]
+        return a_analyser, disparus
+
+    @staticmethod
+    def _extraire_timings(resultat, nom_fichier):
+        """Reporte les mesures d'ingestion du fichier dans le passage courant (une seule fois)"""
+        df = resultat[0]
+        if df is None:
+            return
+        etapes_fichier = df.attrs.pop('timings', None)
+        if etapes_fichier and collecteur_courant() is not None:
+            collecteur_courant().ajouter(etapes_fichier, fichier=nom_fichier)
+
+    def _analyser(self, a_analyser):
+        """Résultats des fichiers modifiés : contenu déjà vu (disque, autre nom) ou analyse via le pool"""
+        resultats = {}
+        futures = {}
+        self.reutilises = []
+        empreintes_connues = {self.fichiers[c]['empreinte']: c for c, resultat in self.resultats.items()
+                              if c in self.fichiers and resultat[0] is not None}
+        for chemin, (_, empreinte) in a_analyser.items():
+            nom = os.path.basename(chemin)
+            if empreinte in empreintes_connues:
+                source = empreintes_connues[empreinte]
+                df, erreur, exclus, doublons = self.resultats[source]
+                resultats[chemin] = (_renommer_source(df.copy(), os.path.basename(source), nom), erreur, exclus, doublons)
+                self.reutilises.append(nom)
+                continue
+            conserve = self._charger_etat(empreinte)
+            if conserve is not None:
+                nom_origine, (df, erreur, exclus, doublons) = conserve
+                resultats[chemin] = (_renommer_source(df, nom_origine, nom), erreur, exclus, doublons)
+                self.reutilises.append(nom)
+                continue
+            if self.pool is not None:
+                futures[chemin] = self.pool.soumettre(chemin, self.filter_type, self.analyzer.solde_initial,
+                                                      self.analyzer.multiplier, self.analyzer.broker, self.analyzer.engine)
+            else:
+                resultats[chemin] = self.analyzer.process_single_file(chemin, self.filter_type)
+                self._extraire_timings(resultats[chemin], nom)
+                self._sauver_etat(empreinte, nom, resultats[chemin])
+        for chemin, future in futures.items():
+            try:
+                resultats[chemin] = future.result()
+            except Exception as e:
+                print(f"[ERROR] Analyse en échec pour {os.path.basename(chemin)}: {str(e)}")
+                resultats[chemin] = (None, str(e), 0, 0)
+            self._extraire_timings(resultats[chemin], os.path.basename(chemin))
+            self._sauver_etat(a_analyser[chemin][1], os.path.basename(chemin), resultats[chemin])
+        return resultats
+
+    def scruter(self, premier_passage=False):
+        """
+        Un passage de surveillance.
+
+        Returns:
+            dict {'analyses': [...], 'disparus': [...], 'rapport': chemin ou None}
+        """
+        a_analyser, disparus = self.detecter_changements(premier_passage)
+        if not a_analyser and not disparus:
+            return {'analyses': [], 'disparus': [], 'rapport': None}
+
+        profil = ProfilEtapes(HORODATAGE_SURVEILLANCE)
+        with profil.actif():
+            with etape("ingestion", fichiers=len(a_analyser)):
+                resultats = self._analyser(a_analyser)
+            # Seuls des rapports nouveaux (ou jusque-là sans deals) : ajout à l'analyse conservée
+            remplaces = [c for c in list(resultats) + disparus if self.resultats.get(c, (None,))[0] is not None]
+            incremental = self.analyse is not None and not remplaces
+            for chemin, resultat in resultats.items():
+                signature, empreinte = a_analyser[chemin]
+                self.fichiers[chemin] = {'signature': signature, 'empreinte': empreinte}
+                self.resultats[chemin] = resultat
+            for chemin in disparus:
+                self.fichiers.pop(chemin, None)
+                self.resultats.pop(chemin, None)
+            if incremental:
+                rapport = self.ajouter([c for c in self.ordre if c in resultats])
+            else:
+                rapport = self.rafraichir()
+        self.derniere_mise_a_jour = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'analyses': [os.path.basename(c) for c in resultats],
+            'reutilises': self.reutilises,
+            'disparus': [os.path.basename(c) for c in disparus],
+            'recalcul_complet': self.recalcul_complet,
+            'timings': profil.resume()['par_etape'],
+        }
+        self._ecrire_resume(rapport)
+        return {'analyses': list(resultats), 'disparus': disparus, 'rapport': rapport}
+
+    def rafraichir(self):
+        """Recalcul complet : fusionne les résultats conservés (sans ré-analyse), recalcule les cumuls et réécrit le rapport"""
+        analyzer = self.analyzer
+        self.recalcul_complet = True
+        analyzer.statistiques_fichiers = {}
+        tous_les_resultats = []
+        for chemin in [c for c in self.ordre if c in self.resultats]:
+            df, erreur, exclus, doublons = self.resultats[chemin]
+            analyzer._enregistrer_resultat_fichier(os.path.basename(chemin),
+                                                   (None if df is None else df.copy(), erreur, exclus, doublons),
+                                                   tous_les_resultats)
+        if not tous_les_resultats:
+            self.analyse, self.df_final, self.statistiques = None, None, None
+            return None
+        with etape("cumuls", lignes_entree=sum(len(df) for df in tous_les_resultats)) as mesure:
+            df_final = analyzer.fusionner_et_calculer_cumuls(tous_les_resultats, solde_initial_reference=10000)
+            mesure.sortie(df_final)
+        self.analyse = AnalysePersistee(df_final, solde_initial=self.solde_initial, multiplier=analyzer.multiplier,
+                                        broker=analyzer.broker, engine=analyzer.engine, filter_type=self.filter_type,
+                                        etat_cumuls=analyzer.etat_cumuls)
+        return self._ecrire_rapport()
+
+    def ajouter(self, chemins):
+        """Ajoute les résultats de rapports nouveaux à l'analyse conservée, puis réécrit le rapport"""
+        analyzer = self.analyzer
+        self.recalcul_complet = False
+        lots = []
+        for chemin in chemins:
+            df, erreur, exclus, doublons = self.resultats[chemin]
+            analyzer._enregistrer_resultat_fichier(os.path.basename(chemin),
+                                                   (None if df is None else df.copy(), erreur, exclus, doublons), lots)
+        if lots:
+            with etape("cumuls", lignes_entree=sum(len(df) for df in lots)) as mesure:
+                resume = self.analyse.ajouter_resultats(lots)
+                mesure.sortie(resume['lignes'])
+            # Deals antérieurs au dernier deal connu : l'analyse a recalculé les cumuls
+            self.recalcul_complet = resume['recalcul_complet']
+        return self._ecrire_rapport()
+
+    def _statistiques(self):
+        """statistiques_globales tirées des agrégats additifs de l'analyse (sans parcourir l'historique)"""
+        agregats, df = self.analyse.agregats, self.analyse.df
+        dernier = df.iloc[-1]
+        solde_final = float(dernier['Solde_cumule'])
+        decides = agregats['gagnants'] + agregats['perdants']
+        return {
+            'lignes': len(df),
+            'total_trades': agregats['total'],
+            'trades_gagnants': agregats['gagnants'],
+            'trades_perdants': agregats['perdants'],
+            'trades_neutres': agregats['neutres'],
+            'taux_reussite': round(agregats['gagnants'] / decides * 100, 1) if decides else 0,
+            'profit_total': round(agregats['profit_total'], 2),
+            'profit_compose': round(float(dernier['Profit_cumule']), 2),
+            'pips_totaux': round(float(dernier['Profit_pips_cumule']), 2),
+            'solde_initial': round(float(self.solde_initial), 2),
+            'solde_final': round(solde_final, 2),
+            'rendement_pct': round((solde_final - self.solde_initial) / self.solde_initial * 100, 2) if self.solde_initial else 0,
+            'drawdown_max': round(agregats['drawdown_max'], 2),
+        }
+
+    def _ecrire_rapport(self):
+        """Statistiques puis réécriture du rapport à partir du DataFrame de l'analyse"""
+        analyzer = self.analyzer
+        self.df_final = self.analyse.df
+        self.statistiques = self._statistiques()
+        try:
+            with etape("ecriture_resultat", lignes_entree=self.df_final, format=self.format_fichier):
+                return ecrire_resultat(analyzer, self.df_final, self.format_fichier, self.sortie,
+                                       HORODATAGE_SURVEILLANCE, self.filter_type)
+        except Exception as e:
+            print(f"[ERROR] Écriture du rapport impossible: {str(e)}")
+            return None
+
+    def _ecrire_resume(self, rapport):
+        resume = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'entrees': self.entrees,
+            'fichiers': statistiques_par_fichier(self.analyzer, self.df_final, self.filter_type),
+            'global': self.statistiques,
+            'resultat': rapport,
+            'derniere_mise_a_jour': self.derniere_mise_a_jour,
+        }
+        chemin = os.path.join(self.sortie, f"RESUME_{HORODATAGE_SURVEILLANCE}.json")
+        with open(f"{chemin}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(resume, f, indent=2, ensure_ascii=False, default=_json)
+        os.replace(f"{chemin}.tmp", chemin)
+
+    # ------------------------------------------------------------------
+    def executer(self, intervalle=30.0, iterations=None, journal=sys.stderr):
+        """Boucle de surveillance (Ctrl+C pour arrêter) ; iterations=None pour ne jamais s'arrêter"""
+        passage = 0
+        try:
+            while iterations is None or passage < iterations:
+                debut = time.perf_counter()
+                changements = self.scruter(premier_passage=(passage == 0))
+                if changements['analyses'] or changements['disparus']:
+                    stats = self.statistiques or {}
+                    print(f"[INFO] {datetime.now():%H:%M:%S} {len(changements['analyses'])} rapport(s) analysé(s) "
+                          f"(dont {len(self.reutilises)} déjà connu(s)), "
+                          f"{len(changements['disparus'])} retiré(s) en {time.perf_counter() - debut:.1f} s - "
+                          f"{stats.get('total_trades', 0)} trades, solde final {stats.get('solde_final')}", file=journal)
+                passage += 1
+                if iterations is None or passage < iterations:
+                    time.sleep(intervalle)
+        except KeyboardInterrupt:
+            print("[INFO] Surveillance arrêtée", file=journal)
+        finally:
+            if self.pool is not None:
+                self.pool.arreter()
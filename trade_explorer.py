@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Explorateur de trades paginé côté serveur
+Permet de parcourir le DataFrame conservé en mémoire après une analyse
+(tri sur n'importe quelle colonne, filtres, pagination par curseur)
+sans renvoyer toutes les lignes au navigateur.
+"""
+
+import base64
+import json
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+class CurseurInvalide(ValueError):
+    """Curseur de pagination illisible ou obsolète"""
+
+
+class TradeExplorer:
+    """Vue paginée et triée sur le DataFrame final d'une tâche"""
+
+    LIMITE_DEFAUT = 100
+    LIMITE_MAX = 1000
+    # Nombre de vues (tri + filtres) gardées en cache
+    TAILLE_CACHE_VUES = 16
+
+    def __init__(self, df: pd.DataFrame):
+        # DataFrame d'origine (permet de détecter un remplacement côté tâche)
+        self.source = df
+        self.df = df.reset_index(drop=True)
+        # Identifiant de version : un curseur émis sur un autre DataFrame est rejeté
+        self.version = uuid.uuid4().hex[:12]
+        self._permutations = {}
+        self._vues = OrderedDict()
+        self._dates = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Tri
+    # ------------------------------------------------------------------
+    def _serie_tri(self, colonne):
+        """Série utilisée pour trier une colonne (dates parsées pour l'heure d'ouverture)"""
+        if colonne == "Heure d'ouverture":
+            return pd.Series(self._serie_dates())
+        return self.df[colonne]
+
+    def _permutation(self, colonne, descendant=False):
+        """Permutation triée (stable, NaN en fin) calculée à la demande puis mise en cache"""
+        cle = (colonne, descendant)
+        perm = self._permutations.get(cle)
+        if perm is not None:
+            return perm
+        serie = self._serie_tri(colonne)
+        try:
+            ordre = serie.sort_values(ascending=not descendant, kind='mergesort', na_position='last')
+        except TypeError:
+            # Colonne objet aux types mélangés : tri sur la représentation texte
+            ordre = serie.astype(str).sort_values(ascending=not descendant, kind='mergesort')
+        perm = ordre.index.to_numpy(dtype=np.int64)
+        with self._lock:
+            self._permutations[cle] = perm
+        return perm
+
+    # ------------------------------------------------------------------
+    # Filtres
+    # ------------------------------------------------------------------
+    def _serie_dates(self):
+        if self._dates is None:
+            if "Heure d'ouverture" in self.df.columns:
+                self._dates = pd.to_datetime(self.df["Heure d'ouverture"], errors='coerce').to_numpy()
+            else:
+                self._dates = np.full(len(self.df), np.datetime64('NaT'), dtype='datetime64[ns]')
+        return self._dates
+
+    @staticmethod
+    def _liste(valeur):
+        if valeur is None or valeur == '':
+            return []
+        if isinstance(valeur, (list, tuple)):
+            return [str(v) for v in valeur if str(v) != '']
+        return [v.strip() for v in str(valeur).split(',') if v.strip() != '']
+
+    def normaliser_filtres(self, filtres):
+        """Normalise les filtres reçus (query string ou JSON) en dictionnaire stable"""
+        filtres = filtres or {}
+        propres = {}
+        symboles = self._liste(filtres.get('symbol'))
+        if symboles:
+            propres['symbol'] = sorted(s.upper() for s in symboles)
+        direction = str(filtres.get('direction') or '').strip().lower()
+        if direction in ('in', 'out'):
+            propres['direction'] = direction
+        for cle in ('date_start', 'date_end'):
+            if filtres.get(cle):
+                propres[cle] = str(filtres.get(cle))
+        signe = str(filtres.get('profit') or '').strip().lower()
+        if signe in ('positive', 'negative', 'zero'):
+            propres['profit'] = signe
+        cles = self._liste(filtres.get('cle_match'))
+        if cles:
+            propres['cle_match'] = sorted(cles)
+        return propres
+
+    def _masque(self, filtres):
+        """Masque booléen correspondant aux filtres normalisés (None = aucune restriction)"""
+        df = self.df
+        masque = None
+
+        def combiner(m):
+            return m if masque is None else (masque & m)
+
+        if 'symbol' in filtres and 'Symbole_ordre' in df.columns:
+            symboles = df['Symbole_ordre'].astype(str).str.upper()
+            masque = combiner(symboles.isin(filtres['symbol']).to_numpy())
+        if 'direction' in filtres and 'Direction' in df.columns:
+            masque = combiner((df['Direction'].astype(str).str.lower() == filtres['direction']).to_numpy())
+        if 'date_start' in filtres or 'date_end' in filtres:
+            dates = self._serie_dates()
+            if 'date_start' in filtres:
+                try:
+                    masque = combiner(dates >= np.datetime64(pd.to_datetime(filtres['date_start'])))
+                except Exception:
+                    pass
+            if 'date_end' in filtres:
+                try:
+                    # Borne de fin inclusive sur la journée, comme /filter_stats
+                    fin = pd.to_datetime(filtres['date_end']) + pd.Timedelta(days=1)
+                    masque = combiner(dates < np.datetime64(fin))
+                except Exception:
+                    pass
+        if 'profit' in filtres and 'Profit' in df.columns:
+            profits = pd.to_numeric(df['Profit'], errors='coerce').to_numpy(dtype=float)
+            if filtres['profit'] == 'positive':
+                masque = combiner(profits > 0)
+            elif filtres['profit'] == 'negative':
+                masque = combiner(profits < 0)
+            else:
+                masque = combiner(profits == 0)
+        if 'cle_match' in filtres and 'Cle_Match' in df.columns:
+            masque = combiner(df['Cle_Match'].astype(str).isin(filtres['cle_match']).to_numpy())
+        return masque
+
+    def _vue(self, tri, descendant, filtres):
+        """Indices des lignes filtrées dans l'ordre de tri (mis en cache par combinaison)"""
+        cle = json.dumps([tri, descendant, filtres], sort_keys=True)
+        with self._lock:
+            vue = self._vues.get(cle)
+            if vue is not None:
+                self._vues.move_to_end(cle)
+                return vue
+        if tri:
+            perm = self._permutation(tri, descendant)
+        else:
+            perm = np.arange(len(self.df), dtype=np.int64)
+        masque = self._masque(filtres)
+        vue = perm if masque is None else perm[masque[perm]]
+        with self._lock:
+            self._vues[cle] = vue
+            while len(self._vues) > self.TAILLE_CACHE_VUES:
+                self._vues.popitem(last=False)
+        return vue
+
+    # ------------------------------------------------------------------
+    # Curseurs
+    # ------------------------------------------------------------------
+    def _encoder_curseur(self, tri, descendant, filtres, position, limite):
+        brut = json.dumps({'v': self.version, 's': tri, 'd': descendant, 'f': filtres, 'o': position, 'l': limite},
+                          separators=(',', ':'))
+        return base64.urlsafe_b64encode(brut.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decoder_curseur(self, curseur):
+        try:
+            rembourrage = '=' * (-len(curseur) % 4)
+            etat = json.loads(base64.urlsafe_b64decode(curseur + rembourrage).decode('utf-8'))
+        except Exception:
+            raise CurseurInvalide('Curseur illisible')
+        if etat.get('v') != self.version:
+            raise CurseurInvalide('Curseur expiré (les données de la tâche ont changé)')
+        return etat.get('s'), bool(etat.get('d')), etat.get('f') or {}, int(etat.get('o', 0)), etat.get('l')
+
+    # ------------------------------------------------------------------
+    # Page
+    # ------------------------------------------------------------------
+    def page(self, tri=None, ordre='asc', filtres=None, curseur=None, limite=None):
+        """
+        Retourne une page de trades.
+
+        Args:
+            tri: colonne de tri (None = ordre chronologique du DataFrame)
+            ordre: 'asc' ou 'desc'
+            filtres: dictionnaire brut (symbol, direction, date_start, date_end, profit, cle_match)
+            curseur: curseur opaque renvoyé par la page précédente (prioritaire sur tri/filtres)
+            limite: nombre de lignes par page (reprise du curseur si absent)
+
+        Returns:
+            Dictionnaire JSON-sérialisable (trades, total, next_cursor...)
+        """
+        if curseur:
+            tri, descendant, filtres, position, limite_curseur = self._decoder_curseur(curseur)
+            limite = limite or limite_curseur
+        else:
+            descendant = str(ordre or 'asc').lower() == 'desc'
+            filtres = self.normaliser_filtres(filtres)
+            position = 0
+            if tri and tri not in self.df.columns:
+                raise KeyError(f"Colonne de tri inconnue: {tri}")
+        try:
+            limite = int(limite or self.LIMITE_DEFAUT)
+        except (TypeError, ValueError):
+            limite = self.LIMITE_DEFAUT
+        limite = max(1, min(limite, self.LIMITE_MAX))
+
+        vue = self._vue(tri or None, descendant, filtres)
+        total = int(len(vue))
+        position = max(0, min(position, total))
+        indices = vue[position:position + limite]
+        fin = position + len(indices)
+
+        page_df = self.df.iloc[indices]
+        trades = json.loads(page_df.to_json(orient='records', date_format='iso', force_ascii=False))
+        return {
+            'trades': trades,
+            'total': total,
+            'offset': position,
+            'count': len(trades),
+            'sort': tri,
+            'order': 'desc' if descendant else 'asc',
+            'filters': filtres,
+            'columns': [str(c) for c in self.df.columns],
+            'next_cursor': self._encoder_curseur(tri, descendant, filtres, fin, limite) if fin < total else None,
+        }
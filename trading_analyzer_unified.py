@@ -5,6 +5,7 @@ Combine l'analyse Forex et autres instruments dans un seul script
 """
 
 import pandas as pd
+import numpy as np
 import os
 import re
 import math
@@ -14,10 +15,23 @@ from openpyxl.chart import LineChart, Reference, PieChart, BarChart
 from openpyxl.chart.label import DataLabelList
 from datetime import datetime, timedelta
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.formatting.rule import ColorScaleRule
 from openpyxl.utils import get_column_letter
 from enum import Enum
 import requests
 from broker_manager import get_broker_manager
+from archive_ingestion import est_archive, ingerer_archive
+from mt5_html_reader import est_rapport_html, lire_sections_html
+from deal_schema import appliquer_schema_deals, concatener_deals
+from profiling import ProfilEtapes, etape, collecteur_courant
+from ingestion import _renommer_source, get_cache_fichiers
+import moteur_rapide
+import scenarios_capital
+import monte_carlo
+import metriques_glissantes
+import sequences_trades
+import matrices_croisees
+import sessions_trading
 
 # News économiques désactivées pour accélérer l'analyse
 
@@ -29,10 +43,24 @@ class InstrumentType(Enum):
     ENERGIE = "energie"
     ACTIONS = "actions"
 
+# Champ 'class' des métadonnées broker -> type d'instrument (SHARE* -> actions ;
+# les classes non listées, comme OTHER, retombent sur la détection par le nom)
+CLASSES_BROKER = {
+    'FOREX': InstrumentType.FOREX,
+    'METAL': InstrumentType.METAUX,
+    'INDEX': InstrumentType.INDICES,
+    'CRYPTO': InstrumentType.CRYPTO,
+    'ENERGY': InstrumentType.ENERGIE,
+}
+
 class TradingAnalyzer:
-    def __init__(self, solde_initial=10000, multiplier=1.0, broker=None):
+    def __init__(self, solde_initial=10000, multiplier=1.0, broker=None, engine=None):
         # Solde initial fourni par l'utilisateur
         self.solde_initial = solde_initial
+        # Moteur de matching / recalcul / cumuls : 'legacy' (ligne à ligne) ou 'fast' (vectorisé, mêmes résultats)
+        self.engine = engine or moteur_rapide.moteur_par_defaut()
+        if self.engine not in moteur_rapide.MOTEURS:
+            raise ValueError(f"Moteur inconnu: {self.engine} (attendu: {', '.join(moteur_rapide.MOTEURS)})")
         # Multiplicateur de taille de position (agit sur le volume, PAS sur le profit directement)
         try:
             self.multiplier = float(multiplier or 1.0)
@@ -40,11 +68,25 @@ class TradingAnalyzer:
             self.multiplier = 1.0
         # Broker pour utiliser les valeurs réelles
         self.broker = broker
+        # Étapes du moteur fast en échec, rattrapées par le moteur legacy ("etape: erreur")
+        self.replis_legacy = []
         self.broker_manager = get_broker_manager() if broker else None
         # Cache pour optimiser les appels API
         self._api_cache = {}
         self._cache_expiry = {}  # Timestamp d'expiration du cache
         self.statistiques_fichiers = {}
+        # État de la récurrence des cumuls après le dernier fusionner_et_calculer_cumuls
+        self.etat_cumuls = None
+        # Onglet de graphiques des métriques glissantes désactivable (ANALYZER_GRAPHIQUES_GLISSANTS=0)
+        self.graphiques_glissants = os.environ.get('ANALYZER_GRAPHIQUES_GLISSANTS', '1').strip() != '0'
+        # Sessions de trading (ANALYZER_SESSIONS, ANALYZER_FUSEAU_SERVEUR), sessions UTC fixes par défaut
+        try:
+            self.sessions = sessions_trading.configuration_environnement()
+        except ValueError as e:
+            print(f"[WARNING] Configuration des sessions invalide ({e}), sessions UTC par défaut")
+            self.sessions = sessions_trading.configuration_sessions()
+        # Type d'instrument mémorisé par symbole (classement fait une seule fois)
+        self._types_instruments = {}
         
         # Configuration des symboles par type
         self.symboles_forex = [
@@ -105,47 +147,78 @@ class TradingAnalyzer:
 
 
     
-    def process_files(self, file_paths, task_id, task_status, filter_type=None):
+    def process_files(self, file_paths, task_id, task_status, filter_type=None, pool=None, futures=None):
         """
-        Traite une liste de fichiers Excel
+        Traite une liste de fichiers Excel (ou d'archives zip / tar.gz de rapports)
         filter_type: 'forex', 'autres', ou None (tous)
+        pool: IngestionPool optionnel pour analyser les fichiers en parallèle
+        futures: {file_path: Future} déjà soumis au pool (upload par morceaux)
         """
         try:
             print(f"[DEBUG] Starting unified analysis with {len(file_paths)} files, filter: {filter_type}")
             tous_les_resultats = []
             total_files = len(file_paths)
-            
-            for i, file_path in enumerate(file_paths):
-                progress = 20 + (i / total_files) * 40
-                task_status[task_id]['progress'] = int(progress)
-                task_status[task_id]['message'] = f'Traitement du fichier {i+1}/{total_files}...'
-                
-                print(f"[DEBUG] Processing file {i+1}/{total_files}: {os.path.basename(file_path)}")
+            futures = dict(futures or {})
+            # Rapports déjà analysés avec le même contenu et les mêmes paramètres
+            cache = get_cache_fichiers()
+            cles_cache, depuis_cache = {}, {}
+            for file_path in file_paths:
+                if est_archive(file_path):
+                    continue
+                cles_cache[file_path] = cache.cle(file_path, filter_type, self.solde_initial, self.multiplier, self.broker, self.engine)
+                if file_path not in futures:
+                    resultat = cache.obtenir(cles_cache[file_path], os.path.basename(file_path))
+                    if resultat is not None:
+                        depuis_cache[file_path] = resultat
+            if pool is not None:
+                for file_path in file_paths:
+                    if file_path not in futures and file_path not in depuis_cache and not est_archive(file_path):
+                        futures[file_path] = pool.soumettre(file_path, filter_type, self.solde_initial, self.multiplier, self.broker, self.engine)
+            
+            with etape("ingestion", fichiers=total_files) as mesure:
+                for i, file_path in enumerate(file_paths):
+                    progress = 20 + (i / total_files) * 40
+                    task_status[task_id]['progress'] = int(progress)
+                    task_status[task_id]['message'] = f'Traitement du fichier {i+1}/{total_files}...'
                 
-                df_result, erreur, exclus, doublons = self.process_single_file(file_path, filter_type)
+                    print(f"[DEBUG] Processing file {i+1}/{total_files}: {os.path.basename(file_path)}")
                 
-                if df_result is not None and len(df_result) > 0:
-                    tous_les_resultats.append(df_result)
-                    
-                    filename = os.path.basename(file_path)
-                    # Compter les trades complets (clés uniques) au lieu des opérations
-                    nb_trades_complets = df_result["Cle_Match"].nunique() if "Cle_Match" in df_result.columns else len(df_result)
-                    self.statistiques_fichiers[filename] = {
-                        'trades': nb_trades_complets,
-                        'exclus': exclus,
-                        'doublons': doublons,
-                        'erreur': erreur
-                    }
-                    print(f"[DEBUG] File processed successfully: {len(df_result)} trades, {exclus} excluded")
-                else:
-                    filename = os.path.basename(file_path)
-                    self.statistiques_fichiers[filename] = {
-                        'trades': 0,
-                        'exclus': 0,
-                        'doublons': 0,
-                        'erreur': erreur or "Aucune donnée trouvée"
-                    }
-                    print(f"[DEBUG] File failed: {erreur}")
+                    if est_archive(file_path):
+                        # Archive : membres extraits et analysés au fil de l'eau
+                        soumettre = None
+                        if pool is not None:
+                            soumettre = lambda chemin: pool.soumettre(chemin, filter_type, self.solde_initial, self.multiplier, self.broker, self.engine)
+                        max_en_vol = 2 * pool.max_workers if pool is not None else 1
+                        nb_membres = 0
+                        for nom_membre, resultat in ingerer_archive(file_path, lambda chemin: self.process_single_file(chemin, filter_type),
+                                                                    soumettre=soumettre, max_en_vol=max_en_vol):
+                            nb_membres += 1
+                            task_status[task_id]['message'] = f'Traitement du fichier {i+1}/{total_files} (membre {nb_membres}: {nom_membre})...'
+                            # Source préfixée par l'archive : deux archives contenant rapport.xlsx ne se mélangent pas
+                            source = f"{os.path.basename(file_path)}/{nom_membre}"
+                            if resultat[0] is not None:
+                                resultat = (_renommer_source(resultat[0], nom_membre, source),) + tuple(resultat[1:])
+                            self._enregistrer_resultat_fichier(source, resultat, tous_les_resultats)
+                        if nb_membres == 0:
+                            self._enregistrer_resultat_fichier(os.path.basename(file_path), (None, "Aucun rapport trouvé dans l'archive", 0, 0), tous_les_resultats)
+                        continue
+
+                    if file_path in depuis_cache:
+                        print(f"[DEBUG] Résultat en cache pour {os.path.basename(file_path)}")
+                        resultat = depuis_cache[file_path]
+                    elif file_path in futures:
+                        # Résultat calculé dans le pool d'ingestion (ordre des fichiers conservé)
+                        try:
+                            resultat = futures[file_path].result()
+                        except Exception as e:
+                            print(f"[ERROR] Ingestion parallèle en échec pour {os.path.basename(file_path)}: {str(e)}")
+                            resultat = (None, str(e), 0, 0)
+                        cache.mettre(cles_cache.get(file_path), os.path.basename(file_path), resultat)
+                    else:
+                        resultat = self.process_single_file(file_path, filter_type)
+                        cache.mettre(cles_cache.get(file_path), os.path.basename(file_path), resultat)
+                    self._enregistrer_resultat_fichier(os.path.basename(file_path), resultat, tous_les_resultats)
+                mesure.sortie(sum(len(df) for df in tous_les_resultats))
             
             if not tous_les_resultats:
                 print(f"[DEBUG] No valid data found in any file")
@@ -157,7 +230,9 @@ class TradingAnalyzer:
             print(f"[DEBUG] Starting fusion and compound interest calculations")
             # On suppose que les profits dans Excel sont calculés avec un solde de référence de 10000
             # Ce sera réajusté dans app.py si nécessaire avec le multiplicateur
-            df_final = self.fusionner_et_calculer_cumuls(tous_les_resultats, solde_initial_reference=10000)
+            with etape("cumuls", lignes_entree=sum(len(df) for df in tous_les_resultats)) as mesure:
+                df_final = self.fusionner_et_calculer_cumuls(tous_les_resultats, solde_initial_reference=10000)
+                mesure.sortie(df_final)
             print(f"[DEBUG] Fusion completed: {len(df_final)} total trades")
             
             task_status[task_id]['progress'] = 75
@@ -171,13 +246,50 @@ class TradingAnalyzer:
             print(f"[ERROR] Traceback: {traceback.format_exc()}")
             raise Exception(f"Erreur lors du traitement des fichiers: {str(e)}")
     
-    def process_single_file(self, file_path, filter_type=None):
-        """Traite un seul fichier Excel avec filtrage optionnel"""
-        try:
-            print(f"[DEBUG] Starting to process file: {file_path}")
+    def _enregistrer_resultat_fichier(self, filename, resultat, tous_les_resultats):
+        """Enregistre le résultat d'analyse d'un fichier (statistiques + DataFrame)"""
+        df_result, erreur, exclus, doublons = resultat
+        if df_result is not None:
+            # Mesures des étapes du fichier (faites éventuellement dans un worker)
+            etapes_fichier = df_result.attrs.pop('timings', None)
+            if etapes_fichier and collecteur_courant() is not None:
+                collecteur_courant().ajouter(etapes_fichier, fichier=filename)
+        if df_result is not None and len(df_result) > 0:
+            tous_les_resultats.append(df_result)
+            
+            # Compter les trades complets (clés uniques) au lieu des opérations
+            nb_trades_complets = df_result["Cle_Match"].nunique() if "Cle_Match" in df_result.columns else len(df_result)
+            self.statistiques_fichiers[filename] = {
+                'trades': nb_trades_complets,
+                'exclus': exclus,
+                'doublons': doublons,
+                'erreur': erreur
+            }
+            print(f"[DEBUG] File processed successfully: {len(df_result)} trades, {exclus} excluded")
+        else:
+            self.statistiques_fichiers[filename] = {
+                'trades': 0,
+                'exclus': 0,
+                'doublons': 0,
+                'erreur': erreur or "Aucune donnée trouvée"
+            }
+            print(f"[DEBUG] File failed: {erreur}")
+    
+    def lire_sections(self, file_path):
+        """Lit un rapport MT5 (Excel ou HTML) et retourne (ordres_df, transactions_df)"""
+        if est_rapport_html(file_path):
+            # Rapport HTML natif MT5 : lecture et découpage des sections en une passe
+            with etape("lecture", format="html") as mesure:
+                ordres_df, transactions_df = lire_sections_html(file_path)
+                mesure.sortie(len(ordres_df) + len(transactions_df))
+            return ordres_df, transactions_df
+
+        with etape("lecture", format="excel") as mesure:
             df = pd.read_excel(file_path, sheet_name=0, header=None)
-            print(f"[DEBUG] File read successfully, shape: {df.shape}")
-            
+            mesure.sortie(df)
+        print(f"[DEBUG] File read successfully, shape: {df.shape}")
+        
+        with etape("detection_sections", lignes_entree=df) as mesure:
             # Trouver les lignes "ordre" et "transaction"
             ligne_ordres = self.trouver_ligne(df, "ordre")
             ligne_transactions = self.trouver_ligne(df, "transaction")
@@ -194,12 +306,55 @@ class TradingAnalyzer:
             transactions_df.columns = header_transactions
             transactions_df = transactions_df[transactions_df.iloc[:, 0].notna()]
             transactions_df.reset_index(drop=True, inplace=True)
+            mesure.sortie(len(ordres_df) + len(transactions_df))
+        return ordres_df, transactions_df
+    
+    def process_single_file(self, file_path, filter_type=None):
+        """
+        Traite un seul fichier de rapport (Excel ou HTML) avec filtrage optionnel.
+        Les mesures des étapes du fichier sont jointes au DataFrame (attrs['timings']) :
+        elles reviennent ainsi aussi des workers du pool d'ingestion.
+        """
+        profil_fichier = ProfilEtapes(os.path.basename(file_path))
+        with profil_fichier.actif():
+            resultat = self._traiter_fichier(file_path, filter_type)
+        if resultat[0] is not None:
+            resultat[0].attrs['timings'] = profil_fichier.etapes
+        return resultat
+    
+    def _traiter_fichier(self, file_path, filter_type=None):
+        """Étapes de traitement d'un fichier : lecture, fusion, classement, matching, recalcul"""
+        try:
+            fusion_df, message, exclus = self.preparer_deals(file_path, filter_type)
+            if fusion_df is None:
+                return None, message, exclus, 0
+            fusion_df, doublons_supprimes = self.apparier_et_recalculer(fusion_df)
+            print(f"[DEBUG] File processing completed: {len(fusion_df)} final trades")
+            return fusion_df, "Succès", exclus, doublons_supprimes
             
-            print(f"[DEBUG] Ordres shape: {ordres_df.shape}, Transactions shape: {transactions_df.shape}")
+        except Exception as e:
+            print(f"[ERROR] Error processing file {file_path}: {str(e)}")
+            import traceback
+            print(f"[ERROR] Traceback: {traceback.format_exc()}")
+            return None, str(e), 0, 0
 
-            if len(ordres_df.columns) < 2 or len(transactions_df.columns) < 2:
-                return None, "Pas assez de colonnes dans les données", 0, 0
+    def preparer_deals(self, file_path, filter_type=None):
+        """
+        Lecture, fusion ordres / transactions, classement, filtrage et typage d'un rapport
+        (deals prêts pour le matching, Cle_Match vide).
+
+        Returns:
+            (fusion_df, message, exclus) ; fusion_df est None si le rapport est inexploitable
+        """
+        print(f"[DEBUG] Starting to process file: {file_path}")
+        ordres_df, transactions_df = self.lire_sections(file_path)
+        
+        print(f"[DEBUG] Ordres shape: {ordres_df.shape}, Transactions shape: {transactions_df.shape}")
+
+        if len(ordres_df.columns) < 2 or len(transactions_df.columns) < 2:
+            return None, "Pas assez de colonnes dans les données", 0
 
+        with etape("fusion", lignes_entree=len(ordres_df) + len(transactions_df)) as mesure:
             # Créer la clé de jointure
             ordres_df["__clé__"] = ordres_df.iloc[:, 1].astype(str)
             transactions_df["__clé__"] = transactions_df.iloc[:, 1].astype(str)
@@ -208,7 +363,7 @@ class TradingAnalyzer:
             fichier_source = os.path.basename(file_path)
             ordres_df["Fichier_Source"] = fichier_source
             transactions_df["Fichier_Source"] = fichier_source
-            
+        
             # Renommer la colonne Prix si elle existe
             if "Prix" in transactions_df.columns:
                 transactions_df.rename(columns={"Prix": "Prix_transaction"}, inplace=True)
@@ -229,30 +384,38 @@ class TradingAnalyzer:
                     colonnes_a_supprimer_tmp.append(col_tmp)
             if colonnes_a_supprimer_tmp:
                 fusion_df.drop(columns=colonnes_a_supprimer_tmp, inplace=True)
-            
-            avant_filtrage = len(fusion_df)
+            mesure.sortie(fusion_df)
+        
+        avant_filtrage = len(fusion_df)
+
+        with etape("classement_filtrage", lignes_entree=fusion_df) as mesure:
+            # Classement des instruments (une fois par symbole distinct)
+            if "Symbole_ordre" in fusion_df.columns:
+                fusion_df = self.classifier_instruments(fusion_df)
 
             # Filtrage selon le type demandé
             apres_filtrage = avant_filtrage  # Initialisation par défaut
-            
+        
             if "Symbole_ordre" in fusion_df.columns and filter_type:
                 print(f"[DEBUG] Applying {filter_type} filter...")
                 if filter_type == 'forex':
-                    fusion_df = fusion_df[fusion_df["Symbole_ordre"].apply(self.est_forex)]
+                    fusion_df = fusion_df[fusion_df["Type_Instrument"] == InstrumentType.FOREX.value]
                 elif filter_type == 'autres':
-                    fusion_df = fusion_df[fusion_df["Symbole_ordre"].apply(self.est_autre_instrument)]
-                
+                    fusion_df = fusion_df[fusion_df["Type_Instrument"] != InstrumentType.FOREX.value]
+            
                 apres_filtrage = len(fusion_df)
                 print(f"[DEBUG] After filtering: {apres_filtrage} rows (excluded: {avant_filtrage - apres_filtrage})")
-                
+            
                 if len(fusion_df) == 0:
-                    return None, f"Aucun instrument {filter_type} trouvé", avant_filtrage - apres_filtrage, 0
+                    return None, f"Aucun instrument {filter_type} trouvé", avant_filtrage - apres_filtrage
+            mesure.sortie(fusion_df)
 
+        with etape("typage", lignes_entree=fusion_df):
             # Conversions des colonnes numériques
             print(f"[DEBUG] Converting numeric columns...")
             fusion_df["Profit"] = self.safe_convert_to_float(fusion_df["Profit"])
             fusion_df["Prix_transaction"] = self.safe_convert_to_float(fusion_df["Prix_transaction"])
-            
+        
             if "T / P" in fusion_df.columns:
                 fusion_df["T / P"] = self.safe_convert_to_float(fusion_df["T / P"])
             if "S / L" in fusion_df.columns:
@@ -260,12 +423,36 @@ class TradingAnalyzer:
 
             fusion_df["Volume_ordre"] = fusion_df["Volume_ordre"].astype(str)
             fusion_df["Symbole_ordre"] = fusion_df["Symbole_ordre"].astype(str)
+            # Schéma typé (catégories, volumes parsés, dates) ; les clés sont codées après le matching
+            fusion_df = appliquer_schema_deals(fusion_df, coder_cles=False)
             fusion_df["Cle_Match"] = None
 
+        # Calculer le nombre d'exclus
+        exclus = avant_filtrage - apres_filtrage
+        return fusion_df, "Succès", exclus
+
+    def apparier_et_recalculer(self, fusion_df):
+        """
+        Matching IN / OUT, recalcul des profits et pips, sélection des colonnes finales
+        et suppression des doublons sur des deals préparés (preparer_deals).
+
+        Returns:
+            (DataFrame final du fichier, nombre de doublons supprimés)
+        """
+        with etape("matching", lignes_entree=fusion_df) as mesure:
             # Logique de matching des trades
-            print(f"[DEBUG] Applying matching logic...")
-            self.apply_matching_logic(fusion_df)
-            
+            print(f"[DEBUG] Applying matching logic (engine: {self.engine})...")
+            matching_rapide = False
+            if self.engine == 'fast':
+                try:
+                    moteur_rapide.apparier(self, fusion_df)
+                    matching_rapide = True
+                except Exception as e:
+                    print(f"[WARNING] Matching rapide en échec ({str(e)}), repli sur le moteur legacy")
+                    self.replis_legacy.append(f"matching: {str(e)}")
+            if not matching_rapide:
+                self.apply_matching_logic(fusion_df)
+        
             # Créer l'index des trades d'entrée
             df_in = fusion_df[(fusion_df["Direction"] == "in") & (fusion_df["Cle_Match"].notna())].copy()
             if len(df_in) > 0:
@@ -273,59 +460,64 @@ class TradingAnalyzer:
             else:
                 # Créer un DataFrame vide avec index vide si aucun trade d'entrée
                 df_in = pd.DataFrame()
+            mesure.sortie(df_in)
 
+        with etape("recalcul", lignes_entree=fusion_df) as mesure:
             # RECALCUL MANUEL DES PROFITS ET PIPS
             print(f"[DEBUG] Recalcul manuel des profits et pips...")
-            try:
-                fusion_df["Profit_recalcule"] = fusion_df.apply(lambda row: self.recalculer_profit_manuel(row, df_in), axis=1)
-                fusion_df["Profit_pips"] = fusion_df.apply(lambda row: self.calculer_pips_ou_points(row, df_in), axis=1)
-            except Exception as e:
-                print(f"[ERROR] Erreur lors du recalcul manuel: {str(e)}")
-                import traceback
-                print(f"[ERROR] Traceback: {traceback.format_exc()}")
-                # Continuer avec les profits Excel si le recalcul échoue
-                fusion_df["Profit_recalcule"] = None
-                fusion_df["Profit_pips"] = None
-            
-            # Utiliser le profit recalculé si disponible, sinon garder celui d'Excel
-            # FORCER l'utilisation du profit recalculé pour tous les trades de sortie avec matching
-            fusion_df["Profit"] = fusion_df.apply(
-                lambda row: row["Profit_recalcule"] if pd.notna(row["Profit_recalcule"]) else row["Profit"], 
-                axis=1
-            )
-            
+            recalcul_rapide = False
+            if self.engine == 'fast':
+                try:
+                    fusion_df["Profit_recalcule"], fusion_df["Profit_pips"] = moteur_rapide.recalculer(self, fusion_df)
+                    fusion_df["Profit"] = fusion_df["Profit_recalcule"].where(fusion_df["Profit_recalcule"].notna(), fusion_df["Profit"])
+                    recalcul_rapide = True
+                except Exception as e:
+                    print(f"[WARNING] Recalcul rapide en échec ({str(e)}), repli sur le moteur legacy")
+                    self.replis_legacy.append(f"recalcul: {str(e)}")
+            if not recalcul_rapide:
+                try:
+                    fusion_df["Profit_recalcule"] = fusion_df.apply(lambda row: self.recalculer_profit_manuel(row, df_in), axis=1)
+                    fusion_df["Profit_pips"] = fusion_df.apply(lambda row: self.calculer_pips_ou_points(row, df_in), axis=1)
+                except Exception as e:
+                    print(f"[ERROR] Erreur lors du recalcul manuel: {str(e)}")
+                    import traceback
+                    print(f"[ERROR] Traceback: {traceback.format_exc()}")
+                    # Continuer avec les profits Excel si le recalcul échoue
+                    fusion_df["Profit_recalcule"] = None
+                    fusion_df["Profit_pips"] = None
+
+                # Utiliser le profit recalculé si disponible, sinon garder celui d'Excel
+                # FORCER l'utilisation du profit recalculé pour tous les trades de sortie avec matching
+                fusion_df["Profit"] = fusion_df.apply(
+                    lambda row: row["Profit_recalcule"] if pd.notna(row["Profit_recalcule"]) else row["Profit"], 
+                    axis=1
+                )
+        
             # Log pour vérifier combien de profits ont été recalculés
             nb_recalcules = fusion_df["Profit_recalcule"].notna().sum()
             print(f"[DEBUG] Profits recalculés: {nb_recalcules} sur {len(fusion_df)} trades")
-            
+            mesure.sortie(int(nb_recalcules))
+        
+        with etape("dedoublonnage", lignes_entree=fusion_df) as mesure:
             # Nettoyage et sélection des colonnes finales
             colonnes_a_garder = [
                 "Heure d'ouverture", "Ordre_ordre", "Symbole_ordre", "Type_ordre", 
-                "Volume_ordre", "S / L", "T / P", "Direction", "Prix_transaction",
-                "Profit", "Cle_Match", "Profit_pips", "Fichier_Source"
+                "Volume_ordre", "Volume_execute", "Volume_total", "S / L", "T / P", "Direction", "Prix_transaction",
+                "Profit", "Cle_Match", "Profit_pips", "Fichier_Source", "Type_Instrument"
             ]
-            
+        
             colonnes_finales = [col for col in colonnes_a_garder if col in fusion_df.columns]
             fusion_df = fusion_df[colonnes_finales]
-            
+        
             # Suppression des doublons
             avant_dedoublonnage = len(fusion_df)
             fusion_df = fusion_df.drop_duplicates().reset_index(drop=True)
+            fusion_df = appliquer_schema_deals(fusion_df)
             apres_dedoublonnage = len(fusion_df)
             doublons_supprimes = avant_dedoublonnage - apres_dedoublonnage
-            
-            print(f"[DEBUG] File processing completed: {len(fusion_df)} final trades")
-            
-            # Calculer le nombre d'exclus
-            exclus = avant_filtrage - apres_filtrage
-            
-            return fusion_df, "Succès", exclus, doublons_supprimes
-            
-        except Exception as e:
-            print(f"[ERROR] Error processing file {file_path}: {str(e)}")
-            import traceback
-            print(f"[ERROR] Traceback: {traceback.format_exc()}")
-            return None, str(e), 0, 0
+            mesure.sortie(fusion_df)
+
+        return fusion_df, doublons_supprimes
     
     def trouver_ligne(self, df, mot_approx):
         """Trouve une ligne contenant un mot approximatif"""
@@ -378,6 +570,41 @@ class TradingAnalyzer:
         else:
             return InstrumentType.ACTIONS
     
+    def type_instrument(self, symbole):
+        """
+        Type d'instrument d'un symbole, mémorisé par analyseur.
+        La classe fournie par le broker (champ 'class') est prioritaire sur la détection par le nom.
+        """
+        cle = str(symbole).upper()
+        type_inst = self._types_instruments.get(cle)
+        if type_inst is not None:
+            return type_inst
+        if self.broker_manager and self.broker:
+            metadata = self.broker_manager.get_symbol_metadata(self.broker, cle)
+            classe = str((metadata or {}).get('class') or '').upper()
+            type_inst = CLASSES_BROKER.get(classe)
+            if type_inst is None and classe.startswith('SHARE'):
+                type_inst = InstrumentType.ACTIONS
+        if type_inst is None:
+            type_inst = self.detecter_type_instrument(cle)
+        self._types_instruments[cle] = type_inst
+        return type_inst
+    
+    def classifier_instruments(self, df):
+        """Ajoute la colonne catégorielle Type_Instrument (un classement par symbole distinct)"""
+        categories = [t.value for t in InstrumentType]
+        # Les symboles manquants sont classés comme leur texte ('nan'), comme avant
+        codes, uniques = pd.factorize(df["Symbole_ordre"], use_na_sentinel=False)
+        codes_types = np.array([categories.index(self.type_instrument(s).value) for s in uniques], dtype=np.int8)
+        df["Type_Instrument"] = pd.Categorical.from_codes(codes_types[codes], categories=categories)
+        return df
+    
+    def _type_instrument_ligne(self, row):
+        """Type d'instrument d'une ligne : colonne Type_Instrument si présente, sinon classement mémorisé"""
+        if "Type_Instrument" in row.index and pd.notna(row["Type_Instrument"]):
+            return InstrumentType(row["Type_Instrument"])
+        return self.type_instrument(row["Symbole_ordre"])
+    
     def est_forex_automatique(self, symbole):
         """Reconnaissance automatique des paires Forex"""
         # Devises connues
@@ -423,8 +650,7 @@ class TradingAnalyzer:
     
     def est_forex(self, symbole):
         """Vérifie si un symbole est une paire Forex"""
-        symbole = str(symbole).lower()
-        return any(forex_pair in symbole for forex_pair in self.symboles_forex)
+        return self.type_instrument(symbole) == InstrumentType.FOREX
     
     def est_autre_instrument(self, symbole):
         """Vérifie si un symbole N'EST PAS une paire Forex"""
@@ -484,7 +710,7 @@ class TradingAnalyzer:
             # Pour chaque trade "in", chercher TOUS les trades "out" correspondants
             for _, trade_in in trades_in_symbole.iterrows():
                 ordre_in = trade_in["Ordre_ordre"]
-                volume_in = self.parse_volume(trade_in["Volume_ordre"])
+                volume_in = self._volume_execute(trade_in)
                 cle_in = trade_in["Cle_Match"]
                 tp_in = trade_in.get("T / P", None)
                 sl_in = trade_in.get("S / L", None)
@@ -506,7 +732,7 @@ class TradingAnalyzer:
                 cum_volume = 0.0
                 selected_out_rows = []
                 for _, trade_out in candidates_out.iterrows():
-                    volume_out = self.parse_volume(trade_out["Volume_ordre"])
+                    volume_out = self._volume_execute(trade_out)
                     cum_volume += volume_out
                     selected_out_rows.append(trade_out)
                     if math.isclose(cum_volume, volume_in, rel_tol=0.02, abs_tol=1e-6) or cum_volume > volume_in:
@@ -536,7 +762,7 @@ class TradingAnalyzer:
                     print(f"[DEBUG] ❌ Aggregated volume does not match. Trying 1:1 fallback")
                     # Fallback: 1:1 sur le premier OUT proche
                     for _, trade_out in candidates_out.iterrows():
-                        volume_out = self.parse_volume(trade_out["Volume_ordre"])
+                        volume_out = self._volume_execute(trade_out)
                         if math.isclose(volume_out, volume_in, rel_tol=0.02, abs_tol=1e-6):
                             print(f"[DEBUG] 🔄 Fallback: Simple 1:1 match found")
                             if fichier is not None:
@@ -618,6 +844,13 @@ class TradingAnalyzer:
         else:
             print(f"[DEBUG] ❌ WARNING: {len(fusion_df) - total_avec_cle} trades still without keys!")
     
+    def _volume_execute(self, row):
+        """Volume exécuté déjà parsé par le schéma des deals (repli sur parse_volume)"""
+        if "Volume_execute" in row.index:
+            volume = row["Volume_execute"]
+            return 0.0 if pd.isna(volume) else float(volume)
+        return self.parse_volume(row["Volume_ordre"])
+    
     def parse_volume(self, volume_str):
         """Parse le volume depuis une chaîne comme '0.56 / 0.56' ou '0.56'"""
         try:
@@ -666,18 +899,23 @@ class TradingAnalyzer:
                 return None
             
             symbole = str(row["Symbole_ordre"]).lower()
-            type_instrument = self.detecter_type_instrument(symbole)
+            type_instrument = self._type_instrument_ligne(row)
             
             # Gestion du volume
             if "Volume_ordre" not in row.index:
                 print(f"[WARNING] Colonne Volume_ordre manquante pour {symbole}")
                 return None
             
-            volume_str = str(row["Volume_ordre"])
-            if "/" in volume_str:
-                volume_base = float(volume_str.split("/")[0].strip())
+            if "Volume_execute" in row.index:
+                volume_base = float(row["Volume_execute"])
+                if math.isnan(volume_base):
+                    raise ValueError(f"Volume illisible: {row['Volume_ordre']}")
             else:
-                volume_base = float(volume_str.strip())
+                volume_str = str(row["Volume_ordre"])
+                if "/" in volume_str:
+                    volume_base = float(volume_str.split("/")[0].strip())
+                else:
+                    volume_base = float(volume_str.strip())
 
             # Appliquer le multiplicateur sur la taille de position (volume effectif)
             volume = volume_base * self.multiplier
@@ -915,14 +1153,19 @@ class TradingAnalyzer:
         """Calcul des pips (Forex) ou points (autres instruments) avec détection d'incohérences"""
         symbole = str(row["Symbole_ordre"]).lower()
         profit = row["Profit"]
-        type_instrument = self.detecter_type_instrument(symbole)
+        type_instrument = self._type_instrument_ligne(row)
         
         # Gestion du volume
-        volume_str = str(row["Volume_ordre"])
-        if "/" in volume_str:
-            volume_base = float(volume_str.split("/")[0].strip())
+        if "Volume_execute" in row.index:
+            volume_base = float(row["Volume_execute"])
+            if math.isnan(volume_base):
+                raise ValueError(f"Volume illisible: {row['Volume_ordre']}")
         else:
-            volume_base = float(volume_str.strip())
+            volume_str = str(row["Volume_ordre"])
+            if "/" in volume_str:
+                volume_base = float(volume_str.split("/")[0].strip())
+            else:
+                volume_base = float(volume_str.strip())
 
         # Appliquer le multiplicateur sur la taille de position (volume effectif)
         volume = volume_base * getattr(self, "multiplier", 1.0)
@@ -1043,7 +1286,7 @@ class TradingAnalyzer:
         print(f"[DEBUG] Solde initial utilisé: {self.solde_initial}, Solde de référence Excel: {solde_initial_reference}")
         
         # Fusionner tous les DataFrames
-        df_complet = pd.concat(tous_les_df, ignore_index=True)
+        df_complet = concatener_deals(tous_les_df)
         print(f"[DEBUG] Merged {len(tous_les_df)} dataframes into {len(df_complet)} total trades")
         
         # Tri par date
@@ -1075,7 +1318,13 @@ class TradingAnalyzer:
         # On les ajuste proportionnellement au solde initial choisi par l'utilisateur
         facteur_ajustement_solde = self.solde_initial / solde_initial_reference if solde_initial_reference > 0 else 1.0
         print(f"[DEBUG] Facteur d'ajustement solde: {facteur_ajustement_solde}")
-        
+
+        if self.engine == 'fast':
+            self.etat_cumuls = moteur_rapide.calculer_cumuls(df_complet, self.solde_initial, solde_initial_reference)
+            print(f"[DEBUG] Compound calculations completed (fast). Final solde: {self.etat_cumuls['solde_courant']:.2f}")
+            print(f"[DEBUG] Max drawdown: {df_complet['Drawdown_pct'].max():.2f}%")
+            return df_complet
+
         for idx, row in df_complet.iterrows():
             profit_original = float(row["Profit"]) if pd.notna(row["Profit"]) else 0.0
             pips = float(row["Profit_pips"]) if pd.notna(row["Profit_pips"]) else 0.0
@@ -1144,6 +1393,14 @@ class TradingAnalyzer:
             df_complet.at[idx, "Drawdown_euros"] = round(drawdown_euros, 2)
             df_complet.at[idx, "Drawdown_running_pct"] = round(drawdown_running_max, 2)
         
+        # État non arrondi de la récurrence : reprise des cumuls lors d'un ajout de deals
+        self.etat_cumuls = {
+            'solde_courant': solde_courant,
+            'profit_cumule': profit_cumule_reel,
+            'pips_cumule': pips_cumule,
+            'plus_haut_solde': plus_haut_solde,
+            'drawdown_running_max': drawdown_running_max,
+        }
         print(f"[DEBUG] Compound calculations completed. Final solde: {solde_courant:.2f}")
         print(f"[DEBUG] Max drawdown: {df_complet['Drawdown_pct'].max():.2f}%")
         
@@ -1170,7 +1427,7 @@ class TradingAnalyzer:
         print(f"[DEBUG] Calculating trades by result")
         
         # Grouper par clé de trade et calculer le profit total de chaque trade complet
-        trades_complets = df.groupby("Cle_Match").agg({
+        trades_complets = df.groupby("Cle_Match", observed=True).agg({
             "Profit": "sum"
         }).reset_index()
         
@@ -1191,7 +1448,7 @@ class TradingAnalyzer:
         trades_gagnants, trades_perdants, trades_neutres, total_trades_complets = self.calculer_trades_par_resultat(df)
         
         # Calculer les profits moyens basés sur les trades complets
-        trades_complets = df.groupby("Cle_Match").agg({
+        trades_complets = df.groupby("Cle_Match", observed=True).agg({
             "Profit": "sum"
         }).reset_index()
         
@@ -1202,52 +1459,11 @@ class TradingAnalyzer:
         stats["gain_moyen"] = profits_gagnants.mean() if len(profits_gagnants) > 0 else 0
         stats["perte_moyenne"] = profits_perdants.mean() if len(profits_perdants) > 0 else 0
         
-        # Calcul des séries consécutives basées sur les trades complets
-        series_gagnantes = []
-        series_perdantes = []
-        
-        serie_gagnante_actuelle = 0
-        serie_perdante_actuelle = 0
-        
-        # Trier par ordre chronologique pour les séries
-        if "Heure d'ouverture" in df.columns:
-            df_triee = df.sort_values("Heure d'ouverture")
-        elif "Ordre_ordre" in df.columns:
-            df_triee = df.sort_values("Ordre_ordre")
-        else:
-            df_triee = df
-        
-        # Parcourir les trades complets dans l'ordre chronologique
-        for _, row in trades_complets.iterrows():
-            profit = row["Profit"]
-            
-            if profit > 0:
-                serie_gagnante_actuelle += 1
-                if serie_perdante_actuelle > 0:
-                    series_perdantes.append(serie_perdante_actuelle)
-                    serie_perdante_actuelle = 0
-            elif profit < 0:
-                serie_perdante_actuelle += 1
-                if serie_gagnante_actuelle > 0:
-                    series_gagnantes.append(serie_gagnante_actuelle)
-                    serie_gagnante_actuelle = 0
-            else:
-                # Trade neutre
-                if serie_gagnante_actuelle > 0:
-                    series_gagnantes.append(serie_gagnante_actuelle)
-                    serie_gagnante_actuelle = 0
-                if serie_perdante_actuelle > 0:
-                    series_perdantes.append(serie_perdante_actuelle)
-                    serie_perdante_actuelle = 0
-        
-        # Ajouter la dernière série
-        if serie_gagnante_actuelle > 0:
-            series_gagnantes.append(serie_gagnante_actuelle)
-        if serie_perdante_actuelle > 0:
-            series_perdantes.append(serie_perdante_actuelle)
-        
-        stats["gains_consecutifs_max"] = max(series_gagnantes) if series_gagnantes else 0
-        stats["pertes_consecutives_max"] = max(series_perdantes) if series_perdantes else 0
+        # Séries consécutives : trades complets dans l'ordre chronologique de clôture (codage par plages)
+        sequences = sequences_trades.analyser_sequences(df)
+        stats["gains_consecutifs_max"] = sequences['global']['series_gagnantes']['max']
+        stats["pertes_consecutives_max"] = sequences['global']['series_perdantes']['max']
+        stats["sequences"] = sequences
         
         # Statistiques du drawdown (basées sur toutes les lignes pour la continuité)
         stats["drawdown_max_pct"] = df["Drawdown_pct"].max()
@@ -1272,6 +1488,7 @@ class TradingAnalyzer:
         - Horaires de fermeture majoritaires (dernier OUT par trade)
         - Heures/Jours/Mois: profits totaux survenus (sur les OUT)
         - Comptes TP/SL par heure/jour/mois (TP=profit total du trade >0, SL<0, au dernier OUT)
+        - Matrices croisées heure × jour, session × symbole, mois × symbole (matrices_croisees)
         - Évolution cumulée du profit (linéaire) au moment du dernier OUT de chaque trade
         - Durée moyenne/médiane des trades (IN -> dernier OUT)
         """
@@ -1302,7 +1519,7 @@ class TradingAnalyzer:
         heures_out_dernier = pd.Series(0, index=heures_index, dtype=int)
         if len(df_out) > 0 and "Cle_Match" in df_out.columns:
             # Dernier OUT par Cle_Match
-            idx_last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match").tail(1)
+            idx_last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match", observed=True).tail(1)
             heures_out_dernier = idx_last_out["Datetime"].dt.hour.value_counts().sort_index()
             heures_out_dernier = heures_out_dernier.reindex(heures_index, fill_value=0)
         result["heures_out_counts"] = heures_out_dernier
@@ -1362,27 +1579,17 @@ class TradingAnalyzer:
         result["best_month"], result["worst_month"] = _best_worst(profits_par_mois)
 
         # 3bis) Comptes TP/SL par heure/jour/mois basés sur le dernier OUT et le profit total du trade
-        tpsl_by_hour = pd.Series(0, index=heures_index, dtype=int)
-        sl_by_hour = pd.Series(0, index=heures_index, dtype=int)
-        tpsl_by_day = pd.Series(0, index=jours_index, dtype=int)
-        sl_by_day = pd.Series(0, index=jours_index, dtype=int)
-        tpsl_by_month = pd.Series(0, index=mois_index, dtype=int)
-        sl_by_month = pd.Series(0, index=mois_index, dtype=int)
-        if len(df_out) > 0 and "Cle_Match" in df_out.columns:
-            trade_profit = df.groupby("Cle_Match")["Profit"].sum().reset_index()
-            last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match").tail(1)[["Cle_Match", "Datetime"]]
-            trades_final = trade_profit.merge(last_out, on="Cle_Match", how="inner")
-            trades_final["hour"] = trades_final["Datetime"].dt.hour
-            trades_final["day"] = trades_final["Datetime"].dt.dayofweek
-            trades_final["month"] = trades_final["Datetime"].dt.month
-            tps = trades_final[trades_final["Profit"] > 0]
-            sls = trades_final[trades_final["Profit"] < 0]
-            tpsl_by_hour = tps.groupby("hour").size().reindex(heures_index, fill_value=0)
-            sl_by_hour = sls.groupby("hour").size().reindex(heures_index, fill_value=0)
-            tpsl_by_day = tps.groupby("day").size().reindex(jours_index, fill_value=0)
-            sl_by_day = sls.groupby("day").size().reindex(jours_index, fill_value=0)
-            tpsl_by_month = tps.groupby("month").size().reindex(mois_index, fill_value=0)
-            sl_by_month = sls.groupby("month").size().reindex(mois_index, fill_value=0)
+        # (marges des matrices croisées, calculées en une seule réduction groupée)
+        matrices = matrices_croisees.calculer_matrices(df, self.sessions)
+        result["matrices_croisees"] = matrices
+        tp_heure_jour = np.array(matrices["heure_jour"]["tp"], dtype=int)
+        sl_heure_jour = np.array(matrices["heure_jour"]["sl"], dtype=int)
+        tpsl_by_hour = pd.Series(tp_heure_jour.sum(axis=1), index=heures_index, dtype=int)
+        sl_by_hour = pd.Series(sl_heure_jour.sum(axis=1), index=heures_index, dtype=int)
+        tpsl_by_day = pd.Series(tp_heure_jour.sum(axis=0), index=jours_index, dtype=int)
+        sl_by_day = pd.Series(sl_heure_jour.sum(axis=0), index=jours_index, dtype=int)
+        tpsl_by_month = pd.Series(np.array(matrices["mois_symbole"]["tp"], dtype=int).sum(axis=1), index=mois_index, dtype=int)
+        sl_by_month = pd.Series(np.array(matrices["mois_symbole"]["sl"], dtype=int).sum(axis=1), index=mois_index, dtype=int)
         result["tp_par_heure"] = tpsl_by_hour
         result["sl_par_heure"] = sl_by_hour
         result["tp_par_jour"] = tpsl_by_day
@@ -1393,8 +1600,8 @@ class TradingAnalyzer:
         # 4) Évolution cumulée (linéaire) des profits par trade au moment du dernier OUT
         cumul_df = pd.DataFrame(columns=["Datetime", "Profit_Trade", "Cumul_Profit"]) 
         if "Cle_Match" in df.columns and len(df_out) > 0:
-            trades_sum = df.groupby("Cle_Match")["Profit"].sum().reset_index()
-            last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match").tail(1)[["Cle_Match", "Datetime"]]
+            trades_sum = df.groupby("Cle_Match", observed=True)["Profit"].sum().reset_index()
+            last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match", observed=True).tail(1)[["Cle_Match", "Datetime"]]
             series_trades = trades_sum.merge(last_out, on="Cle_Match", how="inner").dropna(subset=["Datetime"]) 
             series_trades = series_trades.sort_values("Datetime")
             series_trades["Cumul_Profit"] = series_trades["Profit"].cumsum()
@@ -1405,8 +1612,8 @@ class TradingAnalyzer:
         duree_moyenne_minutes = None
         duree_mediane_minutes = None
         if "Cle_Match" in df.columns and len(df_in) > 0 and len(df_out) > 0:
-            first_in = df_in.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match").head(1)[["Cle_Match", "Datetime"]].rename(columns={"Datetime": "InTime"})
-            last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match").tail(1)[["Cle_Match", "Datetime"]].rename(columns={"Datetime": "OutTime"})
+            first_in = df_in.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match", observed=True).head(1)[["Cle_Match", "Datetime"]].rename(columns={"Datetime": "InTime"})
+            last_out = df_out.sort_values(["Cle_Match", "Datetime"]).groupby("Cle_Match", observed=True).tail(1)[["Cle_Match", "Datetime"]].rename(columns={"Datetime": "OutTime"})
             joined = first_in.merge(last_out, on="Cle_Match", how="inner")
             if len(joined) > 0:
                 durees = (joined["OutTime"] - joined["InTime"]).dt.total_seconds() / 60.0
@@ -1457,113 +1664,21 @@ class TradingAnalyzer:
         return result
 
     def calculer_performance_par_session(self, df: pd.DataFrame):
-        """Calcule la performance par session (Asie/Europe/Amérique).
+        """Calcule la performance par session (sessions_trading, configuration self.sessions).
 
-        Règles:
+        Sessions par défaut (ANALYZER_SESSIONS=utc):
         - Session Asie: 00:00-07:59 UTC
         - Session Europe: 08:00-15:59 UTC
         - Session Amérique: 16:00-23:59 UTC
+        ANALYZER_SESSIONS=marches: places de Tokyo / Londres / New York à l'heure locale (heure d'été
+        comprise) et chevauchement Londres/New York ; ANALYZER_FUSEAU_SERVEUR: heure du serveur MT5.
 
         Métriques:
         - Côté IN (qualité d'ouverture): nb IN, taux de réussite des trades ouverts dans la session
         - Côté OUT (attribution du PnL): PnL total basé sur le DERNIER OUT (profit total du trade), nb TP/SL
         - Décliné par paire (Symbole_ordre) et au total
         """
-        result = {
-            "sessions_total": {},
-            "sessions_par_pair": {}
-        }
-
-        if "Heure d'ouverture" not in df.columns or "Direction" not in df.columns:
-            return result
-
-        data = df.copy()
-        data["Datetime"] = pd.to_datetime(data["Heure d'ouverture"], errors='coerce')
-        data = data[data["Datetime"].notna()]
-        if len(data) == 0:
-            return result
-
-        # Helper: assign session by hour
-        def heure_to_session(h):
-            try:
-                h = int(h)
-            except Exception:
-                return "Autre"
-            if 0 <= h <= 7:
-                return "Asie"
-            if 8 <= h <= 15:
-                return "Europe"
-            if 16 <= h <= 23:
-                return "Amérique"
-            return "Autre"
-
-        data["Session"] = data["Datetime"].dt.hour.apply(heure_to_session)
-
-        # Calcul par paire puis total
-        symbols = list(data["Symbole_ordre"].dropna().unique()) if "Symbole_ordre" in data.columns else ["TOTAL"]
-        if "Symbole_ordre" not in data.columns:
-            data["Symbole_ordre"] = "TOTAL"
-
-        for symbole in symbols:
-            d = data[data["Symbole_ordre"] == symbole].copy()
-            if len(d) == 0:
-                continue
-
-            # Vue IN: qualité des ouvertures par session
-            d_in = d[d["Direction"] == "in"].copy()
-            in_by_session = d_in.groupby("Session").size().reindex(["Asie","Europe","Amérique"], fill_value=0)
-
-            # Pour le taux de réussite côté IN, on a besoin du résultat du trade complet
-            taux_reussite_in = {"Asie": 0.0, "Europe": 0.0, "Amérique": 0.0}
-            if "Cle_Match" in d.columns and len(d_in) > 0:
-                # Profit total par trade
-                profit_par_trade = d.groupby("Cle_Match")["Profit"].sum()
-                # Session d'ouverture du trade (session du premier IN)
-                first_in = d_in.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").head(1)[["Cle_Match","Session"]]
-                first_in = first_in.dropna(subset=["Cle_Match"]).set_index("Cle_Match")
-                joined = first_in.join(profit_par_trade, how="left").rename(columns={"Profit":"Profit_Trade"})
-                for sess in ["Asie","Europe","Amérique"]:
-                    subset = joined[joined["Session"] == sess]
-                    denom = len(subset)
-                    if denom > 0:
-                        taux = (len(subset[subset["Profit_Trade"] > 0]) / denom) * 100.0
-                        taux_reussite_in[sess] = round(float(taux), 2)
-
-            # Vue OUT: attribution PnL sur le DERNIER OUT et comptage TP/SL par session de sortie
-            d_out = d[d["Direction"] == "out"].copy()
-            pnl_session = {"Asie": 0.0, "Europe": 0.0, "Amérique": 0.0}
-            tp_session = {"Asie": 0, "Europe": 0, "Amérique": 0}
-            sl_session = {"Asie": 0, "Europe": 0, "Amérique": 0}
-            if len(d_out) > 0 and "Cle_Match" in d_out.columns:
-                # Profit total du trade + session du dernier OUT
-                trade_profit = d.groupby("Cle_Match")["Profit"].sum().reset_index()
-                last_out = d_out.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").tail(1)[["Cle_Match","Session"]]
-                final = trade_profit.merge(last_out, on="Cle_Match", how="inner")
-                for sess in ["Asie","Europe","Amérique"]:
-                    pnl = final[final["Session"] == sess]["Profit"].sum()
-                    pnl_session[sess] = float(round(pnl, 2))
-                    tp_session[sess] = int((final[(final["Session"] == sess) & (final["Profit"] > 0)]).shape[0])
-                    sl_session[sess] = int((final[(final["Session"] == sess) & (final["Profit"] < 0)]).shape[0])
-
-            bloc = {
-                "in_count": {k: int(in_by_session.get(k, 0)) for k in ["Asie","Europe","Amérique"]},
-                "taux_reussite_in_pct": taux_reussite_in,
-                "pnl_out": pnl_session,
-                "tp_out": tp_session,
-                "sl_out": sl_session
-            }
-
-            if symbole == "TOTAL":
-                result["sessions_total"] = bloc
-            else:
-                result["sessions_par_pair"][symbole] = bloc
-
-        # Si on a plusieurs paires, calculer aussi un total global en agrégeant toutes les lignes
-        if "TOTAL" not in symbols and "Symbole_ordre" in df.columns:
-            result_global = self.calculer_performance_par_session(data.assign(Symbole_ordre="TOTAL"))
-            result["sessions_total"] = result_global.get("sessions_total", {})
-
-        return result
+        return sessions_trading.performance_par_session(df, self.sessions)
 
     def calculer_patterns(self, df: pd.DataFrame, min_support: float = 0.03, min_confidence: float = 0.55, top_k: int = 10, n_permutations: int = 200, max_itemset_size: int = 3):
         """Détecte des patterns (itemsets 1-2) et génère des règles vers TP/SL avec p-values.
@@ -1591,11 +1706,11 @@ class TradingAnalyzer:
         if len(df_in) == 0 or len(df_out) == 0:
             return results
 
-        first_in = df_in.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").head(1)
-        last_out = df_out.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").tail(1)
-        profit_par_trade = data.groupby("Cle_Match")["Profit"].sum()
-        pips_par_trade = data.groupby("Cle_Match")["Profit_pips"].sum() if "Profit_pips" in data.columns else None
-        outs_count = df_out.groupby("Cle_Match").size()
+        first_in = df_in.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match", observed=True).head(1)
+        last_out = df_out.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match", observed=True).tail(1)
+        profit_par_trade = data.groupby("Cle_Match", observed=True)["Profit"].sum()
+        pips_par_trade = data.groupby("Cle_Match", observed=True)["Profit_pips"].sum() if "Profit_pips" in data.columns else None
+        outs_count = df_out.groupby("Cle_Match", observed=True).size()
 
         # Construction du tableau des trades complets
         trades = first_in[["Cle_Match","Symbole_ordre","Type_ordre","Datetime"]].rename(columns={"Datetime":"InTime"}).copy()
@@ -1851,9 +1966,9 @@ class TradingAnalyzer:
         if len(df_in) == 0 or len(df_out) == 0:
             return pd.DataFrame()
 
-        first_in = df_in.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").head(1)
-        last_out = df_out.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match").tail(1)
-        profit_par_trade = data.groupby("Cle_Match")["Profit"].sum()
+        first_in = df_in.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match", observed=True).head(1)
+        last_out = df_out.sort_values(["Cle_Match","Datetime"]).groupby("Cle_Match", observed=True).tail(1)
+        profit_par_trade = data.groupby("Cle_Match", observed=True)["Profit"].sum()
 
         trades = first_in[["Cle_Match","Type_ordre","Datetime"]].rename(columns={"Datetime":"InTime"}).copy()
         trades = trades.merge(last_out[["Cle_Match","Datetime"]].rename(columns={"Datetime":"OutTime"}), on="Cle_Match", how="inner")
@@ -2005,13 +2120,21 @@ class TradingAnalyzer:
             res_df = res_df.head(top_k)
             return res_df
     
-    def create_excel_report(self, df_final, reports_folder, timestamp, filter_type=None):
-        """Crée un rapport Excel complet avec graphiques"""
+    def create_excel_report(self, df_final, reports_folder, timestamp, filter_type=None, resultat_monte_carlo=None,
+                            resultat_glissantes=None):
+        """
+        Crée un rapport Excel complet avec graphiques.
+
+        Args:
+            resultat_monte_carlo: simulation déjà calculée (monte_carlo.simuler_analyse) ; None : calculée ici
+            resultat_glissantes: métriques glissantes déjà calculées (calculer_metriques_glissantes) ; None : calculées ici
+        """
         try:
             print(f"[DEBUG] Starting Excel report creation")
             
             # Calculer les statistiques avancees
-            stats_avancees = self.calculer_statistiques_avancees(df_final)
+            with etape("statistiques_avancees", lignes_entree=df_final):
+                stats_avancees = self.calculer_statistiques_avancees(df_final)
             
             wb = Workbook()
             wb.remove(wb.active)
@@ -2036,7 +2159,7 @@ class TradingAnalyzer:
             trades_avec_resultat = trades_gagnants + trades_perdants
             
             # Calculer le profit total basé sur les trades complets
-            trades_complets = df_final.groupby("Cle_Match").agg({
+            trades_complets = df_final.groupby("Cle_Match", observed=True).agg({
                 "Profit": "sum"
             }).reset_index()
             profit_total_lineaire = trades_complets["Profit"].sum()
@@ -2044,7 +2167,7 @@ class TradingAnalyzer:
             profit_total_compose = df_final['Profit_cumule'].iloc[-1] if len(df_final) > 0 else 0
 
             # Pips totaux et statistiques de pips calculés PAR TRADE COMPLET
-            trades_complets_pips = df_final.groupby("Cle_Match").agg({
+            trades_complets_pips = df_final.groupby("Cle_Match", observed=True).agg({
                 "Profit_pips": "sum"
             }).reset_index()
             pips_totaux = trades_complets_pips["Profit_pips"].sum() if len(trades_complets_pips) > 0 else 0
@@ -2125,8 +2248,9 @@ class TradingAnalyzer:
             print(f"[DEBUG] Summary sheet created with {len(stats_data)} rows")
 
             # === AGRÉGATIONS POUR GRAPHIQUES (placer dans une feuille dédiée) ===
-            aggs = self.calculer_agregations_graphes(df_final)
-            sessions = self.calculer_performance_par_session(df_final)
+            with etape("agregations", lignes_entree=df_final):
+                aggs = self.calculer_agregations_graphes(df_final)
+                sessions = self.calculer_performance_par_session(df_final)
             ws_charts = wb.create_sheet("📈 Graphiques Résumé")
 
             # === SECTION 1: DURÉE MOYENNE ===
@@ -2508,10 +2632,10 @@ class TradingAnalyzer:
             
             # Vérifier s'il y a du Forex et des autres instruments
             if "Symbole_ordre" in df_final.columns:
-                types_instruments = set()
-                for symbole in df_final["Symbole_ordre"].unique():
-                    type_inst = self.detecter_type_instrument(symbole)
-                    types_instruments.add(type_inst)
+                if "Type_Instrument" in df_final.columns:
+                    types_instruments = {InstrumentType(v) for v in df_final["Type_Instrument"].dropna().unique()}
+                else:
+                    types_instruments = {self.type_instrument(s) for s in df_final["Symbole_ordre"].unique()}
                 
                 # Si on a seulement du Forex -> "Profit_pips"
                 # Si on a seulement des autres -> "Profit_points"  
@@ -2585,10 +2709,10 @@ class TradingAnalyzer:
                 
                 # Analyser les performances par instrument
                 # Compter les trades complets par instrument (clés uniques)
-                trades_par_instrument = df_final.groupby("Symbole_ordre")["Cle_Match"].nunique()
+                trades_par_instrument = df_final.groupby("Symbole_ordre", observed=True)["Cle_Match"].nunique()
                 
                 # Calculer les profits par instrument
-                profits_par_instrument = df_final.groupby("Symbole_ordre").agg({
+                profits_par_instrument = df_final.groupby("Symbole_ordre", observed=True).agg({
                     'Profit': ['sum', 'mean'],
                     'Profit_pips': ['sum', 'mean']
                 }).round(2)
@@ -2605,7 +2729,7 @@ class TradingAnalyzer:
                 analyse_instruments = analyse_instruments.sort_values('Profit_Total', ascending=False)
                 
                 # Ajouter le type d'instrument
-                analyse_instruments['Type_Instrument'] = analyse_instruments['Symbole_ordre'].apply(self.detecter_type_instrument)
+                analyse_instruments['Type_Instrument'] = analyse_instruments['Symbole_ordre'].apply(self.type_instrument)
                 
                 # En-têtes
                 headers_instruments = ['Instrument', 'Type', 'Nb Trades', 'Profit Total (€)', 'Profit Moyen (€)', 'Pips/Points Total', 'Pips/Points Moyen']
@@ -2633,10 +2757,11 @@ class TradingAnalyzer:
                 
                 # Ajouter une colonne temporaire pour le type d'instrument
                 df_final_copy = df_final.copy()
-                df_final_copy['Type_Instrument'] = df_final_copy['Symbole_ordre'].apply(self.detecter_type_instrument)
+                if 'Type_Instrument' not in df_final_copy.columns:
+                    df_final_copy = self.classifier_instruments(df_final_copy)
                 
-                # Convertir les enums en chaînes pour le groupby
-                df_final_copy['Type_Instrument_Str'] = df_final_copy['Type_Instrument'].apply(lambda x: x.value)
+                # Chaînes pour le groupby
+                df_final_copy['Type_Instrument_Str'] = df_final_copy['Type_Instrument'].astype(str)
                 
                 # Analyser par type d'instrument
                 # Compter les trades complets par type (clés uniques)
@@ -2735,7 +2860,7 @@ class TradingAnalyzer:
                         cell_titre.alignment = Alignment(horizontal="center", vertical="center")
                         
                         # Déterminer le type d'instrument pour l'affichage
-                        type_instrument = self.detecter_type_instrument(instrument)
+                        type_instrument = self.type_instrument(instrument)
                         is_forex = (type_instrument == InstrumentType.FOREX)
                         unite_mesure = "Pips" if is_forex else "Points"
                         
@@ -2744,7 +2869,7 @@ class TradingAnalyzer:
                         nb_operations = len(df_instrument)
                         
                         # Calculer les trades gagnants/perdants basés sur les trades complets
-                        trades_complets_instrument = df_instrument.groupby("Cle_Match").agg({
+                        trades_complets_instrument = df_instrument.groupby("Cle_Match", observed=True).agg({
                             "Profit": "sum"
                         }).reset_index()
                         
@@ -2814,7 +2939,7 @@ class TradingAnalyzer:
                                     cell.font = Font(bold=True, color="FFFFFF")
                                     cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
                                     cell.alignment = Alignment(horizontal="center")
-                                lignes = ["Asie","Europe","Amérique"]
+                                lignes = sessions.get("sessions", list(bloc_pair.get("in_count", {})))
                                 for r_idx, sess in enumerate(lignes, start=start_row+3):
                                     ws_instrument.cell(row=r_idx, column=1, value=sess)
                                     ws_instrument.cell(row=r_idx, column=2, value=int(bloc_pair.get('in_count',{}).get(sess,0)))
@@ -2877,7 +3002,8 @@ class TradingAnalyzer:
 
             # === ONGLET 6: PATTERNS (MVP étendu) ===
             try:
-                patterns = self.calculer_patterns(df_final, n_permutations=500, max_itemset_size=3)
+                with etape("patterns", lignes_entree=df_final):
+                    patterns = self.calculer_patterns(df_final, n_permutations=500, max_itemset_size=3)
                 ws_patterns = wb.create_sheet("🧩 Patterns")
                 # Explications
                 ws_patterns['A1'] = "🧩 Détection de patterns (règles d'association)"
@@ -2969,7 +3095,8 @@ class TradingAnalyzer:
                     ]
                     for i, line in enumerate(explain, start=1):
                         ws_patterns.cell(row=row+2+i, column=1, value=line)
-                    infl = self.calculer_modele_influence(df_final)
+                    with etape("modele_influence", lignes_entree=df_final):
+                        infl = self.calculer_modele_influence(df_final)
                     if not infl.empty:
                         base_row = row + 2 + len(explain) + 2
                         headers_m = ["Feature", "Coef", "Odds Ratio", "p-value"]
@@ -2991,7 +3118,165 @@ class TradingAnalyzer:
                     print(f"[WARNING] Influence model block failed: {e}")
             except Exception as e:
                 print(f"[WARNING] Patterns sheet creation failed: {e}")
+
+            # === ONGLET 7: SCÉNARIOS DE CAPITAL (solde initial × multiplicateur) ===
+            try:
+                soldes, multiplicateurs = scenarios_capital.grille_par_defaut(self.solde_initial, self.multiplier)
+                with etape("scenarios_capital", lignes_entree=df_final):
+                    scenarios = scenarios_capital.evaluer_grille(self, df_final, soldes, multiplicateurs)
+                ws_scenarios = wb.create_sheet("🎯 Scénarios Capital")
+                ws_scenarios['A1'] = "🎯 Scénarios de capital : mêmes trades, autre solde initial / taille de position"
+                ws_scenarios['A1'].font = Font(bold=True, color="366092", size=14)
+                ws_scenarios['A2'] = "Profits recalculés pour chaque multiplicateur, cumuls composés rejoués pour chaque solde initial."
+                ws_scenarios['A3'] = "Sous l'eau max : plus longue période sous le plus haut solde (jusqu'au retour au sommet). Temps sous l'eau : part de la période."
+                headers_s = ["Solde initial", "Multiplicateur", "Solde final", "Rendement (%)", "Drawdown max (%)",
+                             "Sous l'eau max (jours)", "Temps sous l'eau (%)"]
+                for i, h in enumerate(headers_s, 1):
+                    cell = ws_scenarios.cell(row=5, column=i, value=h)
+                    cell.font = Font(bold=True, color="FFFFFF")
+                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                    cell.alignment = Alignment(horizontal="center")
+                for r_idx, sc in enumerate(scenarios['grille'], start=6):
+                    valeurs = [sc['solde_initial'], sc['multiplicateur'], sc['solde_final'], sc['rendement_pct'],
+                               sc['drawdown_max_pct'], sc['sous_l_eau_max_jours'], sc['sous_l_eau_pct']]
+                    for c_idx, valeur in enumerate(valeurs, 1):
+                        ws_scenarios.cell(row=r_idx, column=c_idx, value=valeur)
+                    # Paramètres de l'analyse en cours
+                    if sc['solde_initial'] == round(float(self.solde_initial), 2) and sc['multiplicateur'] == round(self.multiplier, 4):
+                        for c_idx in range(1, len(valeurs) + 1):
+                            ws_scenarios.cell(row=r_idx, column=c_idx).font = Font(bold=True)
+                    couleur = "C6EFCE" if sc['rendement_pct'] > 0 else "FFC7CE" if sc['rendement_pct'] < 0 else None
+                    if couleur:
+                        ws_scenarios.cell(row=r_idx, column=4).fill = PatternFill(start_color=couleur, end_color=couleur, fill_type="solid")
+            except Exception as e:
+                print(f"[WARNING] Scenarios sheet creation failed: {e}")
+
+            # === ONGLET 8: MONTE CARLO (ordre des trades) ===
+            try:
+                mc = resultat_monte_carlo
+                if mc is None:
+                    with etape("monte_carlo", lignes_entree=df_final):
+                        mc = monte_carlo.simuler_analyse(df_final, solde_initial=self.solde_initial)
+                ws_mc = wb.create_sheet("🎲 Monte Carlo")
+                ws_mc['A1'] = "🎲 Monte Carlo : distribution du drawdown et du rendement selon l'ordre des trades"
+                ws_mc['A1'].font = Font(bold=True, color="366092", size=14)
+                description = monte_carlo.DESCRIPTIONS_METHODES.get(mc['methode'], mc['methode'])
+                ws_mc['A2'] = (f"{mc['nb_chemins']} chemins ({mc['methode']} : {description}), "
+                               f"{mc['nb_trades']} trades, graine {mc['graine']}.")
+                ws_mc['A3'] = f"Ruine : perte d'au moins {mc['seuil_ruine_pct']:.0f}% du solde initial sur le chemin."
+                headers_mc = ["Mesure"] + [f"P{p}" for p in monte_carlo.PERCENTILES] + ["Historique"]
+                for i, h in enumerate(headers_mc, 1):
+                    cell = ws_mc.cell(row=5, column=i, value=h)
+                    cell.font = Font(bold=True, color="FFFFFF")
+                    cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                    cell.alignment = Alignment(horizontal="center")
+                for r_idx, (libelle, cle) in enumerate((("Drawdown max (%)", 'drawdown_max_pct'), ("Rendement (%)", 'rendement_pct')), start=6):
+                    ws_mc.cell(row=r_idx, column=1, value=libelle)
+                    for c_idx, p in enumerate(monte_carlo.PERCENTILES, 2):
+                        ws_mc.cell(row=r_idx, column=c_idx, value=mc[cle][f"p{p}"])
+                    ws_mc.cell(row=r_idx, column=len(headers_mc), value=mc['historique'][cle])
+                ws_mc['A9'] = "Probabilité de ruine (%)"
+                ws_mc['B9'] = mc['probabilite_ruine_pct']
+                ws_mc['A10'] = "Rendement moyen (%)"
+                ws_mc['B10'] = mc['rendement_moyen_pct']
+                ws_mc['A9'].font = Font(bold=True)
+                ws_mc['A10'].font = Font(bold=True)
+            except Exception as e:
+                print(f"[WARNING] Monte Carlo sheet creation failed: {e}")
             
+            # === ONGLET 9: MÉTRIQUES GLISSANTES (optionnel) ===
+            try:
+                glissantes = resultat_glissantes
+                if glissantes is None and self.graphiques_glissants:
+                    with etape("metriques_glissantes", lignes_entree=df_final):
+                        glissantes = metriques_glissantes.calculer_metriques_glissantes(df_final, solde_initial=self.solde_initial)
+                if self.graphiques_glissants:
+                    ws_gl = wb.create_sheet("📉 Métriques Glissantes")
+                    ws_gl['A1'] = "📉 Métriques glissantes : taux de réussite, espérance, drawdown (N trades) et Sharpe / Sortino (N jours ouvrés)"
+                    ws_gl['A1'].font = Font(bold=True, color="366092", size=14)
+                    # Graphiques en haut (une ligne par famille de fenêtres), données en dessous
+                    ligne_donnees = 42
+                    colonne = 1
+                    familles_gl = (
+                        ('trades', "trades", (("Taux réussite (%)", 'taux_reussite'), ("Espérance (€)", 'esperance'), ("Drawdown max (%)", 'drawdown_max_pct'))),
+                        ('jours', "jours", (("Sharpe", 'sharpe'), ("Sortino", 'sortino'), ("Drawdown max (%)", 'drawdown_max_pct'))),
+                    )
+                    for rang_famille, (famille, unite, mesures_gl) in enumerate(familles_gl):
+                        bloc = glissantes[famille]
+                        fenetres = [str(f) for f in bloc['fenetres']]
+                        derniere_ligne = ligne_donnees + len(bloc['dates'])
+                        ws_gl.cell(row=ligne_donnees, column=colonne, value="Date")
+                        for i, date in enumerate(bloc['dates'], start=ligne_donnees + 1):
+                            ws_gl.cell(row=i, column=colonne, value=date[:10] if famille == 'jours' else date.replace('T', ' ')[:16])
+                        premiere = colonne + 1
+                        for rang_mesure, (libelle, cle) in enumerate(mesures_gl):
+                            for j, fenetre in enumerate(fenetres):
+                                ws_gl.cell(row=ligne_donnees, column=premiere + j, value=f"{libelle} {fenetre} {unite}")
+                                for i, valeur in enumerate(bloc['series'][fenetre][cle], start=ligne_donnees + 1):
+                                    ws_gl.cell(row=i, column=premiere + j, value=valeur)
+                            chart_gl = LineChart()
+                            chart_gl.title = f"{libelle} glissant ({unite})"
+                            data = Reference(ws_gl, min_col=premiere, max_col=premiere + len(fenetres) - 1, min_row=ligne_donnees, max_row=derniere_ligne)
+                            cats = Reference(ws_gl, min_col=colonne, min_row=ligne_donnees + 1, max_row=derniere_ligne)
+                            chart_gl.add_data(data, titles_from_data=True)
+                            chart_gl.set_categories(cats)
+                            chart_gl.legend.position = 'b'
+                            chart_gl.height = 9
+                            chart_gl.width = 16
+                            ws_gl.add_chart(chart_gl, f"{get_column_letter(1 + rang_mesure * 9)}{3 + rang_famille * 19}")
+                            premiere += len(fenetres)
+                        colonne = premiere + 1
+                    for cell in ws_gl[ligne_donnees]:
+                        if cell.value is not None:
+                            cell.font = Font(bold=True, color="FFFFFF")
+                            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                            cell.alignment = Alignment(horizontal="center")
+            except Exception as e:
+                print(f"[WARNING] Rolling metrics sheet creation failed: {e}")
+
+            # === ONGLET 10: HEATMAPS (matrices croisées) ===
+            try:
+                matrices = aggs.get("matrices_croisees") or matrices_croisees.calculer_matrices(df_final, self.sessions)
+                ws_hm = wb.create_sheet("🔥 Heatmaps")
+                ws_hm['A1'] = "🔥 Heatmaps : trades complets par case (date du dernier OUT)"
+                ws_hm['A1'].font = Font(bold=True, color="366092", size=14)
+                ws_hm['A2'] = (f"PnL du trade complet, taux de réussite TP / (TP + SL) ; heures du serveur, sessions : "
+                               f"{', '.join(matrices['session_symbole']['lignes'])} (serveur {self.sessions['fuseau_serveur']}).")
+                echelles_hm = (
+                    ("PnL (€)", 'pnl', ColorScaleRule(start_type='min', start_color='F8696B', mid_type='num', mid_value=0,
+                                                      mid_color='FFFFFF', end_type='max', end_color='63BE7B')),
+                    ("Taux réussite (%)", 'taux_reussite', ColorScaleRule(start_type='num', start_value=0, start_color='F8696B',
+                                                                          mid_type='num', mid_value=50, mid_color='FFEB84',
+                                                                          end_type='num', end_value=100, end_color='63BE7B')),
+                    ("Trades", 'trades', ColorScaleRule(start_type='num', start_value=0, start_color='FFFFFF',
+                                                        end_type='max', end_color='5B9BD5')),
+                )
+                ligne = 4
+                for titre, cle, axe in (("Heure × Jour", 'heure_jour', "Heure"), ("Session × Symbole", 'session_symbole', "Session"),
+                                        ("Mois × Symbole", 'mois_symbole', "Mois")):
+                    m = matrices[cle]
+                    if not m['colonnes']:
+                        continue
+                    colonne = 1
+                    for libelle, mesure, regle in echelles_hm:
+                        ws_hm.cell(row=ligne, column=colonne, value=f"{titre} : {libelle}").font = Font(bold=True, color="366092")
+                        for c_idx, valeur in enumerate([axe] + m['colonnes'], colonne):
+                            cell = ws_hm.cell(row=ligne + 1, column=c_idx, value=valeur)
+                            cell.font = Font(bold=True, color="FFFFFF")
+                            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+                            cell.alignment = Alignment(horizontal="center")
+                        for r_idx, (etiquette, valeurs) in enumerate(zip(m['lignes'], m[mesure]), start=ligne + 2):
+                            ws_hm.cell(row=r_idx, column=colonne, value=etiquette).font = Font(bold=True)
+                            for c_idx, valeur in enumerate(valeurs, colonne + 1):
+                                ws_hm.cell(row=r_idx, column=c_idx, value=valeur)
+                        zone = (f"{get_column_letter(colonne + 1)}{ligne + 2}:"
+                                f"{get_column_letter(colonne + len(m['colonnes']))}{ligne + 1 + len(m['lignes'])}")
+                        ws_hm.conditional_formatting.add(zone, regle)
+                        colonne += len(m['colonnes']) + 2
+                    ligne += len(m['lignes']) + 4
+            except Exception as e:
+                print(f"[WARNING] Heatmaps sheet creation failed: {e}")
+
             # Tableau: PERFORMANCE PAR SESSION (TOTAL) en bas du Résumé
             try:
                 bloc_total = sessions.get("sessions_total", {}) if 'sessions' in locals() else {}
@@ -3005,7 +3290,7 @@ class TradingAnalyzer:
                         cell.font = Font(bold=True, color="FFFFFF")
                         cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
                         cell.alignment = Alignment(horizontal="center")
-                    lignes = ["Asie","Europe","Amérique"]
+                    lignes = sessions.get("sessions", list(bloc_total.get("in_count", {})))
                     for r_idx, sess in enumerate(lignes, start=last_row+3):
                         ws_resume.cell(row=r_idx, column=1, value=sess)
                         ws_resume.cell(row=r_idx, column=2, value=int(bloc_total.get('in_count',{}).get(sess,0)))
@@ -3033,7 +3318,8 @@ class TradingAnalyzer:
             # Sauvegarder
             suffix = f"_{filter_type.upper()}" if filter_type else "_UNIFIED"
             fichier_rapport = os.path.join(reports_folder, f"RAPPORT_TRADING{suffix}_{timestamp}.xlsx")
-            wb.save(fichier_rapport)
+            with etape("sauvegarde_classeur"):
+                wb.save(fichier_rapport)
             
             print(f"[DEBUG] Excel report saved successfully: {fichier_rapport}")
             return fichier_rapport
@@ -3045,29 +3331,10 @@ class TradingAnalyzer:
             raise Exception(f"Erreur lors de la création du rapport Excel: {str(e)}")
 
 def main():
-    """Fonction principale pour tester le script"""
-    analyzer = TradingAnalyzer(solde_initial=10000)
-    
-    # Exemple d'utilisation
-    print("=== ANALYSEUR DE TRADING UNIFIÉ ===")
-    print("1. Analyse Forex uniquement")
-    print("2. Analyse autres instruments uniquement")
-    print("3. Analyse complète (tous instruments)")
-    print("4. Quitter")
-    
-    choix = input("\nChoisissez une option (1-4): ")
-    
-    if choix == "1":
-        print("Analyse Forex sélectionnée")
-        # Ici vous ajouteriez la logique pour sélectionner les fichiers
-    elif choix == "2":
-        print("Analyse autres instruments sélectionnée")
-    elif choix == "3":
-        print("Analyse complète sélectionnée")
-    elif choix == "4":
-        print("Au revoir!")
-    else:
-        print("Option invalide")
+    """Ligne de commande : voir analyzer.py (python trading_analyzer_unified.py run <dossier> ...)"""
+    from analyzer import main as main_cli
+    return main_cli()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import sys
+    sys.exit(main())